@@ -8,6 +8,7 @@ import time
 import sys
 
 from autoseq.util.path import mkdir
+from autoseq.pipeline.planner import plan_pipeline
 from autoseq.pipeline.alascca import AlasccaPipeline
 
 
@@ -33,9 +34,17 @@ def alascca(ctx, sample):
                                           runner=ctx.obj['runner'],
                                           jobdb=ctx.obj['jobdb'],
                                           dot_file=ctx.obj['dot_file'],
-                                          scratch=ctx.obj['scratch']
+                                          scratch=ctx.obj['scratch'],
+                                          scratch_budget=ctx.obj['scratch_budget'],
+                                          library_cache=ctx.obj['library_cache'],
+                                          stage_dir=ctx.obj['stage_dir']
                                           )
 
+    if ctx.obj['plan']:
+        click.echo(plan_pipeline(ctx.obj['pipeline'], ctx.obj['cores'],
+                                 ctx.obj['job_params'].get('plan-cost-factors')))
+        return
+
     # start main analysis
     ctx.obj['pipeline'].start()
 
@@ -1,19 +1,61 @@
+import hashlib
+import importlib
 import json
 import logging
 import os
 import signal
+from multiprocessing.pool import ThreadPool
 
 import click
-from pypedream import runners
 
-from .alascca import alascca as alascca_cmd
-from .liqbio import liqbio as liqbio_cmd
-from .liqbio import liqbio_prepare as liqbio_prepare_cmd
+from autoseq.util.path import normpath
+from autoseq.util.refstage import stage_reference, preload_bwa_index
+from autoseq.util.scratch import parse_size
 
 __author__ = 'dankle'
 
+# Number of threads used to check the existence of reference files:
+REF_CHECK_WORKERS = 16
 
-@click.group()
+
+class LazyGroup(click.Group):
+    """
+    A click group whose subcommands are only imported when they are invoked, so that the
+    pipelines and their dependencies are not loaded for e.g. --help.
+
+    Subcommands are specified as a dictionary with command name as key and a tuple of
+    ("module.attribute", short help) as value.
+    """
+    def __init__(self, *args, **kwargs):
+        self.lazy_subcommands = kwargs.pop('lazy_subcommands', {})
+        click.Group.__init__(self, *args, **kwargs)
+
+    def list_commands(self, ctx):
+        return sorted(set(click.Group.list_commands(self, ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands:
+            module_name, attribute_name = self.lazy_subcommands[cmd_name][0].rsplit(".", 1)
+            return getattr(importlib.import_module(module_name), attribute_name)
+        return click.Group.get_command(self, ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.lazy_subcommands:
+                rows.append((cmd_name, self.lazy_subcommands[cmd_name][1]))
+            else:
+                rows.append((cmd_name, click.Group.get_command(self, ctx, cmd_name).short_help or ''))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_subcommands={
+    "alascca": ("autoseq.cli.alascca.alascca", "Run the ALASCCA pipeline for a sample."),
+    "liqbio": ("autoseq.cli.liqbio.liqbio", "Run the LiqBio pipeline for a sample."),
+    "liqbio_prepare": ("autoseq.cli.liqbio.liqbio_prepare", "Generate sample configs from clinseq barcodes."),
+})
 @click.option('--ref', default='/nfs/PROBIO/autoseq-genome/autoseq-genome.json',
               help='json with reference files to use',
               type=str)
@@ -21,23 +63,44 @@ __author__ = 'dankle'
                                                  'parameters.',
               type=str)
 @click.option('--outdir', default='/tmp/autoseq-test', help='output directory', type=click.Path())
+@click.option('--ref-cache', default="~/.cache/autoseq", help="directory in which to cache the processed " +
+                                                               "reference data; set to an empty string to disable")
+@click.option('--stage-ref', default=None, help="node-local directory to copy the reference genome and " +
+                                                 "bwa index to, so that jobs read them from local disk")
+@click.option('--bwa-shm', is_flag=True, help="preload the bwa index into shared memory for all " +
+                                              "alignment jobs on this node")
 @click.option('--libdir', default="/tmp", help="directory to search for libraries")
+@click.option('--library-cache', default=None, help="JSON file in which to cache the fastq files found " +
+                                                     "in libdir between runs")
 @click.option('--runner_name', default='shellrunner', help='Runner to use.')
 @click.option('--loglevel', default='INFO', help='level of logging')
-@click.option('--jobdb', default=None, help="sqlite3 database to write job info and stats")
+@click.option('--jobdb', default=None, help="job database to write job info and stats to; a SQLite " +
+                                                 "database is used if the name ends with .db or .sqlite")
 @click.option('--dot_file', default=None, help="write graph to dot file with this name")
 @click.option('--cores', default=1, help="max number of cores to allow jobs to use")
 @click.option('--umi', is_flag=True, help="To process the data with UMI- Unique Molecular Identifier")
 @click.option('--scratch', default="/tmp", help="scratch dir to use")
+@click.option('--stage-dir', default=None, help="node-local directory to copy fastq files to before " +
+                                                 "processing them")
+@click.option('--scratch-budget', default=None, help="total scratch space that concurrently running jobs " +
+                                                      "may use, e.g. 500G; unlimited by default")
+@click.option('--plan', is_flag=True, help="only estimate the core-hours, disk usage and wall-clock time " +
+                                           "of the pipeline, without running it")
 @click.pass_context
-def cli(ctx, ref, job_params, outdir, libdir, runner_name, loglevel, jobdb, dot_file, cores, umi, scratch):
+def cli(ctx, ref, ref_cache, stage_ref, bwa_shm, job_params, outdir, libdir, library_cache, runner_name, loglevel,
+        jobdb, dot_file, cores, umi, scratch, stage_dir, scratch_budget, plan):
     setup_logging(loglevel)
     logging.debug("Reading reference data from {}".format(ref))
     ctx.obj = {}
-    ctx.obj['refdata'] = load_ref(ref)
+    ctx.obj['refdata'] = load_ref(ref, normpath(ref_cache) if ref_cache else None)
+    if stage_ref and not plan:
+        ctx.obj['refdata'] = stage_reference(ctx.obj['refdata'], stage_ref)
+    if bwa_shm and not plan and ctx.obj['refdata'].get('bwaIndex'):
+        preload_bwa_index(ctx.obj['refdata']['bwaIndex'])
     ctx.obj['job_params'] = load_job_params(job_params)
     ctx.obj['outdir'] = outdir
     ctx.obj['libdir'] = libdir
+    ctx.obj['library_cache'] = library_cache
     ctx.obj['pipeline'] = None
     ctx.obj['runner'] = get_runner(runner_name, cores)
     ctx.obj['jobdb'] = jobdb
@@ -45,6 +108,9 @@ def cli(ctx, ref, job_params, outdir, libdir, runner_name, loglevel, jobdb, dot_
     ctx.obj['cores'] = cores
     ctx.obj['umi'] = umi
     ctx.obj['scratch'] = scratch
+    ctx.obj['stage_dir'] = stage_dir
+    ctx.obj['scratch_budget'] = parse_size(scratch_budget) if scratch_budget else None
+    ctx.obj['plan'] = plan
 
     def capture_sigint(sig, frame):
         """
@@ -88,19 +154,33 @@ def convert_to_absolute_path(possible_relative_path, base_path):
     """
 
     converted_value = possible_relative_path
-    try:
-        if not os.path.isabs(possible_relative_path):
-            joined_path = os.path.join(base_path, possible_relative_path)
-            if os.path.isfile(joined_path) or os.path.isdir(joined_path):
-                converted_value = joined_path
-
-    except Exception, e:
-        pass
+    if isinstance(possible_relative_path, basestring) and not os.path.isabs(possible_relative_path):
+        joined_path = os.path.join(base_path, possible_relative_path)
+        if os.path.isfile(joined_path) or os.path.isdir(joined_path):
+            converted_value = joined_path
 
     return converted_value
 
 
-def make_paths_absolute(input_dict, base_path):
+def collect_relative_paths(input_dict, relative_paths):
+    for curr_value in input_dict.values():
+        if isinstance(curr_value, dict):
+            collect_relative_paths(curr_value, relative_paths)
+        elif isinstance(curr_value, basestring) and not os.path.isabs(curr_value):
+            relative_paths.add(curr_value)
+    return relative_paths
+
+
+def replace_values(input_dict, replacements):
+    for curr_key, curr_value in input_dict.items():
+        if isinstance(curr_value, dict):
+            input_dict[curr_key] = replace_values(curr_value, replacements)
+        elif isinstance(curr_value, basestring):
+            input_dict[curr_key] = replacements.get(curr_value, curr_value)
+    return input_dict
+
+
+def make_paths_absolute(input_dict, base_path, workers=REF_CHECK_WORKERS):
     """Processes the input dictionary, converting relative file paths to absolute
     file paths throughout the dictionary structure.
 
@@ -111,35 +191,113 @@ def make_paths_absolute(input_dict, base_path):
     -- If the value is a non-null string that is not already an absolute path,
     then try prepending the specified base_path and see if the resulting file name
     exists, and in that case then replace the string with the resulting absolute path.
+
+    Each distinct relative path is checked once, with the checks run concurrently.
     """
 
-    for curr_key, curr_value in input_dict.items():
-        if isinstance(curr_value, dict):
-            input_dict[curr_key] = make_paths_absolute(curr_value, base_path)
-        else:
-            converted_value = convert_to_absolute_path(curr_value, base_path)
-            input_dict[curr_key] = converted_value
+    relative_paths = list(collect_relative_paths(input_dict, set()))
+    if not relative_paths:
+        return input_dict
+
+    pool = ThreadPool(max(1, min(workers, len(relative_paths))))
+    try:
+        converted_paths = pool.map(lambda path: convert_to_absolute_path(path, base_path), relative_paths)
+    finally:
+        pool.close()
+
+    return replace_values(input_dict, dict(zip(relative_paths, converted_paths)))
 
-    return input_dict
 
+def ref_cache_filename(ref, cache_dir):
+    return os.path.join(cache_dir, "ref-{}.json".format(hashlib.sha1(os.path.abspath(ref).encode("utf-8")).hexdigest()))
 
-def load_ref(ref):
+
+def reference_directories(refdata, base_path):
+    """
+    :return: Sorted list of the directories in which the relative paths of the reference data are
+    looked up, i.e. the directories whose contents determine how the paths are resolved.
+    """
+    return sorted(set(os.path.dirname(os.path.join(base_path, path))
+                      for path in collect_relative_paths(refdata, set())))
+
+
+def directory_mtimes(directories):
+    """
+    :return: Dictionary with directory as key and its modification time as value, or None if it
+    does not exist. Adding or removing a file in a directory changes its modification time.
+    """
+    mtimes = {}
+    for directory in directories:
+        try:
+            mtimes[directory] = os.path.getmtime(directory)
+        except OSError:
+            mtimes[directory] = None
+    return mtimes
+
+
+def load_cached_ref(ref, cache_dir):
+    """
+    Load the cache entry holding the compiled reference manifest of the specified reference
+    JSON file.
+
+    :return: The cache entry, or None if there is none.
+    """
+    try:
+        with open(ref_cache_filename(ref, cache_dir)) as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return None
+
+
+def save_cached_ref(ref, cache_dir, sha1, dir_mtimes, refdata):
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        cache_filename = ref_cache_filename(ref, cache_dir)
+        tmp_filename = "{}.{}.tmp".format(cache_filename, os.getpid())
+        with open(tmp_filename, 'w') as cache_file:
+            json.dump({"sha1": sha1, "dir_mtimes": dir_mtimes, "refdata": refdata}, cache_file)
+        os.rename(tmp_filename, cache_filename)
+    except (IOError, OSError) as e:
+        logging.warning("Could not cache reference data for {}: {}".format(ref, e))
+
+
+def load_ref(ref, cache_dir=None):
     """
     Processes the input genomic reference data JSON file, converting relative file paths
     to absolute paths where required.
 
+    If a cache directory is specified, then the result is cached there. The cached result is
+    reused as long as the content of the reference JSON file is unchanged, and none of the
+    directories in which its relative paths are looked up has been created, removed or had
+    files added or removed since.
+
     :param ref: Input reference file configuration JSON file.
+    :param cache_dir: Optional directory in which to cache the processed reference data.
     :return: Modified reference file dictionary with relative->absolute file path conversions performed.
     """
 
     basepath = os.path.dirname(ref)
     with open(ref, 'r') as fh:
-        refjson = json.load(fh)
-        refjson_abs = make_paths_absolute(refjson, basepath)
-        return refjson_abs
+        content = fh.read()
+    refdata = json.loads(content)
+    if not cache_dir:
+        return make_paths_absolute(refdata, basepath)
+
+    sha1 = hashlib.sha1(content if isinstance(content, bytes) else content.encode("utf-8")).hexdigest()
+    dir_mtimes = directory_mtimes(reference_directories(refdata, basepath))
+    cached = load_cached_ref(ref, cache_dir)
+    if cached and cached.get("sha1") == sha1 and cached.get("dir_mtimes") == dir_mtimes:
+        logging.debug("Using cached reference data for {}".format(ref))
+        return cached["refdata"]
+
+    refjson_abs = make_paths_absolute(refdata, basepath)
+    save_cached_ref(ref, cache_dir, sha1, dir_mtimes, refjson_abs)
+    return refjson_abs
 
 
 def get_runner(runner_name, maxcores):
+    # pypedream is imported here, rather than at module level, to keep CLI startup fast:
     try:
         module = __import__("pypedream.runners." + runner_name, fromlist="runners")
         runner_class = getattr(module, runner_name.title())
@@ -152,6 +310,7 @@ def get_runner(runner_name, maxcores):
     except ImportError:
         print "Couldn't find runner " + runner_name + ". Available Runners:"
         import inspect
+        from pypedream import runners
         for name, obj in inspect.getmembers(runners):
             if name != "runner" and "runner" in name:
                 print "- " + name
@@ -171,7 +330,3 @@ def setup_logging(loglevel="INFO"):
                         format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
     logging.info("Started log with loglevel %(loglevel)s" % {"loglevel": loglevel})
 
-
-cli.add_command(alascca_cmd)
-cli.add_command(liqbio_cmd)
-cli.add_command(liqbio_prepare_cmd)
@@ -0,0 +1,43 @@
+import logging
+
+import click
+
+from autoseq.cli.cli import setup_logging
+from autoseq.util.jobdb import JobDatabase
+
+
+@click.group()
+@click.option('--db', required=True, help='SQLite job database', type=str)
+@click.option('--loglevel', default='INFO', help='level of logging')
+@click.pass_context
+def cli(ctx, db, loglevel):
+    setup_logging(loglevel)
+    ctx.obj = {'db': db}
+
+
+@cli.command('import')
+@click.option('--pipeline', default=None, help="name of the pipeline that wrote the job databases")
+@click.option('--sample', default=None, help="sample analysed in the runs, e.g. the sdid")
+@click.argument('json-jobdbs', nargs=-1, type=click.Path(exists=True))
+@click.pass_context
+def import_json(ctx, pipeline, sample, json_jobdbs):
+    with JobDatabase(ctx.obj['db']) as jobdb:
+        for json_jobdb in json_jobdbs:
+            run_id = jobdb.import_json(json_jobdb, pipeline=pipeline, sample=sample)
+            logging.info("Imported {} as run {}".format(json_jobdb, run_id))
+
+
+@cli.command('runtime')
+@click.option('--tool', required=True, help="tool name, e.g. vardict")
+@click.option('--percentile', default=95.0, help="runtime percentile to report")
+@click.option('--last-runs', default=None, type=int, help="only consider the most recent runs")
+@click.pass_context
+def runtime(ctx, tool, percentile, last_runs):
+    with JobDatabase(ctx.obj['db']) as jobdb:
+        runtimes = jobdb.tool_runtimes(tool, last_runs)
+        value = jobdb.runtime_percentile(tool, percentile, last_runs)
+
+    if value is None:
+        click.echo("No completed {} jobs found".format(tool))
+    else:
+        click.echo("p{:g} runtime of {} over {} jobs: {:.1f} s".format(percentile, tool, len(runtimes), value))
@@ -3,135 +3,227 @@ import logging
 import datetime
 
 import click
+import numpy as np
 
 from autoseq.cli.cli import setup_logging
+from autoseq.util.jobdb import is_sqlite_jobdb, JobDatabase
+
+COLOR_MAPPER = {'FAILED': 'red',
+                'CANCELLED': 'pink',
+                'RUNNING': 'blue',
+                'COMPLETED': '#00ff00',
+                'PENDING': 'lightblue'}
+
+CRITICAL_PATH_COLOR = 'black'
 
 
 @click.command()
-@click.option('--jobdb', required=True, help='json with reference files to use', type=str)
-@click.option('--svg', required=True, help="output svg file", type=str)
+@click.option('--jobdb', required=True, help='job database (JSON, or SQLite if ending with .db/.sqlite)', type=str)
+@click.option('--svg', required=True, help="output file; the format is given by the extension (svg, png, pdf)",
+              type=str)
+@click.option('--run-id', default=None, type=int, help="run to plot from a SQLite job database (default: latest)")
+@click.option('--label-limit', default=200, help="only label jobs with their names if there are at most this many")
 @click.option('--loglevel', default='INFO', help='level of logging')
-def cli(jobdb, svg, loglevel):
+def cli(jobdb, svg, run_id, label_limit, loglevel):
     setup_logging(loglevel)
 
-    jdb = json.load(open(jobdb, 'r'))
-    jobs = jdb['jobs']
-
+    if is_sqlite_jobdb(jobdb):
+        jobs, dependencies = load_jobs_sqlite(jobdb, run_id)
+    else:
+        jobs, dependencies = load_jobs_json(jobdb), None
+
+    gantt = GanttData(jobs, dependencies)
+    logging.info("Plotting {} jobs; critical path has {} jobs".format(gantt.n_jobs, len(gantt.critical_path)))
+    render(gantt, svg, label_limit)
+
+
+def load_jobs_json(jobdb):
+    """
+    Load the finished jobs of a JSON job database.
+
+    :return: List of dictionaries with jobname, status, starttime, endtime and threads.
+    """
+    with open(jobdb, 'r') as jobdb_file:
+        jdb = json.load(jobdb_file)
+
+    return [{'jobname': j['jobname'],
+             'status': j['status'],
+             'starttime': datetime_to_timestamp(deserialize_date(j['starttime'])),
+             'endtime': datetime_to_timestamp(deserialize_date(j['endtime'])),
+             'threads': j.get('threads') or 1}
+            for j in jdb['jobs'] if j['starttime'] and j['endtime']]
+
+
+def load_jobs_sqlite(jobdb, run_id=None):
+    """
+    Load the finished jobs of a run from a SQLite job database, along with the job
+    dependencies implied by the files they consume and produce.
+
+    :return: Tuple (jobs, dependencies), where dependencies is a list of (job index, upstream job index).
+    :raises click.UsageError: If no run is specified and the job database has no runs.
+    """
+    with JobDatabase(jobdb) as db:
+        if run_id is None:
+            run_ids = db.recent_run_ids(1)
+            if not run_ids:
+                raise click.UsageError("The job database {} has no runs".format(jobdb))
+            run_id = run_ids[0]
+        rows = db.connection.execute(
+            "SELECT job_id, jobname, status, starttime, endtime, threads FROM jobs "
+            "WHERE run_id = ? AND starttime IS NOT NULL AND endtime IS NOT NULL", (run_id,)).fetchall()
+        edges = db.connection.execute(
+            "SELECT DISTINCT consumer.job_id, producer.job_id FROM files consumer "
+            "JOIN files producer ON consumer.path = producer.path "
+            "JOIN jobs ON jobs.job_id = consumer.job_id "
+            "WHERE jobs.run_id = ? AND consumer.direction = 'input' AND producer.direction = 'output'",
+            (run_id,)).fetchall()
+
+    job_id_to_idx = dict((row[0], idx) for idx, row in enumerate(rows))
+    jobs = [{'jobname': jobname, 'status': status, 'starttime': starttime, 'endtime': endtime,
+             'threads': threads or 1}
+            for _, jobname, status, starttime, endtime, threads in rows]
+    dependencies = [(job_id_to_idx[consumer], job_id_to_idx[producer]) for consumer, producer in edges
+                    if consumer in job_id_to_idx and producer in job_id_to_idx]
+    return jobs, dependencies
+
+
+def cores_in_use(starts, ends, threads):
+    """
+    Compute the number of cores in use over time.
+
+    :param starts: Array of job start times.
+    :param ends: Array of job end times.
+    :param threads: Array of the number of threads used by each job.
+    :return: Tuple (times, cores) describing a step function; cores[i] applies from times[i] onwards.
+    """
+    times = np.concatenate([starts, ends])
+    deltas = np.concatenate([threads, -threads])
+    # Jobs ending at the same time as others start release their cores first:
+    order = np.lexsort((deltas, times))
+    return times[order], np.cumsum(deltas[order])
+
+
+def critical_path(starts, ends, dependencies=None, tolerance=1.0):
+    """
+    Find the chain of jobs that determined the end time of the pipeline.
+
+    Starting from the last job to finish, repeatedly step to the upstream job that finished
+    last before the current job started. If dependencies are unknown, any job that finished
+    before the current job started (within the tolerance) is considered a potential upstream job.
+
+    :param starts: Array of job start times.
+    :param ends: Array of job end times.
+    :param dependencies: List of (job index, upstream job index) tuples, or None if unknown.
+    :param tolerance: Seconds of slack allowed between an upstream job ending and a job starting.
+    :return: List of job indexes on the critical path, in order of execution.
+    """
+    if len(ends) == 0:
+        return []
+
+    upstream = None
+    if dependencies is not None:
+        upstream = {}
+        for job_idx, upstream_idx in dependencies:
+            upstream.setdefault(job_idx, []).append(upstream_idx)
+
+    order = np.argsort(ends, kind='mergesort')
+    sorted_ends = ends[order]
+
+    path = [int(order[-1])]
+    while True:
+        current = path[-1]
+        if upstream is not None:
+            candidates = [idx for idx in upstream.get(current, []) if ends[idx] <= starts[current] + tolerance]
+            if not candidates:
+                break
+            previous = max(candidates, key=lambda idx: ends[idx])
+        else:
+            n_finished = np.searchsorted(sorted_ends, starts[current] + tolerance, side='right')
+            # Skip the current job itself, for jobs that ran for less than the tolerance:
+            while n_finished > 0 and order[n_finished - 1] in path:
+                n_finished -= 1
+            if n_finished == 0:
+                break
+            previous = int(order[n_finished - 1])
+        path.append(previous)
+
+    path.reverse()
+    return path
+
+
+class GanttData(object):
+    """
+    Job timings converted into arrays once, relative to the start of the first job.
+    """
+    def __init__(self, jobs, dependencies=None):
+        self.n_jobs = len(jobs)
+        self.jobnames = [j['jobname'] for j in jobs]
+        self.status = np.array([j['status'] for j in jobs], dtype=object)
+        starts = np.array([j['starttime'] for j in jobs], dtype=float)
+        ends = np.array([j['endtime'] for j in jobs], dtype=float)
+        self.threads = np.array([j['threads'] for j in jobs], dtype=float)
+
+        t0 = starts.min() if self.n_jobs else 0.0
+        self.starts = starts - t0
+        self.ends = ends - t0
+        self.critical_path = critical_path(self.starts, self.ends, dependencies)
+        self.times, self.cores = cores_in_use(self.starts, self.ends, self.threads)
+
+
+def render(gantt, output, label_limit=200):
+    """
+    Render the Gantt chart, with the critical path outlined and a cores-in-use curve below it.
+    """
+    import matplotlib
+    matplotlib.use('agg')
     import matplotlib.pyplot as plt
-    plt.switch_backend('agg')
-    import matplotlib.patches as patches
-
-    x1 = [datetime_to_timestamp(deserialize_date(j['starttime'])) for j in jobs if j['starttime'] and j['endtime']]
-    x2 = [datetime_to_timestamp(deserialize_date(j['endtime'])) for j in jobs if j['starttime'] and j['endtime']]
-    y = xrange(len([1 for j in jobs if j['starttime'] and j['endtime']]))
-    status = [j['status'] for j in jobs if j['starttime'] and j['endtime']]
-    jobnames = [j['jobname'] for j in jobs if j['starttime'] and j['endtime']]
-    color_mapper = {'FAILED': 'red',
-                    'CANCELLED': 'pink',
-                    'RUNNING': 'blue',
-                    'COMPLETED': '#00ff00',
-                    'PENDING': 'lightblue'}
-
-    fig6 = plt.figure()
-    plt.axis([0, 1.01*(max(x2)-min(x1)), 0, len(x1)])
-    ax6 = fig6.add_subplot(111)
-
-
-    for idx, j in enumerate([jb for jb in jobs if jb['starttime'] and jb['endtime']]):
-        tstart = x1[idx] - min(x1)
-        tend = x2[idx] - min(x1)
-        p = patches.Rectangle(
-            (tstart, idx),
-            tend - tstart,
-            0.9,
-            facecolor=color_mapper[status[idx]]
-        )
-        ax6.add_patch(p)
-        plt.text(tstart+20, idx+.25, jobnames[idx], fontdict={'size': '5'})
-
-    # for p in [
-    #     patches.Rectangle(
-    #         (0.03, 0.1), 0.2, 0.6,
-    #         facecolor=None  # Default
-    #     ),
-    #     patches.Rectangle(
-    #         (0.26, 0.1), 0.2, 0.6,
-    #         facecolor="none"  # No background
-    #     ),
-    #     patches.Rectangle(
-    #         (0.49, 0.1), 0.2, 0.6,
-    #         facecolor="red"
-    #     ),
-    #     patches.Rectangle(
-    #         (0.72, 0.1), 0.2, 0.6,
-    #         facecolor="#00ffff"
-    #     ),
-    # ]:
-    #     ax6.add_patch(p)
-    fig6.savefig(svg)
-
-
-
-    # import numpy as np
-    # import matplotlib.pyplot as plt
-    #
-    # # Read data from file into variables
-    # y, c, x1, x2 = np.loadtxt('data.txt', unpack=True)
-    #
-    # # Map value to color
-    # color_mapper = np.vectorize(lambda x: {0: 'red', 1: 'blue'}.get(x))
-    #
-    # # Plot a line for every line of data in your file
-    # plt.hlines(y, x1, x2, colors=color_mapper(c))
-
-    # import numpy as np
-    # import matplotlib.pyplot as plt
-    # plt.switch_backend('agg')
-    #
-    # x1 = [deserialize_date(j['starttime']) for j in jobs if j['starttime'] and j['endtime']]
-    # x2 = [deserialize_date(j['endtime']) for j in jobs if j['starttime'] and j['endtime']]
-    # y = xrange(len([1 for j in jobs if j['starttime'] and j['endtime']]))
-    # status = [j['status'] for j in jobs if j['starttime'] and j['endtime']]
-    #
-    # color_mapper = np.vectorize(lambda x: {'FAILED': 'red',
-    #                                        'CANCELLED': 'pink',
-    #                                        'RUNNING': 'blue',
-    #                                        'COMPLETED': 'green',
-    #                                        'PENDING': 'lightblue'}.get(x))
-    #
-    # plt.hlines(y, x1, x2, colors=color_mapper(status))
-    # plt.savefig(svg)
-    #
-
-    # Change font default
-    # gantt.define_font_attributes(fill='black',
-    #                              stroke='black',
-    #                              stroke_width=0,
-    #                              font_family="Verdana")
-    #
-    # res = gantt.Resource('Autoseq jobs')
-    # t1 = gantt.Task(name='tache1',
-    #                 start=datetime.datetime(2014, 12, 25, 12, 00, 00),
-    #                 duration=4,
-    #                 percent_done=44,
-    #                 resources=[res],
-    #                 color="#FF8080")
-    #
-    # # Create a project
-    # p1 = gantt.Project(name='Projet 1')
-    #
-    # # Add tasks to this project
-    # p1.add_task(t1)
-    #
-    # p = gantt.Project(name='Gantt')
-    # # wich contains the first two projects
-    # # and a single task
-    # p.add_task(p1)
-    #
-    # p.make_svg_for_tasks(filename=svg,
-    #                      today=datetime.datetime(2014, 12, 26),
-    #                      start=datetime.datetime(2014, 12, 22),
-    #                      end=datetime.datetime(2015, 01, 1))
+    from matplotlib.collections import PolyCollection
+
+    fig, (ax_gantt, ax_cores) = plt.subplots(2, 1, sharex=True, figsize=(12, 9),
+                                             gridspec_kw={'height_ratios': [4, 1]})
+
+    # Job bars are drawn as a single collection, from vertices computed in one go:
+    rows = np.arange(gantt.n_jobs, dtype=float)
+    verts = np.empty((gantt.n_jobs, 4, 2))
+    verts[:, 0, 0] = verts[:, 3, 0] = gantt.starts
+    verts[:, 1, 0] = verts[:, 2, 0] = gantt.ends
+    verts[:, 0, 1] = verts[:, 1, 1] = rows
+    verts[:, 2, 1] = verts[:, 3, 1] = rows + 0.9
+    colors = [COLOR_MAPPER.get(status, 'grey') for status in gantt.status]
+    edgecolors = np.array(colors, dtype=object)
+    linewidths = np.zeros(gantt.n_jobs)
+    edgecolors[gantt.critical_path] = CRITICAL_PATH_COLOR
+    linewidths[gantt.critical_path] = 1.5
+    ax_gantt.add_collection(PolyCollection(verts, facecolors=colors, edgecolors=list(edgecolors),
+                                           linewidths=linewidths))
+
+    if gantt.critical_path:
+        # Connect the end of each job on the critical path to the start of the next one:
+        path = np.array(gantt.critical_path)
+        connector_x = np.column_stack([gantt.ends[path[:-1]], gantt.starts[path[1:]],
+                                       np.full(len(path) - 1, np.nan)]).ravel()
+        connector_y = np.column_stack([rows[path[:-1]] + 0.45, rows[path[1:]] + 0.45,
+                                       np.full(len(path) - 1, np.nan)]).ravel()
+        ax_gantt.plot(connector_x, connector_y, color=CRITICAL_PATH_COLOR, linewidth=0.8, label='critical path')
+        ax_gantt.legend(loc='upper left', fontsize='small')
+
+    if gantt.n_jobs <= label_limit:
+        for idx in xrange(gantt.n_jobs):
+            ax_gantt.text(gantt.starts[idx] + 20, idx + .25, gantt.jobnames[idx], fontdict={'size': '5'})
+
+    x_max = 1.01 * gantt.ends.max() if gantt.n_jobs else 1.0
+    ax_gantt.set_xlim(0, x_max)
+    ax_gantt.set_ylim(0, max(gantt.n_jobs, 1))
+    ax_gantt.set_ylabel('Job')
+
+    ax_cores.step(gantt.times, gantt.cores, where='post', color='blue')
+    ax_cores.fill_between(gantt.times, gantt.cores, step='post', alpha=0.3, color='blue')
+    ax_cores.set_ylim(0, max(gantt.cores.max() if gantt.n_jobs else 1, 1) * 1.1)
+    ax_cores.set_ylabel('Cores in use')
+    ax_cores.set_xlabel('Seconds since first job started')
+
+    fig.savefig(output)
+    plt.close(fig)
 
 
 def deserialize_date(d):
@@ -6,7 +6,6 @@ import time
 
 import click
 
-from autoseq.pipeline.liqbio import LiqBioPipeline
 from autoseq.util.clinseq_barcode import extract_clinseq_barcodes, convert_barcodes_to_sampledict, validate_clinseq_barcodes
 from autoseq.util.path import mkdir
 
@@ -15,6 +14,10 @@ from autoseq.util.path import mkdir
 @click.argument('sample', type=click.File('r'))
 @click.pass_context
 def liqbio(ctx, sample):
+    # The pipeline is imported here so that liqbio_prepare does not have to load it:
+    from autoseq.pipeline.liqbio import LiqBioPipeline
+    from autoseq.pipeline.planner import plan_pipeline
+
     logging.info("Running Liquid Biopsy pipeline")
     logging.info("Sample is {}".format(sample))
 
@@ -34,7 +37,15 @@ def liqbio(ctx, sample):
                                          jobdb=ctx.obj['jobdb'],
                                          dot_file=ctx.obj['dot_file'],
                                          umi=ctx.obj['umi'],
-                                         scratch=ctx.obj['scratch'])
+                                         scratch=ctx.obj['scratch'],
+                                         scratch_budget=ctx.obj['scratch_budget'],
+                                         library_cache=ctx.obj['library_cache'],
+                                         stage_dir=ctx.obj['stage_dir'])
+
+    if ctx.obj['plan']:
+        click.echo(plan_pipeline(ctx.obj['pipeline'], ctx.obj['cores'],
+                                 ctx.obj['job_params'].get('plan-cost-factors')))
+        return
 
     # start main analysis
     ctx.obj['pipeline'].start()
@@ -53,6 +64,10 @@ def liqbio(ctx, sample):
 @click.argument('barcodes-filename', type=str)
 @click.pass_context
 def liqbio_prepare(ctx, outdir, barcodes_filename):
+    """
+    Generate sample configs from the clinseq barcodes in BARCODES_FILENAME, which is
+    either a .txt file, an .xlsx order form or a directory of .xlsx order forms.
+    """
     logging.info("Extracting clinseq barcodes from input file: " + barcodes_filename)
     clinseq_barcodes = extract_clinseq_barcodes(barcodes_filename)
 
@@ -14,7 +14,7 @@ class AlasccaPipeline(ClinseqPipeline):
                  referral_db_conf="tests/referrals/referral-db-config.json",
                  addresses="tests/referrals/addresses.csv",
                  **kwargs):
-        ClinseqPipeline.__init__(self, sampledata, refdata, job_params, outdir, libdir,
+        ClinseqPipeline.__init__(self, sampledata, refdata, job_params, outdir, libdir, False,
                                  maxcores, scratch, **kwargs)
 
         self.referral_db_conf = referral_db_conf
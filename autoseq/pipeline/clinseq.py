@@ -1,19 +1,57 @@
 from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
-from autoseq.util.path import normpath, stripsuffix
+from autoseq.util.path import normpath, stripsuffix, mkdir
 from autoseq.tools.alignment import align_library, Realignment
-from autoseq.tools.cnvcalling import Cns2Seg, CNVkit, CNVkitFix, QDNASeq
+from autoseq.tools.cnvcalling import Cns2Seg, CNVkit, CNVkitFix, QDNASeq, BinnedCopyNumber
 from autoseq.tools.purity import PureCN
 from autoseq.tools.igv import MakeAllelicFractionTrack, MakeCNVkitTracks, MakeQDNAseqTracks
-from autoseq.util.library import find_fastqs
+from autoseq.util.library import find_fastqs, LibraryIndex
 from autoseq.tools.picard import PicardCollectInsertSizeMetrics, PicardCollectOxoGMetrics, \
-    PicardMergeSamFiles, PicardMarkDuplicates, PicardCollectHsMetrics, PicardCollectWgsMetrics
+    PicardMergeSamFiles, PicardMarkDuplicates, PicardCollectHsMetrics, PicardCollectWgsMetrics, \
+    PicardCollectMultipleMetrics
 from autoseq.tools.variantcalling import HaplotypeCaller, VEP, VcfAddSample, VarDictForPureCN, \
     call_somatic_variants, StrelkaGermline, SomaticSeq , MergeVCF, GenerateIGVNavInput
 from autoseq.tools.msi import MsiSensor, Msings
-from autoseq.tools.contamination import ContEst, ContEstToContamCaveat, CreateContestVCFs
+from autoseq.tools.unix import StageFile
+from autoseq.tools.contamination import ContEst, ContEstToContamCaveat, CreateContestVCFs, \
+    EstimateContamination
 from autoseq.tools.qc import *
 from autoseq.util.clinseq_barcode import *
-import collections, logging
+from autoseq.util.jobwrap import wrap_command, job_tag, job_inputs, job_outputs
+from autoseq.util.resources import monitored_command, load_usage, add_usage_to_jobdb
+from autoseq.util.jobdb import is_sqlite_jobdb, JobDatabaseRecorder
+from autoseq.util.reclaim import find_consumers, initialise_refcounts, release_command
+from autoseq.util.scratch import clean_orphans, get_scratch_factor, scratch_command, JOB_DIR_PREFIX
+from autoseq.util.jvmworker import JvmWorker, get_worker_tool
+from autoseq.util.condaenv import CondaEnvironmentError, resolve_environments
+import collections, distutils.spawn, hashlib, logging, os
+
+
+# FIXME: Move this information to a config JSON file.
+PREP_KIT_NAMES = {"BN": "BIOO_NEXTFLEX",
+                  "KH": "KAPA_HYPERPREP",
+                  "TD": "THRUPLEX_DNASEQ",
+                  "TP": "THRUPLEX_PLASMASEQ",
+                  "TF": "THRUPLEX_FD",
+                  "TS": "TRUSEQ_RNA",
+                  "NN": "NEBNEXT_RNA",
+                  "VI": "VILO_RNA"}
+
+CAPTURE_KIT_NAMES = {"CS": "clinseq_v3_targets",
+                     "CZ": "clinseq_v4",
+                     "EX": "EXOMEV3",
+                     "EO": "EXOMEV1",
+                     "RF": "fusion_v1",
+                     "CC": "core_design",
+                     "CD": "discovery_coho",
+                     "CB": "big_design",
+                     "AL": "alascca_targets",
+                     "TT": "test-regions",
+                     "CP": "progression",
+                     "CM": "monitor",
+                     "PC": "probio_comprehensive",
+                     "PB": "probio_biomarker_signature",
+                     "PA": "pancancer",
+                     "WG": "lowpass_wgs"}
 
 
 class InvalidRefDataException(Exception):
@@ -41,6 +79,9 @@ class SinglePanelResults(object):
         # Coverage QC call:
         self.cov_qc_call = None
 
+        # Genotype fingerprint:
+        self.fingerprint = None
+
         # Structural variants, organised as a dictionary with event type as key,
         # and their effects:
         self.svs = {}
@@ -51,6 +92,61 @@ class SinglePanelResults(object):
         self.msings_output = None
 
 
+class CaptureRegistry(collections.defaultdict):
+    """
+    Dictionary linking unique captures to their SinglePanelResults, which additionally
+    indexes the captures by capture kit, by WGS or not and by normal sample or not as they
+    are registered, so that the captures of a given kind are listed without scanning or
+    sorting all captures. Captures are listed in the order in which they were first registered.
+    """
+    def __init__(self, capture_to_results=None):
+        super(CaptureRegistry, self).__init__(SinglePanelResults)
+        # Ordered set of captures per (is WGS, is normal) combination, where None matches
+        # either value, so that (None, None) holds all captures:
+        self.index = collections.defaultdict(collections.OrderedDict)
+        # Ordered set of captures per capture kit code:
+        self.kit_index = collections.defaultdict(collections.OrderedDict)
+        for capture, results in (capture_to_results or {}).items():
+            self[capture] = results
+
+    @staticmethod
+    def index_keys(capture):
+        wgs, normal = capture.capture_kit_id == "WG", capture.sample_type == "N"
+        return [(wgs, normal), (wgs, None), (None, normal), (None, None)]
+
+    def __setitem__(self, capture, results):
+        super(CaptureRegistry, self).__setitem__(capture, results)
+        if capture not in self.index[(None, None)]:
+            for key in self.index_keys(capture):
+                self.index[key][capture] = None
+            self.kit_index[capture.capture_kit_id][capture] = None
+
+    def __delitem__(self, capture):
+        super(CaptureRegistry, self).__delitem__(capture)
+        for key in self.index_keys(capture):
+            del self.index[key][capture]
+        del self.kit_index[capture.capture_kit_id][capture]
+
+    def __reduce__(self):
+        return self.__class__, (collections.OrderedDict((capture, self[capture]) for capture in self.captures()),)
+
+    def captures(self, wgs=None, normal=None):
+        """
+        List the registered captures in registration order, optionally restricted to WGS or
+        non-WGS captures, and to normal or non-normal captures.
+
+        :return: List of unique capture named tuples.
+        """
+        return list(self.index.get((wgs, normal), ()))
+
+    def kit_captures(self, capture_kit_id):
+        """
+        :return: List of the registered captures with the specified capture kit code, in
+        registration order.
+        """
+        return list(self.kit_index.get(capture_kit_id, ()))
+
+
 class CancerVsNormalPanelResults(object):
     """
     Represents the results generated by performing a paired analysis comparing a cancer and a normal capture.
@@ -82,7 +178,23 @@ class ClinseqPipeline(PypedreamPipeline):
         :param scratch: String indicating folder in which jobs should output all temporary files.
         :param kwargs: Additional key-word arguments.
         :param umi: Flag which can be used for umi-liqbio pipeline.
-        """
+        :param scratch_budget: Total scratch space, in bytes, that concurrently running jobs may reserve.
+        :param library_index: LibraryIndex for libdir, which can be shared between pipelines.
+        :param library_cache: JSON file in which to persist the library index, if none is specified.
+        :param stage_dir: Node-local directory to copy fastq files to before processing them.
+        """
+        self.scratch_budget = kwargs.pop('scratch_budget', None)
+        self.library_index = kwargs.pop('library_index', None)
+        library_cache = kwargs.pop('library_cache', None)
+        self.stage_dir = kwargs.pop('stage_dir', None)
+
+        # pypedream writes a JSON job database. If a SQLite job database is specified, then
+        # the JSON job database is written alongside it:
+        self.sqlite_jobdb = None
+        if is_sqlite_jobdb(kwargs.get('jobdb')):
+            self.sqlite_jobdb = kwargs['jobdb']
+            kwargs['jobdb'] = kwargs['jobdb'] + ".json"
+
         PypedreamPipeline.__init__(self, normpath(outdir), **kwargs)
         self.sampledata = sampledata
         self.refdata = refdata
@@ -91,10 +203,19 @@ class ClinseqPipeline(PypedreamPipeline):
         self.job_params = job_params
         self.maxcores = maxcores
         self.libdir = libdir
+        if self.library_index is None:
+            self.library_index = LibraryIndex(libdir, cache_filename=library_cache)
         self.qc_files = []
         self.scratch = scratch
         self.analysis_id = analysis_id
         self.umi = umi
+        self.jobdb_filename = kwargs.get('jobdb')
+
+        # Dictionary linking jobs to the JSON files their resource usage is recorded in:
+        self.job_to_usage_file = {}
+
+        # Dictionary linking fastq files to their staged copies:
+        self.staged_fastqs = {}
 
         # Set up default job parameters:
         self.default_job_params = {
@@ -104,12 +225,29 @@ class ClinseqPipeline(PypedreamPipeline):
             "cov-low-thresh-fold-cov": 50,
             "vardict-min-alt-frac": 0.02,
             "vardict-min-num-reads": None,
-            "vep-additional-options": ""
+            "vep-additional-options": "",
+            "collect-resource-usage": True,
+            "eager-intermediate-cleanup": True,
+            "keep-intermediates-on-failure": True,
+            "stage-verify-checksum": False,
+            "native-coverage-qc": False,
+            "fingerprint-db": None,
+            "fingerprint-min-concordance": 0.8,
+            "fingerprint-fail-on-mismatch": False,
+            "contest-vcf-cache": None,
+            "contamination-estimator": "contest",
+            "combined-picard-metrics": False,
+            "jvm-worker": False,
+            "jvm-worker-classpath": None,
+            "jvm-worker-heap": "4g",
+            "resolve-conda-envs": True,
+            "igv-track-format": "tdf",
+            "native-binned-copynumber": False
         }
 
-        # Dictionary linking unique captures to corresponding generic single panel
+        # Registry linking unique captures to corresponding generic single panel
         # analysis results (SinglePanelResults objects as values):
-        self.capture_to_results = collections.defaultdict(SinglePanelResults)
+        self.capture_to_results = CaptureRegistry()
 
         # Dictionary linking unique normal library capture items to their corresponding
         # germline VCF filenames:
@@ -119,6 +257,20 @@ class ClinseqPipeline(PypedreamPipeline):
         # cancer library capture analysis results (CancerPanelResults objects as values):
         self.normal_cancer_pair_to_results = collections.defaultdict(CancerVsNormalPanelResults)
 
+        # Dictionary linking pairs of capture kit names to the ContEst population allele
+        # frequency VCF shared by all captures with those kits:
+        self.kit_pair_to_contest_vcf = {}
+
+    @property
+    def capture_to_results(self):
+        return self._capture_to_results
+
+    @capture_to_results.setter
+    def capture_to_results(self, capture_to_results):
+        if not isinstance(capture_to_results, CaptureRegistry):
+            capture_to_results = CaptureRegistry(capture_to_results)
+        self._capture_to_results = capture_to_results
+
     def get_job_param(self, param_name):
         """
         Retrieve the parameter of the specified name from the job parameters, or
@@ -133,6 +285,176 @@ class ClinseqPipeline(PypedreamPipeline):
         else:
             return self.default_job_params[param_name]
 
+    def run(self):
+        """
+        Run the configured pipeline, wrapping the job commands beforehand and recording
+        job statistics afterwards.
+        """
+        if self.get_job_param("resolve-conda-envs"):
+            self.configure_conda_environments()
+        self.configure_job_wrappers()
+        # Persist any libraries scanned after the sample data was checked:
+        self.library_index.save()
+        recorder = self.start_jobdb_recorder()
+        jvm_workers = self.start_jvm_workers()
+        try:
+            PypedreamPipeline.run(self)
+        finally:
+            for jvm_worker in jvm_workers:
+                jvm_worker.stop()
+            self.record_resource_usage()
+            if recorder:
+                recorder.stop()
+
+    def configure_conda_environments(self):
+        """
+        Resolve the conda environments used by the configured jobs once, and make the jobs run
+        their tools with the resolved environments instead of activating them.
+
+        :raises CondaEnvironmentError: If an environment or any of its binaries is missing.
+        """
+        jobs = [job for job in self.graph.nodes() if getattr(job, "conda_env", None)]
+        env_to_variables = resolve_environments(set(job.conda_env for job in jobs))
+        for job in jobs:
+            job.conda_variables = env_to_variables[job.conda_env]
+
+    def configure_job_wrappers(self):
+        """
+        Wrap the commands of all configured jobs, e.g. to collect their resource usage.
+        """
+        if self.get_job_param("eager-intermediate-cleanup"):
+            self.configure_eager_cleanup()
+
+        if self.get_job_param("collect-resource-usage"):
+            self.configure_resource_monitoring()
+
+        self.configure_scratch_reservations()
+
+    def configure_resource_monitoring(self):
+        """
+        Make all jobs record their resource usage.
+        """
+        usage_dir = os.path.join(self.outdir, "jobstats")
+        mkdir(usage_dir)
+        for job in self.graph.nodes():
+            usage_file = os.path.join(usage_dir, "{}.json".format(job_tag(job)))
+            self.job_to_usage_file[job] = usage_file
+            wrap_command(job, lambda cmd, usage_file=usage_file: monitored_command(cmd, usage_file))
+
+    def configure_scratch_reservations(self):
+        """
+        Give each job that uses scratch space a private scratch directory, and make it reserve
+        its estimated scratch footprint before starting, so that concurrently running jobs stay
+        within the scratch budget.
+        """
+        mkdir(self.scratch)
+        removed = clean_orphans(self.scratch)
+        if removed:
+            logging.info("Removed {} orphaned scratch directories from {}".format(len(removed), self.scratch))
+
+        for job in self.graph.nodes():
+            factor = get_scratch_factor(job)
+            if factor is None:
+                continue
+            job_dir = os.path.join(self.scratch, JOB_DIR_PREFIX + job_tag(job))
+            job.scratch = job_dir
+            wrap_command(job, lambda cmd, job_dir=job_dir, inputs=job_inputs(job), factor=factor:
+                         scratch_command(cmd, self.scratch, job_dir, inputs, factor, self.scratch_budget))
+
+    def configure_eager_cleanup(self):
+        """
+        Make the consumers of intermediate files release them as they finish, so that each
+        intermediate file is deleted as soon as its last consumer has succeeded, rather than
+        when the whole pipeline has finished.
+        """
+        jobs = self.graph.nodes()
+        consumers = find_consumers(jobs, lambda job: getattr(job, "is_intermediate", False),
+                                   job_inputs, job_outputs)
+        refcount_dir = os.path.join(self.outdir, ".refcounts")
+        initialise_refcounts(refcount_dir, dict((path, len(consuming_jobs))
+                                                for path, consuming_jobs in consumers.items()))
+
+        job_to_released_files = collections.defaultdict(list)
+        for path, consuming_jobs in consumers.items():
+            for job in consuming_jobs:
+                job_to_released_files[job].append(path)
+
+        keep_on_failure = self.get_job_param("keep-intermediates-on-failure")
+        for job, paths in job_to_released_files.items():
+            wrap_command(job, lambda cmd, paths=sorted(paths): release_command(cmd, refcount_dir, paths,
+                                                                               keep_on_failure))
+        logging.debug("Configured eager removal of {} intermediate files".format(len(consumers)))
+
+    def start_jobdb_recorder(self):
+        """
+        Start recording the jobs of this pipeline in the SQLite job database, if one is used.
+
+        :return: The JobDatabaseRecorder, or None.
+        """
+        if not self.sqlite_jobdb:
+            return None
+
+        if not self.job_to_usage_file:
+            logging.warning("Resource usage collection is disabled; job states will not be " +
+                            "recorded in {}".format(self.sqlite_jobdb))
+
+        jobs = [(job.jobname, job.__class__.__name__, getattr(job, "threads", None),
+                 job_inputs(job), job_outputs(job), usage_file)
+                for job, usage_file in self.job_to_usage_file.items()]
+        recorder = JobDatabaseRecorder(self.sqlite_jobdb, self.analysis_id, self.__class__.__name__,
+                                       self.sampledata.get('sdid'), self.outdir, jobs)
+        recorder.start()
+        recorder.wait_until_registered()
+        return recorder
+
+    def start_jvm_workers(self):
+        """
+        Start a persistent JVM worker for each Java tool with short invocations, if enabled, and make
+        the jobs running the tool submit their invocations to it.
+
+        :return: List of the started JvmWorkers.
+        """
+        if not self.get_job_param("jvm-worker"):
+            return []
+
+        jobs = [job for job in self.graph.nodes() if get_worker_tool(job)]
+        if not jobs:
+            return []
+
+        classpath = self.get_job_param("jvm-worker-classpath")
+        if not classpath:
+            logging.warning("No jvm-worker-classpath specified; Java tools will be run without the JVM worker")
+            return []
+
+        jvm_workers = []
+        for tool in sorted(set(get_worker_tool(job) for job in jobs)):
+            jvm_worker = JvmWorker(classpath, tool, heap=self.get_job_param("jvm-worker-heap"))
+            if not jvm_worker.start():
+                logging.warning("Could not start the JVM worker for {}; it will be run without it".format(tool))
+                continue
+            for job in jobs:
+                if get_worker_tool(job) == tool:
+                    job.jvm_worker = jvm_worker.socket_path
+            jvm_workers.append(jvm_worker)
+        return jvm_workers
+
+    def record_resource_usage(self):
+        """
+        Add the collected per-job resource usage to the job database, if one is used.
+        """
+        if not self.jobdb_filename or not os.path.exists(self.jobdb_filename):
+            return
+
+        usage_by_jobname = {}
+        for job, usage_file in self.job_to_usage_file.items():
+            usage = load_usage(usage_file)
+            if usage is not None:
+                usage_by_jobname[job.jobname] = usage
+
+        if usage_by_jobname:
+            n_updated = add_usage_to_jobdb(self.jobdb_filename, usage_by_jobname)
+            logging.info("Recorded resource usage for {} jobs in {}".format(n_updated, self.jobdb_filename))
+
     def set_germline_vcf(self, normal_capture, vcfs):
         """
         Registers the specified vcf filename for the specified normal capture item,
@@ -237,7 +559,7 @@ class ClinseqPipeline(PypedreamPipeline):
         :return: The corresponding bam filename, or None if it has not been configured.
         """
 
-        if unique_capture in self.get_mapped_captures_all():
+        if unique_capture in self.capture_to_results:
             if umi:
                 return self.capture_to_results[unique_capture].umi_bamfile
             else:
@@ -245,6 +567,41 @@ class ClinseqPipeline(PypedreamPipeline):
         else:
             return None
 
+    def get_fastqs(self, clinseq_barcode):
+        """
+        Find the fastq files for the specified clinseq barcode, staging them to node-local
+        storage if a staging directory has been set for this pipeline.
+
+        :param clinseq_barcode: A clinseq barcode string.
+        :return: Tuple of read 1 and read 2 fastq filename lists, as returned by find_fastqs().
+        """
+        fastqs = find_fastqs(clinseq_barcode, self.libdir, index=self.library_index)
+        if not self.stage_dir:
+            return fastqs
+        return tuple(self.stage_fastqs(clinseq_barcode, fqs) for fqs in fastqs)
+
+    def stage_fastqs(self, clinseq_barcode, fastqs):
+        """
+        Configure staging of the specified fastq files. Each file is staged by a separate job,
+        so that processing of a library can start as soon as its own files have been copied.
+
+        :return: List of staged fastq filenames.
+        """
+        if fastqs is None:
+            return None
+
+        staged = []
+        for fastq in fastqs:
+            if fastq not in self.staged_fastqs:
+                stage_file = StageFile(normpath(fastq),
+                                       os.path.join(self.stage_dir, clinseq_barcode, os.path.basename(fastq)),
+                                       self.get_job_param("stage-verify-checksum"))
+                stage_file.jobname = "stage-{}".format(os.path.basename(fastq))
+                self.add(stage_file)
+                self.staged_fastqs[fastq] = stage_file.output
+            staged.append(self.staged_fastqs[fastq])
+        return staged
+
     def check_sampledata(self):
         """
         Check this pipeline for validity of the sample data. In particular, check that
@@ -255,11 +612,13 @@ class ClinseqPipeline(PypedreamPipeline):
         for sample_type in ['N', 'T', 'CFDNA']:
             clinseq_barcodes_with_data = []
             for clinseq_barcode in self.sampledata[sample_type]:
-                if data_available_for_clinseq_barcode(self.libdir, clinseq_barcode):
+                if data_available_for_clinseq_barcode(self.libdir, clinseq_barcode, self.library_index):
                     clinseq_barcodes_with_data.append(clinseq_barcode)
 
             self.sampledata[sample_type] = clinseq_barcodes_with_data
 
+        self.library_index.save()
+
     def vep_data_is_available(self):
         """
         Indicates whether the VEP folder has been set for this analysis.
@@ -276,7 +635,7 @@ class ClinseqPipeline(PypedreamPipeline):
         :return: List of unique capture named tuples. 
         """
 
-        return self.capture_to_results.keys()
+        return self.capture_to_results.captures()
 
     def get_mapped_captures_no_wgs(self):
         """
@@ -285,9 +644,8 @@ class ClinseqPipeline(PypedreamPipeline):
 
         :return: List of unique capture named tuples.
         """
-        
-        return [capture for capture in self.capture_to_results.keys()
-                if capture.capture_kit_id != "WG"]
+
+        return self.capture_to_results.captures(wgs=False)
 
     def get_mapped_captures_only_wgs(self):
         """
@@ -297,8 +655,7 @@ class ClinseqPipeline(PypedreamPipeline):
         :return: List of unique capture named tuples.
         """
 
-        return [capture for capture in self.capture_to_results.keys()
-                if capture.capture_kit_id == "WG"]
+        return self.capture_to_results.captures(wgs=True)
 
     def get_mapped_captures_normal(self):
         """
@@ -308,9 +665,7 @@ class ClinseqPipeline(PypedreamPipeline):
         :return: List of named tuples.
         """
 
-        non_wgs_unique_captures = self.get_mapped_captures_no_wgs()
-        return filter(lambda unique_capture: unique_capture.sample_type == "N",
-                      non_wgs_unique_captures)
+        return self.capture_to_results.captures(wgs=False, normal=True)
 
     def get_mapped_captures_cancer(self):
         """
@@ -319,10 +674,8 @@ class ClinseqPipeline(PypedreamPipeline):
 
         :return: List of named tuples.
         """
-    
-        non_wgs_unique_captures = self.get_mapped_captures_no_wgs()
-        return filter(lambda unique_capture: unique_capture.sample_type != "N",
-                      non_wgs_unique_captures)
+
+        return self.capture_to_results.captures(wgs=False, normal=False)
 
     def get_prep_kit_name(self, prep_kit_code):
         """
@@ -332,17 +685,7 @@ class ClinseqPipeline(PypedreamPipeline):
         :return: The library prep kit name.
         """
 
-        # FIXME: Move this information to a config JSON file.
-        prep_kit_lookup = {"BN": "BIOO_NEXTFLEX",
-                           "KH": "KAPA_HYPERPREP",
-                           "TD": "THRUPLEX_DNASEQ",
-                           "TP": "THRUPLEX_PLASMASEQ",
-                           "TF": "THRUPLEX_FD",
-                           "TS": "TRUSEQ_RNA",
-                           "NN": "NEBNEXT_RNA",
-                           "VI": "VILO_RNA"}
-
-        return prep_kit_lookup[prep_kit_code]
+        return PREP_KIT_NAMES[prep_kit_code]
 
     def get_capture_name(self, capture_kit_code):
         """
@@ -351,30 +694,8 @@ class ClinseqPipeline(PypedreamPipeline):
         :param capture_kit_code: The two-letter capture kit code.
         :return: The capture-kit name.
         """
-        
-        # FIXME: Move this information to a config JSON file.
-        capture_kit_loopkup = {"CS": "clinseq_v3_targets",
-                               "CZ": "clinseq_v4",
-                               "EX": "EXOMEV3",
-                               "EO": "EXOMEV1",
-                               "RF": "fusion_v1",
-                               "CC": "core_design",
-                               "CD": "discovery_coho",
-                               "CB": "big_design",
-                               "AL": "alascca_targets",
-                               "TT": "test-regions",
-                               "CP": "progression",
-                               "CM": "monitor",
-                               "PC": "probio_comprehensive",
-                               "PB": "probio_biomarker_signature",
-                               "PA": "pancancer"
-                               }
-
-        if capture_kit_code == 'WG':
-            return 'lowpass_wgs'
 
-        else:
-            return capture_kit_loopkup[capture_kit_code]
+        return CAPTURE_KIT_NAMES[capture_kit_code]
 
     def get_all_clinseq_barcodes(self):
         """
@@ -475,8 +796,7 @@ class ClinseqPipeline(PypedreamPipeline):
         """
 
         for clinseq_barcode in self.get_all_clinseq_barcodes():
-            curr_fqs = reduce(lambda l1, l2: l1 + l2,
-                              find_fastqs(clinseq_barcode, self.libdir))
+            curr_fqs = reduce(lambda l1, l2: l1 + l2, self.get_fastqs(clinseq_barcode))
             for fq in curr_fqs:
                 fastqc = FastQC()
                 fastqc.input = fq
@@ -501,8 +821,8 @@ class ClinseqPipeline(PypedreamPipeline):
             for clinseq_barcode in capture_to_barcodes[unique_capture]:
                 curr_bamfiles.append(
                     align_library(self,
-                                  fq1_files=find_fastqs(clinseq_barcode, self.libdir)[0],
-                                  fq2_files=find_fastqs(clinseq_barcode, self.libdir)[1],
+                                  fq1_files=self.get_fastqs(clinseq_barcode)[0],
+                                  fq2_files=self.get_fastqs(clinseq_barcode)[1],
                                   clinseq_barcode=clinseq_barcode,
                                   ref=self.refdata['bwaIndex'],
                                   outdir= "{}/bams/{}".format(self.outdir, capture_kit),
@@ -611,6 +931,9 @@ class ClinseqPipeline(PypedreamPipeline):
                 self.outdir, sample_str)
             make_cnvkit_tracks.output_segments_bedgraph = "{}/cnv/{}_segments.bedGraph".format(
                 self.outdir, sample_str)
+            if self.get_job_param("igv-track-format") == "bigwig":
+                make_cnvkit_tracks.output_profile_bigwig = "{}/cnv/{}_profile.bw".format(self.outdir, sample_str)
+                make_cnvkit_tracks.chrom_sizes = self.get_chrom_sizes()
             self.add(make_cnvkit_tracks)
 
     def configure_fix_cnvkit(self, unique_capture, cnr, cns, cnvkit_fix_filename):
@@ -711,12 +1034,27 @@ class ClinseqPipeline(PypedreamPipeline):
         make_qdnaseq_tracks.input_qdnaseq_file = qdnaseq_output
         make_qdnaseq_tracks.output_segments_bedgraph = "{}/cnv/{}_qdnaseq_segments.bedGraph".format(
             self.outdir, sample_str)
-        make_qdnaseq_tracks.output_copynumber_tdf = "{}/cnv/{}_qdnaseq_copynumber.tdf".format(
-            self.outdir, sample_str)
-        make_qdnaseq_tracks.output_readcount_tdf = "{}/cnv/{}_qdnaseq_readcount.tdf".format(
-            self.outdir, sample_str)
+        if self.get_job_param("igv-track-format") == "bigwig":
+            make_qdnaseq_tracks.output_copynumber_bigwig = "{}/cnv/{}_qdnaseq_copynumber.bw".format(
+                self.outdir, sample_str)
+            make_qdnaseq_tracks.output_readcount_bigwig = "{}/cnv/{}_qdnaseq_readcount.bw".format(
+                self.outdir, sample_str)
+            make_qdnaseq_tracks.chrom_sizes = self.get_chrom_sizes()
+        else:
+            make_qdnaseq_tracks.output_copynumber_tdf = "{}/cnv/{}_qdnaseq_copynumber.tdf".format(
+                self.outdir, sample_str)
+            make_qdnaseq_tracks.output_readcount_tdf = "{}/cnv/{}_qdnaseq_readcount.tdf".format(
+                self.outdir, sample_str)
         self.add(make_qdnaseq_tracks)
 
+    def get_chrom_sizes(self):
+        """
+        :return: The FASTA index of the reference genome, giving the chromosome sizes of bigWig
+        tracks, or None if no reference genome is specified.
+        """
+        reference_genome = self.refdata.get('reference_genome')
+        return reference_genome + ".fai" if reference_genome else None
+
     def configure_single_wgs_analyses(self, unique_wgs):
         """
         Configure generic analyses of a single WGS item in the pipeline.
@@ -724,13 +1062,15 @@ class ClinseqPipeline(PypedreamPipeline):
         :param unique_wgs: An identifier for a single unique library WGS.
         """
 
-        input_bam = self.get_capture_bam(unique_wgs)
+        input_bam = self.get_capture_bam(unique_wgs, umi=False)
         sample_str = compose_lib_capture_str(unique_wgs)
 
-        qdnaseq = QDNASeq(input_bam,
-                          output_segments="{}/cnv/{}-qdnaseq.segments.txt".format(
-                              self.outdir, sample_str),
-                          background=None)
+        output_segments = "{}/cnv/{}-qdnaseq.segments.txt".format(self.outdir, sample_str)
+        if self.get_job_param("native-binned-copynumber") and self.refdata.get('bin_annotations'):
+            qdnaseq = BinnedCopyNumber(input_bam, self.refdata['bin_annotations'], output_segments,
+                                       threads=self.maxcores)
+        else:
+            qdnaseq = QDNASeq(input_bam, output_segments=output_segments, background=None)
 
         self.configure_make_qdnaseq_tracks(qdnaseq.output, sample_str)
 
@@ -750,13 +1090,13 @@ class ClinseqPipeline(PypedreamPipeline):
             isize.input = bam
             isize.jobname = "picard-isize-{}".format(basefn)
             isize.output_metrics = "{}/qc/picard/wgs/{}.picard-insertsize.txt".format(self.outdir, basefn)
-            self.add(isize)
 
             wgsmetrics = PicardCollectWgsMetrics()
             wgsmetrics.input = bam
             wgsmetrics.reference_sequence = self.refdata['reference_genome']
             wgsmetrics.output_metrics = "{}/qc/picard/wgs/{}.picard-wgsmetrics.txt".format(self.outdir, basefn)
             wgsmetrics.jobname = "picard-wgsmetrics-{}".format(basefn)
+            self.add(isize)
             self.add(wgsmetrics)
 
             qc_files += [isize.output_metrics, wgsmetrics.output_metrics]
@@ -983,7 +1323,7 @@ class ClinseqPipeline(PypedreamPipeline):
         # Configure heterozygote concordance:
         hzconcordance = HeterzygoteConcordance()
         hzconcordance.input_vcf = self.get_germline_vcf(normal_capture)
-        hzconcordance.input_bam = self.get_capture_bam(cancer_capture)
+        hzconcordance.input_bam = self.get_capture_bam(cancer_capture, self.umi)
         hzconcordance.reference_sequence = self.refdata['reference_genome']
         cancer_capture_name = self.get_capture_name(cancer_capture.capture_kit_id)
         hzconcordance.target_regions = \
@@ -997,31 +1337,81 @@ class ClinseqPipeline(PypedreamPipeline):
             hzconcordance.output
         self.add(hzconcordance)
 
+    def get_precomputed_contest_vcf(self, capture_name_1, capture_name_2):
+        """
+        Retrieve the ContEst population allele frequency VCF for the specified pair of capture
+        kits from the reference data, as generated by GenerateRefFilesPipeline.
+
+        :return: The VCF filename, or None if it is not included in the reference data.
+        """
+
+        contest_vcfs = self.refdata.get('contest_vcfs') or {}
+        for name_1, name_2 in [(capture_name_1, capture_name_2), (capture_name_2, capture_name_1)]:
+            if isinstance(contest_vcfs.get(name_1), dict) and contest_vcfs[name_1].get(name_2):
+                return contest_vcfs[name_1][name_2]
+        return None
+
+    def get_cached_contest_vcf(self, capture_name_1, capture_name_2, targets_1, targets_2, population_vcf):
+        """
+        Compose the filename of the ContEst VCF for the specified pair of capture kits in the
+        ContEst VCF cache directory. The filename includes a checksum of the input files and
+        their modification times, so that the VCF is regenerated when any of them change.
+
+        :return: The VCF filename, or None if no cache directory is configured.
+        """
+
+        cache_dir = self.get_job_param('contest-vcf-cache')
+        if not cache_dir:
+            return None
+
+        md5 = hashlib.md5()
+        for path in [targets_1, targets_2, population_vcf]:
+            mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+            md5.update("{}\t{}\n".format(path, mtime).encode("utf-8"))
+        return "{}/pop_vcf_{}-{}.{}.vcf".format(normpath(cache_dir), capture_name_1, capture_name_2,
+                                                md5.hexdigest()[:12])
+
     def configure_contest_vcf_generation(self, normal_capture, cancer_capture):
         """
         Configure generation of a contest VCF input file in this pipeline, for a
         specified pairing of normal and cancer library capture events. 
 
+        The VCF only depends on the capture kits of the pairing, and is generated at most
+        once per pair of capture kits. No generation is configured if the VCF is included in
+        the reference data, or if it already exists in the ContEst VCF cache directory.
+
         :param normal_capture: Named tuple indicating normal library capture.
         :param cancer_capture: Named tuple indicating cancer library capture.
-        """
-
-        contest_vcf_generation = CreateContestVCFs()
-        normal_capture_name = self.get_capture_name(normal_capture.capture_kit_id)
-        cancer_capture_name = self.get_capture_name(cancer_capture.capture_kit_id)
-        normal_targets = self.refdata['targets'][normal_capture_name]['targets-bed-slopped20'][:-3]
-        cancer_targets = self.refdata['targets'][cancer_capture_name]['targets-bed-slopped20'][:-3]
-        contest_vcf_generation.input_target_regions_bed_1 = normal_targets
-        contest_vcf_generation.input_target_regions_bed_2 = cancer_targets
-        contest_vcf_generation.input_population_vcf = self.refdata["swegene_common"]
-        normal_capture_str = compose_lib_capture_str(normal_capture)
-        cancer_capture_str = compose_lib_capture_str(cancer_capture)
-        contest_vcf_generation.output = "{}/contamination/pop_vcf_{}-{}.vcf".format(
-            self.outdir, normal_capture_str, cancer_capture_str)
-        contest_vcf_generation.jobname = "contest_pop_vcf_{}-{}".format(
-            normal_capture_str, cancer_capture_str)
-        self.add(contest_vcf_generation)
-        return contest_vcf_generation.output
+        :return: The contest VCF filename.
+        """
+
+        kit_pair = tuple(sorted([self.get_capture_name(normal_capture.capture_kit_id),
+                                 self.get_capture_name(cancer_capture.capture_kit_id)]))
+        if kit_pair in self.kit_pair_to_contest_vcf:
+            return self.kit_pair_to_contest_vcf[kit_pair]
+
+        contest_vcf = self.get_precomputed_contest_vcf(*kit_pair)
+        if not contest_vcf:
+            targets_1 = self.refdata['targets'][kit_pair[0]]['targets-bed-slopped20'][:-3]
+            targets_2 = self.refdata['targets'][kit_pair[1]]['targets-bed-slopped20'][:-3]
+            population_vcf = self.refdata["swegene_common"]
+            contest_vcf = self.get_cached_contest_vcf(kit_pair[0], kit_pair[1], targets_1, targets_2,
+                                                      population_vcf)
+            if contest_vcf and os.path.exists(contest_vcf):
+                logging.debug("Using cached contest VCF {}".format(contest_vcf))
+            else:
+                contest_vcf_generation = CreateContestVCFs()
+                contest_vcf_generation.input_target_regions_bed_1 = targets_1
+                contest_vcf_generation.input_target_regions_bed_2 = targets_2
+                contest_vcf_generation.input_population_vcf = population_vcf
+                contest_vcf_generation.output = contest_vcf or "{}/contamination/pop_vcf_{}-{}.vcf".format(
+                    self.outdir, kit_pair[0], kit_pair[1])
+                contest_vcf_generation.jobname = "contest_pop_vcf_{}-{}".format(kit_pair[0], kit_pair[1])
+                self.add(contest_vcf_generation)
+                contest_vcf = contest_vcf_generation.output
+
+        self.kit_pair_to_contest_vcf[kit_pair] = contest_vcf
+        return contest_vcf
 
     def configure_contest(self, library_capture_1, library_capture_2, contest_vcf):
         """
@@ -1046,6 +1436,32 @@ class ClinseqPipeline(PypedreamPipeline):
         self.add(contest)
         return contest.output
 
+    def configure_estimate_contamination(self, library_capture_1, library_capture_2, contest_vcf):
+        """
+        Configure estimation of the contamination of both library captures of a pairing in
+        this pipeline, using the autoseq contamination estimator instead of running ContEst
+        in both directions. The outputs are in the ContEst format, at the same paths as those
+        configured by configure_contest().
+
+        :param library_capture_1: Named tuple indicating first library capture.
+        :param library_capture_2: Named tuple indicating second library capture.
+        :param contest_vcf: Contest population allele frequency VCF input file.
+        :return: Tuple of the contamination estimates of the first and the second library capture.
+        """
+
+        estimate = EstimateContamination()
+        estimate.input_eval_bam = self.get_capture_bam(library_capture_1, umi=False)
+        estimate.input_genotype_bam = self.get_capture_bam(library_capture_2, umi=False)
+        estimate.input_population_af_vcf = contest_vcf
+        estimate.output = "{}/contamination/{}.contest.txt".format(
+            self.outdir, compose_lib_capture_str(library_capture_1))
+        estimate.output_genotype = "{}/contamination/{}.contest.txt".format(
+            self.outdir, compose_lib_capture_str(library_capture_2))
+        estimate.jobname = "estimate_contamination/{}-{}".format(
+            compose_lib_capture_str(library_capture_1), compose_lib_capture_str(library_capture_2))
+        self.add(estimate)
+        return estimate.output, estimate.output_genotype
+
     def configure_contam_qc_call(self, contest_output, library_capture):
         """
         Configure generation of a contamination QC call in this pipeline,
@@ -1075,13 +1491,18 @@ class ClinseqPipeline(PypedreamPipeline):
         intersection_contest_vcf = \
             self.configure_contest_vcf_generation(normal_capture, cancer_capture)
 
-        # Configure contest for calculating contamination in the cancer sample:
-        cancer_vs_normal_contest_output = \
-            self.configure_contest(cancer_capture, normal_capture, intersection_contest_vcf)
+        if self.get_job_param('contamination-estimator') == "autoseq":
+            # Configure a single estimate of the contamination in both samples:
+            cancer_vs_normal_contest_output, normal_vs_cancer_contest_output = \
+                self.configure_estimate_contamination(cancer_capture, normal_capture, intersection_contest_vcf)
+        else:
+            # Configure contest for calculating contamination in the cancer sample:
+            cancer_vs_normal_contest_output = \
+                self.configure_contest(cancer_capture, normal_capture, intersection_contest_vcf)
 
-        # Configure contest for calculating contamination in the normal sample:
-        normal_vs_cancer_contest_output = \
-            self.configure_contest(normal_capture, cancer_capture, intersection_contest_vcf)
+            # Configure contest for calculating contamination in the normal sample:
+            normal_vs_cancer_contest_output = \
+                self.configure_contest(normal_capture, cancer_capture, intersection_contest_vcf)
 
         # Configure cancer sample contamination QC call:
         cancer_contam_call = self.configure_contam_qc_call(cancer_vs_normal_contest_output,
@@ -1193,7 +1614,7 @@ class ClinseqPipeline(PypedreamPipeline):
         :return: QC files output files resulting from the QC analysis configuration.
         """
 
-        bam = self.get_capture_bam(unique_wgs)
+        bam = self.get_capture_bam(unique_wgs, umi=False)
         wgs_name = compose_lib_capture_str(unique_wgs)
 
         qc_files = []
@@ -1202,13 +1623,13 @@ class ClinseqPipeline(PypedreamPipeline):
         isize.input = bam
         isize.jobname = "picard-isize-{}".format(wgs_name)
         isize.output_metrics = "{}/qc/picard/wgs/{}.picard-insertsize.txt".format(self.outdir, wgs_name)
-        self.add(isize)
 
         wgsmetrics = PicardCollectWgsMetrics()
         wgsmetrics.input = bam
         wgsmetrics.reference_sequence = self.refdata['reference_genome']
         wgsmetrics.output_metrics = "{}/qc/picard/wgs/{}.picard-wgsmetrics.txt".format(self.outdir, wgs_name)
         wgsmetrics.jobname = "picard-wgsmetrics-{}".format(wgs_name)
+        self.add(isize)
         self.add(wgsmetrics)
 
         qc_files += [isize.output_metrics, wgsmetrics.output_metrics]
@@ -1224,6 +1645,50 @@ class ClinseqPipeline(PypedreamPipeline):
             self.qc_files += \
                 self.configure_panel_qc(unique_capture)
 
+        if self.refdata.get('fingerprint_snps'):
+            self.qc_files += self.configure_fingerprinting()
+
+    def configure_fingerprinting(self):
+        """
+        Configure genotype fingerprinting of all panel captures in this pipeline, and an
+        all-vs-all comparison of the fingerprints to detect sample swaps. If a fingerprint
+        database is specified in the job parameters, then the fingerprints are also compared
+        with those of earlier analyses, and added to the database.
+
+        The comparison is reported in MultiQC, with a FAIL call for samples flagged as possible
+        swaps. If the "fingerprint-fail-on-mismatch" job parameter is set, then the comparison
+        job also fails when any sample is flagged.
+
+        :return: List of the fingerprint comparison QC output files.
+        """
+
+        for unique_capture in self.get_mapped_captures_no_wgs():
+            capture_str = compose_lib_capture_str(unique_capture)
+            fingerprint = GenotypeFingerprint()
+            fingerprint.input_bam = self.get_capture_bam(unique_capture, umi=False)
+            fingerprint.input_sites = self.refdata['fingerprint_snps']
+            fingerprint.sample = capture_str
+            fingerprint.individual = unique_capture.sdid
+            fingerprint.output = "{}/qc/fingerprint/{}.fingerprint.json".format(self.outdir, capture_str)
+            fingerprint.jobname = "fingerprint/{}".format(capture_str)
+            self.add(fingerprint)
+            self.capture_to_results[unique_capture].fingerprint = fingerprint.output
+
+        compare_fingerprints = CompareFingerprints()
+        compare_fingerprints.input_fingerprints = [
+            results.fingerprint for results in self.capture_to_results.values() if results.fingerprint]
+        compare_fingerprints.fingerprint_db = self.get_job_param('fingerprint-db')
+        compare_fingerprints.min_concordance = self.get_job_param('fingerprint-min-concordance')
+        compare_fingerprints.fail_on_mismatch = self.get_job_param('fingerprint-fail-on-mismatch')
+        compare_fingerprints.output = "{}/qc/fingerprint/{}.fingerprint-concordance.json".format(
+            self.outdir, self.sampledata['sdid'])
+        compare_fingerprints.output_multiqc_table = "{}/qc/fingerprint/{}.fingerprint-concordance_mqc.tsv".format(
+            self.outdir, self.sampledata['sdid'])
+        compare_fingerprints.jobname = "compare-fingerprints-{}".format(self.sampledata['sdid'])
+        self.add(compare_fingerprints)
+
+        return [compare_fingerprints.output, compare_fingerprints.output_multiqc_table]
+
     def configure_multi_qc(self):
         """
         Configures MultiQC for this pipeline. self.qc_files must be fully populated
@@ -1249,7 +1714,10 @@ class ClinseqPipeline(PypedreamPipeline):
 
     def configure_panel_qc(self, unique_capture):
         """
-        Configure QC analyses for a given library capture.
+        Configure QC analyses for a given library capture. If the "combined-picard-metrics" job
+        parameter is set and Rscript is available, then the insert size metrics and the sequencing
+        artifact metrics are collected by a single CollectMultipleMetrics job, and the sequencing
+        artifact metrics replace the OxoG metrics.
 
         :param unique_capture: Named tuple identifying a sample library capture.
         :return: list of QC output files for this capture.
@@ -1262,20 +1730,36 @@ class ClinseqPipeline(PypedreamPipeline):
 
         capture_str = compose_lib_capture_str(unique_capture)
 
-        isize = PicardCollectInsertSizeMetrics()
-        isize.input = bam
-        isize.output_metrics = "{}/qc/picard/{}/{}.picard-insertsize.txt".format(
-            self.outdir, unique_capture.capture_kit_id, capture_str)
-        isize.jobname = "picard-isize-{}".format(capture_str)
-        self.add(isize)
+        combined_metrics = self.get_job_param('combined-picard-metrics')
+        if combined_metrics and not distutils.spawn.find_executable("Rscript"):
+            logging.warning("Rscript not found; collecting the Picard metrics of {} in separate jobs".format(bam))
+            combined_metrics = False
 
-        oxog = PicardCollectOxoGMetrics()
-        oxog.input = bam
-        oxog.reference_sequence = self.refdata['reference_genome']
-        oxog.output_metrics = "{}/qc/picard/{}/{}.picard-oxog.txt".format(
+        isize_metrics = "{}/qc/picard/{}/{}.picard-insertsize.txt".format(
             self.outdir, unique_capture.capture_kit_id, capture_str)
-        oxog.jobname = "picard-oxog-{}".format(capture_str)
-        self.add(oxog)
+        if combined_metrics:
+            multiple_metrics = PicardCollectMultipleMetrics(
+                bam, self.refdata['reference_genome'], "{}/qc/picard/{}/{}.picard-multiplemetrics".format(
+                    self.outdir, unique_capture.capture_kit_id, capture_str), isize_metrics)
+            multiple_metrics.jobname = "picard-multiplemetrics-{}".format(capture_str)
+            self.add(multiple_metrics)
+            picard_outputs = [multiple_metrics.output_insert_size_metrics,
+                              multiple_metrics.output_pre_adapter_summary_metrics]
+        else:
+            isize = PicardCollectInsertSizeMetrics()
+            isize.input = bam
+            isize.output_metrics = isize_metrics
+            isize.jobname = "picard-isize-{}".format(capture_str)
+            self.add(isize)
+
+            oxog = PicardCollectOxoGMetrics()
+            oxog.input = bam
+            oxog.reference_sequence = self.refdata['reference_genome']
+            oxog.output_metrics = "{}/qc/picard/{}/{}.picard-oxog.txt".format(
+                self.outdir, unique_capture.capture_kit_id, capture_str)
+            oxog.jobname = "picard-oxog-{}".format(capture_str)
+            self.add(oxog)
+            picard_outputs = [isize.output_metrics, oxog.output_metrics]
 
         hsmetrics = PicardCollectHsMetrics()
         hsmetrics.input = bam
@@ -1290,6 +1774,20 @@ class ClinseqPipeline(PypedreamPipeline):
         hsmetrics.jobname = "picard-hsmetrics-{}".format(capture_str)
         self.add(hsmetrics)
 
+        if self.get_job_param('native-coverage-qc'):
+            coverage_outputs = self.configure_target_coverage(bam, targets, capture_str)
+        else:
+            coverage_outputs = self.configure_coverage_tools(bam, targets, capture_str)
+        self.capture_to_results[unique_capture].cov_qc_call = coverage_outputs[-1]
+
+        return picard_outputs + [hsmetrics.output_metrics] + coverage_outputs
+
+    def configure_coverage_tools(self, bam, targets, capture_str):
+        """
+        Configure the sambamba depth, coverage histogram and coverage QC call jobs for a BAM file.
+
+        :return: list of the sambamba depth, coverage histogram and coverage QC call output files.
+        """
         sambamba = SambambaDepth()
         sambamba.targets_bed = self.refdata['targets'][targets]['targets-bed-slopped20'][:-3]
         sambamba.input = bam
@@ -1315,7 +1813,30 @@ class ClinseqPipeline(PypedreamPipeline):
         coverage_qc_call.output = "{}/qc/{}.coverage-qc-call.json".format(self.outdir, capture_str)
         coverage_qc_call.jobname = "coverage-qc-call/{}".format(capture_str)
         self.add(coverage_qc_call)
-        self.capture_to_results[unique_capture].cov_qc_call = coverage_qc_call.output
 
-        return [isize.output_metrics, oxog.output_metrics, hsmetrics.output_metrics,
-                sambamba.output, coverage_hist.output, coverage_qc_call.output]
+        return [sambamba.output, coverage_hist.output, coverage_qc_call.output]
+
+    def configure_target_coverage(self, bam, targets, capture_str):
+        """
+        Configure a single job computing the outputs of configure_coverage_tools() for a BAM file.
+
+        :return: list of the region depth, coverage histogram and coverage QC call output files.
+        """
+        target_coverage = TargetCoverage()
+        target_coverage.input_bam = bam
+        # FIXME: Ugly temporary solution to allow the alascca pipeline to use a specific
+        # targets file:
+        target_coverage.input_bed = self.get_coverage_bed(targets)
+        target_coverage.input_regions = self.refdata['targets'][targets]['targets-bed-slopped20'][:-3]
+        target_coverage.low_thresh_fraction = self.get_job_param('cov-low-thresh-fraction')
+        target_coverage.low_thresh_fold_cov = self.get_job_param('cov-low-thresh-fold-cov')
+        target_coverage.output_regions = "{}/qc/sambamba/{}.sambamba-depth-targets.txt".format(
+            self.outdir, capture_str)
+        target_coverage.output_histogram = "{}/qc/{}.coverage-histogram.txt".format(
+            self.outdir, capture_str)
+        target_coverage.output_qc_call = "{}/qc/{}.coverage-qc-call.json".format(self.outdir, capture_str)
+        target_coverage.jobname = "target-coverage/{}".format(capture_str)
+        self.add(target_coverage)
+
+        return [target_coverage.output_regions, target_coverage.output_histogram,
+                target_coverage.output_qc_call]
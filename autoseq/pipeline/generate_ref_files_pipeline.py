@@ -7,6 +7,8 @@ from pypedream.pipeline.pypedreampipeline import PypedreamPipeline
 from pypedream.runners.shellrunner import Shellrunner
 
 from autoseq.tools.genes import FilterGTFChromosomes, GTF2GenePred, FilterGTFGenes
+from autoseq.tools.cnvcalling import CreateBinAnnotations
+from autoseq.tools.contamination import CreateContestVCFs
 from autoseq.tools.indexing import BwaIndex, SamtoolsFaidx, GenerateChrSizes
 from autoseq.tools.intervals import SlopIntervalList, IntervalListToBed
 from autoseq.tools.msi import MsiSensorScan, IntersectMsiSites
@@ -14,6 +16,7 @@ from autoseq.tools.picard import PicardCreateSequenceDictionary
 from autoseq.tools.qc import *
 from autoseq.tools.unix import Gunzip, Curl, Copy
 from autoseq.tools.variantcalling import VcfFilter, CurlSplitAndLeftAlign, InstallVep
+from autoseq.util.binning import DEFAULT_BIN_SIZE
 from autoseq.util.path import stripsuffix, normpath
 
 __author__ = 'dankle'
@@ -30,6 +33,7 @@ class GenerateRefFilesPipeline(PypedreamPipeline):
         self.input_reference_sequence = "{}/human_g1k_v37_decoy.fasta.gz".format(genome_resources)
         self.cosmic_vcf = "{}/CosmicCodingMuts_v71.vcf.gz".format(genome_resources)
         self.qdnaseq_background = "{}/qdnaseq_background.Rdata".format(genome_resources)
+        self.mappability_bedgraph = "{}/mappability_50mer.bedGraph.gz".format(genome_resources)
         self.swegene_common_vcf = "{}/swegen_common.vcf.gz".format(genome_resources)
         self.thousand_genome_vcf = "{}/1000G_phase1.indels.b37.vcf.gz".format(genome_resources)
         self.mills_and_1000g_gold_standard = "{}/Mills_and_1000G_gold_standard.indels.b37.vcf.gz".format(genome_resources)
@@ -53,6 +57,7 @@ class GenerateRefFilesPipeline(PypedreamPipeline):
         self.prepare_sveffect_regions()
         self.prepare_intervals()
         self.prepare_variants()
+        self.prepare_contest_vcfs()
 
         fetch_vep_cache = InstallVep()
         fetch_vep_cache.output_dir = "{}/vep/".format(self.outdir)
@@ -162,6 +167,30 @@ class GenerateRefFilesPipeline(PypedreamPipeline):
         self.reference_data['oncokb'] = copy_oncokb.output
         
 
+    def prepare_contest_vcfs(self):
+        """
+        Generate a ContEst population allele frequency VCF for every pair of capture kits,
+        registered in self.reference_data['contest_vcfs'] under the alphabetically first and
+        second capture names.
+        """
+
+        self.reference_data['contest_vcfs'] = {}
+        capture_names = sorted(self.reference_data['targets'].keys())
+        for i, capture_name_1 in enumerate(capture_names):
+            self.reference_data['contest_vcfs'][capture_name_1] = {}
+            for capture_name_2 in capture_names[i:]:
+                create_contest_vcf = CreateContestVCFs()
+                create_contest_vcf.input_target_regions_bed_1 = \
+                    self.reference_data['targets'][capture_name_1]['targets-bed-slopped20']
+                create_contest_vcf.input_target_regions_bed_2 = \
+                    self.reference_data['targets'][capture_name_2]['targets-bed-slopped20']
+                create_contest_vcf.input_population_vcf = self.reference_data['swegene_common']
+                create_contest_vcf.output = "{}/variants/contest/pop_vcf_{}-{}.vcf".format(
+                    self.outdir, capture_name_1, capture_name_2)
+                create_contest_vcf.jobname = "contest_pop_vcf_{}-{}".format(capture_name_1, capture_name_2)
+                self.add(create_contest_vcf)
+                self.reference_data['contest_vcfs'][capture_name_1][capture_name_2] = create_contest_vcf.output
+
     def prepare_cnvkit(self, cnv_kit_ref_filename):
         """
 
@@ -365,11 +394,22 @@ class GenerateRefFilesPipeline(PypedreamPipeline):
                                                                  os.path.basename(self.qdnaseq_background)))
         self.add(copy_qdnaseq_bg)
 
+        create_bin_annotations = CreateBinAnnotations()
+        create_bin_annotations.input_reference_sequence = gunzip_ref.output
+        # The mappability track is optional; without it, bins are corrected for GC content only:
+        if os.path.exists(self.mappability_bedgraph):
+            create_bin_annotations.input_mappability = self.mappability_bedgraph
+        create_bin_annotations.bin_size = DEFAULT_BIN_SIZE
+        create_bin_annotations.output = "{}/genome/bin_annotations_{}kb.txt".format(self.outdir,
+                                                                                    DEFAULT_BIN_SIZE // 1000)
+        self.add(create_bin_annotations)
+
         self.reference_data['reference_genome'] = gunzip_ref.output
         self.reference_data['reference_dict'] = create_dict.output_dict
         self.reference_data['chrsizes'] = create_chrsizes.output
         self.reference_data['bwaIndex'] = bwa_index.input_fasta
         self.reference_data['qdnaseq_background'] = copy_qdnaseq_bg.output
+        self.reference_data['bin_annotations'] = create_bin_annotations.output
 
     def make_ref_paths_relative(self):
         """Recursively traverse a given dictionary and make paths relative"""
@@ -4,7 +4,6 @@ from autoseq.util.clinseq_barcode import *
 from autoseq.tools.structuralvariants import Svcaller, Sveffect, MantaSomaticSV, SViCT, Svaba, Lumpy
 from autoseq.tools.umi import *
 from autoseq.tools.alignment import fq_trimming, Realignment
-from autoseq.util.library import find_fastqs
 
 __author__ = 'thowhi'
 
@@ -228,8 +227,8 @@ class LiqBioPipeline(ClinseqPipeline):
             capture_kit = unique_capture.capture_kit_id
             for clinseq_barcode in capture_to_barcodes[unique_capture]:
                 trimmed_fqfiles = fq_trimming(self,
-                                  fq1_files=find_fastqs(clinseq_barcode, self.libdir)[0],
-                                  fq2_files=find_fastqs(clinseq_barcode, self.libdir)[1],
+                                  fq1_files=self.get_fastqs(clinseq_barcode)[0],
+                                  fq2_files=self.get_fastqs(clinseq_barcode)[1],
                                   clinseq_barcode=clinseq_barcode,
                                   ref=self.refdata['bwaIndex'],
                                   outdir= "{}/bams/{}".format(self.outdir, capture_kit),
@@ -0,0 +1,277 @@
+"""
+Dry-run planning of a configured pipeline.
+
+Estimates the core-hours, scratch usage, output size and wall-clock time of a pipeline from
+the sizes of its input fastq files, without running any jobs. Job costs are derived from
+rough per-tool cost factors, and the wall-clock time is predicted by simulating the execution
+of the job graph on a given number of cores.
+"""
+import collections
+import heapq
+import logging
+import os
+
+from autoseq.util.jobwrap import job_inputs, job_outputs
+
+GB = 1024 ** 3
+
+# Cost factors per tool, as (stage, CPU seconds per GB of input, fixed seconds per job,
+# output size relative to input size, scratch usage relative to input size). These are
+# rough estimates and can be overridden when constructing a PipelinePlanner:
+COST_FACTORS = {
+    "StageFile": ("staging", 20, 5, 1.0, 0.0),
+    "Skewer": ("preprocessing", 300, 30, 1.0, 0.0),
+    "Cat": ("preprocessing", 20, 5, 1.0, 0.0),
+    "Bwa": ("alignment", 3600, 60, 0.8, 1.0),
+    "PicardMergeSamFiles": ("alignment", 120, 30, 1.0, 0.5),
+    "Realignment": ("alignment", 900, 120, 1.0, 0.2),
+    "PicardMarkDuplicates": ("alignment", 300, 60, 1.0, 1.0),
+    "FastqToBam": ("umi", 200, 30, 1.0, 0.5),
+    "AlignUnmappedBam": ("alignment", 3600, 60, 1.0, 1.0),
+    "GroupReadsByUmi": ("umi", 600, 60, 1.0, 1.0),
+    "CallDuplexConsensusReads": ("umi", 900, 60, 0.3, 0.5),
+    "FilterConsensusReads": ("umi", 200, 30, 0.9, 0.2),
+    "ClipBam": ("umi", 200, 30, 1.0, 0.2),
+    "HaplotypeCaller": ("variants", 1800, 120, 0.01, 0.0),
+    "StrelkaGermline": ("variants", 600, 120, 0.01, 0.1),
+    "VarDict": ("variants", 1800, 60, 0.01, 0.0),
+    "StrelkaSomatic": ("variants", 600, 120, 0.01, 0.1),
+    "Mutect2Somatic": ("variants", 3600, 120, 0.01, 0.0),
+    "Varscan2Somatic": ("variants", 900, 60, 0.01, 0.0),
+    "SomaticSeq": ("variants", 300, 120, 0.02, 0.1),
+    "VarDictForPureCN": ("variants", 1800, 60, 0.01, 0.1),
+    "MergeVCF": ("variants", 100, 60, 1.0, 0.0),
+    "VcfAddSample": ("variants", 600, 30, 1.0, 0.0),
+    "VEP": ("annotation", 60000, 300, 2.0, 0.0),
+    "GenerateIGVNavInput": ("annotation", 100, 30, 1.0, 0.0),
+    "CNVkit": ("cnv", 200, 120, 0.001, 0.1),
+    "CNVkitFix": ("cnv", 0, 30, 1.0, 0.0),
+    "Cns2Seg": ("cnv", 0, 10, 1.0, 0.0),
+    "QDNASeq": ("cnv", 300, 300, 0.001, 0.0),
+    "BinnedCopyNumber": ("cnv", 60, 30, 0.001, 0.0),
+    "PureCN": ("cnv", 0, 900, 1.0, 0.0),
+    "MakeCNVkitTracks": ("cnv", 0, 30, 1.0, 0.0),
+    "MakeQDNAseqTracks": ("cnv", 0, 60, 1.0, 0.0),
+    "MakeAllelicFractionTrack": ("cnv", 0, 30, 1.0, 0.0),
+    "MantaSomaticSV": ("sv", 600, 300, 0.001, 0.1),
+    "Svcaller": ("sv", 600, 120, 0.01, 0.0),
+    "Sveffect": ("sv", 0, 60, 1.0, 0.0),
+    "SViCT": ("sv", 600, 120, 0.001, 0.0),
+    "Svaba": ("sv", 1200, 300, 0.01, 0.1),
+    "Lumpy": ("sv", 600, 120, 0.01, 0.1),
+    "MsiSensor": ("msi", 300, 60, 0.001, 0.0),
+    "Msings": ("msi", 300, 120, 0.001, 0.1),
+    "FastQC": ("qc", 200, 30, 0.001, 0.0),
+    "MultiQC": ("qc", 0, 120, 1.0, 0.0),
+    "PicardCollectInsertSizeMetrics": ("qc", 150, 60, 0.001, 0.0),
+    "PicardCollectOxoGMetrics": ("qc", 150, 60, 0.001, 0.0),
+    "PicardCollectHsMetrics": ("qc", 150, 60, 0.001, 0.0),
+    "PicardCollectWgsMetrics": ("qc", 150, 60, 0.001, 0.0),
+    "PicardCollectMultipleMetrics": ("qc", 200, 60, 0.001, 0.0),
+    "SambambaDepth": ("qc", 100, 30, 0.001, 0.0),
+    "CoverageHistogram": ("qc", 300, 30, 0.001, 0.0),
+    "CoverageCaveat": ("qc", 0, 5, 1.0, 0.0),
+    "TargetCoverage": ("qc", 200, 30, 0.001, 0.0),
+    "GenotypeFingerprint": ("qc", 60, 30, 0.0001, 0.0),
+    "CompareFingerprints": ("qc", 0, 10, 1.0, 0.0),
+    "HeterzygoteConcordance": ("qc", 300, 120, 0.001, 0.0),
+    "CreateContestVCFs": ("contamination", 0, 120, 1.0, 0.0),
+    "ContEst": ("contamination", 600, 300, 0.001, 0.0),
+    "ContEstToContamCaveat": ("contamination", 0, 5, 1.0, 0.0),
+    "EstimateContamination": ("contamination", 60, 30, 0.0002, 0.0),
+    "AlasccaCNAPlot": ("reporting", 0, 60, 1.0, 0.0),
+    "LiqbioCNAPlot": ("reporting", 0, 60, 1.0, 0.0),
+    "CompileMetadata": ("reporting", 0, 30, 1.0, 0.0),
+    "CompileAlasccaGenomicJson": ("reporting", 0, 30, 1.0, 0.0),
+    "WriteAlasccaReport": ("reporting", 0, 60, 1.0, 0.0),
+}
+
+DEFAULT_COST_FACTORS = ("other", 60, 30, 0.5, 0.0)
+
+JobEstimate = collections.namedtuple("JobEstimate", ["jobname", "tool", "stage", "threads", "input_bytes",
+                                                     "core_seconds", "wall_seconds", "output_bytes",
+                                                     "scratch_bytes", "is_intermediate"])
+
+
+def get_raw_input_sizes(pipeline):
+    """
+    Determine the sizes of the fastq files of all clinseq barcodes in the specified pipeline.
+
+    :param pipeline: A ClinseqPipeline.
+    :return: Dictionary with fastq filename as key and size in bytes as value.
+    """
+    sizes = {}
+    for clinseq_barcode in pipeline.get_all_clinseq_barcodes():
+        fq1s, fq2s = pipeline.library_index.fastq_files(clinseq_barcode)
+        for fastq in fq1s + fq2s:
+            sizes[fastq.path] = fastq.size if fastq.size is not None else os.path.getsize(fastq.path)
+    return sizes
+
+
+class PipelinePlanner(object):
+    """
+    Estimates the resource requirements of the jobs in a configured pipeline.
+    """
+    def __init__(self, jobs, raw_input_sizes, cores, cost_factors=None):
+        """
+        :param jobs: The configured pypedream jobs.
+        :param raw_input_sizes: Dictionary with sizes, in bytes, of the pipeline input files.
+        :param cores: Number of cores available to the pipeline.
+        :param cost_factors: Dictionary of cost factors overriding COST_FACTORS for specific tools.
+        """
+        self.jobs = list(jobs)
+        self.raw_input_sizes = raw_input_sizes
+        self.cores = max(int(cores), 1)
+        self.cost_factors = dict(COST_FACTORS)
+        self.cost_factors.update(cost_factors or {})
+
+        self.job_to_upstream = self.find_upstream_jobs()
+        self.job_to_downstream = collections.defaultdict(list)
+        for job in self.jobs:
+            for upstream_job in self.job_to_upstream[job]:
+                self.job_to_downstream[upstream_job].append(job)
+        self.estimates = self.estimate_jobs()
+
+    def find_upstream_jobs(self):
+        producers = {}
+        for job in self.jobs:
+            for output in job_outputs(job):
+                producers[output] = job
+        return dict((job, set(producers[i] for i in job_inputs(job) if i in producers and producers[i] is not job))
+                    for job in self.jobs)
+
+    def topological_order(self):
+        n_upstream = dict((job, len(upstream)) for job, upstream in self.job_to_upstream.items())
+
+        ready = [job for job in self.jobs if n_upstream[job] == 0]
+        ordered = []
+        while ready:
+            job = ready.pop()
+            ordered.append(job)
+            for downstream_job in self.job_to_downstream[job]:
+                n_upstream[downstream_job] -= 1
+                if n_upstream[downstream_job] == 0:
+                    ready.append(downstream_job)
+
+        if len(ordered) != len(self.jobs):
+            raise ValueError("The pipeline job graph contains a cycle.")
+        return ordered
+
+    def estimate_jobs(self):
+        """
+        Estimate the cost of every job, propagating estimated file sizes down the job graph.
+
+        :return: Dictionary with job as key and JobEstimate as value.
+        """
+        file_sizes = dict(self.raw_input_sizes)
+        estimates = {}
+        for job in self.topological_order():
+            tool = job.__class__.__name__
+            stage, cpu_per_gb, fixed_seconds, output_ratio, scratch_ratio = \
+                self.cost_factors.get(tool, DEFAULT_COST_FACTORS)
+            threads = min(max(int(getattr(job, "threads", 1) or 1), 1), self.cores)
+
+            input_bytes = sum(file_sizes.get(i, 0) for i in set(job_inputs(job)))
+            core_seconds = fixed_seconds * threads + cpu_per_gb * float(input_bytes) / GB
+            output_bytes = output_ratio * input_bytes
+            outputs = set(job_outputs(job))
+            for output in outputs:
+                file_sizes[output] = output_bytes / len(outputs)
+
+            estimates[job] = JobEstimate(getattr(job, "jobname", None), tool, stage, threads, input_bytes,
+                                         core_seconds, core_seconds / threads, output_bytes,
+                                         scratch_ratio * input_bytes, getattr(job, "is_intermediate", False))
+        return estimates
+
+    def simulate(self):
+        """
+        Simulate running the job graph on the available cores, starting ready jobs in
+        pipeline order whenever enough cores are free.
+
+        :return: Tuple (predicted wall-clock seconds, peak concurrent scratch bytes).
+        """
+        n_upstream = dict((job, len(upstream)) for job, upstream in self.job_to_upstream.items())
+
+        order = dict((job, idx) for idx, job in enumerate(self.jobs))
+        ready = [(order[job], job) for job in self.jobs if n_upstream[job] == 0]
+        heapq.heapify(ready)
+        running = []
+        now = 0.0
+        free_cores = self.cores
+        scratch_in_use = 0.0
+        peak_scratch = 0.0
+
+        while ready or running:
+            # Start jobs in order, as long as the next one fits:
+            while ready and self.estimates[ready[0][1]].threads <= free_cores:
+                _, job = heapq.heappop(ready)
+                estimate = self.estimates[job]
+                free_cores -= estimate.threads
+                scratch_in_use += estimate.scratch_bytes
+                heapq.heappush(running, (now + estimate.wall_seconds, order[job], job))
+            peak_scratch = max(peak_scratch, scratch_in_use)
+
+            now, _, job = heapq.heappop(running)
+            estimate = self.estimates[job]
+            free_cores += estimate.threads
+            scratch_in_use -= estimate.scratch_bytes
+            for downstream_job in self.job_to_downstream[job]:
+                n_upstream[downstream_job] -= 1
+                if n_upstream[downstream_job] == 0:
+                    heapq.heappush(ready, (order[downstream_job], downstream_job))
+
+        return now, peak_scratch
+
+    def summarize(self):
+        """
+        :return: Dictionary with per-stage and total estimates.
+        """
+        stages = collections.OrderedDict()
+        for job in self.jobs:
+            estimate = self.estimates[job]
+            stage = stages.setdefault(estimate.stage, {"jobs": 0, "core_hours": 0.0, "output_bytes": 0.0})
+            stage["jobs"] += 1
+            stage["core_hours"] += estimate.core_seconds / 3600
+            if not estimate.is_intermediate:
+                stage["output_bytes"] += estimate.output_bytes
+
+        wall_seconds, peak_scratch = self.simulate()
+        return {
+            "stages": stages,
+            "input_bytes": sum(self.raw_input_sizes.values()),
+            "core_hours": sum(stage["core_hours"] for stage in stages.values()),
+            "output_bytes": sum(stage["output_bytes"] for stage in stages.values()),
+            "peak_scratch_bytes": peak_scratch,
+            "wall_hours": wall_seconds / 3600,
+            "cores": self.cores,
+        }
+
+
+def format_plan(summary):
+    """
+    Format a plan summary as a human-readable table.
+    """
+    lines = ["{:<16}{:>8}{:>14}{:>14}".format("stage", "jobs", "core-hours", "output (GB)")]
+    for stage_name, stage in summary["stages"].items():
+        lines.append("{:<16}{:>8}{:>14.1f}{:>14.2f}".format(
+            stage_name, stage["jobs"], stage["core_hours"], stage["output_bytes"] / GB))
+    lines.append("{:<16}{:>8}{:>14.1f}{:>14.2f}".format(
+        "total", sum(s["jobs"] for s in summary["stages"].values()), summary["core_hours"],
+        summary["output_bytes"] / GB))
+    lines.append("")
+    lines.append("Input fastq size: {:.2f} GB".format(float(summary["input_bytes"]) / GB))
+    lines.append("Peak concurrent scratch usage: {:.2f} GB".format(summary["peak_scratch_bytes"] / GB))
+    lines.append("Predicted wall-clock time on {} cores: {:.1f} h".format(summary["cores"], summary["wall_hours"]))
+    return "\n".join(lines)
+
+
+def plan_pipeline(pipeline, cores, cost_factors=None):
+    """
+    Estimate the resource requirements of a configured ClinseqPipeline.
+
+    :return: Human-readable plan summary.
+    """
+    raw_input_sizes = get_raw_input_sizes(pipeline)
+    logging.debug("Planning pipeline with {} input fastqs".format(len(raw_input_sizes)))
+    planner = PipelinePlanner(pipeline.graph.nodes(), raw_input_sizes, cores, cost_factors)
+    return format_plan(planner.summarize())
@@ -3,6 +3,7 @@ from pypedream.tools.unix import Cat
 
 from autoseq.util.path import normpath
 from autoseq.util.clinseq_barcode import *
+from autoseq.util.jvmworker import GATK3_JAR, worker_command
 
 __author__ = 'dankle'
 
@@ -98,14 +99,14 @@ class Realignment(Job):
         self.known_indel2 = None
         self.target_intervals = None
         self.target_region =  None
+        self.jvm_worker = None
         self.jobname = "Realignment"
 
     def command(self):
 
         # creating target intervals for indel realignment 
         # Param: -L can be added to specify the genomic region
-        target_creator_cmd = "java -jar /nfs/PROBIO/autoseq-scripts/GenomeAnalysisTK-3.5.jar " + \
-                            " -T RealignerTargetCreator " + \
+        target_creator_args = " -T RealignerTargetCreator " + \
                             " -R " + self.reference_genome + \
                             " -known " + self.known_indel1 + \
 			                " -allowPotentiallyMisencodedQuals " + \
@@ -113,6 +114,8 @@ class Realignment(Job):
                             " -known " + self.known_indel2 + \
                             " -I " + self.input_bam + \
                             " -o " + self.target_intervals 
+        target_creator_cmd = worker_command(self.jvm_worker, "gatk3", target_creator_args,
+                                            "java -jar {} ".format(GATK3_JAR) + target_creator_args)
 
         realign_reads_cmd = "java -Xmx8G " + \
                             required("-Djava.io.tmpdir=", self.scratch) + \
@@ -4,6 +4,9 @@ import uuid
 
 from pypedream.job import Job, repeat, required, optional, conditional, stripsuffix
 
+from autoseq.util import binning
+from autoseq.util.condaenv import conda_command
+
 
 class QDNASeq(Job):
     def __init__(self, input_bam, output_segments, background=None):
@@ -11,23 +14,61 @@ class QDNASeq(Job):
         self.input = input_bam
         self.output = output_segments
         self.background = background
+        self.conda_env = "qdnaseqenv"
+        self.conda_variables = None
         self.jobname = "qdnaseq"
 
     def command(self):
-        activate_env_cmd = "source activate qdnaseqenv"
-
         qdnaseq_cmd = "qdnaseq.R " + \
                       required("--bam ", self.input) + \
                       required("--output ", self.output) + \
                       optional("--background ", self.background)
 
-        deactivate_env_cmd = "source deactivate"
+        return conda_command(self.conda_env, self.conda_variables, qdnaseq_cmd)
+
+
+class BinnedCopyNumber(Job):
+    """
+    Estimates copy numbers from read counts in fixed-size bins, as an alternative to QDNASeq,
+    writing a table with the read count, copy number and segmented copy number of each bin.
+    """
+
+    def __init__(self, input_bam, input_bin_annotations, output_segments, threads=1):
+        Job.__init__(self)
+        self.input = input_bam
+        self.input_bin_annotations = input_bin_annotations
+        self.output = output_segments
+        self.threads = threads
+        self.min_mapq = None
+        self.jobname = "binned-copynumber"
+
+    def command(self):
+        required("", self.input)
+        required("", self.input_bin_annotations)
+        required("", self.output)
+        return binning.call_command(self.input, self.input_bin_annotations, self.output, min_mapq=self.min_mapq,
+                                    threads=self.threads)
+
+
+class CreateBinAnnotations(Job):
+    """
+    Annotates the fixed-size bins of a reference genome with their base composition and mappability,
+    for use by BinnedCopyNumber.
+    """
+
+    def __init__(self):
+        Job.__init__(self)
+        self.input_reference_sequence = None
+        self.input_mappability = None
+        self.bin_size = None
+        self.output = None
+        self.jobname = "create-bin-annotations"
 
-        return "{} && {} && {} ".format(
-            activate_env_cmd,
-            qdnaseq_cmd,
-            deactivate_env_cmd,
-        )
+    def command(self):
+        required("", self.input_reference_sequence)
+        required("", self.output)
+        return binning.annotate_command(self.input_reference_sequence, self.output, mappability=self.input_mappability,
+                                        bin_size=self.bin_size)
 
 
 class QDNASeq2Bed(Job):
@@ -1,4 +1,5 @@
 from pypedream.job import required, Job, conditional, optional
+from autoseq.util.contamination import contamination_command
 
 __author__ = 'rebber'
 
@@ -17,11 +18,15 @@ class CreateContestVCFs(Job):
         self.jobname = "create_contest_vcfs"
 
     def command(self):
+        # The VCF is written to a temporary file and then renamed, so that a VCF shared
+        # between pipelines is never read while incomplete:
+        tmp_output = "{}.$$.tmp".format(self.output)
         return "create_contest_vcfs.py " + \
                required(" ", self.input_target_regions_bed_1) + \
                required(" ", self.input_target_regions_bed_2) + \
                required(" ", self.input_population_vcf) + \
-               required("--output-filename ", self.output)
+               required("--output-filename ", tmp_output) + \
+               " && mv " + tmp_output + required(" ", self.output)
 
 
 class ContEst(Job):
@@ -61,4 +66,29 @@ class ContEstToContamCaveat(Job):
     def command(self):
         return "contest_to_contam_caveat.py " + \
             required(" ", self.input_contest_results) + \
-            required("> ", self.output)
\ No newline at end of file
+            required("> ", self.output)
+
+
+class EstimateContamination(Job):
+    """Estimates contamination level in bam file "input_eval_bam" from allele counts at
+    population SNPs, and optionally also in "input_genotype_bam" from the same counts.
+    Outputs are in the ContEst output format."""
+
+    def __init__(self):
+        Job.__init__(self)
+        self.input_eval_bam = None
+        self.input_genotype_bam = None
+        self.input_population_af_vcf = None
+        self.min_genotype_ratio = 0.95
+        self.output = None
+        self.output_genotype = None
+        self.jobname = "estimate_contamination"
+
+    def command(self):
+        required("input_eval_bam", self.input_eval_bam)
+        required("input_genotype_bam", self.input_genotype_bam)
+        required("input_population_af_vcf", self.input_population_af_vcf)
+        required("output", self.output)
+        return contamination_command(self.input_eval_bam, self.input_genotype_bam, self.input_population_af_vcf,
+                                     self.output, output_genotype=self.output_genotype,
+                                     min_genotype_ratio=self.min_genotype_ratio)
@@ -1,6 +1,8 @@
 from pypedream.job import required, Job
 import uuid
 
+from autoseq.util.igvtracks import cnvkit_tracks_command, qdnaseq_tracks_command
+
 __author__ = 'Thomas Whitington'
 
 
@@ -30,50 +32,52 @@ class MakeCNVkitTracks(Job):
         Job.__init__(self)
         self.input_cns = None
         self.input_cnr = None
+        self.chrom_sizes = None
         self.output_profile_bedgraph = None
         self.output_segments_bedgraph = None
+        self.output_profile_bigwig = None
         self.jobname = "make_cnvkit_tracks"
 
     def command(self):
-        awk_cmd1 = "awk '$1 != \"chromosome\" {print $1\"\\t\"$2\"\\t\"$3\"\\t\"$5}' %s > %s" % \
-                   (self.input_cnr, self.output_profile_bedgraph)
-        awk_cmd2 = "awk '$1 != \"chromosome\" {print $1\"\\t\"$2\"\\t\"$3\"\\t\"$5}' %s > %s" % \
-                   (self.input_cns, self.output_segments_bedgraph)
-        return "{} && {}".format(awk_cmd1, awk_cmd2)
+        required("", self.input_cnr)
+        required("", self.input_cns)
+        return cnvkit_tracks_command(self.input_cnr, self.input_cns, self.output_profile_bedgraph,
+                                     self.output_segments_bedgraph, self.output_profile_bigwig, self.chrom_sizes)
 
 
 class MakeQDNAseqTracks(Job):
     """
-    Generate a IGV tracks representing the information from a QDNA-seq run.
+    Generate a IGV tracks representing the information from a QDNA-seq run, as TDF files
+    converted by igvtools, and/or as bigWig files.
     """
 
     def __init__(self):
         Job.__init__(self)
         self.input_qdnaseq_file = None
+        self.chrom_sizes = None
+        self.genome = "hg19"
         self.output_segments_bedgraph = None
         self.output_copynumber_tdf = None
         self.output_readcount_tdf = None
+        self.output_copynumber_bigwig = None
+        self.output_readcount_bigwig = None
         self.jobname = "make_qdnaseq_tracks"
 
     def command(self):
+        required("", self.input_qdnaseq_file)
         copynumber_wig = "{scratch}/copynumber-{uuid}.wig".format(
-            scratch=self.scratch, uuid=uuid.uuid4())
+            scratch=self.scratch, uuid=uuid.uuid4()) if self.output_copynumber_tdf else None
         readcount_wig = "{scratch}/readcount-{uuid}.wig".format(
-            scratch=self.scratch, uuid=uuid.uuid4())
-
-        qdnaseq_to_bedgraph_cmd = "qdnaseq_to_bedgraph.py {} {}".format(
-            self.input_qdnaseq_file, self.output_segments_bedgraph)
-
-        qdnaseq_to_wig_cmd = "qdnaseq_to_wig.py {} {} {}".format(
-            self.input_qdnaseq_file, copynumber_wig, readcount_wig)
-        igvtools_cmd1 = "igvtools toTDF {copynumber_wig} {copynumber_tdf} hg19".format(
-            copynumber_wig=copynumber_wig, copynumber_tdf=self.output_copynumber_tdf
-        )
-        igvtools_cmd2 = "igvtools toTDF {readcount_wig} {readcount_tdf} hg19".format(
-            readcount_wig=readcount_wig, readcount_tdf=self.output_readcount_tdf
-        )
-
-        return "{} && {} && {}".format(qdnaseq_to_bedgraph_cmd,
-                                       qdnaseq_to_wig_cmd,
-                                       igvtools_cmd1,
-                                       igvtools_cmd2)
\ No newline at end of file
+            scratch=self.scratch, uuid=uuid.uuid4()) if self.output_readcount_tdf else None
+        wig_to_tdf = [(wig, tdf) for wig, tdf in [(copynumber_wig, self.output_copynumber_tdf),
+                                                  (readcount_wig, self.output_readcount_tdf)] if tdf]
+
+        tracks_cmd = qdnaseq_tracks_command(self.input_qdnaseq_file, self.output_segments_bedgraph,
+                                            copynumber_wig=copynumber_wig, readcount_wig=readcount_wig,
+                                            copynumber_bigwig=self.output_copynumber_bigwig,
+                                            readcount_bigwig=self.output_readcount_bigwig,
+                                            chrom_sizes=self.chrom_sizes)
+        igvtools_cmds = ["igvtools toTDF {} {} {}".format(wig, tdf, self.genome) for wig, tdf in wig_to_tdf]
+        rm_wig_cmds = ["rm {}".format(" ".join(wig for wig, _ in wig_to_tdf))] if wig_to_tdf else []
+
+        return " && ".join([tracks_cmd] + igvtools_cmds + rm_wig_cmds)
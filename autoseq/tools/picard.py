@@ -92,6 +92,41 @@ class PicardCollectWgsMetrics(Job):
                optional("COVERAGE_CAP=", self.coverage_cap)
 
 
+class PicardCollectMultipleMetrics(Job):
+    """
+    Collects the insert size metrics and the sequencing artifact metrics of a BAM file with
+    CollectMultipleMetrics, which runs both collectors in a single JVM over a single pass of
+    the BAM file. The insert size metrics are moved to the specified file, and the other
+    outputs are named after the output prefix.
+
+    The sequencing artifact metrics summarise pre-adapter and bait bias artifacts per
+    substitution. They are not the per-context OxoG metrics that PicardCollectOxoGMetrics
+    reports, and MultiQC does not show them in its OxoG section. Unlike
+    PicardCollectInsertSizeMetrics, CollectMultipleMetrics always plots the insert size
+    histogram, which requires Rscript.
+    """
+    def __init__(self, input_bam, reference_sequence, output_prefix, output_insert_size_metrics):
+        Job.__init__(self)
+        self.input = input_bam
+        self.reference_sequence = reference_sequence
+        self.output_prefix = output_prefix
+        self.output_insert_size_metrics = output_insert_size_metrics
+        self.output_insert_size_histogram = output_prefix + ".insert_size_histogram.pdf"
+        self.output_pre_adapter_summary_metrics = output_prefix + ".pre_adapter_summary_metrics"
+        self.output_pre_adapter_detail_metrics = output_prefix + ".pre_adapter_detail_metrics"
+        self.output_bait_bias_summary_metrics = output_prefix + ".bait_bias_summary_metrics"
+        self.output_bait_bias_detail_metrics = output_prefix + ".bait_bias_detail_metrics"
+        self.jobname = "picard-multiplemetrics"
+
+    def command(self):
+        return "picard -XX:ParallelGCThreads=8 -Xmx4g CollectMultipleMetrics " + \
+               required("I=", self.input) + \
+               required("R=", self.reference_sequence) + \
+               required("O=", self.output_prefix) + \
+               " PROGRAM=null PROGRAM=CollectInsertSizeMetrics PROGRAM=CollectSequencingArtifactMetrics" + \
+               " && mv {}.insert_size_metrics {}".format(self.output_prefix, self.output_insert_size_metrics)
+
+
 class PicardCreateSequenceDictionary(Job):
     def __init__(self):
         Job.__init__(self)
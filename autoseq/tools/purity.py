@@ -1,5 +1,7 @@
 from pypedream.job import Job, required, optional, conditional
 
+from autoseq.util.condaenv import conda_command
+
 
 # FIXME: Could be adapted so it's possible to run directly from bam files, instead of using pre-calculated segments
 
@@ -27,13 +29,12 @@ class PureCN(Job):
         self.output = "{}/{}_genes.csv".format(
             self.outdir, self.tumorid)
 
+        self.conda_env = "purecn-env"
+        self.conda_variables = None
         self.jobname = "purecn"
 
     def command(self):
 
-        # activating conda env
-        activate_cmd = "source activate purecn-env"
-
         # running PureCN
         running_cmd = "PureCN.R " + required("--out ", self.outdir) + \
                        required("--sampleid ", self.tumorid) + \
@@ -46,7 +47,4 @@ class PureCN(Job):
                        optional("--segfilesdev ", self.seg_sdev) + \
                        conditional(self.postopt, "--postoptimize")
 
-        # deactivating the conda env
-        deactivate_cmd = "source deactivate"
-
-        return " && ".join([activate_cmd, running_cmd, deactivate_cmd])
+        return conda_command(self.conda_env, self.conda_variables, running_cmd)
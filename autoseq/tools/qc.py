@@ -1,5 +1,7 @@
 import os
 from pypedream.job import Job, required, optional, conditional, repeat
+from autoseq.util.coverage import coverage_command
+from autoseq.util.fingerprint import genotype_command, compare_command
 
 
 class HeterzygoteConcordance(Job):
@@ -138,3 +140,88 @@ class CoverageCaveat(Job):
                required("--low-thresh-fraction ", self.low_thresh_fraction) + \
                required("--low-thresh-fold-cov ", self.low_thresh_fold_cov) + \
                required("> ", self.output)
+
+
+class TargetCoverage(Job):
+    """
+    Computes the coverage histogram, the per-region depth table and the coverage QC call of
+    a BAM file in a single pass, replacing CoverageHistogram, CoverageCaveat and SambambaDepth.
+    """
+    def __init__(self):
+        Job.__init__(self)
+        self.input_bam = None
+        self.input_bed = None
+        self.input_regions = None
+        self.min_basequal = None
+        self.coverage_thresholds = [30, 50, 70, 100, 200, 300]
+        self.high_thresh_fraction = 0.95
+        self.high_thresh_fold_cov = 100
+        self.low_thresh_fraction = 0.95
+        self.low_thresh_fold_cov = 50
+        self.output_histogram = None
+        self.output_regions = None
+        self.output_qc_call = None
+        self.jobname = "target-coverage"
+
+    def command(self):
+        required("input_bam", self.input_bam)
+        required("input_bed", self.input_bed)
+        required("output_histogram", self.output_histogram)
+        required("output_qc_call", self.output_qc_call)
+        if self.input_regions:
+            required("output_regions", self.output_regions)
+        return coverage_command(self.input_bam, self.input_bed, self.output_histogram, self.output_qc_call,
+                                regions_bed=self.input_regions, region_table=self.output_regions,
+                                min_basequal=self.min_basequal, thresholds=self.coverage_thresholds,
+                                high_thresh_fraction=self.high_thresh_fraction,
+                                high_thresh_fold_cov=self.high_thresh_fold_cov,
+                                low_thresh_fraction=self.low_thresh_fraction,
+                                low_thresh_fold_cov=self.low_thresh_fold_cov)
+
+
+class GenotypeFingerprint(Job):
+    """
+    Genotypes a BAM file at a panel of common SNPs, producing a compact genotype fingerprint.
+    """
+    def __init__(self):
+        Job.__init__(self)
+        self.input_bam = None
+        self.input_sites = None
+        self.sample = None
+        self.individual = None
+        self.min_depth = None
+        self.min_basequal = None
+        self.output = None
+        self.jobname = "fingerprint"
+
+    def command(self):
+        required("input_bam", self.input_bam)
+        required("input_sites", self.input_sites)
+        required("sample", self.sample)
+        required("output", self.output)
+        return genotype_command(self.input_bam, self.input_sites, self.sample, self.individual or self.sample,
+                                self.output, min_depth=self.min_depth, min_basequal=self.min_basequal)
+
+
+class CompareFingerprints(Job):
+    """
+    Compares fingerprints all-vs-all, and with the fingerprints of earlier batches if a
+    fingerprint database is specified, flagging possible sample swaps.
+    """
+    def __init__(self):
+        Job.__init__(self)
+        self.input_fingerprints = None
+        self.fingerprint_db = None
+        self.min_concordance = None
+        self.min_sites = None
+        self.fail_on_mismatch = False
+        self.output = None
+        self.output_multiqc_table = None
+        self.jobname = "compare-fingerprints"
+
+    def command(self):
+        required("input_fingerprints", self.input_fingerprints)
+        required("output", self.output)
+        return compare_command(self.input_fingerprints, self.output, db=self.fingerprint_db,
+                               min_concordance=self.min_concordance, min_sites=self.min_sites,
+                               multiqc_table=self.output_multiqc_table, fail_on_mismatch=self.fail_on_mismatch)
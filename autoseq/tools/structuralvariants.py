@@ -1,5 +1,7 @@
 from pypedream.job import Job, required, optional, conditional
 
+from autoseq.util.condaenv import conda_command
+
 
 class Svcaller(Job):
     def __init__(self):
@@ -10,12 +12,11 @@ class Svcaller(Job):
         self.output_gtf = None
         self.reference_sequence = None
         self.scratch = None
+        self.conda_env = "svcallerenv"
+        self.conda_variables = None
         self.jobname = "svcaller-run-all"
 
     def command(self):
-        
-        activate_env_cmd = "source activate svcallerenv "
-
         run_all_cmd = ("svcaller run-all --tmp-dir {scratch} " +
                       "--event-type {event_type} " +
                       "--fasta-filename {reference_seq} " +
@@ -29,13 +30,7 @@ class Svcaller(Job):
                           input_bam=self.input_bam,
                       )
 
-        deactivate_env_cmd = "source deactivate"
-
-        return "{} && {} && {}".format(
-            activate_env_cmd,
-            run_all_cmd,
-            deactivate_env_cmd,
-        )
+        return conda_command(self.conda_env, self.conda_variables, run_all_cmd)
 
 class Sveffect(Job):
     def __init__(self):
@@ -49,11 +44,11 @@ class Sveffect(Job):
         self.fusion_regions = None
         self.output_combined_bed = None
         self.output_effects_json = None
+        self.conda_env = "svcallerenv"
+        self.conda_variables = None
         self.jobname = "sveffect"
 
     def command(self):
-        
-        activate_env_cmd = "source activate svcallerenv "
         make_bed_cmd = ("sveffect make-bed " +
                        "--del-gtf {del_gtf} " +
                        "--dup-gtf {dup_gtf} " +
@@ -79,14 +74,7 @@ class Sveffect(Job):
                           combined_effects_bed=self.output_combined_bed,
                       )
 
-        deactivate_env_cmd = "source deactivate"
-
-        return "{} && {} && {} && {}".format(
-            activate_env_cmd,
-            make_bed_cmd,
-            predict_cmd,
-            deactivate_env_cmd,
-        )
+        return conda_command(self.conda_env, self.conda_variables, " && ".join([make_bed_cmd, predict_cmd]))
 
 class MantaSomaticSV(Job):
     def __init__(self):
@@ -1,4 +1,5 @@
 from pypedream.job import Job, required
+from autoseq.util.path import stage_command
 
 
 # case class bwaIndex(ref:File) extends ExternalCommonArgs with  SingleCoreJob with OneDayJob {
@@ -54,3 +55,20 @@ class Curl(Job):
         return "curl " + \
                required(" ", self.remote) + \
                required(" > ", self.output)
+
+
+class StageFile(Job):
+    """
+    Copies an input file to node-local storage, resuming partial copies. Staged files are
+    intermediate, and can be removed once the jobs reading them have finished.
+    """
+    def __init__(self, input_file, output_file, verify_checksum=False):
+        Job.__init__(self)
+        self.input = input_file
+        self.output = output_file
+        self.verify_checksum = verify_checksum
+        self.jobname = "stage"
+        self.is_intermediate = True
+
+    def command(self):
+        return stage_command(self.input, self.output, self.verify_checksum)
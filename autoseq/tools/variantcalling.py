@@ -4,6 +4,8 @@ import uuid
 
 from pypedream.job import Job, repeat, required, optional, conditional
 from autoseq.util.clinseq_barcode import *
+from autoseq.util.condaenv import conda_command
+from autoseq.util.jvmworker import GATK3_JAR, worker_command
 from autoseq.util.vcfutils import vt_split_and_leftaln, fix_ambiguous_cl, remove_dup_cl
 
 class HaplotypeCaller(Job):
@@ -288,12 +290,13 @@ class SomaticSeq(Job):
     self.output_snv = None
     self.output_indel = None
     self.output_vcf = None
+    self.jvm_worker = None
+    self.conda_env = "somaticseqenv"
+    self.conda_variables = None
     self.jobname = 'somaticseq-vcf-merging'
 
   def command(self):
 
-    somatic_seq_env = "source activate somaticseqenv"
-
     somatic_seq = "run_somaticseq.py " + \
                   " --output-directory " + self.output_dir + \
                   " --genome-reference " + self.reference_sequence +  \
@@ -307,19 +310,23 @@ class SomaticSeq(Job):
                   " --strelka-snv " + self.input_strelka_snv + \
                   " --strelka-indel " + self.input_strelka_indel
 
-    deactivate_ssenv = "source deactivate"
-
-    merge_vcf = "java -jar /nfs/PROBIO/autoseq-scripts/GenomeAnalysisTK-3.5.jar " + \
-                " -T CombineVariants " + \
-                " -R " + self.reference_sequence + \
-                " --variant " + self.output_snv + \
-                " --variant " + self.output_indel + \
-                " --assumeIdenticalSamples " + \
-                " | bgzip > " + self.output_vcf 
+    # CombineVariants writes to an uncompressed file, which the run in a fresh JVM overwrites if
+    # the run in the JVM worker fails, and which is compressed once one of the runs succeeds:
+    combined_vcf = self.output_vcf + ".tmp.vcf"
+    combine_args = " -T CombineVariants " + \
+                   " -R " + self.reference_sequence + \
+                   " --variant " + self.output_snv + \
+                   " --variant " + self.output_indel + \
+                   " --assumeIdenticalSamples " + \
+                   " -o " + combined_vcf
+    merge_vcf = worker_command(self.jvm_worker, "gatk3", combine_args,
+                               "java -jar {} ".format(GATK3_JAR) + combine_args) + \
+                " && bgzip -c {vcf} > {output} && rm -f {vcf} {vcf}.idx".format(vcf=combined_vcf,
+                                                                                output=self.output_vcf)
     
     tabix_vcf = "tabix -p vcf {} ".format(self.output_vcf)
 
-    return " && ".join([somatic_seq_env, somatic_seq, deactivate_ssenv, merge_vcf, tabix_vcf])
+    return " && ".join([conda_command(self.conda_env, self.conda_variables, somatic_seq), merge_vcf, tabix_vcf])
 
 class VEP(Job):
     def __init__(self):
@@ -406,17 +413,23 @@ class MergeVCF(Job):
     self.input_vcf_strelka = None
     self.output_vcf = None
     self.reference_genome = None
+    self.jvm_worker = None
 
   def command(self):
 
-    merge_vcf = "java -jar /nfs/PROBIO/autoseq-scripts/GenomeAnalysisTK-3.5.jar " + \
-                " -T CombineVariants " + \
-                " -R " + self.reference_genome + \
-                " --variant:haplotypecaller " + self.input_vcf_hc + \
-                " --variant:strelka " + self.input_vcf_strelka + \
-                " -genotypeMergeOptions PRIORITIZE " + \
-                " -priority haplotypecaller,strelka " + \
-                " | bgzip > {} ".format(self.output_vcf)
+    # See SomaticSeq for why CombineVariants writes to an uncompressed file:
+    combined_vcf = self.output_vcf + ".tmp.vcf"
+    combine_args = " -T CombineVariants " + \
+                   " -R " + self.reference_genome + \
+                   " --variant:haplotypecaller " + self.input_vcf_hc + \
+                   " --variant:strelka " + self.input_vcf_strelka + \
+                   " -genotypeMergeOptions PRIORITIZE " + \
+                   " -priority haplotypecaller,strelka " + \
+                   " -o " + combined_vcf
+    merge_vcf = worker_command(self.jvm_worker, "gatk3", combine_args,
+                               "java -jar {} ".format(GATK3_JAR) + combine_args) + \
+                " && bgzip -c {vcf} > {output} && rm -f {vcf} {vcf}.idx".format(vcf=combined_vcf,
+                                                                                output=self.output_vcf)
     
     tabix_vcf = "tabix -p vcf {} ".format(self.output_vcf)
 
@@ -7,14 +7,46 @@ and
 
 python -c 'import sys; from autoseq.util.bcbio import call_somatic; print call_somatic(sys.stdin.read())'
 
+The *_input_stream functions apply the filters to a whole VCF stream, processing the records
+in blocks with the vectorized *_batch functions, which produce output identical to that of
+the per-line functions.
 """
+import collections
+import itertools
+import re
+from operator import itemgetter, methodcaller
+
+import numpy as np
+
+# Number of VCF lines processed at a time by the *_input_stream functions:
+BLOCK_SIZE = 10000
+
+# Thresholds used by call_somatic(). Likelihood thresholds are like phred scores, so 3.5 = phred35:
+TUMOR_LOD_THRESHOLD = 3.5
+NORMAL_LOD_THRESHOLD = 3.5
+FREQ_THRESHOLD_RATIO = 2.7
+
+REGEX_SSF = re.compile(r'(?:^|;)SSF=([^;]*)')
+
+
+def read_blocks(input_stream, block_size=BLOCK_SIZE):
+    """
+    Read lines from the input stream, in lists of at most block_size lines.
+    """
+    while True:
+        block = list(itertools.islice(input_stream, block_size))
+        if not block:
+            return
+        yield block
 
 
 def depth_freq_filter_input_stream(input_stream, tumor_index, aligner):
-    processed_output = ""
-    for line in input_stream.readlines():
-        processed_output = processed_output + depth_freq_filter(line, tumor_index, aligner)
-    return processed_output
+    return "".join("".join(depth_freq_filter_batch(block, tumor_index, aligner))
+                   for block in read_blocks(input_stream))
+
+
+def call_somatic_input_stream(input_stream):
+    return "".join("".join(call_somatic_batch(block)) for block in read_blocks(input_stream))
 
 
 def depth_freq_filter(line, tumor_index, aligner):
@@ -96,8 +128,7 @@ def call_somatic(line):
     a threshold to avoid calls that are low frequency in both tumor and normal. This supports
     both FreeBayes and VarDict output frequencies.
     """
-    # Thresholds are like phred scores, so 3.5 = phred35
-    tumor_thresh, normal_thresh = 3.5, 3.5
+    tumor_thresh, normal_thresh = TUMOR_LOD_THRESHOLD, NORMAL_LOD_THRESHOLD
     if line.startswith("#CHROM"):
         headers = ['##INFO=<ID=SOMATIC,Number=0,Type=Flag,Description="Somatic event">',
                    ('##FILTER=<ID=REJECT,Description="Not somatic due to normal call frequency '
@@ -165,7 +196,7 @@ def _check_freqs(parts):
     Avoids calling low frequency tumors also present at low frequency in normals,
     which indicates a contamination or persistent error.
     """
-    thresh_ratio = 2.7
+    thresh_ratio = FREQ_THRESHOLD_RATIO
     try:  # FreeBayes
         ao_index = parts[8].split(":").index("AO")
         ro_index = parts[8].split(":").index("RO")
@@ -192,3 +223,268 @@ def _check_freqs(parts):
 
     tumor_freq, normal_freq = _calc_freq(parts[9]), _calc_freq(parts[10])
     return normal_freq <= 0.001 or normal_freq <= tumor_freq / thresh_ratio
+
+
+def _add_filter(parts, filter_name):
+    if parts[6] in (".", "PASS"):
+        parts[6] = filter_name
+    else:
+        parts[6] += ";%s" % filter_name
+
+
+def _split_records(lines, process_header):
+    """
+    Split the records in a block of VCF lines into their columns, processing header lines
+    with the specified function.
+
+    :return: Tuple of (list of output lines, indexes of the records in it, list of record columns).
+    """
+    output = list(lines)
+    record_indexes = []
+    for i, line in enumerate(lines):
+        if line.startswith("#"):
+            output[i] = process_header(line)
+        else:
+            record_indexes.append(i)
+    return output, record_indexes, [lines[i].split("\t") for i in record_indexes]
+
+
+def _key_indexes(format_column, keys, first_occurrence=False):
+    enumerated_keys = list(enumerate(format_column.split(":")))
+    if first_occurrence:
+        enumerated_keys.reverse()
+    positions = dict((key, i) for i, key in enumerated_keys)
+    return [positions.get(key) for key in keys]
+
+
+def _key_occurrences(format_column, keys):
+    """
+    :return: List with, for each key, the list of indexes at which it occurs in the FORMAT column.
+    """
+    occurrences = dict((key, []) for key in keys)
+    for i, key in enumerate(format_column.split(":")):
+        if key in occurrences:
+            occurrences[key].append(i)
+    return [occurrences[key] for key in keys]
+
+
+def _sample_value(sample, indexes):
+    """
+    :param sample: Sample column split into its fields.
+    :param indexes: Indexes at which a key occurs in the FORMAT column.
+    :return: The value of the last occurrence of the key that the sample has a field for, as
+    a dictionary built by zipping the FORMAT and sample fields holds, or None if there is none.
+    """
+    for index in reversed(indexes):
+        if index < len(sample):
+            return sample[index]
+    return None
+
+
+def _format_indexes(records, keys, first_occurrence=False):
+    """
+    Locate the specified FORMAT keys in the FORMAT column of each record. Each distinct FORMAT
+    column is only split once.
+
+    :param first_occurrence: If True, then use the first occurrence of repeated keys, as list.index()
+    does, rather than the last, as a dictionary of the FORMAT fields does.
+    :return: List with, for each record, a list of key indexes (None for absent keys).
+    """
+    format_columns = list(map(itemgetter(8), records))
+    format_to_indexes = dict((format_column, _key_indexes(format_column, keys, first_occurrence))
+                             for format_column in set(format_columns))
+    return list(map(format_to_indexes.__getitem__, format_columns))
+
+
+def _format_values(records, sample_column, keys, first_occurrence=False):
+    """
+    Extract the values of the specified FORMAT keys for one sample. The records are grouped by
+    their FORMAT column, and the sample columns of each group are split together.
+
+    :param first_occurrence: See _format_indexes().
+    :return: Dictionary with key as key and list of values (None where absent) as value.
+    """
+    values = dict((key, [None] * len(records)) for key in keys)
+    format_to_records = collections.defaultdict(list)
+    for i, format_column in enumerate(map(itemgetter(8), records)):
+        format_to_records[format_column].append(i)
+
+    for format_column, record_numbers in format_to_records.items():
+        if first_occurrence:
+            occurrences = [[] if index is None else [index]
+                           for index in _key_indexes(format_column, keys, first_occurrence)]
+        else:
+            occurrences = _key_occurrences(format_column, keys)
+        present = [(key, indexes) for key, indexes in zip(keys, occurrences) if indexes]
+        if not present:
+            continue
+        samples = [records[i][sample_column] for i in record_numbers]
+        n_fields = format_column.count(":") + 1
+        if set(map(methodcaller("count", ":"), samples)) == set([n_fields - 1]):
+            # All samples have a value for every key, so that the values of each key are
+            # evenly spaced in the joined sample columns:
+            fields = ":".join(samples).split(":")
+            columns = [fields[indexes[-1]::n_fields] for _, indexes in present]
+        else:
+            # Truncated samples may lack the last occurrence of a repeated key:
+            split_samples = [sample.split(":") for sample in samples]
+            columns = [[_sample_value(sample, indexes) for sample in split_samples] for _, indexes in present]
+
+        for (key, _), column in zip(present, columns):
+            if len(record_numbers) == len(records):
+                values[key] = column
+            else:
+                key_values = values[key]
+                for i, value in zip(record_numbers, column):
+                    key_values[i] = value
+    return values
+
+
+def _to_float_array(values, default=np.nan):
+    """
+    Convert strings to a float array, in the same way as _safe_to_float(), replacing absent
+    and unparseable values with the default.
+    """
+    try:
+        return np.array([repr(default) if value is None else value for value in values], dtype=float)
+    except ValueError:
+        floats = [_safe_to_float(value) for value in values]
+        return np.array([default if value is None else value for value in floats], dtype=float)
+
+
+def depth_freq_filter_batch(lines, tumor_index, aligner):
+    """
+    Apply depth_freq_filter() to a block of VCF lines, evaluating the filters on all records
+    at once.
+
+    :return: List of output lines, identical to those of depth_freq_filter().
+    """
+    output, record_indexes, records = _split_records(
+        lines, lambda line: depth_freq_filter(line, tumor_index, aligner))
+    if not records:
+        return output
+
+    values = _format_values(records, 9 + tumor_index, ["DP", "AF", "NM", "MQ"])
+    dp, af, nm, mq = [_to_float_array(values[key]) for key in ["DP", "AF", "NM", "MQ"]]
+    qual = _to_float_array(list(map(itemgetter(5), records)))
+    ssfs = list(map(REGEX_SSF.search, map(itemgetter(7), records)))
+    pval = _to_float_array([ssf.group(1).split("=")[-1] if ssf else None for ssf in ssfs])
+
+    # Absent values are NaN, for which all comparisons are false, as for None in depth_freq_filter():
+    with np.errstate(invalid='ignore'):
+        poor_alignment = ((mq < 55.0) & (nm > 1.0)) | ((mq < 60.0) & (nm > 2.0))
+        if aligner != "bwa":
+            poor_alignment[:] = False
+        low_allele_depth = (dp * af < 6) & (poor_alignment | (dp < 10) | (qual < 45))
+        low_freq_quality = (af < 0.2) & (qual < 55) & (pval > 0.06)
+
+    # Only filtered records are modified, as the other records are output unchanged:
+    for i in np.flatnonzero(low_allele_depth | low_freq_quality):
+        parts = records[i]
+        _add_filter(parts, "LowFreqQuality" if low_freq_quality[i] else "LowAlleleDepth")
+        output[record_indexes[i]] = "\t".join(parts)
+    return output
+
+
+def _gl_lod(parts, sample_column, gl_index, tumor):
+    """
+    Compute the tumor or normal likelihood as in _check_lods(), or None if there is no
+    GL information for the sample.
+    """
+    try:
+        gls = [float(x) for x in parts[sample_column].split(":")[gl_index].split(",") if x != "."]
+    except IndexError:
+        return None
+    if not gls:
+        return None
+    if tumor:
+        return max(gls[i] - gls[0] for i in range(1, len(gls)))
+    return min(gls[0] - gls[i] for i in range(1, len(gls)))
+
+
+def _lods(records):
+    """
+    :return: Tuple of tumor and normal likelihood arrays, as compared with thresholds by _check_lods().
+    """
+    tumor_lods = np.full(len(records), TUMOR_LOD_THRESHOLD)
+    normal_lods = np.full(len(records), NORMAL_LOD_THRESHOLD)
+    for i, (gl_index,) in enumerate(_format_indexes(records, ["GL"], first_occurrence=True)):
+        if gl_index is None:
+            continue
+        tumor_lod = _gl_lod(records[i], 9, gl_index, tumor=True)
+        normal_lod = _gl_lod(records[i], 10, gl_index, tumor=False)
+        tumor_lods[i] = -1.0 if tumor_lod is None else tumor_lod
+        if normal_lod is not None:
+            normal_lods[i] = normal_lod
+    return tumor_lods, normal_lods
+
+
+def _freqs(records, sample_column, record_format_indexes):
+    """
+    :return: Array of sample frequencies, as computed by _check_freqs().
+    """
+    freqs = np.zeros(len(records))
+    af_records = [i for i, (ao_index, _, _) in enumerate(record_format_indexes) if ao_index is None]
+    ao_records = [i for i, (ao_index, _, _) in enumerate(record_format_indexes) if ao_index is not None]
+    for i in ao_records:
+        ao_index, ro_index, _ = record_format_indexes[i]
+        sample_values = records[i][sample_column].split(":")
+        try:
+            ao = sum([int(x) for x in sample_values[ao_index].split(",")])
+            ro = int(sample_values[ro_index])
+            freqs[i] = ao / float(ao + ro)
+        except (IndexError, ValueError, ZeroDivisionError):
+            freqs[i] = 0.0
+    if af_records:
+        af_values = _format_values([records[i] for i in af_records], sample_column, ["AF"],
+                                   first_occurrence=True)["AF"]
+        freqs[af_records] = _to_float_array(af_values, default=0.0)
+    return freqs
+
+
+def call_somatic_batch(lines):
+    """
+    Apply call_somatic() to a block of VCF lines, evaluating the likelihood and frequency
+    thresholds on all records at once.
+
+    :return: List of output lines, identical to those of call_somatic().
+    """
+    output, record_indexes, records = _split_records(lines, call_somatic)
+    if not records:
+        return output
+
+    tumor_lod, normal_lod = _lods(records)
+    with np.errstate(invalid='ignore'):
+        somatic = (normal_lod >= NORMAL_LOD_THRESHOLD) & (tumor_lod >= TUMOR_LOD_THRESHOLD)
+
+    # As in call_somatic(), frequencies are only checked for records passing the likelihood
+    # thresholds, and AO and RO are only used if both are present:
+    checked = np.flatnonzero(somatic)
+    checked_records = [records[i] for i in checked]
+    format_columns = list(map(itemgetter(8), checked_records))
+    format_to_indexes = {}
+    for format_column in set(format_columns):
+        ao_index, ro_index, af_index = _key_indexes(format_column, ["AO", "RO", "AF"], first_occurrence=True)
+        if ao_index is None or ro_index is None:
+            ao_index, ro_index = None, None
+        format_to_indexes[format_column] = (ao_index, ro_index, af_index)
+    unsupported = set(format_column for format_column, indexes in format_to_indexes.items()
+                      if indexes == (None, None, None))
+    if unsupported:
+        parts = next(parts for parts in checked_records if parts[8] in unsupported)
+        raise NotImplementedError("Unexpected format annotations: %s" % parts[0])
+
+    if checked_records:
+        record_format_indexes = list(map(format_to_indexes.__getitem__, format_columns))
+        tumor_freq = _freqs(checked_records, 9, record_format_indexes)
+        normal_freq = _freqs(checked_records, 10, record_format_indexes)
+        with np.errstate(invalid='ignore'):
+            somatic[checked] = (normal_freq <= 0.001) | (normal_freq <= tumor_freq / FREQ_THRESHOLD_RATIO)
+
+    for parts, record_index, is_somatic in zip(records, record_indexes, somatic):
+        if is_somatic:
+            parts[7] += ";SOMATIC"
+        else:
+            _add_filter(parts, "REJECT")
+        output[record_index] = "\t".join(parts)
+    return output
@@ -0,0 +1,450 @@
+"""
+Binned read counting and copy number estimation for low-pass WGS, as an alternative to QDNAseq.
+
+The genome is divided into fixed-size bins, annotated once per reference genome with the
+percentage of non-N bases, the GC content and the mappability of each bin. For each BAM file,
+the reads starting in each bin are counted through the BAM index, one chromosome per process.
+The counts of usable bins are corrected by the median count of usable bins with similar GC content
+and mappability, normalised to a median of one, and segmented by binary segmentation of their
+log2 values.
+
+Run as:
+
+    python -m autoseq.util.binning annotate --reference <fasta> [--mappability <bedGraph>]
+        [--bin-size <bases>] <output bin annotations>
+
+    python -m autoseq.util.binning call --bins <bin annotations> [--threads <n>] <bam> <output table>
+
+The output table has one row per bin, with 1-based coordinates as in QDNAseq, and the read
+count, copy number ratio and segmented copy number ratio of each bin in its "readcount",
+"copynumber" and "segmented" columns. Values of bins that are not used are "NA".
+"""
+import collections
+import gzip
+import logging
+import math
+import multiprocessing
+import sys
+
+import click
+import numpy as np
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIN_SIZE = 15000
+DEFAULT_MIN_MAPQ = 37
+DEFAULT_MIN_BASES = 100.0
+DEFAULT_MIN_MAPPABILITY = 0.0
+DEFAULT_SEGMENT_THRESHOLD = 5.0
+DEFAULT_MIN_SEGMENT_BINS = 5
+
+# Chromosomes that are binned, and those left out of the correction and segmentation:
+BINNED_CHROMOSOMES = [str(i) for i in range(1, 23)] + ["X", "Y"]
+UNUSED_CHROMOSOMES = ["X", "Y"]
+
+# Reads that are unmapped, secondary, QC failed, duplicates or supplementary are not counted:
+EXCLUDED_FLAGS = 0x4 | 0x100 | 0x200 | 0x400 | 0x800
+
+# Smallest copy number ratio used when taking logarithms:
+MIN_RATIO = 2 ** -10
+
+ANNOTATION_COLUMNS = ["chromosome", "start", "end", "bases", "gc", "mappability"]
+OUTPUT_COLUMNS = ["feature"] + ANNOTATION_COLUMNS + ["use", "readcount", "copynumber", "segmented"]
+
+BinAnnotations = collections.namedtuple('BinAnnotations', ['starts', 'ends', 'bases', 'gc', 'mappability'])
+
+
+def chromosome_name(chrom):
+    """
+    :return: The chromosome name without any "chr" prefix.
+    """
+    return chrom[3:] if chrom.startswith("chr") else chrom
+
+
+def read_fasta(filename):
+    """
+    Read the sequences of a FASTA file, which may be gzipped, one at a time.
+
+    :return: Generator of (sequence name, sequence) tuples.
+    """
+    open_function = gzip.open if filename.endswith(".gz") else open
+    with open_function(filename) as fasta_file:
+        name, lines = None, []
+        for line in fasta_file:
+            if line.startswith(">"):
+                if name is not None:
+                    yield name, "".join(lines)
+                name, lines = line[1:].split()[0], []
+            else:
+                lines.append(line.rstrip())
+        if name is not None:
+            yield name, "".join(lines)
+
+
+def sequence_composition(sequence, bin_size):
+    """
+    :return: Tuple of arrays with the percentage of non-N bases and the GC percentage of the
+    non-N bases in each bin of the sequence. The GC percentage is NaN for bins without non-N bases.
+    """
+    n_bins = int(math.ceil(len(sequence) / float(bin_size)))
+    bases = np.frombuffer(sequence.upper().ljust(n_bins * bin_size, "N"), dtype=np.uint8).reshape(n_bins, bin_size)
+    acgt_counts = np.isin(bases, np.frombuffer(b"ACGT", dtype=np.uint8)).sum(axis=1)
+    gc_counts = np.isin(bases, np.frombuffer(b"GC", dtype=np.uint8)).sum(axis=1)
+    bin_lengths = np.minimum(bin_size, len(sequence) - np.arange(n_bins) * bin_size)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gc = np.where(acgt_counts > 0, 100.0 * gc_counts / acgt_counts, np.nan)
+    return 100.0 * acgt_counts / bin_lengths, gc
+
+
+def read_bedgraph(filename):
+    """
+    :return: Dictionary with chromosome as key and a tuple of start, end and value arrays, sorted
+    by start, as value.
+    """
+    chrom_to_intervals = collections.defaultdict(list)
+    open_function = gzip.open if filename.endswith(".gz") else open
+    with open_function(filename) as bedgraph_file:
+        for line in bedgraph_file:
+            if line.startswith(("#", "track", "browser")) or not line.strip():
+                continue
+            columns = line.split()
+            chrom_to_intervals[columns[0]].append((int(columns[1]), int(columns[2]), float(columns[3])))
+
+    chrom_to_arrays = {}
+    for chrom, intervals in chrom_to_intervals.items():
+        intervals.sort()
+        chrom_to_arrays[chrom] = tuple(np.array(values) for values in zip(*intervals))
+    return chrom_to_arrays
+
+
+def mean_per_bin(intervals, length, bin_size):
+    """
+    Compute the mean of a track over each bin of a chromosome, with bases outside the track's
+    intervals counting as zero.
+
+    :param intervals: Tuple of start, end and value arrays of non-overlapping intervals, sorted by start.
+    :param length: Length of the chromosome.
+    """
+    starts, ends, values = intervals
+    cumulative = np.concatenate([[0.0], np.cumsum(values * (ends - starts))])
+    n_bins = int(math.ceil(length / float(bin_size)))
+    boundaries = np.minimum(np.arange(n_bins + 1) * bin_size, length)
+
+    # Integral of the track from the start of the chromosome to each bin boundary:
+    i = np.searchsorted(ends, boundaries, side='right')
+    partial = np.zeros(len(boundaries))
+    within = (i < len(starts))
+    within[within] = starts[i[within]] < boundaries[within]
+    partial[within] = values[i[within]] * (boundaries[within] - starts[i[within]])
+    integral = cumulative[i] + partial
+    return np.diff(integral) / np.diff(boundaries)
+
+
+def annotate_bins(fasta, bin_size=DEFAULT_BIN_SIZE, mappability=None, chromosomes=BINNED_CHROMOSOMES):
+    """
+    Annotate the bins of the specified chromosomes of a reference genome.
+
+    :param mappability: Mappability track as returned by read_bedgraph(), with values between 0 and 1.
+    :return: Generator of (chromosome, BinAnnotations) tuples, in the order of the reference genome.
+    Mappability is 100 for all bins if no mappability track is given.
+    """
+    for chrom, sequence in read_fasta(fasta):
+        if chromosome_name(chrom) not in chromosomes:
+            continue
+        bases, gc = sequence_composition(sequence, bin_size)
+        starts = np.arange(len(bases)) * bin_size
+        ends = np.minimum(starts + bin_size, len(sequence))
+        if mappability is None:
+            bin_mappability = np.full(len(bases), 100.0)
+        elif chrom in mappability:
+            bin_mappability = 100.0 * mean_per_bin(mappability[chrom], len(sequence), bin_size)
+        else:
+            bin_mappability = np.zeros(len(bases))
+        yield chrom, BinAnnotations(starts, ends, bases, gc, bin_mappability)
+
+
+def format_value(value):
+    return "NA" if np.isnan(value) else "{:g}".format(value)
+
+
+def write_annotations(chrom_annotations, output_file):
+    output_file.write("\t".join(ANNOTATION_COLUMNS) + "\n")
+    for chrom, annotations in chrom_annotations:
+        for start, end, bases, gc, mappability in zip(*annotations):
+            output_file.write("\t".join([chrom, str(start + 1), str(end), format_value(bases), format_value(gc),
+                                         format_value(mappability)]) + "\n")
+
+
+def read_annotations(filename):
+    """
+    :return: OrderedDict with chromosome as key and BinAnnotations, with 0-based starts, as value.
+    """
+    chrom_to_rows = collections.OrderedDict()
+    with open(filename) as annotation_file:
+        header = annotation_file.readline().rstrip("\r\n").split("\t")
+        indexes = [header.index(column) for column in ANNOTATION_COLUMNS]
+        for line in annotation_file:
+            columns = line.rstrip("\r\n").split("\t")
+            chrom, start, end, bases, gc, mappability = [columns[index] for index in indexes]
+            chrom_to_rows.setdefault(chrom, []).append(
+                (int(start) - 1, int(end), float(bases), float(gc) if gc != "NA" else np.nan, float(mappability)))
+
+    return collections.OrderedDict(
+        (chrom, BinAnnotations(*[np.array(values) for values in zip(*rows)]))
+        for chrom, rows in chrom_to_rows.items())
+
+
+def count_reads(bam, chrom, n_bins, bin_size, min_mapq=DEFAULT_MIN_MAPQ):
+    """
+    Count the reads starting in each bin of a chromosome.
+
+    :param bam: An open pysam AlignmentFile.
+    :return: Array of read counts.
+    """
+    starts = [read.reference_start for read in bam.fetch(chrom)
+              if not read.flag & EXCLUDED_FLAGS and read.mapping_quality >= min_mapq]
+    bin_indexes = np.minimum(np.array(starts, dtype=np.int64) // bin_size, n_bins - 1)
+    return np.bincount(bin_indexes, minlength=n_bins)
+
+
+def _count_chromosome(args):
+    import pysam
+
+    bam_filename, chrom, n_bins, bin_size, min_mapq = args
+    with pysam.AlignmentFile(bam_filename) as bam:
+        if chrom not in bam.references:
+            return np.zeros(n_bins, dtype=np.int64)
+        return count_reads(bam, chrom, n_bins, bin_size, min_mapq)
+
+
+def count_bins(bam_filename, annotations, min_mapq=DEFAULT_MIN_MAPQ, threads=1):
+    """
+    Count the reads of a BAM file in the annotated bins, counting one chromosome per process.
+
+    :return: OrderedDict with chromosome as key and array of read counts as value.
+    """
+    tasks = [(bam_filename, chrom, len(bins.starts), int(bins.ends[0] - bins.starts[0]), min_mapq)
+             for chrom, bins in annotations.items()]
+    if threads > 1:
+        pool = multiprocessing.Pool(min(threads, len(tasks)))
+        try:
+            counts = pool.map(_count_chromosome, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counts = [_count_chromosome(task) for task in tasks]
+    return collections.OrderedDict(zip(annotations.keys(), counts))
+
+
+def usable_bins(chrom, bins, min_bases=DEFAULT_MIN_BASES, min_mappability=DEFAULT_MIN_MAPPABILITY):
+    """
+    :return: Boolean array indicating which bins of the chromosome are used for the copy number estimation.
+    """
+    use = (bins.bases >= min_bases) & (bins.mappability >= min_mappability) & ~np.isnan(bins.gc)
+    if chromosome_name(chrom) in UNUSED_CHROMOSOMES:
+        use[:] = False
+    return use
+
+
+def correct_counts(counts, gc, mappability, use, gc_step=1.0, mappability_step=5.0, min_stratum_bins=20):
+    """
+    Correct read counts for GC content and mappability, by dividing them by the median count of
+    the usable bins in the same GC and mappability stratum. Strata with fewer than min_stratum_bins
+    usable bins are corrected by the median count of the usable bins with the same GC content only.
+
+    :return: Array of corrected counts, NaN for bins that are not usable or cannot be corrected.
+    """
+    gc_stratum = np.floor(np.nan_to_num(gc) / gc_step).astype(np.int64)
+    mappability_stratum = np.floor(mappability / mappability_step).astype(np.int64)
+    strata = gc_stratum * (int(100 / mappability_step) + 2) + mappability_stratum
+
+    expected = np.full(len(counts), np.nan)
+    for stratum in np.unique(strata[use]):
+        in_stratum = use & (strata == stratum)
+        if np.count_nonzero(in_stratum) >= min_stratum_bins:
+            expected[in_stratum] = np.median(counts[in_stratum])
+    for stratum in np.unique(gc_stratum[use & np.isnan(expected)]):
+        in_gc_stratum = use & (gc_stratum == stratum)
+        missing = in_gc_stratum & np.isnan(expected)
+        expected[missing] = np.median(counts[in_gc_stratum])
+
+    corrected = np.full(len(counts), np.nan)
+    valid = use & ~np.isnan(expected)
+    valid[valid] = expected[valid] > 0
+    corrected[valid] = counts[valid] / expected[valid]
+    return corrected
+
+
+def segment(values, threshold=DEFAULT_SEGMENT_THRESHOLD, min_bins=DEFAULT_MIN_SEGMENT_BINS, noise=None):
+    """
+    Segment a sequence of values by recursive binary segmentation: a segment is split where the
+    t-statistic of the difference between the means on either side is largest, as long as that
+    statistic exceeds the threshold.
+
+    :param noise: Standard deviation of the values around their segment means; estimated from the
+    differences between consecutive values by default.
+    :return: List of (start, end) index tuples of the segments.
+    """
+    values = np.asarray(values, dtype=float)
+    if noise is None:
+        noise = estimate_noise(values)
+    if len(values) == 0:
+        return []
+    if not noise > 0:
+        return [(0, len(values))]
+
+    segments = []
+    pending = [(0, len(values))]
+    while pending:
+        start, end = pending.pop()
+        n = end - start
+        if n < 2 * min_bins:
+            segments.append((start, end))
+            continue
+        cumulative = np.cumsum(values[start:end])
+        sizes = np.arange(min_bins, n - min_bins + 1)
+        left_means = cumulative[sizes - 1] / sizes
+        right_means = (cumulative[-1] - cumulative[sizes - 1]) / (n - sizes)
+        statistics = np.abs(left_means - right_means) / (noise * np.sqrt(1.0 / sizes + 1.0 / (n - sizes)))
+        best = np.argmax(statistics)
+        if statistics[best] > threshold:
+            split = start + sizes[best]
+            pending.extend([(split, end), (start, split)])
+        else:
+            segments.append((start, end))
+    return sorted(segments)
+
+
+def estimate_noise(values):
+    """
+    :return: Robust estimate of the standard deviation of values around their local mean, from
+    the median absolute difference between consecutive values.
+    """
+    if len(values) < 2:
+        return 0.0
+    return 1.4826 * np.median(np.abs(np.diff(values))) / math.sqrt(2)
+
+
+def estimate_copy_number(annotations, counts, min_bases=DEFAULT_MIN_BASES, min_mappability=DEFAULT_MIN_MAPPABILITY,
+                         threshold=DEFAULT_SEGMENT_THRESHOLD, min_segment_bins=DEFAULT_MIN_SEGMENT_BINS):
+    """
+    Correct, normalise and segment the read counts of all chromosomes.
+
+    :return: OrderedDict with chromosome as key and a tuple of arrays with the usability, copy number
+    ratio and segmented copy number ratio of each bin as value.
+    """
+    chroms = list(annotations.keys())
+    use = np.concatenate([usable_bins(chrom, annotations[chrom], min_bases, min_mappability) for chrom in chroms])
+    all_counts = np.concatenate([counts[chrom] for chrom in chroms]).astype(float)
+    gc = np.concatenate([annotations[chrom].gc for chrom in chroms])
+    mappability = np.concatenate([annotations[chrom].mappability for chrom in chroms])
+
+    corrected = correct_counts(all_counts, gc, mappability, use)
+    valid = ~np.isnan(corrected)
+    copynumber = np.full(len(corrected), np.nan)
+    if np.any(valid):
+        median = np.median(corrected[valid])
+        if median > 0:
+            copynumber[valid] = corrected[valid] / median
+    valid = ~np.isnan(copynumber)
+
+    log2_ratios = np.log2(np.maximum(copynumber, MIN_RATIO))
+    noise = estimate_noise(log2_ratios[valid])
+    results = collections.OrderedDict()
+    offset = 0
+    for chrom in chroms:
+        n_bins = len(annotations[chrom].starts)
+        chrom_slice = slice(offset, offset + n_bins)
+        offset += n_bins
+
+        chrom_valid = valid[chrom_slice]
+        chrom_log2 = log2_ratios[chrom_slice][chrom_valid]
+        segmented_valid = np.empty(len(chrom_log2))
+        for start, end in segment(chrom_log2, threshold, min_segment_bins, noise):
+            segmented_valid[start:end] = 2 ** chrom_log2[start:end].mean()
+        segmented = np.full(n_bins, np.nan)
+        segmented[chrom_valid] = segmented_valid
+        results[chrom] = (chrom_valid, copynumber[chrom_slice], segmented)
+    return results
+
+
+def write_copy_number(annotations, counts, estimates, output_file):
+    output_file.write("\t".join(OUTPUT_COLUMNS) + "\n")
+    for chrom, bins in annotations.items():
+        use, copynumber, segmented = estimates[chrom]
+        for i in range(len(bins.starts)):
+            start, end = bins.starts[i] + 1, bins.ends[i]
+            output_file.write("\t".join(["{}:{}-{}".format(chrom, start, end), chrom, str(start), str(end),
+                                         format_value(bins.bases[i]), format_value(bins.gc[i]),
+                                         format_value(bins.mappability[i]), "TRUE" if use[i] else "FALSE",
+                                         str(counts[chrom][i]), format_value(copynumber[i]),
+                                         format_value(segmented[i])]) + "\n")
+
+
+def annotate_command(reference, output, mappability=None, bin_size=None, python=sys.executable):
+    """
+    Generate a shell command that annotates the bins of a reference genome, by running this module.
+    """
+    options = ["--reference", reference]
+    if mappability:
+        options += ["--mappability", mappability]
+    if bin_size is not None:
+        options += ["--bin-size", str(bin_size)]
+    return "{} -m autoseq.util.binning annotate {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(output))
+
+
+def call_command(input_bam, bin_annotations, output, min_mapq=None, threads=1, python=sys.executable):
+    """
+    Generate a shell command that estimates binned copy numbers, by running this module.
+    """
+    options = ["--bins", bin_annotations, "--threads", str(threads)]
+    if min_mapq is not None:
+        options += ["--min-mapq", str(min_mapq)]
+    return "{} -m autoseq.util.binning call {} {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(input_bam), quote(output))
+
+
+@click.group()
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+
+
+@main.command()
+@click.option('--reference', required=True, help="reference genome FASTA")
+@click.option('--mappability', default=None, help="mappability bedGraph, with values between 0 and 1")
+@click.option('--bin-size', default=DEFAULT_BIN_SIZE, help="bin size in bases")
+@click.argument('output')
+def annotate(reference, mappability, bin_size, output):
+    mappability_track = read_bedgraph(mappability) if mappability else None
+    with open(output, 'w') as output_file:
+        write_annotations(annotate_bins(reference, bin_size, mappability_track), output_file)
+
+
+@main.command()
+@click.option('--bins', required=True, help="bin annotations, as written by the annotate command")
+@click.option('--min-mapq', default=DEFAULT_MIN_MAPQ, help="minimum mapping quality of counted reads")
+@click.option('--min-bases', default=DEFAULT_MIN_BASES, help="minimum percentage of non-N bases of used bins")
+@click.option('--min-mappability', default=DEFAULT_MIN_MAPPABILITY, help="minimum mappability of used bins")
+@click.option('--threads', default=1, help="number of chromosomes to count reads of concurrently")
+@click.argument('bam')
+@click.argument('output')
+def call(bins, min_mapq, min_bases, min_mappability, threads, bam, output):
+    annotations = read_annotations(bins)
+    counts = count_bins(bam, annotations, min_mapq, threads)
+    logger.info("Counted {} reads in {} bins".format(sum(int(c.sum()) for c in counts.values()),
+                                                     sum(len(c) for c in counts.values())))
+    estimates = estimate_copy_number(annotations, counts, min_bases, min_mappability)
+    with open(output, 'w') as output_file:
+        write_copy_number(annotations, counts, estimates, output_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import collections, logging, os, re
-from autoseq.util.orderform import parse_orderform
+from autoseq.util.orderform import find_orderforms, parse_orderform, parse_orderforms
 from autoseq.util.library import find_fastqs
 
 
@@ -17,13 +17,83 @@ UniqueCapture = collections.namedtuple(
     'capture_kit_id']
 )
 
+# A valid clinseq barcode, with one group per field. The SDID includes its "P-" prefix:
+CLINSEQ_BARCODE_REGEX = re.compile(
+    r'^(AL|LB|OT)-(P-[a-zA-Z0-9]+)-(N|T|CFDNA)-([a-zA-Z0-9]+)-([A-Z]{2}[0-9]+)-([A-Z]{2}[0-9]+|WGS)$')
 
-def data_available_for_clinseq_barcode(libdir, clinseq_barcode):
+
+class ClinseqBarcode(object):
+    """
+    A parsed clinseq barcode. Barcodes are parsed once, with a single regular expression,
+    and the parsed barcodes are memoized by barcode string; use ClinseqBarcode.parse()
+    rather than the constructor.
+    """
+    __slots__ = ('barcode', 'project', 'sdid', 'sample_type', 'sample_id', 'prep_id', 'capture_id',
+                 'unique_capture')
+
+    _parsed = {}
+
+    def __init__(self, barcode, project, sdid, sample_type, sample_id, prep_id, capture_id):
+        self.barcode = barcode
+        self.project = project
+        self.sdid = sdid
+        self.sample_type = sample_type
+        self.sample_id = sample_id
+        self.prep_id = prep_id
+        self.capture_id = capture_id
+        self.unique_capture = UniqueCapture(project, sdid, sample_type, sample_id,
+                                            prep_id[:2], capture_id[:2])
+
+    @classmethod
+    def parse(cls, clinseq_barcode):
+        """
+        :param clinseq_barcode: A clinseq barcode string.
+        :return: The corresponding ClinseqBarcode.
+        :raise ValueError: If the barcode is invalid.
+        """
+        try:
+            return cls._parsed[clinseq_barcode]
+        except (KeyError, TypeError):
+            pass
+
+        match = CLINSEQ_BARCODE_REGEX.match(clinseq_barcode) if isinstance(clinseq_barcode, basestring) else None
+        if match is None:
+            raise ValueError("Invalid clinseq barcode: {}".format(clinseq_barcode))
+        parsed = cls(clinseq_barcode, *match.groups())
+        cls._parsed[clinseq_barcode] = parsed
+        return parsed
+
+    @classmethod
+    def is_valid(cls, clinseq_barcode):
+        try:
+            cls.parse(clinseq_barcode)
+            return True
+        except ValueError:
+            return False
+
+    def __eq__(self, other):
+        return isinstance(other, ClinseqBarcode) and self.barcode == other.barcode
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.barcode)
+
+    def __str__(self):
+        return self.barcode
+
+    def __repr__(self):
+        return "ClinseqBarcode({!r})".format(self.barcode)
+
+
+def data_available_for_clinseq_barcode(libdir, clinseq_barcode, library_index=None):
     """
     Check that data is available for the specified clinseq barcode in the specified library folder.
 
     :param libdir: Directory name where fastqs are organised.
     :param clinseq_barcode: A valid clinseq barcode string
+    :param library_index: Optional LibraryIndex for libdir.
     :return: True if data is available, False otherwise
     """
 
@@ -34,7 +104,7 @@ def data_available_for_clinseq_barcode(libdir, clinseq_barcode):
     if not os.path.exists(filedir):
         logging.warn("Dir {} does not exists for {}. Not using library.".format(filedir, clinseq_barcode))
         return False
-    if find_fastqs(clinseq_barcode, libdir) == (None, None):
+    if find_fastqs(clinseq_barcode, libdir, index=library_index) == (None, None):
         logging.warn("No fastq files found for {} in dir {}".format(clinseq_barcode, filedir))
         return False
 
@@ -51,20 +121,11 @@ def convert_to_libdict(clinseq_barcode):
     :return: A dictionary containing the field types and values present in the barcode
     """
 
-    library_id = clinseq_barcode
+    barcode = ClinseqBarcode.parse(clinseq_barcode)
 
-    if not clinseq_barcode_is_valid(clinseq_barcode):
-        raise ValueError("Invalid clinseq barcode: " + clinseq_barcode)
-
-    capture_id = parse_capture_id(clinseq_barcode)
-    type = parse_sample_type(clinseq_barcode)
-    sample_id = parse_sample_id(clinseq_barcode)
-    project_id = parse_project(clinseq_barcode)
-    sdid = parse_sdid(clinseq_barcode)
-    prep_id = parse_prep_id(clinseq_barcode)
-
-    return {"library_id": library_id, "capture_id": capture_id, "type": type, "sample_id": sample_id,
-            "project_id": project_id, "sdid": sdid, "prep_id": prep_id}
+    return {"library_id": clinseq_barcode, "capture_id": barcode.capture_id, "type": barcode.sample_type,
+            "sample_id": barcode.sample_id, "project_id": barcode.project, "sdid": barcode.sdid,
+            "prep_id": barcode.prep_id}
 
 
 def extract_unique_capture(clinseq_barcode):
@@ -77,22 +138,7 @@ def extract_unique_capture(clinseq_barcode):
     :return: UniqueCapture named tuple
     """
 
-    if not clinseq_barcode_is_valid(clinseq_barcode):
-        raise ValueError("Invalid clinseq barcode: " + clinseq_barcode)
-
-    project = parse_project(clinseq_barcode)
-    sdid = parse_sdid(clinseq_barcode)
-    sample_type = parse_sample_type(clinseq_barcode)
-    sample_id = parse_sample_id(clinseq_barcode)
-    prep_id = parse_prep_id(clinseq_barcode)
-    capture_id = parse_capture_id(clinseq_barcode)
-
-    return UniqueCapture(project,
-                         sdid,
-                         sample_type,
-                         sample_id,
-                         extract_kit_id(prep_id),
-                         extract_kit_id(capture_id))
+    return ClinseqBarcode.parse(clinseq_barcode).unique_capture
 
 
 def parse_project(clinseq_barcode):
@@ -103,7 +149,7 @@ def parse_project(clinseq_barcode):
     :return: The project field from the input string.
     """
 
-    return clinseq_barcode.split("-")[0]
+    return ClinseqBarcode.parse(clinseq_barcode).project
 
 
 def compose_sample_str(capture):
@@ -147,7 +193,7 @@ def parse_sample_type(clinseq_barcode):
     :return: The sample type field from the input string.
     """
 
-    return clinseq_barcode.split("-")[3]
+    return ClinseqBarcode.parse(clinseq_barcode).sample_type
 
 
 def parse_sample_id(clinseq_barcode):
@@ -158,7 +204,7 @@ def parse_sample_id(clinseq_barcode):
     :return: The sample ID field from the input string.
     """
 
-    return clinseq_barcode.split("-")[4]
+    return ClinseqBarcode.parse(clinseq_barcode).sample_id
 
 
 def parse_sdid(clinseq_barcode):
@@ -169,7 +215,7 @@ def parse_sdid(clinseq_barcode):
     :return: The SDID field from the input string.
     """
 
-    return "-".join(clinseq_barcode.split("-")[1:3])
+    return ClinseqBarcode.parse(clinseq_barcode).sdid
 
 
 def parse_prep_id(clinseq_barcode):
@@ -181,7 +227,7 @@ def parse_prep_id(clinseq_barcode):
     :return: Library prep ID string.
     """
 
-    return clinseq_barcode.split("-")[5]
+    return ClinseqBarcode.parse(clinseq_barcode).prep_id
 
 
 def parse_capture_id(clinseq_barcode):
@@ -193,7 +239,7 @@ def parse_capture_id(clinseq_barcode):
     :return: Library capture ID string.
     """
 
-    return clinseq_barcode.split("-")[6]
+    return ClinseqBarcode.parse(clinseq_barcode).capture_id
 
 
 def extract_kit_id(kit_string):
@@ -244,22 +290,7 @@ def clinseq_barcode_is_valid(clinseq_barcode):
     :return: True if the barcode has valid structure, False otherwise.
     """
 
-    fields = clinseq_barcode.split("-")
-    if len(fields) != 7:
-        return False
-
-    project_str = fields[0]
-    sdid_str = "-".join(fields[1:3])
-    sample_type_str = fields[3]
-    sample_id_str = fields[4]
-    prep_id_str = fields[5]
-    capture_id_str = fields[6]
-
-    barcode_valid = \
-        project_valid(project_str) and sdid_valid(sdid_str) and sample_type_valid(sample_type_str) and \
-        sample_id_valid(sample_id_str) and prep_id_valid(prep_id_str) and capture_id_valid(capture_id_str)
-
-    return barcode_valid
+    return ClinseqBarcode.is_valid(clinseq_barcode)
 
 
 def extract_clinseq_barcodes(input_filename):
@@ -267,11 +298,15 @@ def extract_clinseq_barcodes(input_filename):
     Extrat clinseq barcodes from the specified input file:
 
     :param input_filename: Either a .txt listing clinseq barcodes one per line,
-    or a .xlsx order form file containing the barcodes.
+    a .xlsx order form file containing the barcodes, or a directory of .xlsx
+    order forms, which are parsed in parallel.
 
     :return: A list of (not-yet validated) dash-delimited clinseq barcodes.
     """
 
+    if os.path.isdir(input_filename):
+        return list(set(parse_orderforms(find_orderforms(input_filename))))
+
     toks = input_filename.split(".")
 
     if toks[-1] == "txt":
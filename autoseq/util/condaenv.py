@@ -0,0 +1,134 @@
+"""
+Conda environments resolved once per pipeline run.
+
+Some tools are installed in conda environments of their own. Rather than having each job
+activate the environment, which starts conda for every job and contends for its locks when many
+jobs start at once, the pipeline activates each environment once when it starts and records the
+variables that activation sets. Jobs then run their tools in a subshell with those variables
+exported, and with the bin directory of the environment first on the PATH.
+"""
+import distutils.spawn
+import logging
+import os
+import re
+import subprocess
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACTIVATE = "source activate"
+
+# Binaries each environment must provide for the jobs using it:
+CONDA_BINARIES = {
+    "qdnaseqenv": ["qdnaseq.R"],
+    "svcallerenv": ["svcaller", "sveffect"],
+    "purecn-env": ["PureCN.R"],
+    "somaticseqenv": ["run_somaticseq.py"],
+}
+
+# Variables describing shell state rather than the environment. The PATH is reconstructed from
+# the environment prefix, so that jobs keep the PATH of the node they run on:
+IGNORED_VARIABLES = set(["_", "SHLVL", "PWD", "OLDPWD", "PS1", "PATH", "CONDA_SHLVL", "CONDA_PROMPT_MODIFIER"])
+
+
+class CondaEnvironmentError(Exception):
+    """Custom exception indicating that a conda environment required by the pipeline is not usable."""
+    pass
+
+
+def parse_environment(output):
+    """
+    :param output: Output of "env -0".
+    :return: Dictionary with variable names as keys and their values as values.
+    """
+    return dict(entry.split("=", 1) for entry in output.split("\0") if "=" in entry)
+
+
+def activation_variables(before, after):
+    """
+    :return: Dictionary of the variables that differ after activation, except for shell state.
+    Numbered CONDA_PREFIX_<n> variables, recording the stack of activated environments, and exported
+    shell functions are also excluded.
+    """
+    return dict((name, value) for name, value in after.items()
+                if before.get(name) != value and name not in IGNORED_VARIABLES and
+                not name.startswith("CONDA_PREFIX_") and re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name))
+
+
+def resolve_environment(name, activate=DEFAULT_ACTIVATE):
+    """
+    Activate the named environment in a shell, and record the variables activation sets.
+
+    :return: Dictionary of activation variables, including CONDA_PREFIX.
+    :raises CondaEnvironmentError: If the environment could not be activated.
+    """
+    with open(os.devnull, 'w') as devnull:
+        try:
+            before = parse_environment(subprocess.check_output(["bash", "-c", "env -0"]))
+            after = parse_environment(subprocess.check_output(
+                ["bash", "-c", "{} {} > /dev/null && env -0".format(activate, quote(name))], stderr=devnull))
+        except (OSError, subprocess.CalledProcessError):
+            raise CondaEnvironmentError("Could not activate conda environment {}".format(name))
+
+    variables = activation_variables(before, after)
+    if not os.path.isdir(variables.get("CONDA_PREFIX", "")):
+        raise CondaEnvironmentError("Activating conda environment {} did not set a valid CONDA_PREFIX".format(name))
+    return variables
+
+
+def missing_binaries(variables, binaries, path=None):
+    """
+    :param path: PATH that the bin directory of the environment is prepended to; the PATH of
+    this process by default.
+    :return: List of the specified binaries that are not found as executables on the resulting PATH.
+    """
+    search_path = os.pathsep.join([os.path.join(variables["CONDA_PREFIX"], "bin"),
+                                   os.environ.get("PATH", "") if path is None else path])
+    return [binary for binary in binaries if distutils.spawn.find_executable(binary, search_path) is None]
+
+
+def resolve_environments(names, activate=DEFAULT_ACTIVATE):
+    """
+    Resolve the named environments, checking that each of them provides the binaries listed
+    in CONDA_BINARIES.
+
+    :return: Dictionary with environment name as key and activation variables as value.
+    :raises CondaEnvironmentError: Listing all environments that could not be resolved or lack binaries.
+    """
+    env_to_variables = {}
+    problems = []
+    for name in sorted(names):
+        try:
+            variables = resolve_environment(name, activate)
+        except CondaEnvironmentError as e:
+            problems.append(str(e))
+            continue
+        missing = missing_binaries(variables, CONDA_BINARIES.get(name, []))
+        if missing:
+            problems.append("Conda environment {} lacks {}".format(name, ", ".join(missing)))
+            continue
+        logger.info("Resolved conda environment {} at {}".format(name, variables["CONDA_PREFIX"]))
+        env_to_variables[name] = variables
+
+    if problems:
+        raise CondaEnvironmentError("; ".join(problems))
+    return env_to_variables
+
+
+def conda_command(name, variables, command):
+    """
+    Generate a shell command that runs the specified command in a conda environment.
+
+    :param name: Name of the environment.
+    :param variables: Activation variables of the environment, as returned by resolve_environment(),
+    or None to activate the environment in the job instead.
+    """
+    if variables is None:
+        return "source activate {name} && {command} && source deactivate".format(name=name, command=command)
+    exports = ["PATH={}:\"$PATH\"".format(quote(os.path.join(variables["CONDA_PREFIX"], "bin")))] + \
+              ["{}={}".format(variable, quote(value)) for variable, value in sorted(variables.items())]
+    return "(export {} && {})".format(" ".join(exports), command)
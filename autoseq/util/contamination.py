@@ -0,0 +1,226 @@
+"""
+Estimation of sample contamination from allele counts at population SNPs.
+
+This is a lightweight alternative to GATK ContEst. Both BAM files of a pairing are scanned once,
+counting the alleles observed at the SNPs of a population allele frequency VCF. Sites where one
+sample (the genotype sample) is homozygous are then used to estimate the contamination of the
+other (the evaluated sample): reads showing the other allele at such sites are attributed to
+sequencing errors, or to contaminating DNA carrying that allele at its population frequency.
+The contamination level maximises the likelihood of the observed allele counts, and its 95%
+confidence interval is obtained from the likelihood ratio.
+
+Run as:
+
+    python -m autoseq.util.contamination --popfile <vcf> --output <table> [--output-genotype <table>]
+        <eval bam> <genotype bam>
+
+The contamination of the genotype sample is estimated from the same allele counts if
+--output-genotype is specified. The output tables follow the format of ContEst, with
+contamination levels as percentages.
+"""
+import gzip
+import logging
+import sys
+
+import click
+import numpy as np
+
+from autoseq.util.fingerprint import BASE_INDEX, SnpSite, allele_counts
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_GENOTYPE_RATIO = 0.95
+DEFAULT_MIN_GENOTYPE_DEPTH = 10
+DEFAULT_MIN_BASEQUAL = 20
+DEFAULT_ERROR_RATE = 0.001
+MAX_CONTAMINATION = 0.5
+
+# Half of the 95% quantile of the chi-squared distribution with one degree of freedom:
+CI_95_LOG_LIKELIHOOD_DROP = 1.920729
+
+CONTEST_COLUMNS = ["name", "population", "population_fit", "contamination", "confidence_interval_95_width",
+                   "confidence_interval_95_low", "confidence_interval_95_high", "sites"]
+
+
+def read_population_sites(filename):
+    """
+    Read the biallelic SNPs of a population allele frequency VCF, which may be gzipped.
+    Sites without an AF value strictly between 0 and 1 are skipped.
+
+    :return: Tuple of a list of SnpSite tuples, with 0-based positions, and an array of
+    alternative allele frequencies.
+    """
+    sites = []
+    allele_freqs = []
+    open_function = gzip.open if filename.endswith(".gz") else open
+    with open_function(filename) as vcf_file:
+        for line in vcf_file:
+            if line.startswith("#"):
+                continue
+            columns = line.rstrip("\r\n").split("\t", 8)
+            ref, alt = columns[3].upper(), columns[4].upper()
+            if ref not in BASE_INDEX or alt not in BASE_INDEX or len(columns) < 8:
+                continue
+            for info in columns[7].split(";"):
+                if info.startswith("AF="):
+                    try:
+                        allele_freq = float(info[3:])
+                    except ValueError:
+                        break
+                    if 0 < allele_freq < 1:
+                        sites.append(SnpSite(columns[0], int(columns[1]) - 1, ref, alt))
+                        allele_freqs.append(allele_freq)
+                    break
+    return sites, np.array(allele_freqs, dtype=float)
+
+
+def informative_sites(genotype_ref, genotype_alt, eval_ref, eval_alt, allele_freqs,
+                      min_genotype_ratio=DEFAULT_MIN_GENOTYPE_RATIO, min_depth=DEFAULT_MIN_GENOTYPE_DEPTH):
+    """
+    Select the sites at which the genotype sample is homozygous, and express the evaluated sample's
+    allele counts at those sites relative to the homozygous allele.
+
+    :return: Tuple of arrays with the number of reads showing the homozygous allele, the number
+    of reads showing the other allele, and the population frequency of the other allele.
+    """
+    depth = genotype_ref + genotype_alt
+    alt_fraction = genotype_alt / np.maximum(depth, 1).astype(float)
+    hom_ref = (depth >= min_depth) & (alt_fraction <= 1 - min_genotype_ratio)
+    hom_alt = (depth >= min_depth) & (alt_fraction >= min_genotype_ratio)
+    used = (hom_ref | hom_alt) & (eval_ref + eval_alt > 0)
+
+    n_hom = np.where(hom_alt, eval_alt, eval_ref)[used]
+    n_other = np.where(hom_alt, eval_ref, eval_alt)[used]
+    other_freq = np.where(hom_alt, 1 - allele_freqs, allele_freqs)[used]
+    return n_hom, n_other, other_freq
+
+
+def log_likelihood(contamination, n_hom, n_other, other_freq, error_rate=DEFAULT_ERROR_RATE):
+    p_other = (1 - contamination) * error_rate + \
+        contamination * (other_freq * (1 - error_rate) + (1 - other_freq) * error_rate)
+    return np.sum(n_other * np.log(p_other) + n_hom * np.log(1 - p_other))
+
+
+def _bisect(function, low, high, iterations=60):
+    """
+    Find the point in [low, high] where the monotonically decreasing function crosses zero.
+    """
+    for _ in range(iterations):
+        middle = (low + high) / 2.0
+        if function(middle) > 0:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.0
+
+
+def estimate_contamination(n_hom, n_other, other_freq, error_rate=DEFAULT_ERROR_RATE):
+    """
+    Compute the maximum likelihood contamination level, and its 95% confidence interval.
+    The log-likelihood is concave in the contamination level, so the maximum and the interval
+    bounds are found by bisection.
+
+    :return: Dictionary with the contamination, confidence interval bounds (as fractions),
+    the maximum log-likelihood and the number of sites used.
+    """
+    if len(n_hom) == 0:
+        return {"contamination": float("nan"), "ci_low": float("nan"), "ci_high": float("nan"),
+                "log_likelihood": float("nan"), "sites": 0}
+
+    slope_factor = other_freq * (1 - error_rate) + (1 - other_freq) * error_rate - error_rate
+
+    def derivative(contamination):
+        p_other = error_rate + contamination * slope_factor
+        return np.sum((n_other / p_other - n_hom / (1 - p_other)) * slope_factor)
+
+    if derivative(0.0) <= 0:
+        contamination = 0.0
+    elif derivative(MAX_CONTAMINATION) >= 0:
+        contamination = MAX_CONTAMINATION
+    else:
+        contamination = _bisect(derivative, 0.0, MAX_CONTAMINATION)
+
+    max_log_likelihood = log_likelihood(contamination, n_hom, n_other, other_freq, error_rate)
+
+    def above_threshold(value):
+        return log_likelihood(value, n_hom, n_other, other_freq, error_rate) - \
+            (max_log_likelihood - CI_95_LOG_LIKELIHOOD_DROP)
+
+    ci_low = 0.0 if above_threshold(0.0) >= 0 else _bisect(lambda c: -above_threshold(c), 0.0, contamination)
+    ci_high = MAX_CONTAMINATION if above_threshold(MAX_CONTAMINATION) >= 0 else \
+        _bisect(above_threshold, contamination, MAX_CONTAMINATION)
+    return {"contamination": contamination, "ci_low": ci_low, "ci_high": ci_high,
+            "log_likelihood": float(max_log_likelihood), "sites": int(len(n_hom))}
+
+
+def write_contest_table(estimate, output_file, name="META", population="ALL"):
+    """
+    Write a contamination estimate in the output format of ContEst, with percentages.
+    The population_fit column holds the maximum log-likelihood.
+    """
+    output_file.write("\t".join(CONTEST_COLUMNS) + "\n")
+    output_file.write("\t".join([name, population, "{:.2f}".format(estimate["log_likelihood"]),
+                                 "{:.2f}".format(100 * estimate["contamination"]),
+                                 "{:.2f}".format(100 * (estimate["ci_high"] - estimate["ci_low"])),
+                                 "{:.2f}".format(100 * estimate["ci_low"]),
+                                 "{:.2f}".format(100 * estimate["ci_high"]),
+                                 str(estimate["sites"])]) + "\n")
+
+
+def contamination_command(eval_bam, genotype_bam, popfile, output, output_genotype=None,
+                          min_genotype_ratio=None, python=sys.executable):
+    """
+    Generate a shell command that estimates contamination, by running this module.
+    """
+    options = ["--popfile", popfile, "--output", output]
+    if output_genotype:
+        options += ["--output-genotype", output_genotype]
+    if min_genotype_ratio is not None:
+        options += ["--min-genotype-ratio", str(min_genotype_ratio)]
+    return "{} -m autoseq.util.contamination {} {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(eval_bam), quote(genotype_bam))
+
+
+@click.command()
+@click.option('--popfile', required=True, help="population allele frequency VCF")
+@click.option('--output', required=True, help="output table for the evaluated sample")
+@click.option('--output-genotype', default=None, help="output table for the genotype sample")
+@click.option('--min-genotype-ratio', default=DEFAULT_MIN_GENOTYPE_RATIO,
+              help="minimum fraction of reads supporting a homozygous genotype")
+@click.option('--min-genotype-depth', default=DEFAULT_MIN_GENOTYPE_DEPTH, help="minimum depth of genotyped sites")
+@click.option('--min-basequal', default=DEFAULT_MIN_BASEQUAL, help="minimum base quality of counted alleles")
+@click.option('--error-rate', default=DEFAULT_ERROR_RATE, help="sequencing error rate")
+@click.argument('eval_bam')
+@click.argument('genotype_bam')
+def main(popfile, output, output_genotype, min_genotype_ratio, min_genotype_depth, min_basequal, error_rate,
+         eval_bam, genotype_bam):
+    import pysam
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+    sites, allele_freqs = read_population_sites(popfile)
+    counts = {}
+    for bam in [eval_bam, genotype_bam]:
+        with pysam.AlignmentFile(bam) as bam_file:
+            counts[bam] = allele_counts(bam_file, sites, min_basequal)
+
+    pairings = [(eval_bam, genotype_bam, output)]
+    if output_genotype:
+        pairings.append((genotype_bam, eval_bam, output_genotype))
+    for evaluated, genotyped, output_filename in pairings:
+        estimate = estimate_contamination(
+            *informative_sites(counts[genotyped][0], counts[genotyped][1], counts[evaluated][0],
+                               counts[evaluated][1], allele_freqs, min_genotype_ratio, min_genotype_depth),
+            error_rate=error_rate)
+        logger.info("Estimated contamination of {}: {:.4f} ({} sites)".format(
+            evaluated, estimate["contamination"], estimate["sites"]))
+        with open(output_filename, 'w') as output_file:
+            write_contest_table(estimate, output_file)
+
+
+if __name__ == '__main__':
+    main()
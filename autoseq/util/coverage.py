@@ -0,0 +1,279 @@
+"""
+Target coverage QC in a single pass over a BAM file.
+
+Per-base depths are computed over the target regions only, using the BAM index, after which
+the following are written:
+
+- A coverage histogram over the coverage targets, as the "all" rows of "bedtools coverage -hist":
+  all <depth> <number of bases> <total number of bases> <fraction of bases>
+- A region table in the layout of "sambamba depth region", with the read count, mean coverage
+  and percentage of bases at or above each coverage threshold, for each region.
+- The coverage QC call JSON, calling the coverage "OK" if a sufficient fraction of target bases
+  is covered at the high threshold, "WARN" if only the low threshold is met, and "FAIL" otherwise.
+
+Run as:
+
+    python -m autoseq.util.coverage --targets <bed> [--regions <bed>] --histogram <file>
+        [--region-table <file>] --qc-call <json> <bam>
+"""
+import bisect
+import collections
+import gzip
+import json
+import logging
+import sys
+
+import click
+import numpy as np
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_BASEQUAL = 20
+DEFAULT_COVERAGE_THRESHOLDS = [30, 50, 70, 100, 200, 300]
+
+# Reads that are unmapped, secondary, QC failed or duplicates do not contribute to the depth:
+EXCLUDED_FLAGS = 0x4 | 0x100 | 0x200 | 0x400
+
+BedRegion = collections.namedtuple('BedRegion', ['chrom', 'start', 'end', 'fields'])
+
+
+def read_bed(filename):
+    """
+    :return: List of BedRegion tuples, with any columns after the third as a list of fields.
+    """
+    regions = []
+    open_function = gzip.open if filename.endswith(".gz") else open
+    with open_function(filename) as bed_file:
+        for line in bed_file:
+            if line.startswith(("#", "track", "browser")) or not line.strip():
+                continue
+            columns = line.rstrip("\r\n").split("\t")
+            regions.append(BedRegion(columns[0], int(columns[1]), int(columns[2]), columns[3:]))
+    return regions
+
+
+def merge_regions(regions):
+    """
+    Merge overlapping and adjacent regions.
+
+    :return: Dictionary with chromosome as key and sorted list of (start, end) tuples as value.
+    """
+    chrom_to_intervals = collections.defaultdict(list)
+    for region in regions:
+        chrom_to_intervals[region.chrom].append((region.start, region.end))
+
+    merged = {}
+    for chrom, intervals in chrom_to_intervals.items():
+        merged[chrom] = []
+        for start, end in sorted(intervals):
+            if merged[chrom] and start <= merged[chrom][-1][1]:
+                merged[chrom][-1] = (merged[chrom][-1][0], max(end, merged[chrom][-1][1]))
+            else:
+                merged[chrom].append((start, end))
+    return merged
+
+
+def keep_read(read, min_mapq=0):
+    return not read.flag & EXCLUDED_FLAGS and read.mapping_quality >= min_mapq
+
+
+class TargetDepths(object):
+    """
+    Per-base depths over a set of merged target intervals, as one NumPy array per interval.
+    """
+    def __init__(self, interval_depths):
+        """
+        :param interval_depths: Dictionary with chromosome as key and sorted list of
+        (start, end, depth array) tuples as value.
+        """
+        self.interval_depths = interval_depths
+        self.starts = dict((chrom, [start for start, _, _ in intervals])
+                           for chrom, intervals in interval_depths.items())
+
+    @classmethod
+    def from_bam(cls, bam, merged, min_basequal=DEFAULT_MIN_BASEQUAL, min_mapq=0):
+        """
+        Compute the depths of the specified merged intervals, fetching the reads of each
+        interval through the BAM index.
+
+        :param bam: An open pysam AlignmentFile.
+        :param merged: Merged intervals, as returned by merge_regions().
+        """
+        interval_depths = {}
+        for chrom, intervals in sorted(merged.items()):
+            interval_depths[chrom] = []
+            for start, end in intervals:
+                acgt_counts = bam.count_coverage(chrom, start, end, quality_threshold=min_basequal,
+                                                 read_callback=lambda read: keep_read(read, min_mapq))
+                depth = np.sum([np.asarray(counts, dtype=np.int64) for counts in acgt_counts], axis=0)
+                interval_depths[chrom].append((start, end, depth))
+        return cls(interval_depths)
+
+    def depth(self, chrom, start, end):
+        """
+        :return: Depth array for the specified region, which must lie within a single merged interval.
+        """
+        i = bisect.bisect_right(self.starts.get(chrom, []), start) - 1
+        if i < 0 or end > self.interval_depths[chrom][i][1]:
+            raise ValueError("Region {}:{}-{} is not covered by the computed depths".format(chrom, start, end))
+        interval_start, _, depth = self.interval_depths[chrom][i]
+        return depth[start - interval_start:end - interval_start]
+
+    def histogram(self, merged):
+        """
+        :param merged: Merged intervals to compute the histogram over, as returned by merge_regions().
+        :return: Array with the number of bases at each depth.
+        """
+        counts = np.zeros(1, dtype=np.int64)
+        for chrom, intervals in merged.items():
+            for start, end in intervals:
+                interval_counts = np.bincount(self.depth(chrom, start, end))
+                if len(interval_counts) > len(counts):
+                    interval_counts[:len(counts)] += counts
+                    counts = interval_counts
+                else:
+                    counts[:len(interval_counts)] += interval_counts
+        return counts
+
+
+def fraction_at_or_above(histogram, depth):
+    total = histogram.sum()
+    if total == 0:
+        return 0.0
+    return float(histogram[depth:].sum()) / total
+
+
+def write_histogram(histogram, output_file):
+    total = histogram.sum()
+    for depth, n_bases in enumerate(histogram):
+        if n_bases:
+            output_file.write("all\t{}\t{}\t{}\t{}\n".format(depth, n_bases, total, float(n_bases) / total))
+
+
+def write_region_table(regions, depths, read_counts, thresholds, sample_name, output_file):
+    """
+    Write the region table in the layout of "sambamba depth region".
+
+    :param read_counts: List with the number of reads overlapping each region.
+    """
+    n_fields = max([len(region.fields) for region in regions] or [0])
+    output_file.write("\t".join(["# chrom", "chromStart", "chromEnd"] +
+                                ["F{}".format(i + 3) for i in range(n_fields)] +
+                                ["readCount", "meanCoverage"] +
+                                ["percentage{}".format(threshold) for threshold in thresholds] +
+                                ["sampleName"]) + "\n")
+    for region, read_count in zip(regions, read_counts):
+        depth = depths.depth(region.chrom, region.start, region.end)
+        mean_coverage = depth.mean() if len(depth) else 0.0
+        percentages = [100.0 * np.count_nonzero(depth >= threshold) / len(depth) if len(depth) else 0.0
+                       for threshold in thresholds]
+        output_file.write("\t".join([region.chrom, str(region.start), str(region.end)] +
+                                    (region.fields + [""] * n_fields)[:n_fields] +
+                                    [str(read_count), "{:g}".format(mean_coverage)] +
+                                    ["{:g}".format(percentage) for percentage in percentages] +
+                                    [sample_name]) + "\n")
+
+
+def coverage_qc_call(histogram, high_thresh_fraction=0.95, high_thresh_fold_cov=100,
+                     low_thresh_fraction=0.95, low_thresh_fold_cov=50):
+    """
+    Call the coverage of the target bases.
+
+    :return: Dictionary with the call and the fractions of bases at or above the thresholds.
+    """
+    fraction_high = fraction_at_or_above(histogram, high_thresh_fold_cov)
+    fraction_low = fraction_at_or_above(histogram, low_thresh_fold_cov)
+    if fraction_high >= high_thresh_fraction:
+        call = "OK"
+    elif fraction_low >= low_thresh_fraction:
+        call = "WARN"
+    else:
+        call = "FAIL"
+    return {"CALL": call,
+            "HIGH_THRESH_FOLD_COV": high_thresh_fold_cov,
+            "HIGH_THRESH_FRACTION": high_thresh_fraction,
+            "FRACTION_ABOVE_HIGH_THRESH": fraction_high,
+            "LOW_THRESH_FOLD_COV": low_thresh_fold_cov,
+            "LOW_THRESH_FRACTION": low_thresh_fraction,
+            "FRACTION_ABOVE_LOW_THRESH": fraction_low}
+
+
+def sample_name(bam):
+    for read_group in bam.header.get("RG", []):
+        if "SM" in read_group:
+            return read_group["SM"]
+    return ""
+
+
+def coverage_command(input_bam, targets_bed, histogram, qc_call, regions_bed=None, region_table=None,
+                     min_basequal=None, thresholds=None, high_thresh_fraction=0.95, high_thresh_fold_cov=100,
+                     low_thresh_fraction=0.95, low_thresh_fold_cov=50, python=sys.executable):
+    """
+    Generate a shell command that computes the target coverage QC, by running this module.
+    """
+    options = ["--targets", targets_bed, "--histogram", histogram, "--qc-call", qc_call,
+               "--high-thresh-fraction", str(high_thresh_fraction), "--high-thresh-fold-cov", str(high_thresh_fold_cov),
+               "--low-thresh-fraction", str(low_thresh_fraction), "--low-thresh-fold-cov", str(low_thresh_fold_cov)]
+    if regions_bed:
+        options += ["--regions", regions_bed, "--region-table", region_table]
+    if min_basequal is not None:
+        options += ["--min-basequal", str(min_basequal)]
+    for threshold in thresholds or []:
+        options += ["-T", str(threshold)]
+    return "{} -m autoseq.util.coverage {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(input_bam))
+
+
+@click.command()
+@click.option('--targets', required=True, help="BED file of the targets to compute the histogram and QC call over")
+@click.option('--regions', default=None, help="BED file of the regions to include in the region table")
+@click.option('--histogram', required=True, help="output coverage histogram")
+@click.option('--region-table', default=None, help="output region table")
+@click.option('--qc-call', required=True, help="output coverage QC call JSON")
+@click.option('--min-basequal', default=DEFAULT_MIN_BASEQUAL, help="minimum base quality counted in the depth")
+@click.option('--min-mapq', default=0, help="minimum mapping quality of reads counted in the depth")
+@click.option('-T', 'thresholds', multiple=True, type=int, help="coverage threshold of the region table")
+@click.option('--high-thresh-fraction', default=0.95)
+@click.option('--high-thresh-fold-cov', default=100)
+@click.option('--low-thresh-fraction', default=0.95)
+@click.option('--low-thresh-fold-cov', default=50)
+@click.argument('bam')
+def main(targets, regions, histogram, region_table, qc_call, min_basequal, min_mapq, thresholds,
+         high_thresh_fraction, high_thresh_fold_cov, low_thresh_fraction, low_thresh_fold_cov, bam):
+    import pysam
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+    target_regions = read_bed(targets)
+    table_regions = read_bed(regions) if regions else []
+    merged_targets = merge_regions(target_regions)
+
+    with pysam.AlignmentFile(bam) as bam_file:
+        depths = TargetDepths.from_bam(bam_file, merge_regions(target_regions + table_regions),
+                                       min_basequal, min_mapq)
+        read_counts = [bam_file.count(region.chrom, region.start, region.end,
+                                      read_callback=lambda read: keep_read(read, min_mapq))
+                       for region in table_regions]
+        name = sample_name(bam_file)
+
+    target_histogram = depths.histogram(merged_targets)
+    with open(histogram, 'w') as histogram_file:
+        histogram_file.write("# coverage histogram: {}\n".format(bam))
+        write_histogram(target_histogram, histogram_file)
+
+    if region_table:
+        with open(region_table, 'w') as region_table_file:
+            write_region_table(table_regions, depths, read_counts,
+                               list(thresholds) or DEFAULT_COVERAGE_THRESHOLDS, name, region_table_file)
+
+    with open(qc_call, 'w') as qc_call_file:
+        json.dump(coverage_qc_call(target_histogram, high_thresh_fraction, high_thresh_fold_cov,
+                                   low_thresh_fraction, low_thresh_fold_cov), qc_call_file, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
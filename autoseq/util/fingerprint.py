@@ -0,0 +1,423 @@
+"""
+Sample identity checking by genotype fingerprints.
+
+Each capture BAM is genotyped at a fixed panel of common biallelic SNPs, and the genotypes
+are stored as a compact fingerprint of two bit-packed planes, indicating for each site whether
+the reference and the alternative allele were observed. Sites without sufficient depth have
+neither bit set. Fingerprints are written to a JSON file per BAM:
+
+    python -m autoseq.util.fingerprint genotype --sites <vcf> --sample <name> --individual <sdid>
+        <bam> <fingerprint json>
+
+and are then compared all-vs-all, across the batch and optionally against the fingerprints
+of earlier batches kept in a local SQLite fingerprint database:
+
+    python -m autoseq.util.fingerprint compare [--db <fingerprint db>] --output <json>
+        [--multiqc-table <name>_mqc.tsv] [--fail-on-mismatch] <fingerprint json> [<fingerprint json> ...]
+
+Pairs of fingerprints of the same individual with a low genotype concordance, and pairs of
+different individuals with a high concordance, are flagged as possible sample swaps. The
+comparison can also be written as a MultiQC custom content table, listing the call of each
+sample, and can optionally fail when pairs are flagged.
+"""
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+import time
+
+import click
+import numpy as np
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_DEPTH = 10
+DEFAULT_MIN_BASEQUAL = 20
+DEFAULT_MIN_CONCORDANCE = 0.8
+DEFAULT_MIN_SITES = 20
+
+# Alternative allele fractions below and above which sites are called homozygous:
+HOM_REF_MAX_FRACTION = 0.1
+HOM_ALT_MIN_FRACTION = 0.9
+
+# Sites closer together than this are read from the BAM file in a single window:
+MAX_WINDOW_GAP = 1000
+
+BASE_INDEX = {"A": 0, "C": 1, "G": 2, "T": 3}
+
+SnpSite = collections.namedtuple('SnpSite', ['chrom', 'pos', 'ref', 'alt'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    sample TEXT NOT NULL,
+    individual TEXT,
+    panel TEXT NOT NULL,
+    n_sites INTEGER,
+    ref_bits BLOB,
+    alt_bits BLOB,
+    created REAL,
+    PRIMARY KEY (sample, panel)
+);
+"""
+
+
+def read_sites(filename):
+    """
+    Read the biallelic SNPs of a VCF file, which may be gzipped.
+
+    :return: List of SnpSite tuples, with 0-based positions.
+    """
+    sites = []
+    open_function = gzip.open if filename.endswith(".gz") else open
+    with open_function(filename) as vcf_file:
+        for line in vcf_file:
+            if line.startswith("#"):
+                continue
+            columns = line.rstrip("\r\n").split("\t", 5)
+            ref, alt = columns[3].upper(), columns[4].upper()
+            if ref in BASE_INDEX and alt in BASE_INDEX:
+                sites.append(SnpSite(columns[0], int(columns[1]) - 1, ref, alt))
+    return sites
+
+
+def panel_id(sites):
+    """
+    :return: Checksum identifying the specified SNP panel, so that only fingerprints
+    genotyped at the same sites are compared.
+    """
+    md5 = hashlib.md5()
+    for site in sites:
+        md5.update("{}:{}:{}:{}\n".format(*site).encode("utf-8"))
+    return md5.hexdigest()
+
+
+def site_windows(sites, max_gap=MAX_WINDOW_GAP):
+    """
+    Group the sites into windows of nearby sites on the same chromosome.
+
+    :return: List of (chrom, start, end, site indexes) tuples.
+    """
+    order = sorted(range(len(sites)), key=lambda i: (sites[i].chrom, sites[i].pos))
+    windows = []
+    for i in order:
+        site = sites[i]
+        if windows and windows[-1][0] == site.chrom and site.pos - windows[-1][2] <= max_gap:
+            windows[-1][2] = site.pos + 1
+            windows[-1][3].append(i)
+        else:
+            windows.append([site.chrom, site.pos, site.pos + 1, [i]])
+    return [tuple(window) for window in windows]
+
+
+def allele_counts(bam, sites, min_basequal=DEFAULT_MIN_BASEQUAL):
+    """
+    Count the reference and alternative alleles observed at each site.
+
+    :param bam: An open pysam AlignmentFile.
+    :return: Tuple of reference and alternative allele count arrays.
+    """
+    ref_counts = np.zeros(len(sites), dtype=np.int64)
+    alt_counts = np.zeros(len(sites), dtype=np.int64)
+    contigs = set(bam.references)
+    for chrom, start, end, indexes in site_windows(sites):
+        if chrom not in contigs:
+            continue
+        acgt_counts = np.array(bam.count_coverage(chrom, start, end, quality_threshold=min_basequal,
+                                                  read_callback="all"))
+        for i in indexes:
+            ref_counts[i] = acgt_counts[BASE_INDEX[sites[i].ref], sites[i].pos - start]
+            alt_counts[i] = acgt_counts[BASE_INDEX[sites[i].alt], sites[i].pos - start]
+    return ref_counts, alt_counts
+
+
+def call_genotypes(ref_counts, alt_counts, min_depth=DEFAULT_MIN_DEPTH):
+    """
+    Call the genotype of each site from its allele counts.
+
+    :return: Tuple of boolean arrays, indicating for each site whether the reference and the
+    alternative allele is present. Neither is set at sites with a depth below min_depth.
+    """
+    depth = ref_counts + alt_counts
+    called = depth >= min_depth
+    alt_fraction = alt_counts / np.maximum(depth, 1).astype(float)
+    has_ref = called & (alt_fraction < HOM_ALT_MIN_FRACTION)
+    has_alt = called & (alt_fraction > HOM_REF_MAX_FRACTION)
+    return has_ref, has_alt
+
+
+class Fingerprint(object):
+    """
+    Genotype fingerprint of a single sample, as two bit-packed planes.
+    """
+    def __init__(self, sample, individual, panel, n_sites, ref_bits, alt_bits):
+        self.sample = sample
+        self.individual = individual
+        self.panel = panel
+        self.n_sites = n_sites
+        self.ref_bits = ref_bits
+        self.alt_bits = alt_bits
+
+    @classmethod
+    def from_genotypes(cls, sample, individual, panel, has_ref, has_alt):
+        return cls(sample, individual, panel, len(has_ref),
+                   np.packbits(has_ref.astype(np.uint8)), np.packbits(has_alt.astype(np.uint8)))
+
+    def genotypes(self):
+        """
+        :return: Tuple of boolean arrays, as returned by call_genotypes().
+        """
+        return tuple(np.unpackbits(bits)[:self.n_sites].astype(bool) for bits in (self.ref_bits, self.alt_bits))
+
+    def n_called(self):
+        has_ref, has_alt = self.genotypes()
+        return int(np.count_nonzero(has_ref | has_alt))
+
+    def to_dict(self):
+        return {"sample": self.sample, "individual": self.individual, "panel": self.panel,
+                "n_sites": self.n_sites,
+                "ref_bits": base64.b64encode(self.ref_bits.tobytes()).decode("ascii"),
+                "alt_bits": base64.b64encode(self.alt_bits.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, fingerprint_dict):
+        return cls(fingerprint_dict["sample"], fingerprint_dict["individual"], fingerprint_dict["panel"],
+                   fingerprint_dict["n_sites"],
+                   np.frombuffer(base64.b64decode(fingerprint_dict["ref_bits"]), dtype=np.uint8),
+                   np.frombuffer(base64.b64decode(fingerprint_dict["alt_bits"]), dtype=np.uint8))
+
+    def save(self, filename):
+        with open(filename, 'w') as fingerprint_file:
+            json.dump(self.to_dict(), fingerprint_file)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as fingerprint_file:
+            return cls.from_dict(json.load(fingerprint_file))
+
+
+class FingerprintDatabase(object):
+    """
+    A SQLite database holding the fingerprints of previously analysed samples.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, fingerprints):
+        """
+        Store the specified fingerprints, replacing any earlier fingerprints of the same samples.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO fingerprints "
+                "(sample, individual, panel, n_sites, ref_bits, alt_bits, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(fp.sample, fp.individual, fp.panel, fp.n_sites, sqlite3.Binary(fp.ref_bits.tobytes()),
+                  sqlite3.Binary(fp.alt_bits.tobytes()), time.time()) for fp in fingerprints])
+
+    def fingerprints(self, panel):
+        """
+        :return: List of the stored fingerprints genotyped at the specified SNP panel.
+        """
+        rows = self.connection.execute(
+            "SELECT sample, individual, panel, n_sites, ref_bits, alt_bits FROM fingerprints "
+            "WHERE panel = ? ORDER BY sample", (panel,))
+        return [Fingerprint(sample, individual, panel, n_sites, np.frombuffer(bytes(ref_bits), dtype=np.uint8),
+                            np.frombuffer(bytes(alt_bits), dtype=np.uint8))
+                for sample, individual, panel, n_sites, ref_bits, alt_bits in rows]
+
+
+def concordance_matrix(query, reference):
+    """
+    Compute the genotype concordance of every query fingerprint with every reference fingerprint.
+
+    :return: Tuple of matrices with the number of sites called in both fingerprints, and the
+    number of those sites with identical genotypes. Rows correspond to the query fingerprints.
+    """
+    def genotype_indicators(fingerprints):
+        genotypes = [fp.genotypes() for fp in fingerprints]
+        has_ref = np.array([g[0] for g in genotypes], dtype=bool).reshape(len(fingerprints), -1)
+        has_alt = np.array([g[1] for g in genotypes], dtype=bool).reshape(len(fingerprints), -1)
+        hom_ref, het, hom_alt = has_ref & ~has_alt, has_ref & has_alt, ~has_ref & has_alt
+        return [indicator.astype(np.float32) for indicator in (hom_ref | het | hom_alt, hom_ref, het, hom_alt)]
+
+    query_indicators = genotype_indicators(query)
+    reference_indicators = genotype_indicators(reference)
+    n_sites = query_indicators[0].dot(reference_indicators[0].T)
+    n_matching = sum(q.dot(r.T) for q, r in zip(query_indicators[1:], reference_indicators[1:]))
+    return np.rint(n_sites).astype(np.int64), np.rint(n_matching).astype(np.int64)
+
+
+def compare_fingerprints(batch, history=(), min_concordance=DEFAULT_MIN_CONCORDANCE, min_sites=DEFAULT_MIN_SITES):
+    """
+    Compare the fingerprints of a batch with each other and with earlier fingerprints.
+
+    :param batch: List of Fingerprint objects of the batch.
+    :param history: List of earlier Fingerprint objects. Those of samples in the batch are ignored.
+    :return: Dictionary summarising the comparison, listing the flagged pairs.
+    """
+    batch_samples = set(fp.sample for fp in batch)
+    reference = list(batch) + [fp for fp in history if fp.sample not in batch_samples]
+    comparisons = []
+    if batch:
+        n_sites, n_matching = concordance_matrix(batch, reference)
+        concordance = n_matching / np.maximum(n_sites, 1).astype(float)
+        individuals = np.array([fp.individual for fp in reference], dtype=object)
+        same_individual = individuals[:len(batch), np.newaxis] == individuals[np.newaxis, :]
+        # Each pair within the batch is compared once:
+        compared = (n_sites >= min_sites) & ~np.tri(len(batch), len(reference), dtype=bool)
+        mismatch = compared & same_individual & (concordance < min_concordance)
+        unexpected_match = compared & ~same_individual & (concordance >= min_concordance)
+        for i, j in zip(*np.nonzero(mismatch | unexpected_match)):
+            comparisons.append({"sample1": batch[i].sample, "individual1": batch[i].individual,
+                                "sample2": reference[j].sample, "individual2": reference[j].individual,
+                                "n_sites": int(n_sites[i, j]), "concordance": float(concordance[i, j]),
+                                "status": "MISMATCH" if mismatch[i, j] else "UNEXPECTED_MATCH"})
+
+    return {"CALL": "FAIL" if comparisons else "OK",
+            "MIN_CONCORDANCE": min_concordance,
+            "MIN_SITES": min_sites,
+            "samples": dict((fp.sample, fp.n_called()) for fp in batch),
+            "n_reference": len(reference),
+            "flagged": comparisons}
+
+
+def write_multiqc_table(result, output_file):
+    """
+    Write a fingerprint comparison as a MultiQC custom content table, with a row per sample
+    of the batch listing its call and the samples it was flagged with.
+    """
+    sample_to_flagged = collections.defaultdict(list)
+    for comparison in result["flagged"]:
+        for sample, other in [("sample1", "sample2"), ("sample2", "sample1")]:
+            sample_to_flagged[comparison[sample]].append("{} ({}, {:.3f})".format(
+                comparison[other], comparison["status"], comparison["concordance"]))
+
+    output_file.write("# id: 'fingerprint_concordance'\n"
+                      "# section_name: 'Sample identity'\n"
+                      "# description: 'Genotype fingerprint concordance; flagged pairs are possible "
+                      "sample swaps. Overall call: {}'\n"
+                      "# plot_type: 'table'\n".format(result["CALL"]))
+    output_file.write("Sample\tCALL\tCalled sites\tFlagged with\n")
+    for sample in sorted(result["samples"]):
+        flagged = sample_to_flagged.get(sample, [])
+        output_file.write("{}\t{}\t{}\t{}\n".format(sample, "FAIL" if flagged else "OK", result["samples"][sample],
+                                                    ", ".join(flagged) or "-"))
+
+
+def genotype_command(input_bam, sites, sample, individual, output, min_depth=None, min_basequal=None,
+                     python=sys.executable):
+    """
+    Generate a shell command that computes the fingerprint of a BAM file, by running this module.
+    """
+    options = ["--sites", sites, "--sample", sample, "--individual", individual]
+    if min_depth is not None:
+        options += ["--min-depth", str(min_depth)]
+    if min_basequal is not None:
+        options += ["--min-basequal", str(min_basequal)]
+    return "{} -m autoseq.util.fingerprint genotype {} {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(input_bam), quote(output))
+
+
+def compare_command(fingerprints, output, db=None, min_concordance=None, min_sites=None, multiqc_table=None,
+                    fail_on_mismatch=False, python=sys.executable):
+    """
+    Generate a shell command that compares fingerprints, by running this module.
+    """
+    options = ["--output", output]
+    if db:
+        options += ["--db", db]
+    if multiqc_table:
+        options += ["--multiqc-table", multiqc_table]
+    if fail_on_mismatch:
+        options += ["--fail-on-mismatch"]
+    if min_concordance is not None:
+        options += ["--min-concordance", str(min_concordance)]
+    if min_sites is not None:
+        options += ["--min-sites", str(min_sites)]
+    return "{} -m autoseq.util.fingerprint compare {} {}".format(
+        quote(python), " ".join(quote(option) for option in options),
+        " ".join(quote(fingerprint) for fingerprint in fingerprints))
+
+
+@click.group()
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+
+
+@main.command()
+@click.option('--sites', required=True, help="VCF file of the SNP panel")
+@click.option('--sample', required=True, help="name of the sample")
+@click.option('--individual', required=True, help="individual the sample was taken from")
+@click.option('--min-depth', default=DEFAULT_MIN_DEPTH, help="minimum depth of called sites")
+@click.option('--min-basequal', default=DEFAULT_MIN_BASEQUAL, help="minimum base quality of counted alleles")
+@click.argument('bam')
+@click.argument('output')
+def genotype(sites, sample, individual, min_depth, min_basequal, bam, output):
+    import pysam
+
+    snp_sites = read_sites(sites)
+    with pysam.AlignmentFile(bam) as bam_file:
+        ref_counts, alt_counts = allele_counts(bam_file, snp_sites, min_basequal)
+    has_ref, has_alt = call_genotypes(ref_counts, alt_counts, min_depth)
+    fingerprint = Fingerprint.from_genotypes(sample, individual, panel_id(snp_sites), has_ref, has_alt)
+    logger.info("Called {} of {} sites for {}".format(fingerprint.n_called(), len(snp_sites), sample))
+    fingerprint.save(output)
+
+
+@main.command()
+@click.option('--db', default=None, help="SQLite fingerprint database to compare with and add the fingerprints to")
+@click.option('--min-concordance', default=DEFAULT_MIN_CONCORDANCE, help="concordance expected of the same individual")
+@click.option('--min-sites', default=DEFAULT_MIN_SITES, help="minimum number of sites called in both samples")
+@click.option('--output', required=True, help="output JSON file")
+@click.option('--multiqc-table', default=None, help="output MultiQC custom content table, named *_mqc.tsv")
+@click.option('--fail-on-mismatch', is_flag=True, help="exit with an error if possible sample swaps are flagged")
+@click.argument('fingerprints', nargs=-1)
+def compare(db, min_concordance, min_sites, output, multiqc_table, fail_on_mismatch, fingerprints):
+    batch = [Fingerprint.load(filename) for filename in fingerprints]
+    panels = set(fp.panel for fp in batch)
+    if len(panels) > 1:
+        raise click.UsageError("Fingerprints were genotyped at different SNP panels")
+
+    history = []
+    if db and batch:
+        with FingerprintDatabase(db) as fingerprint_db:
+            history = fingerprint_db.fingerprints(batch[0].panel)
+            result = compare_fingerprints(batch, history, min_concordance, min_sites)
+            fingerprint_db.add(batch)
+    else:
+        result = compare_fingerprints(batch, history, min_concordance, min_sites)
+
+    for comparison in result["flagged"]:
+        logger.warn("{status}: {sample1} and {sample2} have a concordance of {concordance:.3f} "
+                    "at {n_sites} sites".format(**comparison))
+    with open(output, 'w') as output_file:
+        json.dump(result, output_file, indent=4, sort_keys=True)
+    if multiqc_table:
+        with open(multiqc_table, 'w') as table_file:
+            write_multiqc_table(result, table_file)
+
+    if fail_on_mismatch and result["CALL"] == "FAIL":
+        raise click.ClickException("{} possible sample swaps flagged; see {}".format(len(result["flagged"]), output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+IGV tracks from CNVkit and QDNAseq outputs.
+
+Each input table is read once, after which its tracks are written as bedGraph files, as
+variableStep wiggle files for conversion to TDF by igvtools, or as bigWig files. BigWig files
+are indexed and contain zoom levels, so that IGV displays whole-genome views of them quickly.
+Writing bigWig files requires pyBigWig.
+
+Run as:
+
+    python -m autoseq.util.igvtracks cnvkit --cnr <cnr> --cns <cns> --profile <bedGraph>
+        --segments <bedGraph> [--profile-bigwig <bw>] [--chrom-sizes <fai>]
+
+    python -m autoseq.util.igvtracks qdnaseq --segments <bedGraph> [--copynumber-wig <wig>]
+        [--readcount-wig <wig>] [--copynumber-bigwig <bw>] [--readcount-bigwig <bw>]
+        [--chrom-sizes <fai>] <qdnaseq table>
+"""
+import collections
+import logging
+import math
+import sys
+
+import click
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+# Number of zoom levels written to bigWig files:
+BIGWIG_ZOOM_LEVELS = 10
+
+# Names of the QDNAseq table columns holding each track, in order of preference:
+QDNASEQ_TRACK_COLUMNS = collections.OrderedDict([
+    ("readcount", ["readcount", "counts"]),
+    ("copynumber", ["copynumber"]),
+    ("segments", ["segmented", "segments"]),
+])
+
+TrackEntry = collections.namedtuple('TrackEntry', ['chrom', 'start', 'end', 'value'])
+
+
+def parse_value(value):
+    """
+    :return: The value as a float, or None if it is missing or not finite.
+    """
+    try:
+        value = float(value)
+    except ValueError:
+        return None
+    return value if not (math.isnan(value) or math.isinf(value)) else None
+
+
+def read_table(filename, track_columns, one_based=False):
+    """
+    Read the tracks of a tab-separated table with a header line, with chromosome, start and end columns.
+
+    :param track_columns: Dictionary with track name as key and a list of candidate column names as value.
+    :param one_based: True if the start coordinates are 1-based, as in QDNAseq tables.
+    :return: Dictionary with track name as key and list of TrackEntry tuples as value, for the tracks
+    whose column is present in the table. Rows with missing values are left out of a track.
+    """
+    tracks = {}
+    with open(filename) as table_file:
+        header = table_file.readline().rstrip("\r\n").split("\t")
+        for column in ["chromosome", "start", "end"]:
+            if column not in header:
+                raise ValueError("No {} column in {}".format(column, filename))
+        chrom_index, start_index, end_index = [header.index(column) for column in ["chromosome", "start", "end"]]
+
+        track_to_index = {}
+        for track, candidates in track_columns.items():
+            for candidate in candidates:
+                if candidate in header:
+                    track_to_index[track] = header.index(candidate)
+                    tracks[track] = []
+                    break
+
+        for line in table_file:
+            columns = line.rstrip("\r\n").split("\t")
+            if len(columns) < len(header):
+                continue
+            chrom = columns[chrom_index].strip('"')
+            start = int(columns[start_index]) - (1 if one_based else 0)
+            end = int(columns[end_index])
+            for track, index in track_to_index.items():
+                value = parse_value(columns[index])
+                if value is not None:
+                    tracks[track].append(TrackEntry(chrom, start, end, value))
+    return tracks
+
+
+def read_cnvkit(filename):
+    """
+    :return: List of TrackEntry tuples with the log2 ratios of a CNVkit .cnr or .cns file.
+    """
+    return read_table(filename, {"log2": ["log2"]}).get("log2", [])
+
+
+def read_qdnaseq(filename):
+    """
+    :return: Dictionary with track name as key and list of TrackEntry tuples as value, for the
+    read count, copy number and segment tracks present in a QDNAseq table.
+    """
+    return read_table(filename, QDNASEQ_TRACK_COLUMNS, one_based=True)
+
+
+def sort_entries(entries, chrom_order=None):
+    """
+    Sort track entries by chromosome and start, dropping entries that overlap a preceding entry,
+    as binary tracks cannot represent overlapping intervals.
+
+    :param chrom_order: List of chromosomes in the order to sort them by; chromosomes not in
+    the list follow in order of appearance.
+    """
+    chrom_rank = dict((chrom, rank) for rank, chrom in enumerate(chrom_order or []))
+    for entry in entries:
+        if entry.chrom not in chrom_rank:
+            chrom_rank[entry.chrom] = len(chrom_rank)
+
+    sorted_entries = []
+    for entry in sorted(entries, key=lambda e: (chrom_rank[e.chrom], e.start, e.end)):
+        if sorted_entries and sorted_entries[-1].chrom == entry.chrom and entry.start < sorted_entries[-1].end:
+            continue
+        sorted_entries.append(entry)
+    return sorted_entries
+
+
+def write_bedgraph(entries, output_file):
+    for entry in entries:
+        output_file.write("{}\t{}\t{}\t{:g}\n".format(entry.chrom, entry.start, entry.end, entry.value))
+
+
+def write_wig(entries, output_file):
+    """
+    Write sorted, non-overlapping entries as a variableStep wiggle file, starting a new block
+    whenever the chromosome or interval width changes.
+    """
+    block = None
+    for entry in entries:
+        if (entry.chrom, entry.end - entry.start) != block:
+            block = (entry.chrom, entry.end - entry.start)
+            output_file.write("variableStep chrom={} span={}\n".format(*block))
+        output_file.write("{}\t{:g}\n".format(entry.start + 1, entry.value))
+
+
+def read_chrom_sizes(filename):
+    """
+    :param filename: A chromosome sizes file, or a FASTA index, with chromosome names and sizes in the first two columns.
+    :return: List of (chromosome, size) tuples.
+    """
+    with open(filename) as sizes_file:
+        return [(columns[0], int(columns[1])) for columns in
+                (line.rstrip("\r\n").split("\t") for line in sizes_file) if len(columns) >= 2]
+
+
+def chrom_sizes_from_entries(entries):
+    """
+    :return: List of (chromosome, size) tuples, using the end of the last entry as the size
+    of each chromosome.
+    """
+    sizes = collections.OrderedDict()
+    for entry in entries:
+        sizes[entry.chrom] = max(sizes.get(entry.chrom, 0), entry.end)
+    return list(sizes.items())
+
+
+def write_bigwig(entries, filename, chrom_sizes=None):
+    """
+    Write sorted, non-overlapping entries as a bigWig file with zoom levels.
+
+    :param chrom_sizes: List of (chromosome, size) tuples; derived from the entries if not specified.
+    """
+    import pyBigWig
+
+    if chrom_sizes is None:
+        chrom_sizes = chrom_sizes_from_entries(entries)
+    known_chroms = set(chrom for chrom, _ in chrom_sizes)
+    entries = [entry for entry in entries if entry.chrom in known_chroms]
+
+    bigwig = pyBigWig.open(filename, "w")
+    try:
+        bigwig.addHeader(chrom_sizes, maxZooms=BIGWIG_ZOOM_LEVELS)
+        if entries:
+            bigwig.addEntries([entry.chrom for entry in entries], [entry.start for entry in entries],
+                              ends=[entry.end for entry in entries], values=[entry.value for entry in entries])
+    finally:
+        bigwig.close()
+
+
+def cnvkit_tracks_command(input_cnr, input_cns, output_profile, output_segments, output_profile_bigwig=None,
+                          chrom_sizes=None, python=sys.executable):
+    """
+    Generate a shell command that writes the CNVkit tracks, by running this module.
+    """
+    options = ["--cnr", input_cnr, "--cns", input_cns, "--profile", output_profile, "--segments", output_segments]
+    if output_profile_bigwig:
+        options += ["--profile-bigwig", output_profile_bigwig]
+    if chrom_sizes:
+        options += ["--chrom-sizes", chrom_sizes]
+    return "{} -m autoseq.util.igvtracks cnvkit {}".format(
+        quote(python), " ".join(quote(option) for option in options))
+
+
+def qdnaseq_tracks_command(input_qdnaseq, output_segments, copynumber_wig=None, readcount_wig=None,
+                           copynumber_bigwig=None, readcount_bigwig=None, chrom_sizes=None, python=sys.executable):
+    """
+    Generate a shell command that writes the QDNAseq tracks, by running this module.
+    """
+    options = ["--segments", output_segments]
+    for option, value in [("--copynumber-wig", copynumber_wig), ("--readcount-wig", readcount_wig),
+                          ("--copynumber-bigwig", copynumber_bigwig), ("--readcount-bigwig", readcount_bigwig),
+                          ("--chrom-sizes", chrom_sizes)]:
+        if value:
+            options += [option, value]
+    return "{} -m autoseq.util.igvtracks qdnaseq {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(input_qdnaseq))
+
+
+@click.group()
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+
+
+@main.command()
+@click.option('--cnr', required=True, help="CNVkit bin-level log2 ratios")
+@click.option('--cns', required=True, help="CNVkit segments")
+@click.option('--profile', required=True, help="output profile bedGraph")
+@click.option('--segments', required=True, help="output segments bedGraph")
+@click.option('--profile-bigwig', default=None, help="output profile bigWig")
+@click.option('--chrom-sizes', default=None, help="chromosome sizes or FASTA index, for bigWig output")
+def cnvkit(cnr, cns, profile, segments, profile_bigwig, chrom_sizes):
+    sizes = read_chrom_sizes(chrom_sizes) if chrom_sizes else None
+    order = [chrom for chrom, _ in sizes] if sizes else None
+    for input_filename, bedgraph, bigwig in [(cnr, profile, profile_bigwig), (cns, segments, None)]:
+        entries = read_cnvkit(input_filename)
+        with open(bedgraph, 'w') as bedgraph_file:
+            write_bedgraph(entries, bedgraph_file)
+        if bigwig:
+            write_bigwig(sort_entries(entries, order), bigwig, sizes)
+        logger.info("Wrote {} track entries from {}".format(len(entries), input_filename))
+
+
+@main.command()
+@click.option('--segments', required=True, help="output segments bedGraph")
+@click.option('--copynumber-wig', default=None, help="output copy number wiggle file")
+@click.option('--readcount-wig', default=None, help="output read count wiggle file")
+@click.option('--copynumber-bigwig', default=None, help="output copy number bigWig")
+@click.option('--readcount-bigwig', default=None, help="output read count bigWig")
+@click.option('--chrom-sizes', default=None, help="chromosome sizes or FASTA index, for bigWig output")
+@click.argument('qdnaseq_table')
+def qdnaseq(segments, copynumber_wig, readcount_wig, copynumber_bigwig, readcount_bigwig, chrom_sizes,
+            qdnaseq_table):
+    sizes = read_chrom_sizes(chrom_sizes) if chrom_sizes else None
+    order = [chrom for chrom, _ in sizes] if sizes else None
+    tracks = read_qdnaseq(qdnaseq_table)
+    needed = ["segments"] + (["copynumber"] if copynumber_wig or copynumber_bigwig else []) + \
+             (["readcount"] if readcount_wig or readcount_bigwig else [])
+    for track in needed:
+        if track not in tracks:
+            raise click.ClickException("No {} column in {}".format(track, qdnaseq_table))
+        tracks[track] = sort_entries(tracks[track], order)
+
+    with open(segments, 'w') as segments_file:
+        write_bedgraph(tracks["segments"], segments_file)
+    for track, wig, bigwig in [("copynumber", copynumber_wig, copynumber_bigwig),
+                               ("readcount", readcount_wig, readcount_bigwig)]:
+        if wig:
+            with open(wig, 'w') as wig_file:
+                write_wig(tracks[track], wig_file)
+        if bigwig:
+            write_bigwig(tracks[track], bigwig, sizes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+"""
+SQLite-backed job database.
+
+Stores runs, jobs, per-job resource usage samples and the files consumed and produced
+by each job, so that job statistics can be queried across many pipeline runs. Existing
+JSON job databases can be imported with JobDatabase.import_json().
+
+The database is opened in WAL mode on local file systems. WAL requires shared memory
+between all connections, so databases on network file systems such as NFS are opened
+in the rollback journal mode instead. Either way, the database should only be written
+to from the host running the pipeline.
+"""
+import datetime
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from autoseq.util.resources import load_usage
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT,
+    pipeline TEXT,
+    sample TEXT,
+    outdir TEXT,
+    source TEXT,
+    status TEXT,
+    starttime REAL,
+    endtime REAL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    jobname TEXT,
+    tool TEXT,
+    sample TEXT,
+    status TEXT,
+    threads INTEGER,
+    starttime REAL,
+    endtime REAL,
+    runtime REAL,
+    exit_status INTEGER,
+    user_cpu_seconds REAL,
+    sys_cpu_seconds REAL,
+    max_rss_bytes INTEGER,
+    read_bytes INTEGER,
+    write_bytes INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS resource_samples (
+    job_id INTEGER NOT NULL REFERENCES jobs(job_id),
+    timestamp REAL,
+    rss_bytes INTEGER,
+    read_bytes INTEGER,
+    write_bytes INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS files (
+    job_id INTEGER NOT NULL REFERENCES jobs(job_id),
+    path TEXT,
+    direction TEXT,
+    size_bytes INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_runs_sample ON runs(sample);
+CREATE INDEX IF NOT EXISTS idx_runs_starttime ON runs(starttime);
+CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_sample ON jobs(sample);
+CREATE INDEX IF NOT EXISTS idx_jobs_tool ON jobs(tool, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_resource_samples_job ON resource_samples(job_id);
+CREATE INDEX IF NOT EXISTS idx_files_job ON files(job_id);
+CREATE INDEX IF NOT EXISTS idx_files_path ON files(path);
+"""
+
+# File system types on which WAL mode is not used:
+NETWORK_FILESYSTEMS = ("nfs", "nfs4", "cifs", "smbfs", "smb3", "lustre", "gpfs", "glusterfs", "ceph",
+                       "fuse.sshfs", "fuse.glusterfs")
+
+# Seconds to wait for the recorder to register a pipeline run:
+REGISTRATION_TIMEOUT = 600
+
+# Columns of the jobs table that are populated from the resource usage statistics:
+USAGE_COLUMNS = ["exit_status", "user_cpu_seconds", "sys_cpu_seconds", "max_rss_bytes",
+                 "read_bytes", "write_bytes"]
+
+
+class JobDatabaseError(Exception):
+    pass
+
+
+def filesystem_type(path, mounts_file="/proc/mounts"):
+    """
+    :return: The type of the file system holding the specified path, according to the mount
+    table, or None if it cannot be determined.
+    """
+    path = os.path.realpath(path)
+    try:
+        with open(mounts_file) as mounts:
+            entries = [line.split() for line in mounts]
+    except IOError:
+        return None
+
+    best_mount_point, best_type = None, None
+    for entry in entries:
+        if len(entry) < 3:
+            continue
+        # Spaces and other special characters are octal-escaped in the mount table:
+        mount_point = re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), entry[1])
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and \
+                (best_mount_point is None or len(mount_point) > len(best_mount_point)):
+            best_mount_point, best_type = mount_point, entry[2]
+    return best_type
+
+
+def is_network_filesystem(path):
+    return filesystem_type(path) in NETWORK_FILESYSTEMS
+
+
+def is_sqlite_jobdb(filename):
+    """
+    Determine whether the specified job database filename refers to a SQLite database.
+    """
+    return filename is not None and filename.endswith(SQLITE_SUFFIXES)
+
+
+def parse_timestamp(value):
+    """
+    Convert a job database timestamp to seconds since the epoch.
+
+    :param value: Number, or date string formatted as %Y-%m-%dT%H:%M:%S, optionally with fractional seconds.
+    :return: Float timestamp, or None if the value is missing or cannot be parsed.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    for date_format in ["%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"]:
+        try:
+            parsed = datetime.datetime.strptime(value, date_format)
+            return time.mktime(parsed.timetuple()) + parsed.microsecond / 1e6
+        except ValueError:
+            pass
+
+    return None
+
+
+def tool_from_jobname(jobname):
+    """
+    Guess the tool name from a jobname such as "picard-isize-LB-P-00000001-N-..." or
+    "cnvkit/LB-P-00000001-T-...", for job records that do not specify the tool.
+    """
+    match = re.match(r'[A-Za-z_]+(-[a-z_]+)*', jobname or "")
+    return match.group(0).strip("-_") if match else None
+
+
+def percentile(values, pct):
+    """
+    Compute a percentile of the specified values using linear interpolation.
+
+    :param values: Sorted list of numbers.
+    :param pct: Percentile, between 0 and 100.
+    :return: The percentile value, or None if values is empty.
+    """
+    if not values:
+        return None
+    position = (len(values) - 1) * pct / 100.0
+    lower = int(math.floor(position))
+    upper = int(math.ceil(position))
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class JobDatabase(object):
+    """
+    A SQLite job database holding the jobs of many pipeline runs.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=60)
+        self.journal_mode = self.set_journal_mode()
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def set_journal_mode(self):
+        """
+        Use WAL mode if the database is on a local file system, and the rollback journal otherwise.
+        An existing database is switched back from WAL mode when it has been moved to a network
+        file system, which is only possible when no other connection is using it.
+
+        :return: The journal mode in use.
+        """
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        if is_network_filesystem(directory):
+            mode = "DELETE"
+        else:
+            mode = "WAL"
+        try:
+            return self.connection.execute("PRAGMA journal_mode={}".format(mode)).fetchone()[0].upper()
+        except sqlite3.OperationalError as e:
+            logger.warning("Could not set journal mode {} for {}: {}".format(mode, self.filename, e))
+            return self.connection.execute("PRAGMA journal_mode").fetchone()[0].upper()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_run(self, name=None, pipeline=None, sample=None, outdir=None, source=None,
+                status="RUNNING", starttime=None):
+        """
+        Register a new pipeline run.
+
+        :return: The run_id of the new run.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (name, pipeline, sample, outdir, source, status, starttime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, pipeline, sample, outdir, source, status,
+                 starttime if starttime is not None else time.time()))
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, status, endtime=None):
+        with self.connection:
+            self.connection.execute("UPDATE runs SET status = ?, endtime = ? WHERE run_id = ?",
+                                    (status, endtime if endtime is not None else time.time(), run_id))
+
+    def add_job(self, run_id, jobname, tool=None, sample=None, status="PENDING", threads=None,
+                inputs=(), outputs=()):
+        """
+        Register a job of the specified run, along with its input and output files.
+
+        :return: The job_id of the new job.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO jobs (run_id, jobname, tool, sample, status, threads) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, jobname, tool or tool_from_jobname(jobname), sample, status, threads))
+            job_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO files (job_id, path, direction) VALUES (?, ?, ?)",
+                [(job_id, path, "input") for path in inputs] +
+                [(job_id, path, "output") for path in outputs])
+        return job_id
+
+    def update_job(self, job_id, status=None, starttime=None, endtime=None, usage=None):
+        """
+        Update the state of a job, optionally adding resource usage statistics as collected
+        by autoseq.util.resources.
+
+        :param job_id: The job to update.
+        :param status: New job status, or None to leave it unchanged.
+        :param starttime: Start timestamp, in any format accepted by parse_timestamp().
+        :param endtime: End timestamp, in any format accepted by parse_timestamp().
+        :param usage: Resource usage dictionary, or None.
+        """
+        values = {"status": status, "starttime": parse_timestamp(starttime), "endtime": parse_timestamp(endtime)}
+        if usage is not None:
+            for column in USAGE_COLUMNS:
+                values[column] = usage.get(column)
+            if values["starttime"] is None:
+                values["starttime"] = usage.get("starttime")
+            if values["endtime"] is None:
+                values["endtime"] = usage.get("endtime")
+        values = dict((column, value) for column, value in values.items() if value is not None)
+
+        if "starttime" in values and "endtime" in values:
+            values["runtime"] = values["endtime"] - values["starttime"]
+
+        with self.connection:
+            if values:
+                columns = sorted(values.keys())
+                self.connection.execute(
+                    "UPDATE jobs SET {} WHERE job_id = ?".format(", ".join("{} = ?".format(c) for c in columns)),
+                    [values[column] for column in columns] + [job_id])
+            if usage is not None and usage.get("samples"):
+                self.connection.executemany(
+                    "INSERT INTO resource_samples (job_id, timestamp, rss_bytes, read_bytes, write_bytes) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [[job_id] + list(sample) for sample in usage["samples"]])
+
+    def update_file_sizes(self, job_id):
+        """
+        Record the current sizes of the files of the specified job.
+        """
+        rows = self.connection.execute("SELECT rowid, path FROM files WHERE job_id = ?", (job_id,)).fetchall()
+        sizes = []
+        for rowid, path in rows:
+            try:
+                sizes.append((os.path.getsize(path), rowid))
+            except (OSError, TypeError):
+                pass
+        with self.connection:
+            self.connection.executemany("UPDATE files SET size_bytes = ? WHERE rowid = ?", sizes)
+
+    def import_json(self, jobdb_filename, name=None, pipeline=None, sample=None):
+        """
+        Import a JSON job database, as written by pypedream, as a new run.
+
+        :param jobdb_filename: JSON job database filename.
+        :param name: Run name; defaults to the JSON filename.
+        :param pipeline: Name of the pipeline that produced the job database.
+        :param sample: Sample (e.g. sdid) that the run analysed.
+        :return: The run_id of the imported run.
+        """
+        with open(jobdb_filename) as jobdb_file:
+            jobs = json.load(jobdb_file).get("jobs", [])
+
+        starttimes = [t for t in [parse_timestamp(job.get("starttime")) for job in jobs] if t is not None]
+        endtimes = [t for t in [parse_timestamp(job.get("endtime")) for job in jobs] if t is not None]
+        statuses = set(job.get("status") for job in jobs)
+        run_status = "FAILED" if statuses & {"FAILED", "CANCELLED"} else "COMPLETED"
+
+        run_id = self.add_run(name=name or jobdb_filename, pipeline=pipeline, sample=sample,
+                              source=os.path.abspath(jobdb_filename), status=run_status,
+                              starttime=min(starttimes) if starttimes else None)
+        self.finish_run(run_id, run_status, max(endtimes) if endtimes else None)
+
+        for job in jobs:
+            job_id = self.add_job(run_id, job.get("jobname"), tool=job.get("tool"),
+                                  sample=job.get("sample", sample), status=job.get("status"))
+            self.update_job(job_id, starttime=job.get("starttime"), endtime=job.get("endtime"),
+                            usage=job.get("resources"))
+
+        return run_id
+
+    def recent_run_ids(self, n_runs):
+        rows = self.connection.execute(
+            "SELECT run_id FROM runs ORDER BY starttime DESC LIMIT ?", (n_runs,)).fetchall()
+        return [row[0] for row in rows]
+
+    def tool_runtimes(self, tool, last_n_runs=None, status="COMPLETED"):
+        """
+        Retrieve the runtimes, in seconds, of all jobs of the specified tool.
+
+        :param tool: Tool name, matched case-insensitively.
+        :param last_n_runs: Only consider the most recent runs, if specified.
+        :param status: Only consider jobs with this status.
+        :return: Sorted list of runtimes.
+        """
+        query = "SELECT runtime FROM jobs WHERE tool = ? COLLATE NOCASE AND status = ? AND runtime IS NOT NULL"
+        params = [tool, status]
+        if last_n_runs is not None:
+            run_ids = self.recent_run_ids(last_n_runs)
+            query += " AND run_id IN ({})".format(", ".join("?" * len(run_ids)) or "NULL")
+            params += run_ids
+        query += " ORDER BY runtime"
+        return [row[0] for row in self.connection.execute(query, params)]
+
+    def runtime_percentile(self, tool, pct=95, last_n_runs=None):
+        """
+        Compute a runtime percentile for the specified tool, e.g. the p95 runtime of
+        vardict over the last 200 runs.
+        """
+        return percentile(self.tool_runtimes(tool, last_n_runs), pct)
+
+
+class JobDatabaseRecorder(threading.Thread):
+    """
+    Records the jobs of a running pipeline in a SQLite job database.
+
+    All jobs are registered as PENDING when the recorder starts. The resource usage files
+    written by the job monitors are then polled, so that jobs are updated as they finish,
+    and a final update is made when the recorder is stopped.
+
+    Errors are logged and kept in the error attribute, and a failure to register the run is
+    raised in the pipeline by wait_until_registered(). A poll that fails, e.g. because the
+    database is locked, is retried at the next poll.
+    """
+    def __init__(self, filename, run_name, pipeline, sample, outdir, jobs, poll_interval=10):
+        """
+        :param filename: SQLite job database filename.
+        :param jobs: List of (jobname, tool, threads, inputs, outputs, usage_file) tuples.
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.filename = filename
+        self.run_name = run_name
+        self.pipeline = pipeline
+        self.sample = sample
+        self.outdir = outdir
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.registered = threading.Event()
+        self.run_id = None
+        self.error = None
+        self.usage_file_to_job_id = {}
+
+    def run(self):
+        try:
+            # The SQLite connection must be created and used in this thread only:
+            with JobDatabase(self.filename) as jobdb:
+                self.run_id = jobdb.add_run(self.run_name, self.pipeline, self.sample, self.outdir)
+                for jobname, tool, threads, inputs, outputs, usage_file in self.jobs:
+                    job_id = jobdb.add_job(self.run_id, jobname, tool, self.sample, threads=threads,
+                                           inputs=inputs, outputs=outputs)
+                    self.usage_file_to_job_id[usage_file] = job_id
+                self.registered.set()
+
+                while not self.stop_event.wait(self.poll_interval):
+                    try:
+                        self.record_finished_jobs(jobdb)
+                    except sqlite3.OperationalError as e:
+                        logger.warning("Could not record finished jobs in {}, retrying: {}".format(self.filename, e))
+                self.record_finished_jobs(jobdb)
+
+                self.finish(jobdb)
+        except Exception as e:
+            logger.exception("Recording jobs in {} failed; job states are no longer recorded".format(self.filename))
+            self.error = e
+        finally:
+            self.registered.set()
+
+    def wait_until_registered(self, timeout=REGISTRATION_TIMEOUT):
+        """
+        Wait for the run and its jobs to be registered in the job database. The wait is done in
+        short intervals, so that it can be interrupted.
+
+        :raises JobDatabaseError: If registration failed or did not finish within the timeout.
+        """
+        deadline = time.time() + timeout
+        while not self.registered.wait(min(1.0, timeout)):
+            if time.time() >= deadline:
+                raise JobDatabaseError("Timed out registering the pipeline run in {}".format(self.filename))
+        if self.error is not None:
+            raise JobDatabaseError("Could not register the pipeline run in {}: {}".format(self.filename, self.error))
+
+    def record_finished_jobs(self, jobdb):
+        for usage_file, job_id in list(self.usage_file_to_job_id.items()):
+            usage = load_usage(usage_file) if os.path.exists(usage_file) else None
+            if usage is not None:
+                status = "COMPLETED" if usage["exit_status"] == 0 else "FAILED"
+                jobdb.update_job(job_id, status=status, usage=usage)
+                jobdb.update_file_sizes(job_id)
+                del self.usage_file_to_job_id[usage_file]
+
+    def finish(self, jobdb):
+        failed = jobdb.connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE run_id = ? AND status != 'COMPLETED'", (self.run_id,)).fetchone()[0]
+        with jobdb.connection:
+            jobdb.connection.execute(
+                "UPDATE jobs SET status = 'NOT_RUN' WHERE run_id = ? AND status = 'PENDING'", (self.run_id,))
+        jobdb.finish_run(self.run_id, "FAILED" if failed else "COMPLETED")
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
@@ -0,0 +1,60 @@
+"""
+Helpers for inspecting and decorating pypedream jobs after a pipeline has been configured.
+"""
+import re
+import uuid
+
+
+def wrap_command(job, wrapper):
+    """
+    Replace the command of the specified job with a wrapped version of it.
+
+    The original command is still generated lazily, when the runner asks for it.
+
+    :param job: A pypedream Job instance.
+    :param wrapper: Function taking the original command string and returning a new command string.
+    """
+    original_command = job.command
+
+    def wrapped_command():
+        return wrapper(original_command())
+
+    job.command = wrapped_command
+
+
+def job_tag(job):
+    """
+    Generate a unique file-system safe tag for the specified job, based on its jobname.
+
+    :param job: A pypedream Job instance.
+    :return: String tag.
+    """
+    jobname = getattr(job, "jobname", None) or job.__class__.__name__.lower()
+    return "{}-{}".format(re.sub(r'[^A-Za-z0-9_.-]+', '_', jobname), uuid.uuid4().hex[:8])
+
+
+
+def _port_values(job, prefix):
+    values = []
+    for attribute_name, value in vars(job).items():
+        if not attribute_name.startswith(prefix):
+            continue
+        if isinstance(value, (list, tuple)):
+            values.extend(v for v in value if isinstance(v, basestring))
+        elif isinstance(value, basestring):
+            values.append(value)
+    return values
+
+
+def job_inputs(job):
+    """
+    List the input files of the specified job, i.e. the values of its "input*" attributes.
+    """
+    return _port_values(job, "input")
+
+
+def job_outputs(job):
+    """
+    List the output files of the specified job, i.e. the values of its "output*" attributes.
+    """
+    return _port_values(job, "output")
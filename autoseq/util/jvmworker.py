@@ -0,0 +1,193 @@
+"""
+Persistent JVM worker for short Java tool invocations.
+
+Short GATK3 invocations spend much of their run time starting the JVM and loading classes.
+When enabled, the pipeline starts a nailgun server listening on a Unix socket, with the tool
+jar on its class path, and jobs running such tools submit them to the server using the nailgun
+client "ng".
+
+GATK3 is not re-entrant: it keeps the exit status of the running program in a static field and
+reconfigures the global log4j logger. Invocations are therefore run in the worker one at a time,
+holding an exclusive lock on a file next to the socket, and each worker hosts a single tool, as
+the fat jars of different tools conflict on a shared class path.
+
+If an invocation fails in the worker, e.g. because the worker could not be started, has been
+stopped or has died, is not reachable from the node the job runs on, or ran out of heap, then
+the tool is run again in a fresh JVM, exactly as without the worker, and the exit status of that
+run is the exit status of the job.
+
+Tools run in the worker share its heap, and JVM options of individual invocations are not
+applied, so only short invocations that are given absolute paths should be submitted to it.
+"""
+import collections
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+NAILGUN_SERVER_CLASS = "com.facebook.nailgun.NGServer"
+NAILGUN_CLIENT = "ng"
+
+# Lock file, next to the socket, serialising the invocations run in a worker:
+LOCK_FILENAME = "worker.lock"
+
+GATK3_JAR = "/nfs/PROBIO/autoseq-scripts/GenomeAnalysisTK-3.5.jar"
+
+# Jar and main class of each tool that can be run in a worker:
+JavaTool = collections.namedtuple('JavaTool', ['jar', 'main_class'])
+JAVA_TOOLS = {
+    "gatk3": JavaTool(GATK3_JAR, "org.broadinstitute.gatk.engine.CommandLineGATK"),
+}
+
+# Java tool run by each job that can submit its invocations to a worker:
+WORKER_TOOLS = {
+    "Realignment": "gatk3",
+    "MergeVCF": "gatk3",
+    "SomaticSeq": "gatk3",
+}
+
+
+def get_worker_tool(job):
+    """
+    :return: Name of the Java tool the specified job can run in the worker, or None.
+    """
+    return WORKER_TOOLS.get(job.__class__.__name__)
+
+
+def find_tool_jar(tool):
+    """
+    :return: Path to the jar of the specified tool, or None if it does not exist.
+    """
+    jar = JAVA_TOOLS[tool].jar
+    return jar if os.path.exists(jar) else None
+
+
+def server_address(socket_path):
+    return "local:" + socket_path
+
+
+def lock_path(socket_path):
+    return os.path.join(os.path.dirname(socket_path), LOCK_FILENAME)
+
+
+def worker_command(socket_path, tool, args, fallback):
+    """
+    Generate a shell command that runs a Java tool in the worker listening on the specified
+    socket, waiting for any other invocation in the worker to finish first, and that runs the
+    fallback command instead if the invocation fails in the worker.
+
+    :param socket_path: Socket of the worker, or None if no worker is used.
+    :param tool: Name of the tool, as listed in JAVA_TOOLS.
+    :param args: Tool arguments, as a shell command fragment.
+    :param fallback: Command to run the tool with in a fresh JVM.
+    """
+    if not socket_path:
+        return fallback
+    return "{{ flock {lock} {ng} --nailgun-server {address} {main_class} {args} || " \
+           "{{ echo \"{tool} failed in the JVM worker; running it in a new JVM\" >&2; {fallback}; }}; }}".format(
+               lock=quote(lock_path(socket_path)), ng=NAILGUN_CLIENT, address=quote(server_address(socket_path)),
+               main_class=JAVA_TOOLS[tool].main_class, args=args, tool=tool, fallback=fallback)
+
+
+class JvmWorker(object):
+    """
+    A nailgun server hosting a single Java tool, started and stopped by the pipeline.
+    """
+    def __init__(self, classpath, tool, heap="4g", java="java"):
+        """
+        :param classpath: Class path of the nailgun server and its dependencies, as a string.
+        :param tool: Name of the tool to host, as listed in JAVA_TOOLS.
+        """
+        self.classpath = classpath
+        self.tool = tool
+        self.heap = heap
+        self.java = java
+        self.jar = find_tool_jar(tool)
+        self.socket_dir = None
+        self.socket_path = None
+        self.process = None
+
+    def server_command(self):
+        return [self.java, "-Xmx" + self.heap, "-cp", ":".join([self.classpath, self.jar]),
+                NAILGUN_SERVER_CLASS, server_address(self.socket_path)]
+
+    def is_running(self):
+        """
+        :return: True if the worker responds to the nailgun client.
+        """
+        if self.socket_path is None or not os.path.exists(self.socket_path):
+            return False
+        with open(os.devnull, 'w') as devnull:
+            try:
+                return subprocess.call([NAILGUN_CLIENT, "--nailgun-server", server_address(self.socket_path),
+                                        "ng-version"], stdout=devnull, stderr=devnull) == 0
+            except OSError:
+                return False
+
+    def start(self, timeout=60, poll_interval=0.5):
+        """
+        Start the worker, and wait until it responds.
+
+        :return: True if the worker was started, False otherwise.
+        """
+        if not self.jar:
+            logger.warning("No jar found for {}; not starting its JVM worker".format(self.tool))
+            return False
+
+        # The socket is created in a private directory, as any process able to connect to it
+        # can run code in the worker:
+        self.socket_dir = tempfile.mkdtemp(prefix="autoseq-jvm-")
+        self.socket_path = os.path.join(self.socket_dir, "worker.sock")
+        open(lock_path(self.socket_path), 'w').close()
+        try:
+            self.process = subprocess.Popen(self.server_command())
+        except OSError as e:
+            logger.warning("Could not start the JVM worker: {}".format(e))
+            self.stop()
+            return False
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                logger.warning("The JVM worker exited with status {}".format(self.process.returncode))
+                break
+            if self.is_running():
+                logger.info("Started JVM worker hosting {} on {}".format(self.tool, self.socket_path))
+                return True
+            time.sleep(poll_interval)
+        else:
+            logger.warning("The JVM worker did not respond within {} seconds".format(timeout))
+
+        self.stop()
+        return False
+
+    def stop(self, timeout=10):
+        """
+        Stop the worker, killing it if it does not shut down within the timeout.
+        """
+        if self.process is not None and self.process.poll() is None:
+            if self.is_running():
+                with open(os.devnull, 'w') as devnull:
+                    subprocess.call([NAILGUN_CLIENT, "--nailgun-server", server_address(self.socket_path),
+                                     "ng-stop"], stdout=devnull, stderr=devnull)
+            deadline = time.time() + timeout
+            while self.process.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+            if self.process.poll() is None:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+        if self.socket_dir is not None:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+        self.socket_dir = None
+        self.socket_path = None
@@ -1,51 +1,167 @@
+import collections
+import json
 import logging
 import os
 import re
 
 from autoseq.util.path import normpath
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 logger = logging.getLogger(__name__)
 
+REGEX_FQ1 = re.compile(r'(.+)(_1\.fastq.gz|_1\.fq.gz|R1_\d{3}.fastq.gz)')
+REGEX_FQ2 = re.compile(r'(.+)(_2\.fastq.gz|_2\.fq.gz|R2_\d{3}.fastq.gz)')
 
-def find_fastqs(library, libdir):
-    """Find fastq files for a given library id in a given direcory.
+FastqFile = collections.namedtuple('FastqFile', ['path', 'size', 'mtime'])
 
-        Returns a tuple with two lists:
-    (['foo_1.fastq.gz', 'bar_1.fastq.gz'], # read 1
-     ['foo_2.fastq.gz', 'bar_2.fastq.gz'])
 
-    Supports the following file naming convenstions:
-    *_1.fastq.gz / *_2.fastq.gz
-    *_1.fq.gz / *_2.fq.gz
-    *R1_nnn.fastq.gz / *R2_nnn.fastq.gz
+def list_dir(dirname):
+    """
+    List the entries of a directory.
 
-    :rtype: tuple[str,str]
+    :return: List of (filename, stat result) tuples. The stat result is None where it
+    was not obtained as part of the directory listing.
     """
-    if not library:
-        return (None, None)
-    regex_fq1 = '(.+)(_1\.fastq.gz|_1\.fq.gz|R1_\d{3}.fastq.gz)'
-    regex_fq2 = '(.+)(_2\.fastq.gz|_2\.fq.gz|R2_\d{3}.fastq.gz)'
+    if scandir is not None:
+        entries = []
+        for entry in scandir(dirname):
+            try:
+                stat = entry.stat()
+            except OSError:
+                stat = None
+            entries.append((entry.name, stat))
+        return entries
+    return [(name, None) for name in os.listdir(dirname)]
+
 
-    d = normpath(os.path.join(libdir, library))
-    logger.debug("Looking for fastq files for library {library} in {libdir}".format(library=library, libdir=libdir))
+def scan_library_dir(dirname):
+    """
+    Find the read 1 and read 2 fastq files in a library directory, following the naming
+    conventions described in find_fastqs().
 
+    :return: Tuple of two sorted lists of (filename, size, mtime) tuples.
+    """
     fq1s = []
     fq2s = []
-
-    for f in os.listdir(d):
-        match1 = re.search(regex_fq1, f)
-        if match1:
-            fn = "".join(match1.groups())
-            fq1s.append(os.path.join(libdir, library, fn))
-        match2 = re.search(regex_fq2, f)
-        if match2:
-            fn = "".join(match2.groups())
-            fq2s.append(os.path.join(libdir, library, fn))
+    for name, stat in list_dir(dirname):
+        for regex, fqs in [(REGEX_FQ1, fq1s), (REGEX_FQ2, fq2s)]:
+            match = regex.search(name)
+            if match:
+                fn = "".join(match.groups())
+                fn_stat = stat
+                if fn_stat is None or fn != name:
+                    try:
+                        fn_stat = os.stat(os.path.join(dirname, fn))
+                    except OSError:
+                        fn_stat = None
+                fqs.append((fn, fn_stat.st_size if fn_stat else None, fn_stat.st_mtime if fn_stat else None))
 
     fq1s.sort()
     fq2s.sort()
-
-    logging.debug("Found {}".format((fq1s, fq2s)))
     return fq1s, fq2s
 
 
+class LibraryIndex(object):
+    """
+    Index of the fastq files in a library directory.
+
+    Each library folder is scanned at most once, so that an index shared by all lookups in
+    a pipeline, or in a batch of pipelines, avoids repeated directory listings. The index
+    can optionally be persisted to a JSON cache file, in which case entries are reused
+    across runs for as long as the modification time of their library folder is unchanged.
+    The cache file is only written by save(), once all libraries of interest have been scanned.
+    """
+    def __init__(self, libdir, cache_filename=None):
+        """
+        :param libdir: Directory in which library folders are located.
+        :param cache_filename: Optional JSON file in which to persist the index.
+        """
+        self.libdir = libdir
+        self.cache_filename = cache_filename
+        self.libraries = {}
+        self.cached = {}
+        self.modified = False
+        if cache_filename and os.path.isfile(cache_filename):
+            try:
+                with open(cache_filename) as cache_file:
+                    self.cached = json.load(cache_file)
+            except ValueError:
+                logger.warn("Ignoring invalid library index cache {}".format(cache_filename))
+
+    def scan(self, library):
+        d = normpath(os.path.join(self.libdir, library))
+        dir_mtime = os.stat(d).st_mtime
+        cached = self.cached.get(d)
+        if cached and cached["mtime"] == dir_mtime:
+            logger.debug("Using cached fastq files for library {}".format(library))
+            return cached["fq1s"], cached["fq2s"]
+
+        logger.debug("Looking for fastq files for library {library} in {libdir}".format(
+            library=library, libdir=self.libdir))
+        fq1s, fq2s = scan_library_dir(d)
+        self.cached[d] = {"mtime": dir_mtime, "fq1s": fq1s, "fq2s": fq2s}
+        self.modified = True
+        return fq1s, fq2s
+
+    def save(self):
+        """
+        Write the index to the cache file, if one is used and libraries have been scanned since
+        the index was loaded or last saved.
+        """
+        if not self.cache_filename or not self.modified:
+            return
+        tmp_filename = "{}.{}.tmp".format(self.cache_filename, os.getpid())
+        with open(tmp_filename, 'w') as cache_file:
+            json.dump(self.cached, cache_file)
+        os.rename(tmp_filename, self.cache_filename)
+        self.modified = False
+
+    def fastq_files(self, library):
+        """
+        :return: Tuple of two lists of FastqFile tuples, for read 1 and read 2 respectively.
+        :raise OSError: If the library folder does not exist.
+        """
+        if library not in self.libraries:
+            fq1s, fq2s = self.scan(library)
+            self.libraries[library] = tuple(
+                [FastqFile(os.path.join(self.libdir, library, fn), size, mtime) for fn, size, mtime in fqs]
+                for fqs in (fq1s, fq2s))
+        return self.libraries[library]
+
+    def find_fastqs(self, library):
+        """
+        Find fastq files for a given library id. See find_fastqs().
+        """
+        if not library:
+            return (None, None)
+        fq1s, fq2s = self.fastq_files(library)
+        found = [fq.path for fq in fq1s], [fq.path for fq in fq2s]
+        logging.debug("Found {}".format(found))
+        return found
+
+
+def find_fastqs(library, libdir, index=None):
+    """Find fastq files for a given library id in a given direcory.
+
+        Returns a tuple with two lists:
+    (['foo_1.fastq.gz', 'bar_1.fastq.gz'], # read 1
+     ['foo_2.fastq.gz', 'bar_2.fastq.gz'])
+
+    Supports the following file naming convenstions:
+    *_1.fastq.gz / *_2.fastq.gz
+    *_1.fq.gz / *_2.fq.gz
+    *R1_nnn.fastq.gz / *R2_nnn.fastq.gz
+
+    :param index: Optional LibraryIndex for libdir, used to avoid rescanning the library folder.
+    :rtype: tuple[str,str]
+    """
+    if index is None:
+        index = LibraryIndex(libdir)
+    return index.find_fastqs(library)
@@ -1,6 +1,12 @@
 import logging
+import multiprocessing
+import os
 
-from openpyxl import load_workbook
+
+def load_workbook(filename, **kwargs):
+    # openpyxl is only imported when an order form is actually parsed:
+    from openpyxl import load_workbook as openpyxl_load_workbook
+    return openpyxl_load_workbook(filename, **kwargs)
 
 
 def parse_orderform_block(block_of_values):
@@ -8,22 +14,27 @@ def parse_orderform_block(block_of_values):
     Extract clinseq barcodes from the given list of order form fields. Looks
     in the entries between <SAMPLE ENTRIES> and </SAMPLE ENTRIES> for clinseq barcodes.
 
-    :param block_of_values: List of fields from which to extract clinseq barcodes
+    Stops consuming the fields at </SAMPLE ENTRIES>, so that the rest of a streamed
+    order form is not read.
+
+    :param block_of_values: Iterable of fields from which to extract clinseq barcodes
     :return: List of (not-yet validated) clinseq barcode strings
     """
 
     clinseq_barcode_strings = []
     clinseq_barcodes_section = False
+    n_ignored = 0
     for cell_value in block_of_values:
         if cell_value == "</SAMPLE ENTRIES>":
-            clinseq_barcodes_section = False
+            break
         if clinseq_barcodes_section:
             clinseq_barcode_strings.append(cell_value)
-        if cell_value == "<SAMPLE ENTRIES>":
+        elif cell_value == "<SAMPLE ENTRIES>":
             clinseq_barcodes_section = True
         else:
-            logging.debug("Ignoring field from order form: " + cell_value)
+            n_ignored += 1
 
+    logging.debug("Ignored {} fields before the sample entries of the order form".format(n_ignored))
     return clinseq_barcode_strings
 
 
@@ -35,8 +46,8 @@ def parse_orderform_worksheet(order_form_worksheet):
     :return: List of clinseq barcodes extracted from the worksheet.
     """
 
-    first_column_vals = [row[0].value for row in list(order_form_worksheet.iter_rows()) if
-                         row[0].value is not None]
+    first_column_vals = (row[0].value for row in order_form_worksheet.iter_rows(min_col=1, max_col=1)
+                         if row and row[0].value is not None)
 
     return parse_orderform_block(first_column_vals)
 
@@ -49,5 +60,39 @@ def parse_orderform(order_form_filename):
     :return: List of clinseq barcodes extracted from the order form.
     """
 
-    workbook = load_workbook(order_form_filename)
-    return parse_orderform_worksheet(workbook.worksheets[0])
+    workbook = load_workbook(order_form_filename, read_only=True, data_only=True)
+    try:
+        return parse_orderform_worksheet(workbook.worksheets[0])
+    finally:
+        # Read-only workbooks keep the file open until closed:
+        if hasattr(workbook, "close"):
+            workbook.close()
+
+
+def find_orderforms(dirname):
+    """
+    :return: Sorted list of the .xlsx files in the specified directory, skipping Excel lock files.
+    """
+    return sorted(os.path.join(dirname, filename) for filename in os.listdir(dirname)
+                  if filename.endswith(".xlsx") and not filename.startswith("~$"))
+
+
+def parse_orderforms(order_form_filenames, processes=None):
+    """
+    Extract clinseq barcodes from several order forms, parsing them in parallel.
+
+    :param order_form_filenames: List of excel spreadsheet filenames.
+    :param processes: Number of worker processes. Defaults to the number of CPUs.
+    :return: List of clinseq barcodes extracted from the order forms, in the order of the forms.
+    """
+    if len(order_form_filenames) <= 1 or processes == 1:
+        barcodes_per_form = [parse_orderform(filename) for filename in order_form_filenames]
+    else:
+        pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(order_form_filenames)))
+        try:
+            barcodes_per_form = pool.map(parse_orderform, order_form_filenames)
+        finally:
+            pool.close()
+            pool.join()
+
+    return [barcode for barcodes in barcodes_per_form for barcode in barcodes]
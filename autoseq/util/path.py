@@ -1,6 +1,23 @@
+import hashlib
 import logging
 import os
+import shutil
 import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+
+import click
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+# Chunk size used when copying and checksumming staged files:
+STAGE_CHUNK_BYTES = 8 * 1024 ** 2
+
+# Suffix of files that are still being staged:
+PARTIAL_SUFFIX = ".part"
 
 
 def normpath(path):
@@ -77,20 +94,142 @@ def rsync_file(src, target):
     subprocess.check_call(rsync_command, stderr=open('/dev/null', 'w'), stdout=open('/dev/null', 'w'))
 
 
-def fetch_raw_data(sampledata, rawdata_dir):
+def fetch_raw_data(sampledata, rawdata_dir, workers=4):
     """
-    Copy data for a single report to a directory
+    Copy data for a single report to a directory, copying up to the specified number of
+    files at the same time.
     """
     items_to_copy = ["PANEL_TUMOR_FQ1", "PANEL_TUMOR_FQ2", "PANEL_NORMAL_FQ1", "PANEL_NORMAL_FQ2",
                      "WGS_TUMOR_FQ1", "WGS_TUMOR_FQ2", "WGS_NORMAL_FQ1", "WGS_NORMAL_FQ2",
                      "RNASEQ_FQ1", "RNASEQ_FQ2", "RNASEQCAP_FQ1", "RNASEQCAP_FQ2"]
 
+    files_to_stage = []
     for item in items_to_copy:
         if sampledata[item] is not None and sampledata[item] is not "NA":
             new_fqs = []
             for f in sampledata[item]:
                 local_file = os.path.abspath("{}/{}".format(rawdata_dir, os.path.expanduser(f)))
                 new_fqs.append(local_file)
-                rsync_file(f, local_file)
+                files_to_stage.append((f, local_file))
             sampledata[item] = new_fqs
-    return sampledata
\ No newline at end of file
+
+    stage_files(files_to_stage, workers=workers)
+    return sampledata
+
+
+def file_checksum(filename):
+    """
+    :return: Hex MD5 checksum of the specified file.
+    """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(STAGE_CHUNK_BYTES), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def source_checksum(src):
+    """
+    :return: Hex MD5 checksum of a file to be staged, taken from an accompanying .md5 file
+    if there is one, so that the source file need not be read twice.
+    """
+    md5_filename = src + ".md5"
+    if os.path.isfile(md5_filename):
+        with open(md5_filename) as md5_file:
+            fields = md5_file.read().split()
+        if fields:
+            return fields[0].lower()
+    return file_checksum(src)
+
+
+def stage_file(src, target, verify_checksum=False):
+    """
+    Copy a file to a staging location. The file is copied to target + ".part" and renamed
+    once complete, and a partial copy left by an interrupted attempt is resumed rather than
+    restarted. A target that already exists with the size of the source is not copied again.
+
+    :param src: Source file.
+    :param target: Staged file.
+    :param verify_checksum: If True, then the MD5 checksum of the staged file is verified as well as its size.
+    :return: The staged filename.
+    :raise IOError: If the staged file does not match the source file.
+    """
+    src = os.path.expandvars(os.path.expanduser(src))
+    target = os.path.expandvars(os.path.expanduser(target))
+    src_size = os.path.getsize(src)
+
+    if os.path.isfile(target) and os.path.getsize(target) == src_size:
+        if not verify_checksum or file_checksum(target) == source_checksum(src):
+            logging.debug("{} is already staged".format(src))
+            return target
+        logging.warn("Staged copy of {} does not match its checksum, copying it again".format(src))
+        os.remove(target)
+
+    mkdir(os.path.dirname(target))
+    partial = target + PARTIAL_SUFFIX
+    offset = os.path.getsize(partial) if os.path.isfile(partial) else 0
+    if offset > src_size:
+        offset = 0
+    if offset:
+        logging.info("Resuming copy of {} from byte {}".format(src, offset))
+    else:
+        logging.info("Copying {} to {}".format(src, target))
+
+    with open(src, 'rb') as src_file:
+        with open(partial, 'ab' if offset else 'wb') as partial_file:
+            src_file.seek(offset)
+            shutil.copyfileobj(src_file, partial_file, STAGE_CHUNK_BYTES)
+
+    staged_size = os.path.getsize(partial)
+    if staged_size != src_size:
+        raise IOError("Staged {} bytes of {}, expected {}".format(staged_size, src, src_size))
+    if verify_checksum and file_checksum(partial) != source_checksum(src):
+        os.remove(partial)
+        raise IOError("Checksum mismatch after staging {}".format(src))
+    os.rename(partial, target)
+    return target
+
+
+def stage_files(src_target_pairs, workers=4, verify_checksum=False):
+    """
+    Copy files to their staging locations concurrently. See stage_file().
+
+    :param src_target_pairs: List of (source, target) filename tuples.
+    :param workers: Maximum number of files to copy at the same time.
+    :param verify_checksum: If True, then the MD5 checksums of the staged files are verified.
+    :return: List of staged filenames.
+    """
+    if not src_target_pairs:
+        return []
+    pool = ThreadPool(max(1, min(workers, len(src_target_pairs))))
+    try:
+        return pool.map(lambda src_target: stage_file(src_target[0], src_target[1], verify_checksum),
+                        src_target_pairs)
+    finally:
+        pool.close()
+
+
+def stage_command(src, target, verify_checksum=False, python=sys.executable):
+    """
+    Generate a shell command that stages a file, by running this module.
+    """
+    return "{} -m autoseq.util.path {}{} {}".format(
+        quote(python), "--verify-checksum " if verify_checksum else "", quote(src), quote(target))
+
+
+@click.command()
+@click.option('--verify-checksum', is_flag=True, help="verify the MD5 checksums of the staged files")
+@click.option('--workers', default=4, help="maximum number of files to copy at the same time")
+@click.argument('files', nargs=-1)
+def main(verify_checksum, workers, files):
+    """
+    Stage files: FILES is a list of SOURCE TARGET pairs.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+    if len(files) % 2 != 0:
+        raise click.BadParameter("Expected pairs of source and target files")
+    stage_files(list(zip(files[::2], files[1::2])), workers, verify_checksum)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
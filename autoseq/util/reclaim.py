@@ -0,0 +1,137 @@
+"""
+Eager removal of intermediate files.
+
+When the pipeline starts, a reference count is written for every intermediate file, equal
+to the number of jobs consuming it. Each consuming job releases its reference once it has
+finished successfully, by running:
+
+    python -m autoseq.util.reclaim --refcounts <refcount dir> <file> [<file> ...]
+
+The file is deleted as soon as the last reference is released.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import sys
+
+import click
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+# Index files that are removed together with the file they index:
+INDEX_SUFFIXES = [".bai", ".tbi", ".idx", ".crai"]
+
+
+def refcount_filename(refcount_dir, path):
+    return os.path.join(refcount_dir, hashlib.md5(path.encode("utf-8")).hexdigest())
+
+
+def find_consumers(jobs, is_intermediate, get_inputs, get_outputs):
+    """
+    Count the consumers of every intermediate file produced by the specified jobs.
+
+    :param jobs: List of jobs.
+    :param is_intermediate: Function indicating whether a job's outputs are intermediate.
+    :param get_inputs: Function listing the input files of a job.
+    :param get_outputs: Function listing the output files of a job.
+    :return: Dictionary with intermediate file as key and list of consuming jobs as value.
+    """
+    intermediate_files = set()
+    for job in jobs:
+        if is_intermediate(job):
+            intermediate_files.update(get_outputs(job))
+
+    consumers = {}
+    for job in jobs:
+        for input_file in set(get_inputs(job)):
+            if input_file in intermediate_files:
+                consumers.setdefault(input_file, []).append(job)
+    return consumers
+
+
+def initialise_refcounts(refcount_dir, file_to_n_consumers):
+    """
+    Write the initial reference count of each intermediate file.
+
+    :param refcount_dir: Directory to store reference counts in.
+    :param file_to_n_consumers: Dictionary with file as key and number of consumers as value.
+    """
+    if not os.path.isdir(refcount_dir):
+        os.makedirs(refcount_dir)
+    for path, n_consumers in file_to_n_consumers.items():
+        with open(refcount_filename(refcount_dir, path), 'w') as refcount_file:
+            refcount_file.write("{}\t{}\n".format(n_consumers, path))
+
+
+def remove_with_indexes(path):
+    for filename in [path] + [path + suffix for suffix in INDEX_SUFFIXES] + \
+            [os.path.splitext(path)[0] + suffix for suffix in INDEX_SUFFIXES]:
+        if os.path.isfile(filename):
+            os.remove(filename)
+            logger.info("Removed intermediate file {}".format(filename))
+
+
+def release(refcount_dir, path):
+    """
+    Release one reference to the specified file, deleting the file when no references remain.
+
+    :return: The remaining reference count, or None if the file is not reference counted.
+    """
+    refcount_path = refcount_filename(refcount_dir, path)
+    try:
+        refcount_file = open(refcount_path, 'r+')
+    except IOError:
+        return None
+
+    with refcount_file:
+        fcntl.flock(refcount_file, fcntl.LOCK_EX)
+        count = int(refcount_file.read().split("\t")[0]) - 1
+        refcount_file.seek(0)
+        refcount_file.truncate()
+        refcount_file.write("{}\t{}\n".format(count, path))
+        refcount_file.flush()
+        if count <= 0:
+            remove_with_indexes(path)
+            os.remove(refcount_path)
+
+    return count
+
+
+def release_command(command, refcount_dir, paths, keep_on_failure=True, python=sys.executable):
+    """
+    Generate a shell command that releases references to the specified files after running
+    the given command.
+
+    :param command: The original shell command string.
+    :param refcount_dir: Directory containing the reference counts.
+    :param paths: Files consumed by the command.
+    :param keep_on_failure: If True, then references are only released if the command succeeds.
+    :param python: Python interpreter to run the release with.
+    :return: The new command string, which exits with the status of the original command.
+    """
+    # Failing to release a reference must not fail the job itself:
+    release_cmd = "{{ {} -m autoseq.util.reclaim --refcounts {} {} || true; }}".format(
+        quote(python), quote(refcount_dir), " ".join(quote(path) for path in paths))
+    if keep_on_failure:
+        return "(\n{}\n) && {}".format(command, release_cmd)
+    else:
+        return "(\n{}\n)\nstatus=$?\n{}\nexit $status".format(command, release_cmd)
+
+
+@click.command()
+@click.option('--refcounts', required=True, help="directory containing the reference counts")
+@click.argument('paths', nargs=-1)
+def main(refcounts, paths):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+    for path in paths:
+        release(refcounts, path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Staging of reference data to node-local storage.
+
+Reference files, together with their index files, are copied to a staging directory on the
+local node and verified by checksum. The staging directory keeps a manifest of verified copies,
+so that later runs on the same node reuse them after checking only their sizes and the
+modification times of the originals. Optionally, the bwa index is also preloaded into shared
+memory with "bwa shm", so that concurrent alignment jobs on the node share a single copy.
+"""
+import fcntl
+import json
+import logging
+import os
+import subprocess
+
+from autoseq.util.path import file_checksum, mkdir, normpath, stage_files
+
+logger = logging.getLogger(__name__)
+
+# Reference data items that are staged by default:
+STAGED_REFERENCE_KEYS = ["bwaIndex", "reference_genome", "reference_dict"]
+
+# Index files that are staged together with a reference file, if they exist:
+COMPANION_SUFFIXES = [".fai", ".amb", ".ann", ".bwt", ".pac", ".sa", ".alt", ".tbi", ".idx"]
+
+MANIFEST_FILENAME = ".autoseq-staged.json"
+LOCK_FILENAME = ".autoseq-staged.lock"
+
+
+def companion_files(path):
+    """
+    :return: The specified reference file followed by its existing index files.
+    """
+    files = [path]
+    for suffix in COMPANION_SUFFIXES:
+        if os.path.isfile(path + suffix):
+            files.append(path + suffix)
+    sequence_dict = os.path.splitext(path)[0] + ".dict"
+    if sequence_dict != path and os.path.isfile(sequence_dict):
+        files.append(sequence_dict)
+    return files
+
+
+def staged_path(stage_dir, path):
+    return os.path.join(stage_dir, normpath(path).lstrip("/"))
+
+
+def is_verified(manifest, src, target):
+    """
+    Determine whether target is a previously verified copy of src, that is still up to date.
+    """
+    entry = manifest.get(target)
+    if not entry or not os.path.isfile(target):
+        return False
+    src_stat = os.stat(src)
+    return entry["size"] == src_stat.st_size == os.path.getsize(target) and entry["mtime"] == src_stat.st_mtime
+
+
+def stage_reference(refdata, stage_dir, keys=None, workers=4):
+    """
+    Copy reference files and their index files to a node-local staging directory.
+
+    :param refdata: Reference data dictionary, as loaded by load_ref().
+    :param stage_dir: Node-local directory to stage the files in.
+    :param keys: Reference data items to stage. Defaults to STAGED_REFERENCE_KEYS.
+    :param workers: Maximum number of files to copy at the same time.
+    :return: A copy of refdata, in which the staged items point at the staged copies.
+    """
+    keys = STAGED_REFERENCE_KEYS if keys is None else keys
+    staged_refdata = dict(refdata)
+
+    src_target_pairs = {}
+    for key in keys:
+        path = refdata.get(key)
+        if not path or not os.path.isfile(path):
+            logger.debug("Not staging reference item {}".format(key))
+            continue
+        for src in companion_files(path):
+            src_target_pairs[src] = staged_path(stage_dir, src)
+        staged_refdata[key] = staged_path(stage_dir, path)
+
+    mkdir(stage_dir)
+    with open(os.path.join(stage_dir, LOCK_FILENAME), 'a') as lock_file:
+        # Other pipelines on the node wait here until the staging is complete:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        manifest_filename = os.path.join(stage_dir, MANIFEST_FILENAME)
+        manifest = {}
+        if os.path.isfile(manifest_filename):
+            with open(manifest_filename) as manifest_file:
+                manifest = json.load(manifest_file)
+
+        to_stage = [(src, target) for src, target in sorted(src_target_pairs.items())
+                    if not is_verified(manifest, src, target)]
+        if to_stage:
+            logger.info("Staging {} reference files to {}".format(len(to_stage), stage_dir))
+            stage_files(to_stage, workers=workers, verify_checksum=True)
+            for src, target in to_stage:
+                src_stat = os.stat(src)
+                manifest[target] = {"src": src, "size": src_stat.st_size, "mtime": src_stat.st_mtime,
+                                    "md5": file_checksum(target)}
+            with open(manifest_filename, 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+
+    return staged_refdata
+
+
+def bwa_shm_loaded(fasta):
+    """
+    :return: True if the bwa index of the specified fasta is loaded in shared memory.
+    """
+    try:
+        output = subprocess.check_output(["bwa", "shm", "-l"], stderr=open(os.devnull, 'w'))
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return any(line.split("\t")[0] == fasta for line in output.decode().splitlines())
+
+
+def preload_bwa_index(fasta):
+    """
+    Load the bwa index of the specified fasta into shared memory, unless it is already loaded.
+    "bwa mem" uses the shared memory index when given the same index name.
+    """
+    if bwa_shm_loaded(fasta):
+        logger.info("bwa index {} is already loaded in shared memory".format(fasta))
+        return
+    logger.info("Loading bwa index {} into shared memory".format(fasta))
+    subprocess.check_call(["bwa", "shm", fasta])
@@ -1,6 +1,15 @@
-from reportgen.reporting.util import create_sql_session
-from reportgen.reporting.metadata import query_database
-from referralmanager.cli.models.referrals import AlasccaBloodReferral, AlasccaTissueReferral
+# The referral database libraries pull in SQLAlchemy, and are therefore only imported when
+# the referral database is queried.
+
+
+def create_sql_session(db_config_file):
+    from reportgen.reporting.util import create_sql_session as reportgen_create_sql_session
+    return reportgen_create_sql_session(db_config_file)
+
+
+def query_database(sample_barcode, referral_type, session):
+    from reportgen.reporting.metadata import query_database as reportgen_query_database
+    return reportgen_query_database(sample_barcode, referral_type, session)
 
 
 def get_hospital_code(sample_barcode, referral_type, db_config_file):
@@ -92,6 +101,8 @@ def only_alascca_class_report(blood_barcode, tissue_barcode, db_config_file):
                          "NORWAY": "full",
                          "SWEDEN": "full"}
     
+    from referralmanager.cli.models.referrals import AlasccaBloodReferral, AlasccaTissueReferral
+
     # Get the hospital codes from the referrals
     hospital_blood = get_hospital_code(blood_barcode, AlasccaBloodReferral, db_config_file)
     hospital_tissue = get_hospital_code(tissue_barcode, AlasccaTissueReferral, db_config_file)
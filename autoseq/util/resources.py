@@ -0,0 +1,292 @@
+"""
+Per-job resource usage collection.
+
+Every pipeline job command is wrapped so that it runs under a small monitor process:
+
+    python -m autoseq.util.resources --output <stats.json> '<job command>'
+
+The monitor runs the command in a bash subshell, samples the process tree from /proc
+while it runs and collects user/sys CPU time from getrusage once it has finished. The
+resulting statistics are written as JSON and later merged into the job database.
+"""
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import click
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+# Interval, in seconds, between /proc samples of the monitored process tree:
+DEFAULT_SAMPLE_INTERVAL = 2.0
+
+# Maximum number of samples kept in the recorded time series; older samples are thinned out:
+MAX_RECORDED_SAMPLES = 500
+
+
+def read_proc_io(pid, proc_root="/proc"):
+    """
+    Read the I/O counters of a process.
+
+    :param pid: Process id.
+    :param proc_root: Location of the proc filesystem.
+    :return: Dictionary with rchar, wchar, read_bytes and write_bytes, or None if unavailable.
+    """
+    counters = {}
+    try:
+        with open(os.path.join(proc_root, str(pid), "io")) as io_file:
+            for line in io_file:
+                key, _, value = line.partition(":")
+                counters[key.strip()] = int(value.strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+    return dict((key, counters.get(key, 0)) for key in ["rchar", "wchar", "read_bytes", "write_bytes"])
+
+
+def read_proc_rss(pid, proc_root="/proc"):
+    """
+    Read the current resident set size of a process.
+
+    :param pid: Process id.
+    :param proc_root: Location of the proc filesystem.
+    :return: RSS in bytes, or 0 if unavailable.
+    """
+    try:
+        with open(os.path.join(proc_root, str(pid), "status")) as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    return 0
+
+
+def list_process_tree(root_pid, proc_root="/proc"):
+    """
+    List the process ids of the specified process and all of its descendants.
+
+    :param root_pid: Process id at the root of the tree.
+    :param proc_root: Location of the proc filesystem.
+    :return: List of process ids, starting with root_pid.
+    """
+    children = {}
+    try:
+        entries = os.listdir(proc_root)
+    except OSError:
+        return [root_pid]
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc_root, entry, "stat")) as stat_file:
+                stat = stat_file.read()
+        except (IOError, OSError):
+            continue
+        # The command name field is in parentheses and may contain spaces:
+        fields = stat[stat.rfind(")") + 2:].split()
+        if len(fields) > 1:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+
+    tree = [root_pid]
+    idx = 0
+    while idx < len(tree):
+        tree.extend(children.get(tree[idx], []))
+        idx += 1
+
+    return tree
+
+
+class ProcessTreeMonitor(object):
+    """
+    Tracks the peak total RSS and the cumulative I/O of a process tree by repeated sampling.
+
+    I/O of reaped descendants is accounted to their parent by the kernel, so summing the
+    most recent counters of every process seen gives the I/O of the whole tree, up to the
+    last sample.
+    """
+    def __init__(self, root_pid, proc_root="/proc"):
+        self.root_pid = root_pid
+        self.proc_root = proc_root
+        self.peak_rss = 0
+        self.n_samples = 0
+        self.last_io = {}
+        self.samples = []
+        self.sample_step = 1
+
+    def sample(self):
+        total_rss = 0
+        for pid in list_process_tree(self.root_pid, self.proc_root):
+            total_rss += read_proc_rss(pid, self.proc_root)
+            io_counters = read_proc_io(pid, self.proc_root)
+            if io_counters is not None:
+                self.last_io[pid] = io_counters
+
+        self.peak_rss = max(self.peak_rss, total_rss)
+        self.n_samples += 1
+        if self.n_samples % self.sample_step == 0:
+            self.record_sample(total_rss)
+
+    def record_sample(self, rss):
+        """
+        Record a (timestamp, rss, read_bytes, write_bytes) sample in the time series, halving
+        the resolution of the series whenever it grows beyond MAX_RECORDED_SAMPLES.
+        """
+        io_totals = self.io_totals()
+        self.samples.append([time.time(), rss, io_totals["read_bytes"], io_totals["write_bytes"]])
+        if len(self.samples) > MAX_RECORDED_SAMPLES:
+            self.samples = self.samples[::2]
+            self.sample_step *= 2
+
+    def io_totals(self):
+        totals = {"rchar": 0, "wchar": 0, "read_bytes": 0, "write_bytes": 0}
+        for io_counters in self.last_io.values():
+            for key in totals:
+                totals[key] += io_counters[key]
+        return totals
+
+
+def run_and_monitor(command, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Run the specified shell command and collect its resource usage.
+
+    :param command: Shell command string, run with bash.
+    :param sample_interval: Seconds between samples of the process tree.
+    :return: Dictionary of resource usage statistics, including the exit status.
+    """
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    starttime = time.time()
+    process = subprocess.Popen(["/bin/bash", "-c", command])
+    monitor = ProcessTreeMonitor(process.pid)
+
+    while process.poll() is None:
+        monitor.sample()
+        # Sleep in short steps so that short jobs are not delayed by a full interval:
+        waited = 0.0
+        while waited < sample_interval and process.poll() is None:
+            time.sleep(0.05)
+            waited += 0.05
+
+    endtime = time.time()
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    io_totals = monitor.io_totals()
+
+    # ru_maxrss is in kilobytes on Linux and refers to the largest single descendant,
+    # whereas the sampled peak is the sum over the tree; report the larger of the two:
+    max_rss = max(monitor.peak_rss, usage_after.ru_maxrss * 1024)
+
+    # Fall back to block I/O counts (512 byte units) if /proc I/O counters are unavailable:
+    read_bytes = io_totals["read_bytes"]
+    write_bytes = io_totals["write_bytes"]
+    if not monitor.last_io:
+        read_bytes = (usage_after.ru_inblock - usage_before.ru_inblock) * 512
+        write_bytes = (usage_after.ru_oublock - usage_before.ru_oublock) * 512
+
+    return {
+        "exit_status": process.returncode,
+        "starttime": starttime,
+        "endtime": endtime,
+        "wall_seconds": endtime - starttime,
+        "user_cpu_seconds": usage_after.ru_utime - usage_before.ru_utime,
+        "sys_cpu_seconds": usage_after.ru_stime - usage_before.ru_stime,
+        "max_rss_bytes": max_rss,
+        "read_bytes": read_bytes,
+        "write_bytes": write_bytes,
+        "rchar": io_totals["rchar"],
+        "wchar": io_totals["wchar"],
+        "n_samples": monitor.n_samples,
+        "samples": monitor.samples,
+    }
+
+
+def write_usage(usage, output_filename):
+    """
+    Write resource usage statistics to a JSON file, atomically.
+    """
+    tmp_filename = output_filename + ".tmp"
+    with open(tmp_filename, 'w') as output_file:
+        json.dump(usage, output_file, sort_keys=True, indent=4)
+    os.rename(tmp_filename, output_filename)
+
+
+def monitored_command(command, output_filename, python=sys.executable):
+    """
+    Generate a shell command that runs the given command under the resource monitor.
+
+    :param command: The original shell command string.
+    :param output_filename: JSON file to write the resource usage statistics to.
+    :param python: Python interpreter to run the monitor with.
+    :return: The wrapped shell command string.
+    """
+    return "{python} -m autoseq.util.resources --output {output} {command}".format(
+        python=quote(python), output=quote(output_filename), command=quote(command))
+
+
+def load_usage(usage_filename):
+    """
+    Load resource usage statistics written by the monitor.
+
+    :return: Dictionary of statistics, or None if the file does not exist or cannot be parsed.
+    """
+    try:
+        with open(usage_filename) as usage_file:
+            return json.load(usage_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def add_usage_to_jobdb(jobdb_filename, usage_by_jobname):
+    """
+    Add resource usage statistics to the job records of a JSON job database.
+
+    :param jobdb_filename: JSON job database written by the pipeline.
+    :param usage_by_jobname: Dictionary with jobname as key and resource usage dictionary as value.
+    :return: Number of job records that were updated.
+    """
+    with open(jobdb_filename) as jobdb_file:
+        jobdb = json.load(jobdb_file)
+
+    n_updated = 0
+    for job in jobdb.get("jobs", []):
+        usage = usage_by_jobname.get(job.get("jobname"))
+        if usage is not None:
+            job["resources"] = usage
+            n_updated += 1
+
+    tmp_filename = jobdb_filename + ".tmp"
+    with open(tmp_filename, 'w') as jobdb_file:
+        json.dump(jobdb, jobdb_file, indent=4)
+    os.rename(tmp_filename, jobdb_filename)
+
+    return n_updated
+
+
+@click.command()
+@click.option('--output', required=True, help="JSON file to write resource usage statistics to")
+@click.option('--interval', default=DEFAULT_SAMPLE_INTERVAL, help="seconds between process tree samples")
+@click.argument('command', type=str)
+def monitor(output, interval, command):
+    usage = run_and_monitor(command, interval)
+    try:
+        write_usage(usage, output)
+    except (IOError, OSError) as e:
+        logger.warning("Could not write resource usage to {}: {}".format(output, e))
+
+    # Mirror the shell convention for commands terminated by a signal:
+    exit_status = usage["exit_status"]
+    sys.exit(exit_status if exit_status >= 0 else 128 - exit_status)
+
+
+if __name__ == '__main__':
+    monitor()
@@ -0,0 +1,263 @@
+"""
+Scratch space budgeting for pipeline jobs.
+
+Jobs that write temporary files get a private scratch directory, and are run through
+
+    python -m autoseq.util.scratch --root <scratch> --dir <job scratch dir> [--budget <bytes>]
+        [--factor <f>] [--input <file> ...] '<job command>'
+
+which estimates the scratch footprint of the job from the sizes of its input files, waits
+until the footprint fits within the scratch budget alongside the reservations of other jobs,
+and removes the job scratch directory once the job has finished. Reservations are kept in a
+ledger in the scratch root, shared by all pipelines using that scratch volume.
+"""
+import errno
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import click
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FILENAME = ".autoseq-scratch-ledger.json"
+JOB_DIR_PREFIX = "autoseq-job-"
+OWNER_FILENAME = ".owner"
+
+# Minimum reservation for any job using scratch space:
+MIN_RESERVATION_BYTES = 100 * 1024 ** 2
+
+# Estimated scratch usage of each tool, relative to the total size of its input files.
+# Jobs can override this by setting a scratch_factor attribute:
+SCRATCH_FACTORS = {
+    "Bwa": 1.0,
+    "Skewer": 1.2,
+    "Realignment": 0.2,
+    "PicardMarkDuplicates": 1.0,
+    "CNVkit": 0.1,
+    "FastqToBam": 0.5,
+    "AlignUnmappedBam": 1.0,
+    "GroupReadsByUmi": 1.0,
+    "CallDuplexConsensusReads": 0.5,
+    "FilterConsensusReads": 0.2,
+    "ClipBam": 0.2,
+    "VarDict": 0.01,
+    "VarDictForPureCN": 0.01,
+    "VcfAddSample": 1.0,
+    "MsiSensor": 0.01,
+    "Svcaller": 0.5,
+    "MakeQDNAseqTracks": 1.0,
+    "WriteAlasccaReport": 0.0,
+}
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(size):
+    """
+    Parse a size string such as "500G" or "2T" into a number of bytes.
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$', str(size).upper())
+    if not match:
+        raise ValueError("Invalid size: {}".format(size))
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def get_scratch_factor(job):
+    """
+    :return: The scratch usage factor of the specified job, or None if it does not use scratch space.
+    """
+    factor = getattr(job, "scratch_factor", None)
+    if factor is None:
+        factor = SCRATCH_FACTORS.get(job.__class__.__name__)
+    return factor
+
+
+def estimate_reservation(inputs, factor, min_bytes=MIN_RESERVATION_BYTES):
+    """
+    Estimate the scratch footprint of a job from the sizes of its existing input files.
+    """
+    input_bytes = 0
+    for input_file in inputs:
+        try:
+            input_bytes += os.path.getsize(input_file)
+        except OSError:
+            pass
+    return max(int(factor * input_bytes), min_bytes)
+
+
+def pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def owner_is_alive(owner):
+    """
+    Determine whether the process owning a reservation or job directory is still running.
+    Owners on other hosts are assumed to be alive.
+    """
+    if owner.get("host") != socket.gethostname():
+        return True
+    return pid_is_alive(owner.get("pid"))
+
+
+class ScratchLedger(object):
+    """
+    File-locked record of the scratch space reserved by running jobs.
+    """
+    def __init__(self, root):
+        self.filename = os.path.join(root, LEDGER_FILENAME)
+
+    def _update(self, update_function):
+        with open(self.filename, 'a+') as ledger_file:
+            fcntl.flock(ledger_file, fcntl.LOCK_EX)
+            ledger_file.seek(0)
+            content = ledger_file.read()
+            reservations = json.loads(content) if content.strip() else {}
+            result = update_function(reservations)
+            ledger_file.seek(0)
+            ledger_file.truncate()
+            json.dump(reservations, ledger_file)
+            return result
+
+    @staticmethod
+    def _prune(reservations):
+        for key, reservation in list(reservations.items()):
+            if not owner_is_alive(reservation):
+                logger.info("Dropping stale scratch reservation for {}".format(reservation.get("dir")))
+                del reservations[key]
+
+    def try_reserve(self, key, n_bytes, budget, job_dir=None):
+        """
+        Reserve scratch space if it fits within the budget. A job that is larger than the whole
+        budget is admitted when no other reservations are held, so that it can still run.
+
+        :return: True if the reservation was made.
+        """
+        def reserve(reservations):
+            self._prune(reservations)
+            reserved = sum(r["bytes"] for r in reservations.values())
+            if budget is not None and reservations and reserved + n_bytes > budget:
+                return False
+            reservations[key] = {"host": socket.gethostname(), "pid": os.getpid(), "bytes": n_bytes,
+                                 "dir": job_dir, "since": time.time()}
+            return True
+
+        return self._update(reserve)
+
+    def reserve(self, key, n_bytes, budget, job_dir=None, poll_interval=10):
+        """
+        Wait until the scratch space can be reserved within the budget.
+        """
+        waited = False
+        while not self.try_reserve(key, n_bytes, budget, job_dir):
+            if not waited:
+                logger.info("Waiting for {} bytes of scratch space to become available".format(n_bytes))
+                waited = True
+            time.sleep(poll_interval)
+
+    def release(self, key):
+        self._update(lambda reservations: reservations.pop(key, None))
+
+    def prune(self):
+        self._update(self._prune)
+
+    def reserved_bytes(self):
+        return self._update(lambda reservations: sum(r["bytes"] for r in reservations.values()))
+
+
+def clean_orphans(root):
+    """
+    Remove job scratch directories left behind by killed jobs on this host, and drop their
+    reservations from the ledger.
+
+    :param root: Scratch root directory.
+    :return: List of removed directories.
+    """
+    if not os.path.isdir(root):
+        return []
+
+    removed = []
+    for entry in os.listdir(root):
+        job_dir = os.path.join(root, entry)
+        if not entry.startswith(JOB_DIR_PREFIX) or not os.path.isdir(job_dir):
+            continue
+        try:
+            with open(os.path.join(job_dir, OWNER_FILENAME)) as owner_file:
+                owner = json.load(owner_file)
+        except (IOError, ValueError):
+            continue
+        if not owner_is_alive(owner):
+            logger.info("Removing orphaned scratch directory {}".format(job_dir))
+            shutil.rmtree(job_dir, ignore_errors=True)
+            removed.append(job_dir)
+
+    ScratchLedger(root).prune()
+    return removed
+
+
+def run_in_job_dir(command, root, job_dir, n_bytes, budget=None, poll_interval=10):
+    """
+    Run a command in a private scratch directory, once its scratch footprint fits within the budget.
+
+    :return: Exit status of the command.
+    """
+    ledger = ScratchLedger(root)
+    key = os.path.basename(job_dir)
+    ledger.reserve(key, n_bytes, budget, job_dir, poll_interval)
+    try:
+        if not os.path.isdir(job_dir):
+            os.makedirs(job_dir)
+        with open(os.path.join(job_dir, OWNER_FILENAME), 'w') as owner_file:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid()}, owner_file)
+        return subprocess.call(["/bin/bash", "-c", command])
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        ledger.release(key)
+
+
+def scratch_command(command, root, job_dir, inputs, factor, budget=None, python=sys.executable):
+    """
+    Generate a shell command that runs the given command with a scratch reservation.
+    """
+    options = ["--root", root, "--dir", job_dir, "--factor", str(factor)]
+    if budget is not None:
+        options += ["--budget", str(budget)]
+    for input_file in inputs:
+        options += ["--input", input_file]
+    return "{} -m autoseq.util.scratch {} {}".format(
+        quote(python), " ".join(quote(option) for option in options), quote(command))
+
+
+@click.command()
+@click.option('--root', required=True, help="scratch root directory holding the reservation ledger")
+@click.option('--dir', 'job_dir', required=True, help="scratch directory of the job")
+@click.option('--budget', default=None, type=int, help="total scratch budget in bytes")
+@click.option('--factor', default=1.0, help="scratch usage relative to the total size of the input files")
+@click.option('--input', 'inputs', multiple=True, help="input file of the job")
+@click.option('--poll-interval', default=10, help="seconds between attempts to reserve scratch space")
+@click.argument('command', type=str)
+def main(root, job_dir, budget, factor, inputs, poll_interval, command):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(asctime)s %(funcName)s - %(message)s')
+    n_bytes = estimate_reservation(inputs, factor)
+    exit_status = run_in_job_dir(command, root, job_dir, n_bytes, budget, poll_interval)
+    sys.exit(exit_status if exit_status >= 0 else 128 - exit_status)
+
+
+if __name__ == '__main__':
+    main()
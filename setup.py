@@ -16,7 +16,8 @@ setup(name='autoseq',
               'autoseq = autoseq.cli.cli:cli',
               'report2json = autoseq.report2json:main',
               'generate-ref = autoseq.generate_ref:main',
-              'jobs2gantt = autoseq.cli.jobs2gantt:cli'
+              'jobs2gantt = autoseq.cli.jobs2gantt:cli',
+              'autoseq-jobdb = autoseq.cli.jobdb:cli'
           ]
       }
       )
@@ -0,0 +1,199 @@
+"""
+Benchmarks of configuration-time hot paths.
+
+The benchmarks are skipped unless the AUTOSEQ_BENCHMARK environment variable is set:
+
+    AUTOSEQ_BENCHMARK=1 py.test tests/benchmarks
+
+Each measurement is compared with the corresponding entry in the baselines JSON file
+(AUTOSEQ_BENCHMARK_BASELINES, defaulting to baselines.json in this directory), and fails if
+it exceeds the baseline by more than a factor AUTOSEQ_BENCHMARK_TOLERANCE (default 1.5). A
+benchmark fails if it does not finish within AUTOSEQ_BENCHMARK_TIMEOUT seconds (default 3600).
+Measurements without a baseline are recorded as new baselines, and all baselines are
+overwritten if AUTOSEQ_BENCHMARK_UPDATE is set.
+"""
+import Queue
+import json
+import multiprocessing
+import os
+import resource
+import time
+import unittest
+
+BENCHMARKS_ENABLED = bool(os.environ.get("AUTOSEQ_BENCHMARK"))
+BASELINES_FILENAME = os.environ.get("AUTOSEQ_BENCHMARK_BASELINES",
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json"))
+TOLERANCE = float(os.environ.get("AUTOSEQ_BENCHMARK_TOLERANCE", 1.5))
+UPDATE_BASELINES = bool(os.environ.get("AUTOSEQ_BENCHMARK_UPDATE"))
+TIMEOUT = float(os.environ.get("AUTOSEQ_BENCHMARK_TIMEOUT", 3600))
+
+# Interval, in seconds, at which to check that a benchmark process is still running:
+POLL_INTERVAL = 1.0
+
+# Measurements below these values are not compared, as they are dominated by noise:
+MIN_COMPARED = {"seconds": 0.05, "peak_memory_mb": 5.0}
+
+skip_unless_enabled = unittest.skipUnless(BENCHMARKS_ENABLED, "set AUTOSEQ_BENCHMARK=1 to run benchmarks")
+
+
+def _status_mb(field):
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    raise KeyError(field)
+
+
+def current_memory_mb():
+    try:
+        return _status_mb("VmRSS")
+    except (IOError, KeyError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def reset_peak_memory():
+    try:
+        with open("/proc/self/clear_refs", 'w') as clear_refs:
+            clear_refs.write("5")
+    except IOError:
+        pass
+
+
+def peak_memory_mb():
+    try:
+        return _status_mb("VmHWM")
+    except (IOError, KeyError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class StageTimer(object):
+    """
+    Records the wall-clock time and peak memory growth of consecutive stages of a benchmark.
+    """
+    def __init__(self):
+        self.measurements = {}
+
+    def measure(self, stage, function, *args, **kwargs):
+        reset_peak_memory()
+        start_memory = current_memory_mb()
+        start = time.time()
+        result = function(*args, **kwargs)
+        self.measurements[stage] = {"seconds": time.time() - start,
+                                    "peak_memory_mb": max(peak_memory_mb() - start_memory, 0.0)}
+        return result
+
+
+def _run_in_child(queue, function, args):
+    timer = StageTimer()
+    try:
+        function(timer, *args)
+        queue.put((timer.measurements, None))
+    except Exception as e:
+        queue.put((None, "{}: {}".format(e.__class__.__name__, e)))
+
+
+def run_benchmark(function, *args, **kwargs):
+    """
+    Run a benchmark function in a separate process, so that its memory usage is not affected
+    by earlier benchmarks.
+
+    :param function: Function taking a StageTimer followed by args, and using the timer to
+    measure each of its stages.
+    :param timeout: Seconds to wait for the benchmark to finish; TIMEOUT by default.
+    :return: Dictionary with stage as key and dictionary of measurements as value.
+    :raises RuntimeError: If the benchmark fails, times out, or its process exits without
+    reporting, e.g. because it was killed when running out of memory.
+    """
+    timeout = kwargs.pop("timeout", TIMEOUT)
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_in_child, args=(queue, function, args))
+    process.start()
+    deadline = time.time() + timeout
+    while True:
+        try:
+            measurements, error = queue.get(timeout=POLL_INTERVAL)
+            break
+        except Queue.Empty:
+            if not process.is_alive():
+                process.join()
+                # The process may have reported just before exiting:
+                if not queue.empty():
+                    continue
+                raise RuntimeError("Benchmark process exited with code {} without reporting".format(
+                    process.exitcode))
+            if time.time() > deadline:
+                process.terminate()
+                process.join()
+                raise RuntimeError("Benchmark did not finish within {} seconds".format(timeout))
+    process.join()
+    if error:
+        raise RuntimeError(error)
+    return measurements
+
+
+def load_baselines(filename=BASELINES_FILENAME):
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as baselines_file:
+        return json.load(baselines_file)
+
+
+def save_baselines(baselines, filename=BASELINES_FILENAME):
+    with open(filename, 'w') as baselines_file:
+        json.dump(baselines, baselines_file, indent=4, sort_keys=True)
+        baselines_file.write("\n")
+
+
+def find_regressions(name, measurements, baselines, tolerance=TOLERANCE):
+    """
+    Compare measurements with their baselines.
+
+    :return: List of strings describing the measurements exceeding their baseline by more
+    than the tolerance factor.
+    """
+    regressions = []
+    for stage, stage_measurements in sorted(measurements.items()):
+        baseline = baselines.get("{}/{}".format(name, stage), {})
+        for metric, value in sorted(stage_measurements.items()):
+            if metric not in baseline:
+                continue
+            limit = max(baseline[metric], MIN_COMPARED.get(metric, 0)) * tolerance
+            if value > limit:
+                regressions.append("{}/{} {}: {:.3f} > {:.3f} (baseline {:.3f})".format(
+                    name, stage, metric, value, limit, baseline[metric]))
+    return regressions
+
+
+def record_baselines(name, measurements, baselines, update=UPDATE_BASELINES):
+    """
+    Add measurements to the baselines where they are missing, or everywhere if update is True.
+
+    :return: True if the baselines were modified.
+    """
+    modified = False
+    for stage, stage_measurements in measurements.items():
+        key = "{}/{}".format(name, stage)
+        if update or key not in baselines:
+            baselines[key] = dict((metric, round(value, 3)) for metric, value in stage_measurements.items())
+            modified = True
+    return modified
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    """
+    Base class for benchmarks, checking each benchmark against the shared baselines file.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.baselines = load_baselines()
+
+    def check_benchmark(self, name, function, *args):
+        measurements = run_benchmark(function, *args)
+        for stage, stage_measurements in sorted(measurements.items()):
+            print("{}/{}: {:.3f} s, {:.1f} MB".format(name, stage, stage_measurements["seconds"],
+                                                      stage_measurements["peak_memory_mb"]))
+        regressions = [] if UPDATE_BASELINES else find_regressions(name, measurements, self.baselines)
+        if record_baselines(name, measurements, self.baselines):
+            save_baselines(self.baselines)
+        self.assertEqual(regressions, [])
+        return measurements
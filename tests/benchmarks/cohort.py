@@ -0,0 +1,159 @@
+"""
+Synthetic cohorts for benchmarking pipeline construction.
+
+A cohort consists of a library directory containing a fastq pair for every clinseq barcode,
+a sample JSON listing those barcodes, and reference data in which every file name exists
+as an empty file.
+"""
+import json
+import os
+
+# Two-letter capture kit codes, and the names under which they appear in the reference data:
+CAPTURE_KITS = [("TT", "test-regions"), ("CM", "monitor"), ("CP", "progression")]
+
+# Name under which the low-pass whole genome "capture" appears in the reference data:
+LOWPASS_WGS = "lowpass_wgs"
+
+PREP_KIT = ("TP", "THRUPLEX_PLASMASEQ")
+
+TARGET_FILES = {
+    "targets-bed-slopped20": "{}.slopped20.bed.gz",
+    "targets-interval_list": "{}.interval_list",
+    "targets-interval_list-slopped20": "{}.slopped20.interval_list",
+    "msisites": "{}.msisites.tsv",
+    "msings-baseline": "{}.msings.baseline",
+    "msings-bed": "{}.msings.bed",
+    "msings-msi_intervals": "{}.msings.msi_intervals",
+    "purecn_targets": "{}.purecn.txt",
+}
+
+REFERENCE_FILES = {
+    "bwaIndex": "genome/genome.fasta",
+    "chrsizes": "genome/genome.chrsizes.txt",
+    "reference_genome": "genome/genome.fasta",
+    "reference_dict": "genome/genome.dict",
+    "dbSNP": "variants/dbsnp.vcf.gz",
+    "1KG": "variants/1kg.vcf.gz",
+    "Mills_and_1KG_gold_standard": "variants/mills.vcf.gz",
+    "swegene_common": "variants/swegen_common.vcf.gz",
+    "brca_exchange": "variants/brca_exchange.vcf.gz",
+    "oncokb": "variants/oncokb.txt",
+    "ar_regions": "intervals/ar_regions.bed",
+    "ts_regions": "intervals/ts_regions.bed",
+    "fusion_regions": "intervals/fusion_regions.bed",
+}
+
+
+def touch(filename):
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    open(filename, 'a').close()
+
+
+def make_sampledata(n_captures, sdid="P-00000001", project="LB", lowpass=True):
+    """
+    Generate sample data with one normal sample, captured with every capture kit, and a series
+    of cfDNA timepoints, each captured with one of the capture kits in turn.
+
+    :param n_captures: Total number of panel captures.
+    :param lowpass: If True, then every sample also has a low-pass whole genome library.
+    :return: Sample data dictionary, in the format of a sample JSON.
+    """
+    sampledata = {"sdid": sdid, "N": [], "T": [], "CFDNA": []}
+    prep_code = PREP_KIT[0]
+    normal_id = "{:08d}".format(1)
+    normal_kits = CAPTURE_KITS[:n_captures]
+    for capture_code, _ in normal_kits:
+        sampledata["N"].append("-".join([project, sdid, "N", normal_id, prep_code + "1", capture_code + "1"]))
+    if lowpass:
+        sampledata["N"].append("-".join([project, sdid, "N", normal_id, prep_code + "1", "WGS"]))
+
+    for timepoint in range(n_captures - len(normal_kits)):
+        sample_id = "{:08d}".format(timepoint + 2)
+        capture_code = CAPTURE_KITS[timepoint % len(CAPTURE_KITS)][0]
+        sampledata["CFDNA"].append("-".join([project, sdid, "CFDNA", sample_id, prep_code + "1", capture_code + "1"]))
+        if lowpass:
+            sampledata["CFDNA"].append("-".join([project, sdid, "CFDNA", sample_id, prep_code + "1", "WGS"]))
+
+    return sampledata
+
+
+def make_alascca_sampledata(sdid="P-00000001", project="AL"):
+    """
+    Generate sample data with one normal and one tumour sample, both captured with the first
+    capture kit, as an ALASCCA analysis requires.
+
+    :return: Sample data dictionary, in the format of a sample JSON.
+    """
+    prep_code, capture_code = PREP_KIT[0], CAPTURE_KITS[0][0]
+    return {"sdid": sdid, "CFDNA": [],
+            "N": ["-".join([project, sdid, "N", "{:08d}".format(1), prep_code + "1", capture_code + "1"])],
+            "T": ["-".join([project, sdid, "T", "{:08d}".format(2), prep_code + "1", capture_code + "1"])]}
+
+
+def make_libdir(libdir, sampledata):
+    """
+    Create an empty fastq pair for every clinseq barcode in the sample data.
+    """
+    for sample_type in ["N", "T", "CFDNA"]:
+        for clinseq_barcode in sampledata[sample_type]:
+            for read in [1, 2]:
+                touch(os.path.join(libdir, clinseq_barcode, "{}_{}.fastq.gz".format(clinseq_barcode, read)))
+
+
+def make_refdata(refdir):
+    """
+    Create reference data covering all capture kits, in which every file exists but is empty.
+
+    :return: Reference data dictionary with absolute paths, as loaded by load_ref().
+    """
+    refdata = dict((key, os.path.join(refdir, filename)) for key, filename in REFERENCE_FILES.items())
+    refdata["vep_dir"] = os.path.join(refdir, "vep")
+    refdata["targets"] = {}
+    prep_kit_name = PREP_KIT[1]
+    for capture_name in [name for _, name in CAPTURE_KITS] + [LOWPASS_WGS]:
+        target_dir = os.path.join(refdir, "intervals", "targets")
+        targets = dict((key, os.path.join(target_dir, filename.format(capture_name)))
+                       for key, filename in TARGET_FILES.items())
+        targets["blacklist-bed"] = None
+        targets["cnvkit-ref"] = {prep_kit_name: dict(
+            (sample_type, os.path.join(target_dir, "{}.{}.{}.cnn".format(capture_name, prep_kit_name, sample_type)))
+            for sample_type in ["N", "CFDNA"])}
+        targets["cnvkit-fix"] = {prep_kit_name: dict(
+            (sample_type, os.path.join(target_dir, "{}.{}.{}.cnvkit-fix.tsv".format(
+                capture_name, prep_kit_name, sample_type)))
+            for sample_type in ["N", "CFDNA"])}
+        refdata["targets"][capture_name] = targets
+
+    for filename in iter_filenames(refdata):
+        touch(filename)
+    os.makedirs(refdata["vep_dir"])
+    return refdata
+
+
+def iter_filenames(refdata):
+    for key, value in refdata.items():
+        if isinstance(value, dict):
+            for filename in iter_filenames(value):
+                yield filename
+        elif value is not None and key != "vep_dir":
+            yield value
+
+
+def make_cohort(dirname, n_captures, lowpass=True, sampledata=None):
+    """
+    Create a synthetic cohort in the specified directory.
+
+    :param sampledata: Sample data of the cohort; generated by make_sampledata() by default.
+    :return: Tuple of (sample JSON filename, reference data dictionary, library directory).
+    """
+    if sampledata is None:
+        sampledata = make_sampledata(n_captures, lowpass=lowpass)
+    libdir = os.path.join(dirname, "libraries")
+    make_libdir(libdir, sampledata)
+    refdata = make_refdata(os.path.join(dirname, "genome"))
+    sample_filename = os.path.join(dirname, "sample.json")
+    with open(sample_filename, 'w') as sample_file:
+        json.dump(sampledata, sample_file, indent=4)
+    return sample_filename, refdata, libdir
@@ -0,0 +1,52 @@
+import random
+
+from benchmarks import BenchmarkTestCase, skip_unless_enabled
+
+N_RECORDS = 200000
+
+HEADER = ["##fileformat=VCFv4.1\n",
+          "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTUMOR\tNORMAL\n"]
+
+
+def vardict_lines(n_records, seed=0):
+    """
+    Generate VarDict-like somatic VCF lines with random depths, frequencies and qualities.
+    """
+    rng = random.Random(seed)
+    lines = list(HEADER)
+    for i in range(n_records):
+        samples = [":".join(["0/1", str(rng.randint(1, 500)), "10", "10,5", "{:.4f}".format(rng.uniform(0, 0.6)),
+                             "5,5", "3,2", "{:.1f}".format(rng.uniform(0, 4)), "{:.1f}".format(rng.uniform(30, 60))])
+                   for _ in range(2)]
+        lines.append("\t".join(["1", str(i + 1), ".", "A", "T", "{:.1f}".format(rng.uniform(0, 100)), "PASS",
+                                "STATUS=StrongSomatic;SSF={:.4f}".format(rng.uniform(0, 0.2)),
+                                "GT:DP:VD:AD:AF:RD:ALD:NM:MQ"] + samples) + "\n")
+    return lines
+
+
+def filter_vardict(timer, n_records):
+    from autoseq.util.bcbio import depth_freq_filter, depth_freq_filter_batch, call_somatic, \
+        call_somatic_batch, read_blocks
+
+    lines = vardict_lines(n_records)
+    per_line = timer.measure("depth_freq_filter", lambda: [depth_freq_filter(line, 0, "bwa") for line in lines])
+    batch = timer.measure("depth_freq_filter_batch", lambda: [
+        output for block in read_blocks(iter(lines)) for output in depth_freq_filter_batch(block, 0, "bwa")])
+    if batch != per_line:
+        raise AssertionError("depth_freq_filter_batch output differs from depth_freq_filter")
+
+    per_line = timer.measure("call_somatic", lambda: [call_somatic(line) for line in lines])
+    batch = timer.measure("call_somatic_batch", lambda: [
+        output for block in read_blocks(iter(lines)) for output in call_somatic_batch(block)])
+    if batch != per_line:
+        raise AssertionError("call_somatic_batch output differs from call_somatic")
+
+
+@skip_unless_enabled
+class TestBcbioFilters(BenchmarkTestCase):
+    def test_vardict_filters(self):
+        measurements = self.check_benchmark("bcbio-vardict-{}".format(N_RECORDS), filter_vardict, N_RECORDS)
+        for function in ["depth_freq_filter", "call_somatic"]:
+            speedup = measurements[function]["seconds"] / measurements[function + "_batch"]["seconds"]
+            print("{}: {:.1f}x speedup".format(function, speedup))
+            self.assertGreater(speedup, 1.0)
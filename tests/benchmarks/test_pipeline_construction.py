@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+
+from benchmarks import BenchmarkTestCase, skip_unless_enabled
+from benchmarks.cohort import make_alascca_sampledata, make_cohort
+
+COHORT_SIZES = [1, 10, 100, 500]
+
+
+def export_dot(pipeline, dot_filename):
+    from networkx.drawing.nx_pydot import write_dot
+    write_dot(pipeline.graph, dot_filename)
+
+
+def measure_rendering(timer, pipeline, dirname):
+    timer.measure("commands", lambda: [job.command() for job in pipeline.graph.nodes()])
+    timer.measure("wrap", pipeline.configure_job_wrappers)
+    timer.measure("wrapped_commands", lambda: [job.command() for job in pipeline.graph.nodes()])
+    timer.measure("dot", export_dot, pipeline, os.path.join(dirname, "pipeline.dot"))
+
+
+def construct_liqbio(timer, dirname, n_captures, umi):
+    """
+    Benchmark the configuration of a liqbio pipeline for a synthetic cohort, followed by
+    rendering all job commands, wrapping them, and exporting the job graph.
+    """
+    from autoseq.pipeline.liqbio import LiqBioPipeline
+
+    sample_filename, refdata, libdir = make_cohort(dirname, n_captures)
+    with open(sample_filename) as sample_file:
+        sampledata = json.load(sample_file)
+
+    outdir = os.path.join(dirname, "output")
+    job_params = {"collect-resource-usage": True, "eager-intermediate-cleanup": True}
+    pipeline = timer.measure("construct", LiqBioPipeline, sampledata, refdata, job_params, outdir,
+                             libdir, umi, scratch=os.path.join(dirname, "scratch"))
+    measure_rendering(timer, pipeline, dirname)
+
+
+def construct_alascca(timer, dirname):
+    """
+    Benchmark the configuration of an ALASCCA pipeline, which analyses a single tumour and
+    normal pair, followed by the same steps as construct_liqbio(). The report jobs are left out,
+    as configuring them queries the referral database.
+    """
+    from autoseq.pipeline.alascca import AlasccaPipeline
+
+    sample_filename, refdata, libdir = make_cohort(dirname, 2, sampledata=make_alascca_sampledata())
+    with open(sample_filename) as sample_file:
+        sampledata = json.load(sample_file)
+
+    outdir = os.path.join(dirname, "output")
+    job_params = {"collect-resource-usage": True, "eager-intermediate-cleanup": True,
+                  "create_alascca_report": False}
+    pipeline = timer.measure("construct", AlasccaPipeline, sampledata, refdata, job_params, outdir,
+                             libdir, scratch=os.path.join(dirname, "scratch"))
+    measure_rendering(timer, pipeline, dirname)
+
+
+# ClinseqPipeline itself is not benchmarked, as its constructor configures no jobs; the
+# configuration methods it provides are benchmarked through LiqBioPipeline and AlasccaPipeline.
+
+
+@skip_unless_enabled
+class TestPipelineConstruction(BenchmarkTestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def check_liqbio(self, umi):
+        for n_captures in COHORT_SIZES:
+            name = "liqbio{}-{}".format("-umi" if umi else "", n_captures)
+            self.check_benchmark(name, construct_liqbio, os.path.join(self.dirname, name), n_captures, umi)
+
+    def test_liqbio(self):
+        self.check_liqbio(umi=False)
+
+    def test_liqbio_umi(self):
+        self.check_liqbio(umi=True)
+
+    def test_alascca(self):
+        self.check_benchmark("alascca", construct_alascca, os.path.join(self.dirname, "alascca"))
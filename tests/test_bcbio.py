@@ -0,0 +1,115 @@
+import random
+import unittest
+from StringIO import StringIO
+
+from autoseq.util.bcbio import *
+
+HEADER = ["##fileformat=VCFv4.1\n",
+          '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Total Depth">\n',
+          "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tTUMOR\tNORMAL\n"]
+
+VARDICT_FORMAT = "GT:DP:VD:AD:AF:RD:ALD:NM:MQ"
+FREEBAYES_FORMAT = "GT:DP:RO:AO:GL"
+
+
+def vardict_record(qual, ssf, tumor, normal, filter_value="PASS"):
+    return "\t".join(["17", "7578475", ".", "A", "AG", qual, filter_value,
+                      "STATUS=StrongSomatic;TYPE=Insertion;SSF={}".format(ssf), VARDICT_FORMAT,
+                      tumor, normal]) + "\n"
+
+
+def vardict_sample(dp, af, nm, mq):
+    return ":".join(["0/1", dp, "10", "10,5", af, "5,5", "3,2", nm, mq])
+
+
+def random_number(rng, low, high):
+    choice = rng.random()
+    if choice < 0.05:
+        return "."
+    elif choice < 0.08:
+        return ""
+    elif choice < 0.1:
+        return "nan"
+    return str(round(rng.uniform(low, high), rng.randint(0, 3)))
+
+
+def random_vardict_line(rng):
+    samples = [vardict_sample(random_number(rng, 0, 40), random_number(rng, 0, 0.6),
+                              random_number(rng, 0, 4), random_number(rng, 30, 60)) for _ in range(2)]
+    return vardict_record(random_number(rng, 0, 100), random_number(rng, 0, 0.2), samples[0], samples[1],
+                          rng.choice(["PASS", ".", "q22.5"]))
+
+
+def random_freebayes_line(rng):
+    samples = []
+    for _ in range(2):
+        gls = ",".join(str(round(rng.uniform(-30, 0), 2)) for _ in range(rng.choice([2, 3, 3, 6])))
+        samples.append(":".join(["0/1", "40", str(rng.randint(0, 40)),
+                                 ",".join(str(rng.randint(0, 20)) for _ in range(rng.choice([1, 2]))), gls]))
+    return "\t".join(["3", "178936091", ".", "G", "A", "55.5", rng.choice(["PASS", "."]), "TYPE=snp",
+                      FREEBAYES_FORMAT] + samples) + "\n"
+
+
+class TestBcbio(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(42)
+        self.vardict_lines = HEADER + [random_vardict_line(rng) for _ in range(500)]
+        self.freebayes_lines = HEADER + [random_freebayes_line(rng) for _ in range(500)]
+
+    def test_depth_freq_filter(self):
+        line = vardict_record("30", "0.5", vardict_sample("8", "0.5", "0", "60"), vardict_sample("20", "0", "0", "60"))
+        self.assertEquals(depth_freq_filter(line, 0, "bwa").split("\t")[6], "LowAlleleDepth")
+        line = vardict_record("50", "0.1", vardict_sample("80", "0.1", "0", "60"), vardict_sample("20", "0", "0", "60"))
+        self.assertEquals(depth_freq_filter(line, 0, "bwa").split("\t")[6], "LowFreqQuality")
+
+    def test_depth_freq_filter_batch_edge_cases(self):
+        lines = HEADER + [
+            # Poor mapping quality, only filtered for bwa:
+            vardict_record("80", "0.01", vardict_sample("20", "0.25", "3", "58"), vardict_sample("20", "0", "0", "60")),
+            # Missing and unparseable values:
+            vardict_record(".", "", vardict_sample(".", "0.1", "0", "60"), vardict_sample("20", "0", "0", "60")),
+            vardict_record("20", "0.5", "0/1:4", vardict_sample("20", "0", "0", "60"), "q22.5"),
+            # Multiple SSF entries, of which the first is used:
+            vardict_record("20", "0.5;SSF=0.01", vardict_sample("80", "0.1", "0", "60\n"),
+                           vardict_sample("20", "0", "0", "60\n"), "."),
+        ]
+        # Repeated FORMAT keys, with samples truncated before or after their last occurrence:
+        for tumor in ["1:5:0.05:0.05:nan", "1:5:0.05:0.05:nan:0.5", "1:5", "1:5:0.05:1:50:0.5:7"]:
+            lines.append("\t".join(["17", "7578475", ".", "A", "AG", "30", "PASS", "SSF=0.1", "GT:DP:AF:NM:MQ:AF",
+                                    tumor, "1:20:0:0:60:0"]) + "\n")
+        for aligner in ["bwa", "star"]:
+            for tumor_index in [0, 1]:
+                self.assertEquals(depth_freq_filter_batch(lines, tumor_index, aligner),
+                                  [depth_freq_filter(line, tumor_index, aligner) for line in lines])
+
+    def test_depth_freq_filter_batch(self):
+        self.assertEquals(depth_freq_filter_batch(self.vardict_lines, 0, "bwa"),
+                          [depth_freq_filter(line, 0, "bwa") for line in self.vardict_lines])
+
+    def test_depth_freq_filter_input_stream(self):
+        expected = "".join(depth_freq_filter(line, 0, "bwa") for line in self.vardict_lines)
+        self.assertEquals(depth_freq_filter_input_stream(StringIO("".join(self.vardict_lines)), 0, "bwa"),
+                          expected)
+
+    def test_call_somatic_batch_vardict(self):
+        self.assertEquals(call_somatic_batch(self.vardict_lines),
+                          [call_somatic(line) for line in self.vardict_lines])
+
+    def test_call_somatic_batch_freebayes(self):
+        self.assertEquals(call_somatic_batch(self.freebayes_lines),
+                          [call_somatic(line) for line in self.freebayes_lines])
+
+    def test_call_somatic_batch_unexpected_format(self):
+        line = "\t".join(["1", "100", ".", "A", "T", "50", "PASS", ".", "GT:DP", "0/1:10", "0/0:10"]) + "\n"
+        with self.assertRaises(NotImplementedError):
+            call_somatic(line)
+        with self.assertRaises(NotImplementedError):
+            call_somatic_batch([line])
+
+    def test_call_somatic_input_stream(self):
+        expected = "".join(call_somatic(line) for line in self.freebayes_lines)
+        self.assertEquals(call_somatic_input_stream(StringIO("".join(self.freebayes_lines))), expected)
+
+    def test_read_blocks(self):
+        blocks = list(read_blocks(StringIO("".join(self.vardict_lines)), block_size=200))
+        self.assertEquals([len(block) for block in blocks], [200, 200, 103])
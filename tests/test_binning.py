@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from mock import MagicMock, patch
+
+from autoseq.util.binning import *
+
+
+class TestBinning(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sequence_composition(self):
+        bases, gc = sequence_composition("ACGTNNNNggcc" + "AT", bin_size=4)
+        self.assertEquals(list(bases), [100, 0, 100, 100])
+        self.assertEquals(list(gc[[0, 2, 3]]), [50, 100, 0])
+        self.assertTrue(np.isnan(gc[1]))
+
+    def test_mean_per_bin(self):
+        intervals = (np.array([0, 5, 12]), np.array([5, 10, 14]), np.array([1.0, 0.5, 1.0]))
+        self.assertEquals(list(mean_per_bin(intervals, 15, 10)), [0.75, 0.4])
+        empty = (np.array([]), np.array([]), np.array([]))
+        self.assertEquals(list(mean_per_bin(empty, 15, 10)), [0, 0])
+
+    def test_annotations_round_trip(self):
+        fasta = os.path.join(self.tmpdir, "genome.fasta")
+        with open(fasta, 'w') as fasta_file:
+            fasta_file.write(">1 chromosome 1\nACGTAC\nGTNN\n>MT\nACGT\n>chr2\nGGGG\n")
+        mappability = {"1": (np.array([0]), np.array([5]), np.array([1.0]))}
+        annotations_file = os.path.join(self.tmpdir, "bins.txt")
+        with open(annotations_file, 'w') as output_file:
+            write_annotations(annotate_bins(fasta, bin_size=5, mappability=mappability), output_file)
+        with open(annotations_file) as annotations:
+            self.assertEquals(annotations.read().splitlines()[:3],
+                              ["chromosome\tstart\tend\tbases\tgc\tmappability", "1\t1\t5\t100\t40\t100",
+                               "1\t6\t10\t60\t66.6667\t0"])
+
+        annotations = read_annotations(annotations_file)
+        self.assertEquals(annotations.keys(), ["1", "chr2"])
+        self.assertEquals(list(annotations["1"].starts), [0, 5])
+        self.assertEquals(list(annotations["chr2"].mappability), [0])
+
+    def test_count_reads(self):
+        reads = [MagicMock(reference_start=start, flag=flag, mapping_quality=mapq)
+                 for start, flag, mapq in [(5, 0, 60), (12, 0, 60), (14, 0x400, 60), (15, 0, 10), (29, 0x1, 40)]]
+        bam = MagicMock()
+        bam.fetch.return_value = reads
+        self.assertEquals(list(count_reads(bam, "1", 3, 10, min_mapq=37)), [1, 1, 1])
+
+    @patch('autoseq.util.binning._count_chromosome')
+    def test_count_bins(self, mock_count_chromosome):
+        mock_count_chromosome.side_effect = lambda args: np.arange(args[2])
+        annotations = collections.OrderedDict([("1", BinAnnotations(np.array([0, 10]), np.array([10, 20]), None,
+                                                                    None, None))])
+        counts = count_bins("in.bam", annotations, min_mapq=20)
+        self.assertEquals(list(counts["1"]), [0, 1])
+        mock_count_chromosome.assert_called_once_with(("in.bam", "1", 2, 10, 20))
+
+    def test_correct_counts(self):
+        gc = np.array([40.0] * 20 + [60.0] * 20 + [np.nan])
+        counts = np.array([10.0] * 20 + [20.0] * 20 + [5])
+        use = ~np.isnan(gc)
+        corrected = correct_counts(counts, gc, np.full(41, 100.0), use)
+        self.assertTrue(np.allclose(corrected[:40], 1.0))
+        self.assertTrue(np.isnan(corrected[40]))
+
+        # Strata with few bins fall back to the median of the GC stratum:
+        mappability = np.array([100.0] * 19 + [50.0] + [100.0] * 21)
+        corrected = correct_counts(counts, gc, mappability, use)
+        self.assertEquals(corrected[19], 1.0)
+
+    def test_segment(self):
+        np.random.seed(1)
+        values = np.concatenate([np.zeros(50), np.ones(30), np.zeros(40)]) + np.random.normal(0, 0.1, 120)
+        self.assertEquals(segment(values), [(0, 50), (50, 80), (80, 120)])
+        self.assertEquals(segment(np.random.normal(0, 0.1, 100)), [(0, 100)])
+        self.assertEquals(segment([]), [])
+
+    def test_estimate_copy_number(self):
+        np.random.seed(2)
+        n_bins = 200
+        annotations = collections.OrderedDict()
+        counts = {}
+        for chrom in ["1", "X"]:
+            gc = np.random.choice([38.0, 42.0], n_bins)
+            annotations[chrom] = BinAnnotations(np.arange(n_bins) * 100, np.arange(1, n_bins + 1) * 100,
+                                                np.full(n_bins, 100.0), gc, np.full(n_bins, 100.0))
+            # Bins with low GC content have fewer reads, and the second half of chromosome 1 is gained:
+            expected = np.where(gc < 40, 80.0, 120.0) * np.where(np.arange(n_bins) >= 100, 1.5, 1.0)
+            counts[chrom] = np.random.poisson(expected)
+
+        estimates = estimate_copy_number(annotations, counts)
+        use, copynumber, segmented = estimates["1"]
+        self.assertTrue(use.all())
+        self.assertFalse(estimates["X"][0].any())
+        self.assertTrue(np.isnan(estimates["X"][2]).all())
+        self.assertEquals(len(set(segmented[:100])), 1)
+        self.assertEquals(len(set(segmented[100:])), 1)
+        self.assertAlmostEqual(segmented[150] / segmented[50], 1.5, delta=0.1)
+
+    def test_write_copy_number(self):
+        annotations = collections.OrderedDict([("1", BinAnnotations(np.array([0, 10]), np.array([10, 20]),
+                                                                    np.array([100.0, 0.0]), np.array([40.0, np.nan]),
+                                                                    np.array([100.0, 0.0])))])
+        output = StringIO()
+        write_copy_number(annotations, {"1": np.array([12, 0])},
+                          {"1": (np.array([True, False]), np.array([1.25, np.nan]), np.array([1.0, np.nan]))}, output)
+        self.assertEquals(output.getvalue().splitlines(),
+                          ["\t".join(OUTPUT_COLUMNS), "1:1-10\t1\t1\t10\t100\t40\t100\tTRUE\t12\t1.25\t1",
+                           "1:11-20\t1\t11\t20\t0\tNA\t0\tFALSE\t0\tNA\tNA"])
+
+    def test_call_command(self):
+        self.assertEquals(call_command("in.bam", "bins.txt", "out.txt", threads=4, python="python"),
+                          "python -m autoseq.util.binning call --bins bins.txt --threads 4 in.bam out.txt")
@@ -1,3 +1,9 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 from mock import patch, mock_open
 from autoseq.cli.cli import *
@@ -86,3 +92,112 @@ class TestCLI(unittest.TestCase):
         with patch('autoseq.cli.cli.open', mocked_open, create=True):
             loaded_ref = load_ref("/dummy/base/dir/dummy_file.json")
             self.assertEquals(loaded_ref["some_key"], "/dummy/base/dir/a_terminal_filename")
+
+
+class TestLoadRefCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.ref = os.path.join(self.tmpdir, "ref.json")
+        open(os.path.join(self.tmpdir, "genome.fasta"), 'w').close()
+        self.write_ref('{"reference_genome": "genome.fasta", "targets": {"panel": {"bed": "missing.bed"}}}')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        shutil.rmtree(self.cache_dir)
+
+    def write_ref(self, content, mtime=1000):
+        with open(self.ref, 'w') as ref_file:
+            ref_file.write(content)
+        os.utime(self.ref, (mtime, mtime))
+        os.utime(self.tmpdir, (mtime, mtime))
+
+    def test_load_ref_cached(self):
+        refdata = load_ref(self.ref, self.cache_dir)
+        self.assertEquals(refdata["reference_genome"], os.path.join(self.tmpdir, "genome.fasta"))
+        self.assertEquals(refdata["targets"]["panel"]["bed"], "missing.bed")
+
+        with patch('autoseq.cli.cli.make_paths_absolute') as mock_make_paths_absolute:
+            self.assertEquals(load_ref(self.ref, self.cache_dir), refdata)
+            # Touching the file without changing its content keeps the cached data valid:
+            os.utime(self.ref, (2000, 2000))
+            self.assertEquals(load_ref(self.ref, self.cache_dir), refdata)
+            self.assertFalse(mock_make_paths_absolute.called)
+
+    def test_load_ref_cache_invalidated(self):
+        load_ref(self.ref, self.cache_dir)
+        self.write_ref('{"reference_genome": "other.fasta"}', mtime=2000)
+        self.assertEquals(load_ref(self.ref, self.cache_dir), {"reference_genome": "other.fasta"})
+
+    def test_load_ref_cache_invalidated_by_subdirectory(self):
+        self.write_ref('{"reference_genome": "genome/genome.fasta", "bed": "intervals/targets/panel.bed"}')
+        os.mkdir(os.path.join(self.tmpdir, "genome"))
+        self.assertEquals(load_ref(self.ref, self.cache_dir)["reference_genome"], "genome/genome.fasta")
+
+        # Adding a file to an existing subdirectory changes its modification time:
+        genome_dir = os.path.join(self.tmpdir, "genome")
+        open(os.path.join(genome_dir, "genome.fasta"), 'w').close()
+        os.utime(genome_dir, (3000, 3000))
+        self.assertEquals(load_ref(self.ref, self.cache_dir)["reference_genome"],
+                          os.path.join(genome_dir, "genome.fasta"))
+
+        # Creating a missing subdirectory, along with its files, invalidates the cache too:
+        os.makedirs(os.path.join(self.tmpdir, "intervals", "targets"))
+        open(os.path.join(self.tmpdir, "intervals", "targets", "panel.bed"), 'w').close()
+        self.assertEquals(load_ref(self.ref, self.cache_dir)["bed"],
+                          os.path.join(self.tmpdir, "intervals", "targets", "panel.bed"))
+
+
+# Report the cumulative import time of each top-level package, similar to "python -X importtime",
+# and the modules loaded after running the specified statement:
+IMPORT_TIMING_SCRIPT = """
+import json, sys, time
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+import_times = {}
+original_import = builtins.__import__
+def timed_import(name, *args, **kwargs):
+    start = time.time()
+    try:
+        return original_import(name, *args, **kwargs)
+    finally:
+        package = name.split(".")[0]
+        import_times[package] = import_times.get(package, 0) + time.time() - start
+builtins.__import__ = timed_import
+start = time.time()
+try:
+    %s
+except SystemExit:
+    pass
+builtins.__import__ = original_import
+print(json.dumps({"seconds": time.time() - start, "import_times": import_times, "modules": sorted(sys.modules)}))
+"""
+
+HEAVY_MODULES = ["pypedream", "openpyxl", "reportgen", "referralmanager", "sqlalchemy",
+                 "autoseq.pipeline", "autoseq.tools"]
+
+
+class TestStartup(unittest.TestCase):
+    budget_seconds = float(os.environ.get("AUTOSEQ_STARTUP_BUDGET", 2.0))
+
+    def run_startup(self, statement):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_TIMING_SCRIPT % statement],
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return json.loads(output.decode().strip().splitlines()[-1])
+
+    def check_startup(self, statement):
+        report = self.run_startup(statement)
+        slowest = sorted(report["import_times"].items(), key=lambda item: -item[1])[:10]
+        summary = "\n".join("{:>8.3f}s {}".format(seconds, package) for package, seconds in slowest)
+        heavy = [m for m in report["modules"] if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)]
+        self.assertEquals(heavy, [], "Heavy modules loaded at startup:\n{}\n{}".format(heavy, summary))
+        self.assertLess(report["seconds"], self.budget_seconds,
+                        "Startup took {:.3f}s:\n{}".format(report["seconds"], summary))
+
+    def test_help_startup(self):
+        self.check_startup("from autoseq.cli.cli import cli; cli(['--help'])")
+
+    def test_liqbio_prepare_startup(self):
+        self.check_startup("import autoseq.cli.liqbio")
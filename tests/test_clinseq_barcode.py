@@ -182,3 +182,26 @@ class TestClinseqBarcode(unittest.TestCase):
         self.assertFalse(
             data_available_for_clinseq_barcode("test_libdir",
                                                "LB-P-00000001-CFDNA-01234567-TP201701011540-CM2017001022000"))
+
+    def test_clinseq_barcode_parse(self):
+        barcode = ClinseqBarcode.parse("LB-P-00000001-CFDNA-01234567-TP201701011540-CM2017001022000")
+        self.assertEquals(barcode.sdid, "P-00000001")
+        self.assertEquals(barcode.prep_id, "TP201701011540")
+        self.assertEquals(barcode.unique_capture, self.test_capture1)
+        self.assertFalse(hasattr(barcode, "__dict__"))
+
+    def test_clinseq_barcode_parse_memoized(self):
+        barcode_str = "LB-P-00000001-CFDNA-01234567-TP1-WGS"
+        self.assertIs(ClinseqBarcode.parse(barcode_str), ClinseqBarcode.parse(barcode_str))
+        self.assertEquals(ClinseqBarcode.parse(barcode_str).unique_capture, self.test_capture2)
+
+    def test_clinseq_barcode_parse_invalid(self):
+        self.assertRaises(ValueError, lambda: ClinseqBarcode.parse("LB-P-00000001-CFDNA-01234567-TP1-C1"))
+        self.assertRaises(ValueError, lambda: ClinseqBarcode.parse(None))
+        self.assertFalse(ClinseqBarcode.is_valid("LB-P-00000001-XX-01234567-TP1-CM1"))
+
+    def test_parse_fields(self):
+        barcode_str = "AL-P-NA12877-T-03098849-TD1-TT1"
+        self.assertEquals([parse_project(barcode_str), parse_sdid(barcode_str), parse_sample_type(barcode_str),
+                           parse_sample_id(barcode_str), parse_prep_id(barcode_str), parse_capture_id(barcode_str)],
+                          ["AL", "P-NA12877", "T", "03098849", "TD1", "TT1"])
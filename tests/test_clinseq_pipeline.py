@@ -1,5 +1,9 @@
 import unittest
 import itertools
+import os
+import pickle
+import shutil
+import tempfile
 from mock import patch
 from autoseq.pipeline.clinseq import *
 from autoseq.util.clinseq_barcode import UniqueCapture
@@ -263,6 +267,7 @@ class TestClinseq(unittest.TestCase):
         mock_get_capture_bam.return_value = "test.bam"
         self.test_clinseq_pipeline.configure_single_wgs_analyses(self.test_wg_capture)
         self.assertEquals(len(self.test_clinseq_pipeline.graph.nodes()), 2)
+        mock_get_capture_bam.assert_called_once_with(self.test_wg_capture, umi=False)
 
     def test_run_wgs_bam_qc(self):
         self.assertEquals(len(self.test_clinseq_pipeline.run_wgs_bam_qc(["test1.bam", "test2.bam"])),
@@ -428,3 +433,349 @@ class TestClinseq(unittest.TestCase):
         qc_files = self.test_clinseq_pipeline.configure_panel_qc(self.test_cancer_capture)
         self.assertEquals(len(self.test_clinseq_pipeline.graph.nodes()), 6)
         self.assertEquals(len(qc_files), 6)
+
+
+class TestClinseqStaging(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": ["AL-P-NA12877-N-03098121-TD1-TT1"], "CFDNA": []}
+        self.test_clinseq_pipeline = ClinseqPipeline(self.sample_data, {}, {}, "/tmp", "/nfs/LIQBIO/INBOX/exomes",
+                                                     umi=False)
+
+    @patch('autoseq.pipeline.clinseq.find_fastqs')
+    def test_get_fastqs_staged(self, mock_find_fastqs):
+        mock_find_fastqs.return_value = (["/nfs/lib/foo_1.fq.gz"], ["/nfs/lib/foo_2.fq.gz"])
+        self.test_clinseq_pipeline.stage_dir = "/local/raw"
+        barcode = "AL-P-NA12877-N-03098121-TD1-TT1"
+        expected = (["/local/raw/{}/foo_1.fq.gz".format(barcode)], ["/local/raw/{}/foo_2.fq.gz".format(barcode)])
+        self.assertEquals(self.test_clinseq_pipeline.get_fastqs(barcode), expected)
+        self.assertEquals(self.test_clinseq_pipeline.get_fastqs(barcode), expected)
+        self.assertEquals(len(self.test_clinseq_pipeline.staged_fastqs), 2)
+        self.assertEquals(len(self.test_clinseq_pipeline.graph.nodes()), 2)
+
+    @patch('autoseq.pipeline.clinseq.find_fastqs')
+    def test_get_fastqs_not_staged(self, mock_find_fastqs):
+        mock_find_fastqs.return_value = (["/nfs/lib/foo_1.fq.gz"], ["/nfs/lib/foo_2.fq.gz"])
+        self.assertEquals(self.test_clinseq_pipeline.get_fastqs("AL-P-NA12877-N-03098121-TD1-TT1"),
+                          (["/nfs/lib/foo_1.fq.gz"], ["/nfs/lib/foo_2.fq.gz"]))
+        self.assertEquals(self.test_clinseq_pipeline.staged_fastqs, {})
+
+
+class TestCaptureRegistry(unittest.TestCase):
+    def setUp(self):
+        self.cancer_capture = UniqueCapture("AL", "P-NA12877", "CFDNA", "03098850", "TD", "TT")
+        self.normal_capture = UniqueCapture("AL", "P-NA12877", "N", "03098121", "TD", "TT")
+        self.wg_capture = UniqueCapture("AL", "P-NA12877", "N", "03098121", "TD", "WG")
+        self.registry = CaptureRegistry()
+
+    def test_register_on_access(self):
+        self.registry[self.cancer_capture].cnr = "cancer.cnr"
+        self.assertIsInstance(self.registry[self.cancer_capture], SinglePanelResults)
+        self.assertEquals(self.registry.captures(), [self.cancer_capture])
+        self.assertEquals(self.registry.captures(wgs=False, normal=False), [self.cancer_capture])
+
+    def test_index(self):
+        for capture in [self.cancer_capture, self.normal_capture, self.wg_capture]:
+            self.registry[capture] = SinglePanelResults()
+        self.assertEquals(self.registry.captures(wgs=True), [self.wg_capture])
+        self.assertEquals(sorted(self.registry.captures(wgs=False)), sorted([self.cancer_capture,
+                                                                            self.normal_capture]))
+        self.assertEquals(self.registry.captures(wgs=False, normal=True), [self.normal_capture])
+        self.assertEquals(self.registry.captures(wgs=False, normal=False), [self.cancer_capture])
+        self.assertEquals(len(self.registry.captures()), 3)
+
+    def test_registration_order(self):
+        captures = [self.wg_capture, self.cancer_capture, self.normal_capture]
+        for capture in captures:
+            self.registry[capture] = SinglePanelResults()
+        # Re-registering a capture keeps its position:
+        self.registry[self.wg_capture] = SinglePanelResults()
+        self.assertEquals(self.registry.captures(), captures)
+        self.assertEquals(self.registry.captures(normal=True), [self.wg_capture, self.normal_capture])
+        self.assertEquals(pickle.loads(pickle.dumps(self.registry)).captures(), captures)
+
+    def test_delete(self):
+        self.registry[self.normal_capture] = SinglePanelResults()
+        del self.registry[self.normal_capture]
+        self.assertEquals(self.registry.captures(wgs=False, normal=True), [])
+
+    def test_from_dict(self):
+        registry = CaptureRegistry({self.wg_capture: 1})
+        self.assertEquals(registry[self.wg_capture], 1)
+        self.assertEquals(registry.captures(wgs=True), [self.wg_capture])
+
+    def test_kit_captures(self):
+        for capture in [self.wg_capture, self.cancer_capture, self.normal_capture]:
+            self.registry[capture] = SinglePanelResults()
+        self.assertEquals(self.registry.kit_captures("TT"), [self.cancer_capture, self.normal_capture])
+        self.assertEquals(self.registry.kit_captures("WG"), [self.wg_capture])
+        del self.registry[self.cancer_capture]
+        self.assertEquals(self.registry.kit_captures("TT"), [self.normal_capture])
+        self.assertEquals(self.registry.kit_captures("CS"), [])
+
+    def test_kit_names(self):
+        self.assertEquals(PREP_KIT_NAMES["TP"], "THRUPLEX_PLASMASEQ")
+        self.assertEquals(CAPTURE_KIT_NAMES["WG"], "lowpass_wgs")
+
+
+class TestClinseqCoverageQC(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": ["AL-P-NA12877-N-03098121-TD1-TT1"], "CFDNA": []}
+        self.ref_data = {
+            "reference_genome": "genome/test-genome-masked.fasta",
+            "targets": {
+                "test-regions": {
+                    "targets-bed-slopped20": "intervals/targets/test-regions-GRCh37.slopped20.bed.gz",
+                    "targets-interval_list-slopped20": "intervals/targets/test-regions-GRCh37.slopped20.interval_list"
+                }
+            }
+        }
+        self.normal_capture = UniqueCapture("AL", "P-NA12877", "N", "03098121", "TD", "TT")
+
+    def configure_panel_qc(self, job_params):
+        pipeline = ClinseqPipeline(self.sample_data, self.ref_data, job_params, "/tmp", "/nfs/LIQBIO/INBOX/exomes",
+                                   umi=False)
+        pipeline.capture_to_results[self.normal_capture].merged_bamfile = "normal.bam"
+        return pipeline, pipeline.configure_panel_qc(self.normal_capture)
+
+    def test_configure_panel_qc_native_coverage(self):
+        pipeline, qc_files = self.configure_panel_qc({"native-coverage-qc": True})
+        self.assertEquals(len(pipeline.graph.nodes()), 4)
+        self.assertEquals(qc_files[3:], ["/tmp/qc/sambamba/AL-P-NA12877-N-03098121-TD-TT.sambamba-depth-targets.txt",
+                                         "/tmp/qc/AL-P-NA12877-N-03098121-TD-TT.coverage-histogram.txt",
+                                         "/tmp/qc/AL-P-NA12877-N-03098121-TD-TT.coverage-qc-call.json"])
+        self.assertEquals(pipeline.capture_to_results[self.normal_capture].cov_qc_call, qc_files[-1])
+
+    def test_configure_panel_qc_same_outputs(self):
+        _, qc_files = self.configure_panel_qc({})
+        _, native_qc_files = self.configure_panel_qc({"native-coverage-qc": True})
+        self.assertEquals(qc_files, native_qc_files)
+
+    @patch('distutils.spawn.find_executable', return_value="/usr/bin/Rscript")
+    def test_configure_panel_qc_combined_picard_metrics(self, mock_find_executable):
+        _, qc_files = self.configure_panel_qc({})
+        pipeline, combined_qc_files = self.configure_panel_qc({"combined-picard-metrics": True})
+        mock_find_executable.assert_called_with("Rscript")
+        self.assertEquals(combined_qc_files[2:], qc_files[2:])
+        picard_jobs = [job for job in pipeline.graph.nodes() if job.jobname.startswith("picard")]
+        self.assertEquals(sorted(type(job).__name__ for job in picard_jobs),
+                          ["PicardCollectHsMetrics", "PicardCollectMultipleMetrics"])
+        # The insert size metrics stay at their path, while the OxoG metrics are replaced:
+        self.assertEquals(combined_qc_files[:2],
+                          [qc_files[0], "/tmp/qc/picard/TT/AL-P-NA12877-N-03098121-TD-TT.picard-multiplemetrics."
+                                        "pre_adapter_summary_metrics"])
+
+    @patch('distutils.spawn.find_executable', return_value=None)
+    def test_configure_panel_qc_combined_picard_metrics_without_r(self, mock_find_executable):
+        _, qc_files = self.configure_panel_qc({})
+        pipeline, combined_qc_files = self.configure_panel_qc({"combined-picard-metrics": True})
+        self.assertEquals(combined_qc_files, qc_files)
+        self.assertFalse([job for job in pipeline.graph.nodes() if isinstance(job, PicardCollectMultipleMetrics)])
+
+
+class TestClinseqFingerprinting(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": ["AL-P-NA12877-N-03098121-TD1-TT1"],
+                            "CFDNA": ["LB-P-NA12877-CFDNA-03098850-TD1-TT1"]}
+        self.ref_data = {"fingerprint_snps": "variants/fingerprint-snps.vcf.gz", "targets": {}}
+        self.test_clinseq_pipeline = ClinseqPipeline(self.sample_data, self.ref_data, {"fingerprint-db": "fp.db"},
+                                                     "/tmp", "/nfs/LIQBIO/INBOX/exomes", umi=False)
+        for capture in [UniqueCapture("AL", "P-NA12877", "N", "03098121", "TD", "TT"),
+                        UniqueCapture("LB", "P-NA12877", "CFDNA", "03098850", "TD", "TT")]:
+            self.test_clinseq_pipeline.capture_to_results[capture].merged_bamfile = \
+                "{}.bam".format(compose_lib_capture_str(capture))
+
+    def test_configure_fingerprinting(self):
+        qc_files = self.test_clinseq_pipeline.configure_fingerprinting()
+        self.assertEquals(qc_files, ["/tmp/qc/fingerprint/P-NA12877.fingerprint-concordance.json",
+                                     "/tmp/qc/fingerprint/P-NA12877.fingerprint-concordance_mqc.tsv"])
+        self.assertEquals(len(self.test_clinseq_pipeline.graph.nodes()), 3)
+        compare_jobs = [job for job in self.test_clinseq_pipeline.graph.nodes()
+                        if isinstance(job, CompareFingerprints)]
+        self.assertEquals(sorted(compare_jobs[0].input_fingerprints),
+                          ["/tmp/qc/fingerprint/AL-P-NA12877-N-03098121-TD-TT.fingerprint.json",
+                           "/tmp/qc/fingerprint/LB-P-NA12877-CFDNA-03098850-TD-TT.fingerprint.json"])
+        self.assertEquals(compare_jobs[0].fingerprint_db, "fp.db")
+        self.assertFalse(compare_jobs[0].fail_on_mismatch)
+
+    def test_fingerprinting_qc_files(self):
+        with patch.object(self.test_clinseq_pipeline, "configure_panel_qc", return_value=[]):
+            self.test_clinseq_pipeline.configure_all_panel_qcs()
+        self.assertIn("/tmp/qc/fingerprint/P-NA12877.fingerprint-concordance_mqc.tsv",
+                      self.test_clinseq_pipeline.qc_files)
+
+
+class TestClinseqContestVCFs(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": [], "CFDNA": []}
+        self.ref_data = {
+            "swegene_common": "variants/swegen_common.vcf.gz",
+            "targets": {
+                "progression": {"targets-bed-slopped20": "intervals/targets/progression.slopped20.bed.gz"},
+                "monitor": {"targets-bed-slopped20": "intervals/targets/monitor.slopped20.bed.gz"}
+            }
+        }
+        self.normal_capture = UniqueCapture("LB", "P-NA12877", "N", "03098121", "TD", "CP")
+        self.cancer_capture_1 = UniqueCapture("LB", "P-NA12877", "CFDNA", "03098850", "TD", "CM")
+        self.cancer_capture_2 = UniqueCapture("LB", "P-NA12877", "CFDNA", "03098851", "TD", "CM")
+
+    def make_pipeline(self, job_params=None):
+        return ClinseqPipeline(self.sample_data, self.ref_data, job_params or {}, "/tmp",
+                               "/nfs/LIQBIO/INBOX/exomes", umi=False)
+
+    def test_one_vcf_per_kit_pair(self):
+        pipeline = self.make_pipeline()
+        contest_vcf_1 = pipeline.configure_contest_vcf_generation(self.normal_capture, self.cancer_capture_1)
+        contest_vcf_2 = pipeline.configure_contest_vcf_generation(self.normal_capture, self.cancer_capture_2)
+        self.assertEquals(contest_vcf_1, "/tmp/contamination/pop_vcf_monitor-progression.vcf")
+        self.assertEquals(contest_vcf_2, contest_vcf_1)
+        self.assertEquals(len(pipeline.graph.nodes()), 1)
+
+    def test_precomputed_vcf(self):
+        self.ref_data["contest_vcfs"] = {"monitor": {"progression": "variants/contest/pop_vcf_monitor-progression.vcf"}}
+        pipeline = self.make_pipeline()
+        contest_vcf = pipeline.configure_contest_vcf_generation(self.normal_capture, self.cancer_capture_1)
+        self.assertEquals(contest_vcf, "variants/contest/pop_vcf_monitor-progression.vcf")
+        self.assertEquals(len(pipeline.graph.nodes()), 0)
+
+    def test_cached_vcf(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            pipeline = self.make_pipeline({"contest-vcf-cache": cache_dir})
+            contest_vcf = pipeline.configure_contest_vcf_generation(self.normal_capture, self.cancer_capture_1)
+            self.assertTrue(contest_vcf.startswith(os.path.join(cache_dir, "pop_vcf_monitor-progression.")))
+            self.assertEquals(len(pipeline.graph.nodes()), 1)
+
+            open(contest_vcf, 'w').close()
+            pipeline = self.make_pipeline({"contest-vcf-cache": cache_dir})
+            self.assertEquals(pipeline.configure_contest_vcf_generation(self.cancer_capture_1, self.normal_capture),
+                              contest_vcf)
+            self.assertEquals(len(pipeline.graph.nodes()), 0)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_estimate_contamination(self):
+        pipeline = self.make_pipeline({"contamination-estimator": "autoseq"})
+        pipeline.configure_contamination_estimate(self.normal_capture, self.cancer_capture_1)
+        estimates = [job for job in pipeline.graph.nodes() if isinstance(job, EstimateContamination)]
+        self.assertEquals(len(estimates), 1)
+        self.assertFalse([job for job in pipeline.graph.nodes() if isinstance(job, ContEst)])
+        results = pipeline.normal_cancer_pair_to_results[(self.normal_capture, self.cancer_capture_1)]
+        self.assertEquals(results.cancer_contest_output,
+                          "/tmp/contamination/LB-P-NA12877-CFDNA-03098850-TD-CM.contest.txt")
+        self.assertEquals(results.normal_contest_output,
+                          "/tmp/contamination/LB-P-NA12877-N-03098121-TD-CP.contest.txt")
+        self.assertEquals(estimates[0].output_genotype, results.normal_contest_output)
+
+
+class TestClinseqJvmWorker(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": [], "CFDNA": []}
+
+    def make_pipeline(self, job_params):
+        pipeline = ClinseqPipeline(self.sample_data, {}, job_params, "/tmp", "/nfs/LIQBIO/INBOX/exomes", umi=False)
+        self.merge_vcf = MergeVCF()
+        self.merge_vcf.jobname = "merge-vcf"
+        self.isize = PicardCollectInsertSizeMetrics()
+        pipeline.add(self.merge_vcf)
+        pipeline.add(self.isize)
+        return pipeline
+
+    @patch('autoseq.pipeline.clinseq.JvmWorker')
+    def test_start_jvm_workers(self, mock_jvm_worker):
+        mock_jvm_worker.return_value.start.return_value = True
+        mock_jvm_worker.return_value.socket_path = "/tmp/worker.sock"
+        pipeline = self.make_pipeline({"jvm-worker": True, "jvm-worker-classpath": "/opt/nailgun-server.jar"})
+        self.assertEquals(pipeline.start_jvm_workers(), [mock_jvm_worker.return_value])
+        mock_jvm_worker.assert_called_once_with("/opt/nailgun-server.jar", "gatk3", heap="4g")
+        self.assertEquals(self.merge_vcf.jvm_worker, "/tmp/worker.sock")
+        self.assertFalse(hasattr(self.isize, "jvm_worker"))
+
+    @patch('autoseq.pipeline.clinseq.JvmWorker')
+    def test_start_jvm_worker_failed(self, mock_jvm_worker):
+        mock_jvm_worker.return_value.start.return_value = False
+        pipeline = self.make_pipeline({"jvm-worker": True, "jvm-worker-classpath": "/opt/nailgun-server.jar"})
+        self.assertEquals(pipeline.start_jvm_workers(), [])
+        self.assertEquals(self.merge_vcf.jvm_worker, None)
+
+    @patch('autoseq.pipeline.clinseq.JvmWorker')
+    def test_jvm_worker_disabled(self, mock_jvm_worker):
+        pipeline = self.make_pipeline({})
+        self.assertEquals(pipeline.start_jvm_workers(), [])
+        self.assertFalse(mock_jvm_worker.called)
+
+
+class TestClinseqCondaEnvironments(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": [], "CFDNA": []}
+        self.pipeline = ClinseqPipeline(self.sample_data, {}, {}, "/tmp", "/nfs/LIQBIO/INBOX/exomes", umi=False)
+        self.qdnaseq = QDNASeq("input.bam", "segments.txt")
+        self.purecn = PureCN("input.seg", "input.vcf", "tumorID", "/tmp/purecn")
+        self.pipeline.add(self.qdnaseq)
+        self.pipeline.add(self.purecn)
+
+    @patch('autoseq.pipeline.clinseq.resolve_environments')
+    def test_configure_conda_environments(self, mock_resolve_environments):
+        mock_resolve_environments.return_value = {"qdnaseqenv": {"CONDA_PREFIX": "/envs/qdnaseqenv"},
+                                                  "purecn-env": {"CONDA_PREFIX": "/envs/purecn-env"}}
+        self.pipeline.configure_conda_environments()
+        self.assertEquals(mock_resolve_environments.call_args[0][0], set(["qdnaseqenv", "purecn-env"]))
+        self.assertEquals(self.qdnaseq.conda_variables, {"CONDA_PREFIX": "/envs/qdnaseqenv"})
+        self.assertIn("/envs/purecn-env/bin", self.purecn.command())
+
+    @patch('autoseq.pipeline.clinseq.resolve_environments')
+    def test_configure_conda_environments_missing(self, mock_resolve_environments):
+        mock_resolve_environments.side_effect = CondaEnvironmentError("Conda environment qdnaseqenv lacks qdnaseq.R")
+        self.assertRaises(CondaEnvironmentError, self.pipeline.configure_conda_environments)
+
+
+class TestClinseqIgvTracks(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": [], "CFDNA": []}
+
+    def make_pipeline(self, job_params):
+        return ClinseqPipeline(self.sample_data, {"reference_genome": "/ref/genome.fasta"}, job_params, "/tmp",
+                               "/nfs/LIQBIO/INBOX/exomes", umi=False)
+
+    def test_configure_make_qdnaseq_tracks(self):
+        pipeline = self.make_pipeline({})
+        pipeline.configure_make_qdnaseq_tracks("/tmp/cnv/sample-qdnaseq.segments.txt", "sample")
+        job = pipeline.graph.nodes()[0]
+        self.assertEquals(job.output_copynumber_tdf, "/tmp/cnv/sample_qdnaseq_copynumber.tdf")
+        self.assertEquals(job.output_copynumber_bigwig, None)
+
+    def test_configure_make_qdnaseq_tracks_bigwig(self):
+        pipeline = self.make_pipeline({"igv-track-format": "bigwig"})
+        pipeline.configure_make_qdnaseq_tracks("/tmp/cnv/sample-qdnaseq.segments.txt", "sample")
+        job = pipeline.graph.nodes()[0]
+        self.assertEquals(job.output_readcount_bigwig, "/tmp/cnv/sample_qdnaseq_readcount.bw")
+        self.assertEquals(job.output_readcount_tdf, None)
+        self.assertEquals(job.chrom_sizes, "/ref/genome.fasta.fai")
+
+
+class TestClinseqBinnedCopyNumber(unittest.TestCase):
+    def setUp(self):
+        self.sample_data = {"sdid": "P-NA12877", "T": [], "N": [], "CFDNA": []}
+        self.unique_wgs = UniqueCapture("AL", "P-NA12877", "CFDNA", "03098849", "TD", "WG")
+
+    def configure(self, job_params, refdata):
+        pipeline = ClinseqPipeline(self.sample_data, refdata, job_params, "/tmp", "/nfs/LIQBIO/INBOX/exomes",
+                                   umi=False)
+        pipeline.capture_to_results[self.unique_wgs].merged_bamfile = "/tmp/sample.bam"
+        pipeline.configure_single_wgs_analyses(self.unique_wgs)
+        return [job for job in pipeline.graph.nodes() if getattr(job, "input", None) == "/tmp/sample.bam"][0]
+
+    def test_native_binned_copynumber(self):
+        job = self.configure({"native-binned-copynumber": True}, {"bin_annotations": "/ref/bins.txt"})
+        self.assertEquals(type(job), BinnedCopyNumber)
+        self.assertEquals(job.input_bin_annotations, "/ref/bins.txt")
+
+    def test_qdnaseq_by_default(self):
+        self.assertEquals(type(self.configure({}, {"bin_annotations": "/ref/bins.txt"})), QDNASeq)
+        self.assertEquals(type(self.configure({"native-binned-copynumber": True}, {})), QDNASeq)
+
+    def test_wgs_qc(self):
+        pipeline = ClinseqPipeline(self.sample_data, {"reference_genome": "/ref/genome.fasta"}, {}, "/tmp",
+                                   "/nfs/LIQBIO/INBOX/exomes", umi=True)
+        pipeline.capture_to_results[self.unique_wgs].merged_bamfile = "/tmp/sample.bam"
+        pipeline.configure_wgs_qc(self.unique_wgs)
+        self.assertEquals(set(job.input for job in pipeline.graph.nodes()), set(["/tmp/sample.bam"]))
@@ -10,6 +10,30 @@ class TestCNVCalling(unittest.TestCase):
         self.assertIn('output_segments.txt', cmd)
         self.assertIn('qdnaseq.R', cmd)
 
+    def test_qdna_seq_resolved_env(self):
+        qdna_seq = QDNASeq("dummy.bam", "output_segments.txt")
+        qdna_seq.conda_variables = {"CONDA_PREFIX": "/envs/qdnaseqenv"}
+        cmd = qdna_seq.command()
+        self.assertTrue(cmd.startswith('(export PATH=/envs/qdnaseqenv/bin:"$PATH"'))
+        self.assertNotIn('source activate', cmd)
+
+    def test_binned_copy_number(self):
+        binned = BinnedCopyNumber("dummy.bam", "bins.txt", "output_segments.txt", threads=4)
+        cmd = binned.command()
+        self.assertIn('autoseq.util.binning call', cmd)
+        self.assertIn('--bins bins.txt --threads 4 dummy.bam output_segments.txt', cmd)
+
+    def test_create_bin_annotations(self):
+        annotations = CreateBinAnnotations()
+        annotations.input_reference_sequence = "genome.fasta"
+        annotations.input_mappability = "mappability.bedGraph.gz"
+        annotations.bin_size = 15000
+        annotations.output = "bins.txt"
+        cmd = annotations.command()
+        self.assertIn('autoseq.util.binning annotate', cmd)
+        self.assertIn('--mappability mappability.bedGraph.gz', cmd)
+        self.assertIn('--bin-size 15000', cmd)
+
     def test_qdnaseq2bed(self):
         qdnaseq2bed = QDNASeq2Bed("segments.txt", "output.bed", "genes.gtf")
         cmd = qdnaseq2bed.command()
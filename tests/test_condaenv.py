@@ -0,0 +1,63 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from autoseq.util.condaenv import *
+
+
+class TestCondaEnv(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmpdir, "envs", "qdnaseqenv")
+        os.makedirs(os.path.join(self.prefix, "bin"))
+        self.activate = os.path.join(self.tmpdir, "activate")
+        with open(self.activate, 'w') as activate_file:
+            activate_file.write('if [ "$1" != "qdnaseqenv" ]; then echo "no such env" >&2; return 1; fi\n'
+                                'export CONDA_PREFIX={} CONDA_DEFAULT_ENV=$1 R_LIBS_USER="/r libs"\n'
+                                'export PATH=$CONDA_PREFIX/bin:$PATH CONDA_SHLVL=1 CONDA_PREFIX_1=/base\n'
+                                'echo "activated $1"\n'.format(self.prefix))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def add_binary(self, name):
+        binary = os.path.join(self.prefix, "bin", name)
+        open(binary, 'w').close()
+        os.chmod(binary, stat.S_IRWXU)
+
+    def test_parse_environment(self):
+        self.assertEquals(parse_environment("A=1\0B=x=y\nz\0"), {"A": "1", "B": "x=y\nz"})
+
+    def test_activation_variables(self):
+        before = {"HOME": "/root", "PATH": "/usr/bin", "SHLVL": "1"}
+        after = {"HOME": "/root", "PATH": "/env/bin:/usr/bin", "SHLVL": "2", "CONDA_PREFIX": "/env",
+                 "CONDA_PREFIX_1": "/base", "BASH_FUNC_module%%": "() { :; }"}
+        self.assertEquals(activation_variables(before, after), {"CONDA_PREFIX": "/env"})
+
+    def test_resolve_environment(self):
+        variables = resolve_environment("qdnaseqenv", activate="source " + self.activate)
+        self.assertEquals(variables, {"CONDA_PREFIX": self.prefix, "CONDA_DEFAULT_ENV": "qdnaseqenv",
+                                      "R_LIBS_USER": "/r libs"})
+        self.assertRaises(CondaEnvironmentError, resolve_environment, "missingenv", "source " + self.activate)
+
+    def test_missing_binaries(self):
+        self.add_binary("qdnaseq.R")
+        self.assertEquals(missing_binaries({"CONDA_PREFIX": self.prefix}, ["qdnaseq.R", "bash", "no-such-tool"]),
+                          ["no-such-tool"])
+        self.assertEquals(missing_binaries({"CONDA_PREFIX": self.prefix}, ["bash"], path=""), ["bash"])
+
+    def test_resolve_environments(self):
+        self.assertRaisesRegexp(CondaEnvironmentError, "missingenv.*qdnaseqenv lacks qdnaseq.R",
+                                resolve_environments, ["qdnaseqenv", "missingenv"], "source " + self.activate)
+        self.add_binary("qdnaseq.R")
+        env_to_variables = resolve_environments(["qdnaseqenv"], "source " + self.activate)
+        self.assertEquals(env_to_variables["qdnaseqenv"]["CONDA_PREFIX"], self.prefix)
+
+    def test_conda_command(self):
+        self.assertEquals(conda_command("qdnaseqenv", None, "qdnaseq.R --bam x.bam"),
+                          "source activate qdnaseqenv && qdnaseq.R --bam x.bam && source deactivate")
+        cmd = conda_command("qdnaseqenv", {"CONDA_PREFIX": "/envs/q", "R_LIBS_USER": "/r libs"}, "qdnaseq.R && true")
+        self.assertEquals(cmd, "(export PATH=/envs/q/bin:\"$PATH\" CONDA_PREFIX=/envs/q R_LIBS_USER='/r libs' && "
+                               "qdnaseq.R && true)")
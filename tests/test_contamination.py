@@ -36,3 +36,17 @@ class TestContamination(unittest.TestCase):
         cmd = contest_to_contam_caveat.command()
         self.assertIn('input.txt', cmd)
         self.assertIn('output.txt', cmd)
+
+    def test_estimate_contamination(self):
+        estimate = EstimateContamination()
+        estimate.input_eval_bam = "test_eval.bam"
+        estimate.input_genotype_bam = "test_genotype.bam"
+        estimate.input_population_af_vcf = "test.vcf"
+        estimate.output = "output.txt"
+        estimate.output_genotype = "output_genotype.txt"
+        cmd = estimate.command()
+        self.assertIn('-m autoseq.util.contamination', cmd)
+        self.assertIn('--popfile test.vcf', cmd)
+        self.assertIn('--output output.txt', cmd)
+        self.assertIn('--output-genotype output_genotype.txt', cmd)
+        self.assertTrue(cmd.endswith('test_eval.bam test_genotype.bam'))
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from autoseq.util.contamination import *
+
+
+def simulate_counts(contamination, n_sites=5000, depth=200, seed=1):
+    """
+    Simulate allele counts at population SNPs for a contaminated evaluated sample, and an
+    uncontaminated genotype sample from the same individual, with sequencing errors.
+    """
+    random_state = np.random.RandomState(seed)
+    allele_freqs = random_state.uniform(0.05, 0.95, n_sites)
+    own_alt_alleles = random_state.binomial(2, allele_freqs)
+    contaminant_alt_alleles = random_state.binomial(2, allele_freqs)
+    alt_fraction = (1 - contamination) * own_alt_alleles / 2.0 + contamination * contaminant_alt_alleles / 2.0
+    alt_fraction = alt_fraction * (1 - DEFAULT_ERROR_RATE) + (1 - alt_fraction) * DEFAULT_ERROR_RATE
+    eval_alt = random_state.binomial(depth, alt_fraction)
+    genotype_alt = random_state.binomial(depth, own_alt_alleles / 2.0)
+    return depth - genotype_alt, genotype_alt, depth - eval_alt, eval_alt, allele_freqs
+
+
+class TestContaminationEstimate(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_population_sites(self):
+        vcf = os.path.join(self.tmpdir, "pop.vcf")
+        with open(vcf, 'w') as vcf_file:
+            vcf_file.write("##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+                           "1\t100\t.\tA\tG\t.\t.\tDP=10;AF=0.25\n"
+                           "1\t200\t.\tA\tG\t.\t.\tAF=1.0\n"
+                           "1\t300\t.\tAT\tA\t.\t.\tAF=0.5\n"
+                           "2\t50\t.\tC\tT\t.\t.\tAF=0.4;DP=3\n")
+        sites, allele_freqs = read_population_sites(vcf)
+        self.assertEquals(sites, [SnpSite("1", 99, "A", "G"), SnpSite("2", 49, "C", "T")])
+        self.assertEquals(list(allele_freqs), [0.25, 0.4])
+
+    def test_informative_sites(self):
+        n_hom, n_other, other_freq = informative_sites(
+            np.array([20, 0, 10, 20, 5]), np.array([0, 20, 10, 0, 0]),
+            np.array([18, 1, 10, 0, 10]), np.array([2, 19, 10, 0, 0]), np.array([0.1, 0.2, 0.3, 0.4, 0.5]))
+        self.assertEquals(list(n_hom), [18, 19])
+        self.assertEquals(list(n_other), [2, 1])
+        self.assertEquals(list(other_freq), [0.1, 0.8])
+
+    def test_estimate_contamination(self):
+        for contamination in [0.0, 0.02, 0.1]:
+            genotype_ref, genotype_alt, eval_ref, eval_alt, allele_freqs = simulate_counts(contamination)
+            estimate = estimate_contamination(
+                *informative_sites(genotype_ref, genotype_alt, eval_ref, eval_alt, allele_freqs))
+            self.assertAlmostEquals(estimate["contamination"], contamination, delta=0.005)
+            self.assertLessEqual(estimate["ci_low"], estimate["contamination"])
+            self.assertGreaterEqual(estimate["ci_high"], estimate["contamination"])
+            self.assertGreater(estimate["sites"], 0)
+
+    def test_estimate_contamination_no_sites(self):
+        estimate = estimate_contamination(np.array([]), np.array([]), np.array([]))
+        self.assertEquals(estimate["sites"], 0)
+        self.assertTrue(np.isnan(estimate["contamination"]))
+
+    def test_write_contest_table(self):
+        output = StringIO()
+        write_contest_table({"contamination": 0.0123, "ci_low": 0.01, "ci_high": 0.015,
+                             "log_likelihood": -1234.5, "sites": 500}, output)
+        lines = output.getvalue().splitlines()
+        self.assertEquals(lines[0].split("\t"), CONTEST_COLUMNS)
+        self.assertEquals(lines[1], "META\tALL\t-1234.50\t1.23\t0.50\t1.00\t1.50\t500")
+
+    def test_contamination_command(self):
+        cmd = contamination_command("eval.bam", "genotype.bam", "pop.vcf", "eval.contest.txt",
+                                    output_genotype="genotype.contest.txt", python="python")
+        self.assertEquals(cmd, "python -m autoseq.util.contamination --popfile pop.vcf --output eval.contest.txt "
+                               "--output-genotype genotype.contest.txt eval.bam genotype.bam")
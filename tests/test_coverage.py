@@ -0,0 +1,93 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from mock import MagicMock
+
+from autoseq.util.coverage import *
+
+
+class TestCoverage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.depths = TargetDepths({"1": [(100, 110, np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9]))],
+                                    "2": [(0, 4, np.array([50, 50, 100, 100])),
+                                          (10, 12, np.array([1, 1]))]})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_bed(self):
+        bed = os.path.join(self.tmpdir, "targets.bed.gz")
+        with gzip.open(bed, 'w') as bed_file:
+            bed_file.write("track name=targets\n1\t100\t110\tGENE1\n\n2\t0\t4\n")
+        self.assertEquals(read_bed(bed), [BedRegion("1", 100, 110, ["GENE1"]), BedRegion("2", 0, 4, [])])
+
+    def test_merge_regions(self):
+        regions = [BedRegion("1", 20, 30, []), BedRegion("1", 0, 10, []), BedRegion("1", 10, 15, []),
+                   BedRegion("1", 25, 40, []), BedRegion("2", 5, 6, [])]
+        self.assertEquals(merge_regions(regions), {"1": [(0, 15), (20, 40)], "2": [(5, 6)]})
+
+    def test_depth(self):
+        self.assertEquals(list(self.depths.depth("1", 102, 105)), [2, 3, 4])
+        self.assertEquals(list(self.depths.depth("2", 10, 12)), [1, 1])
+        self.assertRaises(ValueError, self.depths.depth, "1", 95, 105)
+        self.assertRaises(ValueError, self.depths.depth, "2", 2, 11)
+        self.assertRaises(ValueError, self.depths.depth, "3", 0, 1)
+
+    def test_histogram(self):
+        histogram = self.depths.histogram({"1": [(105, 108)], "2": [(0, 4)]})
+        self.assertEquals(histogram.sum(), 7)
+        self.assertEquals(histogram[5], 1)
+        self.assertEquals(histogram[50], 2)
+        self.assertEquals(histogram[100], 2)
+
+    def test_write_histogram(self):
+        output = StringIO()
+        write_histogram(np.array([1, 0, 3]), output)
+        self.assertEquals(output.getvalue(), "all\t0\t1\t4\t0.25\nall\t2\t3\t4\t0.75\n")
+
+    def test_write_region_table(self):
+        output = StringIO()
+        regions = [BedRegion("1", 100, 104, ["GENE1"]), BedRegion("2", 0, 4, [])]
+        write_region_table(regions, self.depths, [3, 20], [2, 100], "NA12877", output)
+        lines = output.getvalue().splitlines()
+        self.assertEquals(lines[0], "# chrom\tchromStart\tchromEnd\tF3\treadCount\tmeanCoverage\t"
+                                    "percentage2\tpercentage100\tsampleName")
+        self.assertEquals(lines[1], "1\t100\t104\tGENE1\t3\t1.5\t50\t0\tNA12877")
+        self.assertEquals(lines[2], "2\t0\t4\t\t20\t75\t100\t50\tNA12877")
+
+    def test_coverage_qc_call(self):
+        histogram = np.bincount([50, 50, 100, 100])
+        self.assertEquals(coverage_qc_call(histogram, 0.5, 100, 0.95, 50)["CALL"], "OK")
+        self.assertEquals(coverage_qc_call(histogram, 0.95, 100, 0.95, 50)["CALL"], "WARN")
+        call = coverage_qc_call(histogram, 0.95, 100, 0.95, 60)
+        self.assertEquals(call["CALL"], "FAIL")
+        self.assertEquals(call["FRACTION_ABOVE_LOW_THRESH"], 0.5)
+        self.assertEquals(json.loads(json.dumps(call))["LOW_THRESH_FOLD_COV"], 60)
+
+    def test_from_bam(self):
+        bam = MagicMock()
+        bam.count_coverage.return_value = ([1, 0], [0, 2], [0, 0], [3, 0])
+        depths = TargetDepths.from_bam(bam, {"1": [(10, 12)]}, min_basequal=30)
+        self.assertEquals(list(depths.depth("1", 10, 12)), [4, 2])
+        self.assertEquals(bam.count_coverage.call_args[1]["quality_threshold"], 30)
+
+    def test_keep_read(self):
+        read = MagicMock(flag=0x400, mapping_quality=60)
+        self.assertFalse(keep_read(read))
+        read.flag = 0x1 | 0x2
+        self.assertTrue(keep_read(read))
+        self.assertFalse(keep_read(read, min_mapq=61))
+
+    def test_coverage_command(self):
+        cmd = coverage_command("in put.bam", "targets.bed", "hist.txt", "call.json", min_basequal=20,
+                               thresholds=[30], python="python")
+        self.assertTrue(cmd.startswith("python -m autoseq.util.coverage --targets targets.bed"))
+        self.assertIn("--min-basequal 20 -T 30", cmd)
+        self.assertNotIn("--regions", cmd)
+        self.assertTrue(cmd.endswith("'in put.bam'"))
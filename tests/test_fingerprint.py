@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from click.testing import CliRunner
+from mock import MagicMock
+
+from autoseq.util.fingerprint import *
+
+
+def make_fingerprint(sample, individual, genotypes, panel="panel"):
+    """
+    :param genotypes: String of genotypes per site: 0 (hom ref), 1 (het), 2 (hom alt) or . (no call).
+    """
+    has_ref = np.array([g in "01" for g in genotypes])
+    has_alt = np.array([g in "12" for g in genotypes])
+    return Fingerprint.from_genotypes(sample, individual, panel, has_ref, has_alt)
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_sites(self):
+        vcf = os.path.join(self.tmpdir, "snps.vcf")
+        with open(vcf, 'w') as vcf_file:
+            vcf_file.write("##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\n"
+                           "1\t100\trs1\tA\tG\n1\t200\trs2\tAT\tA\n2\t50\trs3\tc\tt\t.\t.\n")
+        self.assertEquals(read_sites(vcf), [SnpSite("1", 99, "A", "G"), SnpSite("2", 49, "C", "T")])
+
+    def test_site_windows(self):
+        sites = [SnpSite("2", 10, "A", "G"), SnpSite("1", 5000, "A", "G"), SnpSite("1", 100, "A", "G"),
+                 SnpSite("1", 600, "A", "G")]
+        self.assertEquals(site_windows(sites, max_gap=1000),
+                          [("1", 100, 601, [2, 3]), ("1", 5000, 5001, [1]), ("2", 10, 11, [0])])
+
+    def test_allele_counts(self):
+        bam = MagicMock()
+        bam.references = ["1"]
+        bam.count_coverage.return_value = ([10, 0, 0], [0, 0, 0], [5, 0, 7], [0, 0, 1])
+        sites = [SnpSite("1", 100, "A", "G"), SnpSite("1", 102, "G", "T"), SnpSite("2", 5, "A", "G")]
+        ref_counts, alt_counts = allele_counts(bam, sites)
+        self.assertEquals(list(ref_counts), [10, 7, 0])
+        self.assertEquals(list(alt_counts), [5, 1, 0])
+        self.assertEquals(bam.count_coverage.call_count, 1)
+
+    def test_call_genotypes(self):
+        has_ref, has_alt = call_genotypes(np.array([20, 10, 0, 3]), np.array([0, 10, 20, 3]), min_depth=10)
+        self.assertEquals(list(has_ref), [True, True, False, False])
+        self.assertEquals(list(has_alt), [False, True, True, False])
+
+    def test_fingerprint_round_trip(self):
+        fingerprint = make_fingerprint("S1", "P-1", "0120.21201")
+        self.assertEquals(len(fingerprint.ref_bits), 2)
+        loaded = Fingerprint.from_dict(json.loads(json.dumps(fingerprint.to_dict())))
+        self.assertEquals(loaded.n_called(), 9)
+        for original, copy in zip(fingerprint.genotypes(), loaded.genotypes()):
+            self.assertEquals(list(original), list(copy))
+
+    def test_concordance_matrix(self):
+        fingerprints = [make_fingerprint("S1", "P-1", "0121"), make_fingerprint("S2", "P-1", "012."),
+                        make_fingerprint("S3", "P-2", "2100")]
+        n_sites, n_matching = concordance_matrix(fingerprints[:1], fingerprints)
+        self.assertEquals(n_sites.tolist(), [[4, 3, 4]])
+        self.assertEquals(n_matching.tolist(), [[4, 3, 1]])
+
+    def test_compare_fingerprints(self):
+        batch = [make_fingerprint("S1", "P-1", "0121021"), make_fingerprint("S2", "P-1", "2100122"),
+                 make_fingerprint("S3", "P-2", "2100122")]
+        history = [make_fingerprint("S0", "P-3", "0121021"), make_fingerprint("S1", "P-1", "2222222")]
+        result = compare_fingerprints(batch, history, min_concordance=0.8, min_sites=5)
+        self.assertEquals(result["CALL"], "FAIL")
+        self.assertEquals(result["n_reference"], 4)
+        flagged = sorted((c["sample1"], c["sample2"], c["status"]) for c in result["flagged"])
+        self.assertEquals(flagged, [("S1", "S0", "UNEXPECTED_MATCH"), ("S1", "S2", "MISMATCH"),
+                                    ("S2", "S3", "UNEXPECTED_MATCH")])
+
+    def test_compare_fingerprints_min_sites(self):
+        batch = [make_fingerprint("S1", "P-1", "01...."), make_fingerprint("S2", "P-1", "21....")]
+        result = compare_fingerprints(batch, min_sites=5)
+        self.assertEquals(result["CALL"], "OK")
+        self.assertEquals(result["samples"], {"S1": 2, "S2": 2})
+
+    def test_write_multiqc_table(self):
+        result = compare_fingerprints([make_fingerprint("S1", "P-1", "0121021"), make_fingerprint("S2", "P-1", "2100122"),
+                                       make_fingerprint("S3", "P-2", "0000000")], min_sites=5)
+        output = StringIO()
+        write_multiqc_table(result, output)
+        lines = output.getvalue().splitlines()
+        self.assertIn("Overall call: FAIL", lines[2])
+        self.assertEquals(lines[5:], ["S1\tFAIL\t7\tS2 (MISMATCH, 0.286)", "S2\tFAIL\t7\tS1 (MISMATCH, 0.286)",
+                                      "S3\tOK\t7\t-"])
+
+    def test_compare_fail_on_mismatch(self):
+        filenames = []
+        for sample, genotypes in [("S1", "0121021"), ("S2", "2100122")]:
+            filenames.append(os.path.join(self.tmpdir, "{}.json".format(sample)))
+            make_fingerprint(sample, "P-1", genotypes).save(filenames[-1])
+        output = os.path.join(self.tmpdir, "concordance.json")
+        table = os.path.join(self.tmpdir, "concordance_mqc.tsv")
+
+        result = CliRunner().invoke(main, ["compare", "--min-sites", "5", "--output", output,
+                                           "--multiqc-table", table] + filenames)
+        self.assertEquals(result.exit_code, 0, result.output)
+        self.assertTrue(os.path.exists(table))
+
+        result = CliRunner().invoke(main, ["compare", "--min-sites", "5", "--output", output,
+                                           "--fail-on-mismatch"] + filenames)
+        self.assertEquals(result.exit_code, 1)
+        self.assertIn("1 possible sample swaps flagged", result.output)
+        with open(output) as output_file:
+            self.assertEquals(json.load(output_file)["CALL"], "FAIL")
+
+    def test_fingerprint_database(self):
+        with FingerprintDatabase(os.path.join(self.tmpdir, "fingerprints.db")) as fingerprint_db:
+            fingerprint_db.add([make_fingerprint("S1", "P-1", "0121"), make_fingerprint("S2", "P-2", "2100"),
+                                make_fingerprint("S3", "P-3", "2100", panel="other")])
+            fingerprint_db.add([make_fingerprint("S1", "P-1", "1111")])
+            fingerprints = fingerprint_db.fingerprints("panel")
+        self.assertEquals([fp.sample for fp in fingerprints], ["S1", "S2"])
+        self.assertEquals(list(fingerprints[0].genotypes()[1]), [True] * 4)
+
+    def test_genotype_command(self):
+        cmd = genotype_command("in.bam", "snps.vcf", "S1", "P-1", "out.json", min_depth=15, python="python")
+        self.assertEquals(cmd, "python -m autoseq.util.fingerprint genotype --sites snps.vcf --sample S1 "
+                               "--individual P-1 --min-depth 15 in.bam out.json")
@@ -0,0 +1,40 @@
+import unittest
+
+from autoseq.tools.igv import *
+
+
+class TestIgv(unittest.TestCase):
+    def test_make_cnvkit_tracks(self):
+        make_cnvkit_tracks = MakeCNVkitTracks()
+        make_cnvkit_tracks.input_cnr = "sample.cnr"
+        make_cnvkit_tracks.input_cns = "sample.cns"
+        make_cnvkit_tracks.output_profile_bedgraph = "profile.bedGraph"
+        make_cnvkit_tracks.output_segments_bedgraph = "segments.bedGraph"
+        make_cnvkit_tracks.output_profile_bigwig = "profile.bw"
+        cmd = make_cnvkit_tracks.command()
+        self.assertIn("-m autoseq.util.igvtracks cnvkit --cnr sample.cnr --cns sample.cns", cmd)
+        self.assertIn("--profile-bigwig profile.bw", cmd)
+
+    def test_make_qdnaseq_tracks_tdf(self):
+        make_qdnaseq_tracks = MakeQDNAseqTracks()
+        make_qdnaseq_tracks.input_qdnaseq_file = "qdnaseq.txt"
+        make_qdnaseq_tracks.output_segments_bedgraph = "segments.bedGraph"
+        make_qdnaseq_tracks.output_copynumber_tdf = "copynumber.tdf"
+        make_qdnaseq_tracks.output_readcount_tdf = "readcount.tdf"
+        make_qdnaseq_tracks.scratch = "/scratch"
+        cmd = make_qdnaseq_tracks.command()
+        self.assertRegexpMatches(cmd, r"igvtools toTDF /scratch/copynumber-[0-9a-f-]+\.wig copynumber.tdf hg19")
+        self.assertRegexpMatches(cmd, r"igvtools toTDF /scratch/readcount-[0-9a-f-]+\.wig readcount.tdf hg19")
+        self.assertIn("--readcount-wig /scratch/readcount-", cmd)
+        self.assertNotIn("bigwig", cmd)
+
+    def test_make_qdnaseq_tracks_bigwig(self):
+        make_qdnaseq_tracks = MakeQDNAseqTracks()
+        make_qdnaseq_tracks.input_qdnaseq_file = "qdnaseq.txt"
+        make_qdnaseq_tracks.output_segments_bedgraph = "segments.bedGraph"
+        make_qdnaseq_tracks.output_copynumber_bigwig = "copynumber.bw"
+        make_qdnaseq_tracks.output_readcount_bigwig = "readcount.bw"
+        make_qdnaseq_tracks.chrom_sizes = "ref.fa.fai"
+        cmd = make_qdnaseq_tracks.command()
+        self.assertIn("--copynumber-bigwig copynumber.bw --readcount-bigwig readcount.bw --chrom-sizes ref.fa.fai", cmd)
+        self.assertNotIn("igvtools", cmd)
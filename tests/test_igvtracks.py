@@ -0,0 +1,97 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from click.testing import CliRunner
+from mock import MagicMock, patch
+
+from autoseq.util.igvtracks import *
+
+
+class TestIgvTracks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.qdnaseq_table = os.path.join(self.tmpdir, "qdnaseq.segments.txt")
+        with open(self.qdnaseq_table, 'w') as table_file:
+            table_file.write("feature\tchromosome\tstart\tend\treadcount\tcopynumber\tsegmented\n"
+                             "2:1-100\t2\t1\t100\t8\t1.1\t1.05\n"
+                             "1:101-200\t1\t101\t200\t12\tNA\t0.9\n"
+                             "1:1-100\t1\t1\t100\t10\t0.8\t0.9\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_file(self, content):
+        filename = os.path.join(self.tmpdir, "table.txt")
+        with open(filename, 'w') as table_file:
+            table_file.write(content)
+        return filename
+
+    def test_read_cnvkit(self):
+        cnr = os.path.join(self.tmpdir, "sample.cnr")
+        with open(cnr, 'w') as cnr_file:
+            cnr_file.write("chromosome\tstart\tend\tgene\tlog2\tdepth\tweight\n"
+                           "1\t0\t100\tGENE1\t-0.5\t40\t1\n1\t100\t200\tGENE1\tnan\t0\t0\n")
+        self.assertEquals(read_cnvkit(cnr), [TrackEntry("1", 0, 100, -0.5)])
+
+    def test_read_qdnaseq(self):
+        tracks = read_qdnaseq(self.qdnaseq_table)
+        self.assertEquals(sorted(tracks.keys()), ["copynumber", "readcount", "segments"])
+        self.assertEquals(tracks["copynumber"], [TrackEntry("2", 0, 100, 1.1), TrackEntry("1", 0, 100, 0.8)])
+        self.assertEquals(len(tracks["readcount"]), 3)
+
+    def test_read_table_missing_column(self):
+        self.assertRaises(ValueError, read_cnvkit, self.make_file("start\tend\tlog2\n"))
+
+    def test_sort_entries(self):
+        entries = [TrackEntry("2", 0, 10, 1.0), TrackEntry("1", 5, 15, 2.0), TrackEntry("1", 0, 10, 3.0),
+                   TrackEntry("1", 10, 20, 4.0)]
+        self.assertEquals(sort_entries(entries, ["1", "2"]),
+                          [TrackEntry("1", 0, 10, 3.0), TrackEntry("1", 10, 20, 4.0), TrackEntry("2", 0, 10, 1.0)])
+        self.assertEquals(sort_entries(entries)[0].chrom, "2")
+
+    def test_write_wig(self):
+        output = StringIO()
+        write_wig([TrackEntry("1", 0, 100, 0.5), TrackEntry("1", 100, 200, 1), TrackEntry("1", 200, 250, 2),
+                   TrackEntry("2", 0, 50, 3)], output)
+        self.assertEquals(output.getvalue(), "variableStep chrom=1 span=100\n1\t0.5\n101\t1\n"
+                                             "variableStep chrom=1 span=50\n201\t2\n"
+                                             "variableStep chrom=2 span=50\n1\t3\n")
+
+    def test_write_bigwig(self):
+        pybigwig = MagicMock()
+        with patch.dict(sys.modules, {"pyBigWig": pybigwig}):
+            write_bigwig([TrackEntry("1", 0, 100, 0.5), TrackEntry("MT", 0, 10, 1.0)], "out.bw",
+                         chrom_sizes=[("1", 1000)])
+        bigwig = pybigwig.open.return_value
+        pybigwig.open.assert_called_once_with("out.bw", "w")
+        bigwig.addHeader.assert_called_once_with([("1", 1000)], maxZooms=BIGWIG_ZOOM_LEVELS)
+        bigwig.addEntries.assert_called_once_with(["1"], [0], ends=[100], values=[0.5])
+        self.assertTrue(bigwig.close.called)
+
+    def test_chrom_sizes(self):
+        fai = self.make_file("1\t1000\t52\t60\t61\n2\t500\t1100\t60\t61\n")
+        self.assertEquals(read_chrom_sizes(fai), [("1", 1000), ("2", 500)])
+        self.assertEquals(chrom_sizes_from_entries([TrackEntry("1", 0, 100, 0), TrackEntry("1", 100, 200, 0)]),
+                          [("1", 200)])
+
+    def test_qdnaseq_cli(self):
+        segments = os.path.join(self.tmpdir, "segments.bedGraph")
+        wig = os.path.join(self.tmpdir, "copynumber.wig")
+        result = CliRunner().invoke(main, ["qdnaseq", "--segments", segments, "--copynumber-wig", wig,
+                                           self.qdnaseq_table])
+        self.assertEquals(result.exit_code, 0, result.output)
+        with open(segments) as segments_file:
+            self.assertEquals(segments_file.read(), "2\t0\t100\t1.05\n1\t0\t100\t0.9\n1\t100\t200\t0.9\n")
+        with open(wig) as wig_file:
+            self.assertEquals(wig_file.read(), "variableStep chrom=2 span=100\n1\t1.1\n"
+                                               "variableStep chrom=1 span=100\n1\t0.8\n")
+
+    def test_qdnaseq_tracks_command(self):
+        cmd = qdnaseq_tracks_command("in.txt", "seg.bedGraph", copynumber_bigwig="cn.bw", chrom_sizes="ref.fa.fai",
+                                     python="python")
+        self.assertEquals(cmd, "python -m autoseq.util.igvtracks qdnaseq --segments seg.bedGraph "
+                               "--copynumber-bigwig cn.bw --chrom-sizes ref.fa.fai in.txt")
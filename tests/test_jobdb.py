@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from autoseq.util.jobdb import *
+
+
+class TestJobdb(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_filename = os.path.join(self.tmpdir, "jobdb.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_json_jobdb(self, filename, vardict_runtime):
+        jobs = [{"jobname": "vardict/LB-P-00000001-T-01", "tool": "VarDict", "status": "COMPLETED",
+                 "starttime": "2017-05-01T10:00:00", "endtime": "2017-05-01T10:00:{:02d}".format(vardict_runtime)},
+                {"jobname": "picard-isize-LB-P-00000001-T-01", "status": "FAILED",
+                 "starttime": "2017-05-01T10:00:00.500000", "endtime": "2017-05-01T10:00:01.500000"},
+                {"jobname": "multiqc-P-00000001", "status": "PENDING", "starttime": None, "endtime": None}]
+        with open(filename, 'w') as jobdb_file:
+            json.dump({"jobs": jobs}, jobdb_file)
+
+    def test_is_sqlite_jobdb(self):
+        self.assertTrue(is_sqlite_jobdb("/tmp/jobdb.sqlite"))
+        self.assertTrue(is_sqlite_jobdb("/tmp/jobdb.db"))
+        self.assertFalse(is_sqlite_jobdb("/tmp/jobdb.json"))
+        self.assertFalse(is_sqlite_jobdb(None))
+
+    def test_parse_timestamp(self):
+        self.assertEquals(parse_timestamp(None), None)
+        self.assertEquals(parse_timestamp(12.5), 12.5)
+        self.assertAlmostEquals(parse_timestamp("2017-05-01T10:00:01.5") - parse_timestamp("2017-05-01T10:00:00"),
+                                1.5)
+        self.assertEquals(parse_timestamp("not a date"), None)
+
+    def test_tool_from_jobname(self):
+        self.assertEquals(tool_from_jobname("picard-isize-LB-P-00000001-T-01"), "picard-isize")
+        self.assertEquals(tool_from_jobname("cnvkit/LB-P-00000001-T-01"), "cnvkit")
+        self.assertEquals(tool_from_jobname(None), None)
+
+    def test_percentile(self):
+        self.assertEquals(percentile([], 95), None)
+        self.assertEquals(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertAlmostEquals(percentile([0, 10], 95), 9.5)
+
+    def test_import_json(self):
+        with JobDatabase(self.db_filename) as jobdb:
+            for idx in range(5):
+                json_filename = os.path.join(self.tmpdir, "jobdb-{}.json".format(idx))
+                self.write_json_jobdb(json_filename, 10 * (idx + 1))
+                jobdb.import_json(json_filename, sample="P-00000001")
+
+            self.assertEquals(jobdb.tool_runtimes("vardict"), [10, 20, 30, 40, 50])
+            self.assertEquals(jobdb.tool_runtimes("picard-isize"), [])
+            self.assertEquals(jobdb.tool_runtimes("picard-isize", status="FAILED"), [1.0] * 5)
+            self.assertEquals(jobdb.runtime_percentile("VARDICT", 50), 30)
+            self.assertEquals(len(jobdb.recent_run_ids(2)), 2)
+            self.assertEquals(jobdb.connection.execute("SELECT status FROM runs").fetchone()[0], "FAILED")
+
+    def test_update_job_with_usage(self):
+        with JobDatabase(self.db_filename) as jobdb:
+            run_id = jobdb.add_run("run", "ClinseqPipeline", "P-00000001")
+            job_id = jobdb.add_job(run_id, "bwa-LB-P-00000001-T-01", tool="Bwa",
+                                   inputs=["in.fq.gz"], outputs=["out.bam"])
+            jobdb.update_job(job_id, status="COMPLETED",
+                             usage={"exit_status": 0, "starttime": 100.0, "endtime": 160.0, "max_rss_bytes": 1024,
+                                    "samples": [[110.0, 512, 0, 0], [150.0, 1024, 10, 20]]})
+
+            row = jobdb.connection.execute(
+                "SELECT status, runtime, max_rss_bytes FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            self.assertEquals(tuple(row), ("COMPLETED", 60.0, 1024))
+            self.assertEquals(jobdb.connection.execute(
+                "SELECT COUNT(*) FROM resource_samples WHERE job_id = ?", (job_id,)).fetchone()[0], 2)
+            self.assertEquals(jobdb.connection.execute(
+                "SELECT COUNT(*) FROM files WHERE job_id = ?", (job_id,)).fetchone()[0], 2)
+
+    def test_recorder(self):
+        usage_file = os.path.join(self.tmpdir, "bwa.json")
+        recorder = JobDatabaseRecorder(self.db_filename, "run", "ClinseqPipeline", "P-00000001", self.tmpdir,
+                                       [("bwa", "Bwa", 4, [], [], usage_file),
+                                        ("vardict", "VarDict", 1, [], [], os.path.join(self.tmpdir, "vd.json"))],
+                                       poll_interval=0.01)
+        recorder.start()
+        recorder.wait_until_registered()
+        with open(usage_file, 'w') as usage_fh:
+            json.dump({"exit_status": 0, "starttime": 1.0, "endtime": 3.0}, usage_fh)
+        recorder.stop()
+
+        with JobDatabase(self.db_filename) as jobdb:
+            statuses = dict(jobdb.connection.execute("SELECT jobname, status FROM jobs").fetchall())
+            self.assertEquals(statuses, {"bwa": "COMPLETED", "vardict": "NOT_RUN"})
+            self.assertEquals(jobdb.connection.execute("SELECT status FROM runs").fetchone()[0], "FAILED")
+
+    def test_filesystem_type(self):
+        mounts_file = os.path.join(self.tmpdir, "mounts")
+        with open(mounts_file, 'w') as mounts:
+            mounts.write("/dev/sda1 / ext4 rw 0 0\n"
+                         "server:/export /nfs nfs4 rw 0 0\n"
+                         "server:/other /nfs/local\\040dir ext4 rw 0 0\n")
+        self.assertEquals(filesystem_type("/nfs/jobdb.sqlite", mounts_file), "nfs4")
+        self.assertEquals(filesystem_type("/nfs/local dir/jobdb.sqlite", mounts_file), "ext4")
+        self.assertEquals(filesystem_type("/nfsdir/jobdb.sqlite", mounts_file), "ext4")
+        self.assertEquals(filesystem_type("/tmp", os.path.join(self.tmpdir, "missing")), None)
+
+    def test_journal_mode(self):
+        with JobDatabase(self.db_filename) as jobdb:
+            self.assertEquals(jobdb.journal_mode, "WAL")
+        with patch('autoseq.util.jobdb.is_network_filesystem', return_value=True):
+            with JobDatabase(self.db_filename) as jobdb:
+                self.assertEquals(jobdb.journal_mode, "DELETE")
+
+    def test_recorder_registration_error(self):
+        recorder = JobDatabaseRecorder(os.path.join(self.tmpdir, "missing", "jobdb.sqlite"), "run",
+                                       "ClinseqPipeline", "P-00000001", self.tmpdir, [])
+        recorder.start()
+        self.assertRaisesRegexp(JobDatabaseError, "Could not register", recorder.wait_until_registered, 10)
+        recorder.stop()
+
+    def test_recorder_registration_timeout(self):
+        recorder = JobDatabaseRecorder(self.db_filename, "run", "ClinseqPipeline", "P-00000001", self.tmpdir, [])
+        self.assertRaisesRegexp(JobDatabaseError, "Timed out", recorder.wait_until_registered, 0.01)
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from autoseq.cli.jobs2gantt import *
+
+
+class TestJobs2Gantt(unittest.TestCase):
+    def test_cores_in_use(self):
+        times, cores = cores_in_use(np.array([0., 5.]), np.array([10., 20.]), np.array([4., 2.]))
+        self.assertEquals(list(times), [0., 5., 10., 20.])
+        self.assertEquals(list(cores), [4., 6., 2., 0.])
+
+    def test_critical_path_without_dependencies(self):
+        starts = np.array([0., 0., 10., 10.5, 30.])
+        ends = np.array([10., 5., 30., 12., 40.])
+        self.assertEquals(critical_path(starts, ends), [0, 2, 4])
+
+    def test_critical_path_with_dependencies(self):
+        starts = np.array([0., 0., 10., 10.5, 30.])
+        ends = np.array([10., 5., 30., 12., 40.])
+        self.assertEquals(critical_path(starts, ends, [(4, 3), (3, 1)]), [1, 3, 4])
+
+    def test_critical_path_no_jobs(self):
+        self.assertEquals(critical_path(np.array([]), np.array([])), [])
+
+    def test_gantt_data(self):
+        jobs = [{'jobname': 'a', 'status': 'COMPLETED', 'starttime': 100., 'endtime': 110., 'threads': 1},
+                {'jobname': 'b', 'status': 'FAILED', 'starttime': 110., 'endtime': 130., 'threads': 2}]
+        gantt = GanttData(jobs)
+        self.assertEquals(list(gantt.starts), [0., 10.])
+        self.assertEquals(gantt.critical_path, [0, 1])
+        self.assertEquals(gantt.cores.max(), 2)
+
+    def test_load_jobs_sqlite_without_runs(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            self.assertRaisesRegexp(click.UsageError, "has no runs", load_jobs_sqlite,
+                                    os.path.join(tmpdir, "jobdb.sqlite"))
+        finally:
+            shutil.rmtree(tmpdir)
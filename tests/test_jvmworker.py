@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from autoseq.util.jvmworker import *
+
+
+class MergeVCF(object):
+    pass
+
+
+class TestJvmWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_worker_tool(self):
+        self.assertEquals(get_worker_tool(MergeVCF()), "gatk3")
+        self.assertEquals(get_worker_tool(object()), None)
+
+    def test_worker_command(self):
+        self.assertEquals(worker_command(None, "gatk3", "-T CombineVariants", "java -jar gatk.jar -T CombineVariants"),
+                          "java -jar gatk.jar -T CombineVariants")
+        cmd = worker_command("/tmp/my worker/worker.sock", "gatk3", "-T CombineVariants",
+                             "java -jar gatk.jar -T CombineVariants")
+        self.assertEquals(cmd, "{ flock '/tmp/my worker/worker.lock' ng --nailgun-server 'local:/tmp/my worker/worker.sock' "
+                               "org.broadinstitute.gatk.engine.CommandLineGATK -T CombineVariants || "
+                               "{ echo \"gatk3 failed in the JVM worker; running it in a new JVM\" >&2; "
+                               "java -jar gatk.jar -T CombineVariants; }; }")
+
+    def test_find_tool_jar(self):
+        jar = os.path.join(self.tmpdir, "GenomeAnalysisTK.jar")
+        with patch.dict(JAVA_TOOLS, {"gatk3": JavaTool(jar, "org.broadinstitute.gatk.engine.CommandLineGATK")}):
+            self.assertEquals(find_tool_jar("gatk3"), None)
+            open(jar, 'w').close()
+            self.assertEquals(find_tool_jar("gatk3"), jar)
+
+    @patch('autoseq.util.jvmworker.find_tool_jar')
+    def test_server_command(self, mock_find_tool_jar):
+        mock_find_tool_jar.return_value = "/opt/gatk.jar"
+        worker = JvmWorker("/opt/nailgun-server.jar:/opt/jna.jar", "gatk3", heap="2g")
+        worker.socket_path = "/tmp/worker.sock"
+        self.assertEquals(worker.server_command(),
+                          ["java", "-Xmx2g", "-cp", "/opt/nailgun-server.jar:/opt/jna.jar:/opt/gatk.jar",
+                           NAILGUN_SERVER_CLASS, "local:/tmp/worker.sock"])
+
+    @patch('autoseq.util.jvmworker.find_tool_jar')
+    def test_start_without_java(self, mock_find_tool_jar):
+        mock_find_tool_jar.return_value = "/opt/gatk.jar"
+        worker = JvmWorker("/opt/nailgun-server.jar", "gatk3", java=os.path.join(self.tmpdir, "no-java"))
+        self.assertFalse(worker.start())
+        self.assertEquals(worker.socket_path, None)
+        self.assertFalse(worker.is_running())
+
+    @patch('autoseq.util.jvmworker.find_tool_jar')
+    def test_start_without_tools(self, mock_find_tool_jar):
+        mock_find_tool_jar.return_value = None
+        self.assertFalse(JvmWorker("/opt/nailgun-server.jar", "gatk3").start())
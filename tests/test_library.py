@@ -1,7 +1,11 @@
 import os
+import shutil
+import tempfile
 import unittest
 
-from autoseq.util.library import find_fastqs
+from mock import patch
+
+from autoseq.util.library import find_fastqs, LibraryIndex
 
 
 class TestLibrary(unittest.TestCase):
@@ -51,3 +55,68 @@ class TestLibrary(unittest.TestCase):
         files = find_fastqs(library='NA12877-N-03098121-TD1-TT1', libdir='tests/libraries')
         self.assertIn(self.libdir, files[0][0])
         self.assertIn(self.library, files[0][0])
+
+
+class TestLibraryIndex(unittest.TestCase):
+    library = 'NA12877-N-03098121-TD1-TT1'
+    libdir = 'tests/libraries'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_find_fastqs_matches_unindexed(self):
+        index = LibraryIndex(self.libdir)
+        self.assertEqual(index.find_fastqs(self.library), find_fastqs(self.library, self.libdir))
+        self.assertEqual(index.find_fastqs(None), (None, None))
+
+    def test_fastq_files(self):
+        fq1s, fq2s = LibraryIndex(self.libdir).fastq_files(self.library)
+        self.assertEqual([os.path.basename(fq.path) for fq in fq1s],
+                         ['bar_1.fq.gz', 'baz_R1_001.fastq.gz', 'baz_R1_999.fastq.gz', 'foo_1.fastq.gz'])
+        self.assertEqual(fq2s[0].size, 0)
+        self.assertIsNotNone(fq2s[0].mtime)
+
+    @patch('autoseq.util.library.scan_library_dir')
+    def test_library_scanned_once(self, mock_scan_library_dir):
+        mock_scan_library_dir.return_value = ([("foo_1.fastq.gz", 0, 0)], [("foo_2.fastq.gz", 0, 0)])
+        index = LibraryIndex(self.libdir)
+        index.find_fastqs(self.library)
+        find_fastqs(self.library, self.libdir, index=index)
+        self.assertEqual(mock_scan_library_dir.call_count, 1)
+
+    def test_persisted_cache(self):
+        library_dir = os.path.join(self.tmpdir, "lib")
+        os.mkdir(library_dir)
+        open(os.path.join(library_dir, "foo_1.fq.gz"), 'w').close()
+        os.utime(library_dir, (1000, 1000))
+        cache_filename = os.path.join(self.tmpdir, "cache.json")
+        index = LibraryIndex(self.tmpdir, cache_filename)
+        index.find_fastqs("lib")
+        index.save()
+
+        with patch('autoseq.util.library.scan_library_dir') as mock_scan_library_dir:
+            fq1s, _ = LibraryIndex(self.tmpdir, cache_filename).find_fastqs("lib")
+            self.assertFalse(mock_scan_library_dir.called)
+            self.assertEqual(fq1s, [os.path.join(self.tmpdir, "lib", "foo_1.fq.gz")])
+
+        # Adding a file changes the directory mtime, invalidating the cached entry:
+        open(os.path.join(library_dir, "foo_2.fq.gz"), 'w').close()
+        os.utime(library_dir, (2000, 2000))
+        _, fq2s = LibraryIndex(self.tmpdir, cache_filename).find_fastqs("lib")
+        self.assertEqual(fq2s, [os.path.join(self.tmpdir, "lib", "foo_2.fq.gz")])
+
+    def test_cache_saved_once(self):
+        for library in ["lib1", "lib2"]:
+            os.mkdir(os.path.join(self.tmpdir, library))
+        cache_filename = os.path.join(self.tmpdir, "cache.json")
+        index = LibraryIndex(self.tmpdir, cache_filename)
+        with patch('autoseq.util.library.json.dump') as mock_dump:
+            index.find_fastqs("lib1")
+            index.find_fastqs("lib2")
+            self.assertFalse(mock_dump.called)
+            index.save()
+            index.save()
+            self.assertEqual(mock_dump.call_count, 1)
@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 from mock import MagicMock, patch
 
@@ -50,3 +53,29 @@ class TestOrderform(unittest.TestCase):
 
         extracted_barcodes = parse_orderform(dummy_worksheet)
         self.assertEquals(extracted_barcodes, [])
+
+    def test_parse_orderform_block_stops_at_end(self):
+        def fields():
+            yield "<SAMPLE ENTRIES>"
+            yield "LB-P-00000001-CFDNA-01234567-TP201701011540-CM2017001022000"
+            yield "</SAMPLE ENTRIES>"
+            raise AssertionError("Fields after the sample entries should not be read")
+        self.assertEquals(parse_orderform_block(fields()),
+                          ["LB-P-00000001-CFDNA-01234567-TP201701011540-CM2017001022000"])
+
+    def test_parse_orderform_xlsx(self):
+        extracted_barcodes = parse_orderform("tests/liqbio_test_orderform.xlsx")
+        self.assertEquals(len(extracted_barcodes), 9)
+        self.assertEquals(extracted_barcodes[0], "NA12877-T-03098849-TD1-TT1")
+
+    def test_parse_orderforms(self):
+        orderform_dir = tempfile.mkdtemp()
+        try:
+            for filename in ["form1.xlsx", "form2.xlsx", "~$form1.xlsx"]:
+                shutil.copy("tests/liqbio_test_orderform.xlsx", os.path.join(orderform_dir, filename))
+            orderforms = find_orderforms(orderform_dir)
+            self.assertEquals([os.path.basename(f) for f in orderforms], ["form1.xlsx", "form2.xlsx"])
+            self.assertEquals(parse_orderforms(orderforms, processes=2),
+                              parse_orderform(orderforms[0]) + parse_orderform(orderforms[1]))
+        finally:
+            shutil.rmtree(orderform_dir)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from autoseq.util.path import *
+
+
+class TestStaging(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, "src", "foo_1.fastq.gz")
+        self.target = os.path.join(self.tmpdir, "staged", "foo_1.fastq.gz")
+        mkdir(os.path.dirname(self.src))
+        with open(self.src, 'wb') as src_file:
+            src_file.write(b"0123456789" * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def test_stage_file(self):
+        self.assertEquals(stage_file(self.src, self.target, verify_checksum=True), self.target)
+        self.assertEquals(self.read(self.target), self.read(self.src))
+        self.assertFalse(os.path.exists(self.target + PARTIAL_SUFFIX))
+
+    def test_stage_file_resumes_partial_copy(self):
+        mkdir(os.path.dirname(self.target))
+        with open(self.target + PARTIAL_SUFFIX, 'wb') as partial_file:
+            partial_file.write(self.read(self.src)[:4321])
+        stage_file(self.src, self.target, verify_checksum=True)
+        self.assertEquals(self.read(self.target), self.read(self.src))
+
+    def test_stage_file_skips_staged_file(self):
+        stage_file(self.src, self.target)
+        os.utime(self.target, (1000, 1000))
+        stage_file(self.src, self.target)
+        self.assertEquals(os.path.getmtime(self.target), 1000)
+
+    def test_stage_file_replaces_corrupt_file(self):
+        mkdir(os.path.dirname(self.target))
+        with open(self.target, 'wb') as target_file:
+            target_file.write(b"x" * 10000)
+        stage_file(self.src, self.target, verify_checksum=True)
+        self.assertEquals(self.read(self.target), self.read(self.src))
+
+    def test_stage_file_checksum_mismatch(self):
+        with open(self.src + ".md5", 'w') as md5_file:
+            md5_file.write("d41d8cd98f00b204e9800998ecf8427e  foo_1.fastq.gz\n")
+        self.assertRaises(IOError, lambda: stage_file(self.src, self.target, verify_checksum=True))
+        self.assertFalse(os.path.exists(self.target))
+
+    def test_stage_files(self):
+        other_src = os.path.join(self.tmpdir, "src", "foo_2.fastq.gz")
+        shutil.copy(self.src, other_src)
+        other_target = os.path.join(self.tmpdir, "staged", "foo_2.fastq.gz")
+        self.assertEquals(stage_files([(self.src, self.target), (other_src, other_target)], workers=2),
+                          [self.target, other_target])
+        self.assertTrue(os.path.isfile(other_target))
+        self.assertEquals(stage_files([]), [])
@@ -95,3 +95,17 @@ class TestPicard(unittest.TestCase):
         self.assertIn('input.bam', cmd)
         self.assertIn('output.bam', cmd)
         self.assertIn('dummy_output_metrics', cmd)
+
+    def test_picard_collect_multiple_metrics(self):
+        test_job = PicardCollectMultipleMetrics("test_input", "dummy_reference", "test_output", "test_isize.txt")
+        self.assertEquals(test_job.output_insert_size_metrics, "test_isize.txt")
+        self.assertEquals(test_job.output_insert_size_histogram, "test_output.insert_size_histogram.pdf")
+        self.assertEquals(test_job.output_pre_adapter_summary_metrics, "test_output.pre_adapter_summary_metrics")
+        cmd = test_job.command()
+        self.assertEquals(cmd.count("picard "), 1)
+        self.assertIn('CollectMultipleMetrics', cmd)
+        self.assertIn('I=test_input', cmd)
+        self.assertIn('R=dummy_reference', cmd)
+        self.assertIn('O=test_output', cmd)
+        self.assertIn('PROGRAM=null PROGRAM=CollectInsertSizeMetrics PROGRAM=CollectSequencingArtifactMetrics', cmd)
+        self.assertTrue(cmd.endswith(' && mv test_output.insert_size_metrics test_isize.txt'))
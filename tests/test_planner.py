@@ -0,0 +1,63 @@
+import unittest
+
+from autoseq.pipeline.planner import *
+
+
+class Bwa(object):
+    def __init__(self, input_fastq, output, threads):
+        self.input_fastq = input_fastq
+        self.output = output
+        self.threads = threads
+        self.jobname = "bwa"
+        self.is_intermediate = False
+
+
+class VarDict(object):
+    def __init__(self, input_bam, output):
+        self.input_bam = input_bam
+        self.output = output
+        self.threads = 1
+        self.jobname = "vardict"
+        self.is_intermediate = False
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.bwa1 = Bwa("lib1.fq.gz", "lib1.bam", 2)
+        self.bwa2 = Bwa("lib2.fq.gz", "lib2.bam", 2)
+        self.vardict = VarDict("lib1.bam", "lib1.vcf")
+        self.cost_factors = {"Bwa": ("alignment", 3600, 0, 0.5, 1.0),
+                             "VarDict": ("variants", 1800, 0, 0.1, 0.0)}
+        self.planner = PipelinePlanner([self.vardict, self.bwa1, self.bwa2],
+                                       {"lib1.fq.gz": GB, "lib2.fq.gz": GB}, 2, self.cost_factors)
+
+    def test_upstream_jobs(self):
+        self.assertEquals(self.planner.job_to_upstream[self.vardict], set([self.bwa1]))
+        self.assertEquals(self.planner.job_to_upstream[self.bwa1], set())
+
+    def test_estimates(self):
+        self.assertEquals(self.planner.estimates[self.bwa1].core_seconds, 3600)
+        self.assertEquals(self.planner.estimates[self.bwa1].wall_seconds, 1800)
+        self.assertEquals(self.planner.estimates[self.vardict].input_bytes, GB / 2)
+        self.assertEquals(self.planner.estimates[self.vardict].core_seconds, 900)
+
+    def test_threads_capped_at_cores(self):
+        planner = PipelinePlanner([self.bwa1], {"lib1.fq.gz": GB}, 1, self.cost_factors)
+        self.assertEquals(planner.estimates[self.bwa1].threads, 1)
+
+    def test_simulate(self):
+        # Both bwa jobs need both cores, so they run one after the other, followed by vardict:
+        wall_seconds, peak_scratch = self.planner.simulate()
+        self.assertEquals(wall_seconds, 1800 + 1800 + 900)
+        self.assertEquals(peak_scratch, GB)
+
+    def test_summarize(self):
+        summary = self.planner.summarize()
+        self.assertAlmostEquals(summary["core_hours"], 2.25)
+        self.assertEquals(summary["stages"]["alignment"]["jobs"], 2)
+        self.assertIn("Predicted wall-clock time on 2 cores: 1.2 h", format_plan(summary))
+
+    def test_cycle(self):
+        self.bwa1.input_fastq = "lib1.vcf"
+        with self.assertRaises(ValueError):
+            PipelinePlanner([self.vardict, self.bwa1], {}, 1)
@@ -77,3 +77,50 @@ class TestQC(unittest.TestCase):
         cmd = test_job.command()
         self.assertIn('dummy_input', cmd)
         self.assertIn('test_output', cmd)
+
+    def test_target_coverage(self):
+        test_job = TargetCoverage()
+        test_job.input_bam = "input.bam"
+        test_job.input_bed = "input.bed"
+        test_job.input_regions = "regions.bed"
+        test_job.output_histogram = "histogram.txt"
+        test_job.output_regions = "regions.txt"
+        test_job.output_qc_call = "qc-call.json"
+        cmd = test_job.command()
+        self.assertIn('-m autoseq.util.coverage', cmd)
+        self.assertIn('--targets input.bed', cmd)
+        self.assertIn('--regions regions.bed --region-table regions.txt', cmd)
+        self.assertIn('--histogram histogram.txt', cmd)
+        self.assertIn('--qc-call qc-call.json', cmd)
+        self.assertIn('-T 30', cmd)
+        self.assertTrue(cmd.endswith('input.bam'))
+
+    def test_genotype_fingerprint(self):
+        test_job = GenotypeFingerprint()
+        test_job.input_bam = "input.bam"
+        test_job.input_sites = "snps.vcf.gz"
+        test_job.sample = "AL-P-NA12877-N-03098121-TD-TT"
+        test_job.individual = "P-NA12877"
+        test_job.output = "test_output"
+        cmd = test_job.command()
+        self.assertIn('-m autoseq.util.fingerprint genotype', cmd)
+        self.assertIn('--sites snps.vcf.gz', cmd)
+        self.assertIn('--individual P-NA12877', cmd)
+        self.assertTrue(cmd.endswith('input.bam test_output'))
+
+    def test_compare_fingerprints(self):
+        test_job = CompareFingerprints()
+        test_job.input_fingerprints = ["a.fingerprint.json", "b.fingerprint.json"]
+        test_job.fingerprint_db = "fingerprints.db"
+        test_job.output = "test_output"
+        cmd = test_job.command()
+        self.assertIn('-m autoseq.util.fingerprint compare', cmd)
+        self.assertIn('--db fingerprints.db', cmd)
+        self.assertIn('--output test_output', cmd)
+        self.assertTrue(cmd.endswith('a.fingerprint.json b.fingerprint.json'))
+        self.assertNotIn('--fail-on-mismatch', cmd)
+
+        test_job.output_multiqc_table = "test_output_mqc.tsv"
+        test_job.fail_on_mismatch = True
+        cmd = test_job.command()
+        self.assertIn('--multiqc-table test_output_mqc.tsv --fail-on-mismatch', cmd)
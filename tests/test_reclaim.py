@@ -0,0 +1,69 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from autoseq.util.reclaim import *
+
+
+class DummyJob(object):
+    def __init__(self, inputs, outputs, is_intermediate=False):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.is_intermediate = is_intermediate
+
+
+class TestReclaim(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.refcount_dir = os.path.join(self.tmpdir, "refcounts")
+        self.intermediate = os.path.join(self.tmpdir, "trimmed.fq.gz")
+        open(self.intermediate, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_find_consumers(self):
+        skewer = DummyJob(["raw.fq.gz"], ["trimmed.fq.gz"], is_intermediate=True)
+        bwa = DummyJob(["trimmed.fq.gz"], ["aligned.bam"])
+        fastqc = DummyJob(["trimmed.fq.gz", "trimmed.fq.gz"], ["fastqc.zip"])
+        vardict = DummyJob(["aligned.bam"], ["out.vcf"])
+        consumers = find_consumers([skewer, bwa, fastqc, vardict], lambda job: job.is_intermediate,
+                                   lambda job: job.inputs, lambda job: job.outputs)
+        self.assertEquals(consumers, {"trimmed.fq.gz": [bwa, fastqc]})
+
+    def test_release(self):
+        initialise_refcounts(self.refcount_dir, {self.intermediate: 2})
+        self.assertEquals(release(self.refcount_dir, self.intermediate), 1)
+        self.assertTrue(os.path.exists(self.intermediate))
+        self.assertEquals(release(self.refcount_dir, self.intermediate), 0)
+        self.assertFalse(os.path.exists(self.intermediate))
+        self.assertEquals(os.listdir(self.refcount_dir), [])
+        self.assertEquals(release(self.refcount_dir, self.intermediate), None)
+
+    def test_release_removes_index(self):
+        bam = os.path.join(self.tmpdir, "merged.bam")
+        for filename in [bam, bam + ".bai"]:
+            open(filename, 'w').close()
+        initialise_refcounts(self.refcount_dir, {bam: 1})
+        release(self.refcount_dir, bam)
+        self.assertFalse(os.path.exists(bam + ".bai"))
+
+    def test_release_command_keep_on_failure(self):
+        initialise_refcounts(self.refcount_dir, {self.intermediate: 1})
+        cmd = release_command("false", self.refcount_dir, [self.intermediate], python=sys.executable)
+        self.assertNotEquals(subprocess.call(cmd, shell=True, executable="/bin/bash"), 0)
+        self.assertTrue(os.path.exists(self.intermediate))
+
+        cmd = release_command("true", self.refcount_dir, [self.intermediate], python=sys.executable)
+        self.assertEquals(subprocess.call(cmd, shell=True, executable="/bin/bash"), 0)
+        self.assertFalse(os.path.exists(self.intermediate))
+
+    def test_release_command_release_on_failure(self):
+        initialise_refcounts(self.refcount_dir, {self.intermediate: 1})
+        cmd = release_command("exit 3", self.refcount_dir, [self.intermediate], keep_on_failure=False,
+                              python=sys.executable)
+        self.assertEquals(subprocess.call(cmd, shell=True, executable="/bin/bash"), 3)
+        self.assertFalse(os.path.exists(self.intermediate))
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from autoseq.util.refstage import *
+
+
+class TestRefstage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.genome_dir = os.path.join(self.tmpdir, "nfs", "genome")
+        self.stage_dir = os.path.join(self.tmpdir, "local")
+        os.makedirs(self.genome_dir)
+        self.fasta = os.path.join(self.genome_dir, "genome.fasta")
+        for filename in [self.fasta, self.fasta + ".fai", self.fasta + ".bwt",
+                         os.path.join(self.genome_dir, "genome.dict")]:
+            with open(filename, 'w') as f:
+                f.write(os.path.basename(filename))
+        self.refdata = {"bwaIndex": self.fasta, "reference_genome": self.fasta, "dbSNP": "dbsnp.vcf.gz"}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_companion_files(self):
+        self.assertEquals(companion_files(self.fasta),
+                          [self.fasta, self.fasta + ".fai", self.fasta + ".bwt",
+                           os.path.join(self.genome_dir, "genome.dict")])
+
+    def test_stage_reference(self):
+        staged_refdata = stage_reference(self.refdata, self.stage_dir)
+        staged_fasta = staged_path(self.stage_dir, self.fasta)
+        self.assertEquals(staged_refdata["bwaIndex"], staged_fasta)
+        self.assertEquals(staged_refdata["reference_genome"], staged_fasta)
+        self.assertEquals(staged_refdata["dbSNP"], "dbsnp.vcf.gz")
+        self.assertTrue(os.path.isfile(staged_fasta + ".bwt"))
+        self.assertTrue(os.path.isfile(os.path.join(os.path.dirname(staged_fasta), "genome.dict")))
+        self.assertEquals(self.refdata["bwaIndex"], self.fasta)
+
+    @patch('autoseq.util.refstage.stage_files')
+    def test_stage_reference_reuses_verified_copies(self, mock_stage_files):
+        mock_stage_files.side_effect = stage_files
+        stage_reference(self.refdata, self.stage_dir)
+        self.assertEquals(len(mock_stage_files.call_args[0][0]), 4)
+
+        mock_stage_files.reset_mock()
+        stage_reference(self.refdata, self.stage_dir)
+        self.assertFalse(mock_stage_files.called)
+
+        # Updating a reference file invalidates its staged copy:
+        with open(self.fasta + ".bwt", 'w') as f:
+            f.write("updated index")
+        stage_reference(self.refdata, self.stage_dir)
+        self.assertEquals(mock_stage_files.call_args[0][0],
+                          [(self.fasta + ".bwt", staged_path(self.stage_dir, self.fasta) + ".bwt")])
+
+    @patch('autoseq.util.refstage.subprocess.check_call')
+    @patch('autoseq.util.refstage.bwa_shm_loaded')
+    def test_preload_bwa_index(self, mock_bwa_shm_loaded, mock_check_call):
+        mock_bwa_shm_loaded.return_value = True
+        preload_bwa_index(self.fasta)
+        self.assertFalse(mock_check_call.called)
+        mock_bwa_shm_loaded.return_value = False
+        preload_bwa_index(self.fasta)
+        mock_check_call.assert_called_with(["bwa", "shm", self.fasta])
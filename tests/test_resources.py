@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from autoseq.util.resources import *
+
+
+class TestResources(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_proc_io(self):
+        proc_root = os.path.join(self.tmpdir, "proc")
+        os.makedirs(os.path.join(proc_root, "123"))
+        with open(os.path.join(proc_root, "123", "io"), 'w') as io_file:
+            io_file.write("rchar: 10\nwchar: 20\nsyscr: 1\nsyscw: 2\nread_bytes: 4096\nwrite_bytes: 8192\n")
+
+        self.assertEquals(read_proc_io(123, proc_root),
+                          {"rchar": 10, "wchar": 20, "read_bytes": 4096, "write_bytes": 8192})
+        self.assertEquals(read_proc_io(124, proc_root), None)
+
+    def test_read_proc_rss(self):
+        proc_root = os.path.join(self.tmpdir, "proc")
+        os.makedirs(os.path.join(proc_root, "123"))
+        with open(os.path.join(proc_root, "123", "status"), 'w') as status_file:
+            status_file.write("Name:\tbash\nVmPeak:\t  200 kB\nVmRSS:\t  100 kB\n")
+
+        self.assertEquals(read_proc_rss(123, proc_root), 102400)
+        self.assertEquals(read_proc_rss(124, proc_root), 0)
+
+    def test_list_process_tree(self):
+        proc_root = os.path.join(self.tmpdir, "proc")
+        for pid, ppid in [(1, 0), (10, 1), (11, 10), (12, 11), (20, 1)]:
+            os.makedirs(os.path.join(proc_root, str(pid)))
+            with open(os.path.join(proc_root, str(pid), "stat"), 'w') as stat_file:
+                stat_file.write("{} (some cmd) S {} 1 1\n".format(pid, ppid))
+
+        self.assertEquals(list_process_tree(10, proc_root), [10, 11, 12])
+
+    def test_run_and_monitor(self):
+        usage = run_and_monitor("exit 3", sample_interval=0.1)
+        self.assertEquals(usage["exit_status"], 3)
+        for key in ["user_cpu_seconds", "sys_cpu_seconds", "max_rss_bytes", "read_bytes", "write_bytes"]:
+            self.assertIn(key, usage)
+        self.assertTrue(usage["wall_seconds"] >= 0)
+
+    def test_monitored_command(self):
+        output = os.path.join(self.tmpdir, "usage.json")
+        cmd = monitored_command("echo 'a b' | grep -q a && exit 5", output, python=sys.executable)
+        self.assertEquals(subprocess.call(cmd, shell=True), 5)
+        self.assertEquals(load_usage(output)["exit_status"], 5)
+
+    def test_add_usage_to_jobdb(self):
+        jobdb_filename = os.path.join(self.tmpdir, "jobdb.json")
+        with open(jobdb_filename, 'w') as jobdb_file:
+            json.dump({"jobs": [{"jobname": "bwa", "status": "COMPLETED"},
+                                {"jobname": "vardict", "status": "FAILED"}]}, jobdb_file)
+
+        self.assertEquals(add_usage_to_jobdb(jobdb_filename, {"bwa": {"max_rss_bytes": 10}}), 1)
+        jobs = json.load(open(jobdb_filename))["jobs"]
+        self.assertEquals(jobs[0]["resources"], {"max_rss_bytes": 10})
+        self.assertNotIn("resources", jobs[1])
@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from autoseq.util.scratch import *
+
+
+class Bwa(object):
+    pass
+
+
+class TestScratch(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_parse_size(self):
+        self.assertEquals(parse_size("100"), 100)
+        self.assertEquals(parse_size("2K"), 2048)
+        self.assertEquals(parse_size("1.5G"), int(1.5 * 1024 ** 3))
+        self.assertEquals(parse_size("2tb"), 2 * 1024 ** 4)
+        self.assertRaises(ValueError, lambda: parse_size("lots"))
+
+    def test_get_scratch_factor(self):
+        job = Bwa()
+        self.assertEquals(get_scratch_factor(job), SCRATCH_FACTORS["Bwa"])
+        job.scratch_factor = 3.0
+        self.assertEquals(get_scratch_factor(job), 3.0)
+        self.assertEquals(get_scratch_factor(object()), None)
+
+    def test_estimate_reservation(self):
+        input_file = os.path.join(self.root, "input.bam")
+        with open(input_file, 'w') as fh:
+            fh.write("x" * 1000)
+        self.assertEquals(estimate_reservation([input_file, "missing.bam"], 2.0, min_bytes=0), 2000)
+        self.assertEquals(estimate_reservation([input_file], 2.0, min_bytes=5000), 5000)
+
+    def test_ledger_admission(self):
+        ledger = ScratchLedger(self.root)
+        self.assertTrue(ledger.try_reserve("job1", 600, 1000))
+        self.assertFalse(ledger.try_reserve("job2", 600, 1000))
+        self.assertTrue(ledger.try_reserve("job3", 400, 1000))
+        self.assertEquals(ledger.reserved_bytes(), 1000)
+        ledger.release("job1")
+        self.assertTrue(ledger.try_reserve("job2", 600, 1000))
+
+    def test_ledger_admits_oversized_job_when_empty(self):
+        ledger = ScratchLedger(self.root)
+        self.assertTrue(ledger.try_reserve("job1", 2000, 1000))
+        self.assertFalse(ledger.try_reserve("job2", 1, 1000))
+
+    def test_ledger_prunes_dead_owners(self):
+        with open(os.path.join(self.root, LEDGER_FILENAME), 'w') as ledger_file:
+            json.dump({"dead": {"host": socket.gethostname(), "pid": 2 ** 22 + 1, "bytes": 1000, "dir": None}},
+                      ledger_file)
+        self.assertTrue(ScratchLedger(self.root).try_reserve("job1", 600, 1000))
+
+    def test_clean_orphans(self):
+        orphan = os.path.join(self.root, JOB_DIR_PREFIX + "bwa-1")
+        live = os.path.join(self.root, JOB_DIR_PREFIX + "bwa-2")
+        other = os.path.join(self.root, "not-ours")
+        for job_dir, pid in [(orphan, 2 ** 22 + 1), (live, os.getpid())]:
+            os.makedirs(job_dir)
+            with open(os.path.join(job_dir, OWNER_FILENAME), 'w') as owner_file:
+                json.dump({"host": socket.gethostname(), "pid": pid}, owner_file)
+        os.makedirs(other)
+
+        self.assertEquals(clean_orphans(self.root), [orphan])
+        self.assertTrue(os.path.isdir(live))
+        self.assertTrue(os.path.isdir(other))
+
+    def test_scratch_command(self):
+        job_dir = os.path.join(self.root, JOB_DIR_PREFIX + "test")
+        cmd = scratch_command("test -d {0} && exit 4".format(job_dir), self.root, job_dir, [], 1.0,
+                              budget=10 ** 9, python=sys.executable)
+        self.assertEquals(subprocess.call(cmd, shell=True), 4)
+        self.assertFalse(os.path.exists(job_dir))
+        self.assertEquals(ScratchLedger(self.root).reserved_bytes(), 0)
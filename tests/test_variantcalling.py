@@ -161,6 +161,19 @@ class TestVariantCalling(unittest.TestCase):
         self.assertIn('bgzip > output.vcf.gz', cmd)
         self.assertIn('tabix', cmd)
 
+    def test_merge_vcf_jvm_worker(self):
+        merge_vcf = MergeVCF()
+        merge_vcf.input_vcf_hc = "hc.vcf.gz"
+        merge_vcf.input_vcf_strelka = "strelka.vcf.gz"
+        merge_vcf.reference_genome = "dummy.fasta"
+        merge_vcf.output_vcf = "output.vcf.gz"
+        merge_vcf.jvm_worker = "/tmp/worker/worker.sock"
+        cmd = merge_vcf.command()
+        # Both the worker and the fallback runs write the same file, compressed only after either succeeds:
+        self.assertEquals(cmd.count("-o output.vcf.gz.tmp.vcf"), 2)
+        self.assertIn("; }; } && bgzip -c output.vcf.gz.tmp.vcf > output.vcf.gz && rm -f output.vcf.gz.tmp.vcf ", cmd)
+        self.assertNotIn("| bgzip", cmd)
+
     def test_vcf_filter(self):
         vcf_filter = VcfFilter()
         vcf_filter.input = "input.vcf"